@@ -2,8 +2,10 @@
 import os #, stat, sys
 import logging
 import gtk
+import numpy
 from lxml import etree
 from pytrainer.lib.srtmlayer import SrtmLayer
+from pytrainer.elevation import add_corrected_elevations, write_gpx
 
 class fixelevation:
     _data = None
@@ -37,40 +39,22 @@ class fixelevation:
             """
             self._data = etree.parse(gpx_file)
             self._xmlns = self._data.getroot().nsmap[None]
-            nsmap = self._data.getroot().nsmap
-            pyt_ns = "http://sourceforge.net.project/pytrainer/GPX/0/1"
-            PYTRAINER = "{%s}" % pyt_ns
             self._trkpt_path = '{%s}trk/{%s}trkseg/{%s}trkpt' % (self._xmlns, self._xmlns, self._xmlns)
 
-            def addExt(trackpoint, ele_new):
-                #Add new elevation to extension tag
-                '''
-                <extensions>
-                    <pytrainer:ele method="srtm_bilinear">31.1</pytrainer:ele>
-                </extensions>
-                '''
-                ext = etree.Element("extensions")
-                py_ele = etree.SubElement(ext, PYTRAINER + "ele", method="srtm_bilinear")
-                py_ele.text = str(ele_new)
-                trackpoint.append(ext)
-
             """
             Replace elevation from GPX by data from SRTM.
             TODO (Arnd) make a function within class fixelevation out of this for better reuse
             """
             trackpoints = self._data.findall(self._trkpt_path)
-            for trkpt in trackpoints:
-                lat = float(trkpt.attrib['lat'])
-                lon = float(trkpt.attrib['lon'])
-            
-                ele = trkpt.find('{%s}ele' % self._xmlns)
-                ele_new = self._srtm.get_elevation(lat, lon)
+            lats = [float(trkpt.attrib['lat']) for trkpt in trackpoints]
+            lons = [float(trkpt.attrib['lon']) for trkpt in trackpoints]
+            elevations = self._srtm.get_elevations(lats, lons)
 
-                if not ele_new:
-                    ele_fixed = False
-                    break 
-
-                addExt(trkpt, ele_new)
+            if numpy.isnan(elevations).any():
+                ele_fixed = False
+            else:
+                #Replaces the elevations of earlier runs, like pytrainer-fixelevation
+                add_corrected_elevations(trackpoints, elevations)
                 
             if not ele_fixed:
                 # Try Google maps elevation API
@@ -93,10 +77,12 @@ class fixelevation:
                 try:
                     google_ele = cjson.decode(urllib2.urlopen(url).read())
                     if google_ele['status'] == "OK":
+                        #Elevations of the trackpoints in order
+                        google_elevations = []
                         t_idx = 0
                         ele_points = len(google_ele['results'])
                         for ele_new in xrange(0,ele_points):
-                            addExt(trackpoints[t_idx], google_ele['results'][ele_new]['elevation'])
+                            google_elevations.append(google_ele['results'][ele_new]['elevation'])
                             for intermediate in xrange(ele_new+1, ele_new+steps):
                                 if intermediate<len(trackpoints):
                                     if ele_new==ele_points-1:
@@ -106,18 +92,16 @@ class fixelevation:
                                         ele2 = google_ele['results'][ele_new+1]['elevation']
                                         calculated = (ele1 * (intermediate-ele_new)  + ele2 * (steps - (intermediate-ele_new))) / steps
                                     t_idx += 1
-                                    addExt(trackpoints[t_idx], calculated)
+                                    google_elevations.append(calculated)
                             t_idx += 1
+                        add_corrected_elevations(trackpoints, google_elevations)
                         ele_fixed = True
                 except urllib2.HTTPError:
                     pass
 
             if ele_fixed:
-                # Write out to original *.gpx.                         
-                self._data.write( gpx_file, 
-                                encoding=self._data.docinfo.encoding, 
-                                xml_declaration=True, 
-                                pretty_print=False)
+                # Write out to original *.gpx.
+                write_gpx(self._data, gpx_file)
                 res_msg = "Elevation has been fixed."
                 #TODO Expire activity out of pool - so get updated info
                 self.pytrainer_main.activitypool.remove_activity(aid)
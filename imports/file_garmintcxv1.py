@@ -20,11 +20,15 @@
 import logging
 import os
 from lxml import etree
+from pytrainer.lib.xmlValidation import get_schema, get_transform
 
 from pytrainer.lib.xmlUtils import XMLParser
 from pytrainer.lib.date import Date
+from pytrainer.lib.sniffer import Signature
 
 class garmintcxv1():
+	signatures = [Signature(root="TrainingCenterDatabase", namespace="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v1")]
+
 	def __init__(self, parent = None, data_path = None):
 		logging.debug("init")
 		self.parent = parent
@@ -68,8 +72,7 @@ class garmintcxv1():
 			#parse filename as xml
 			xmldoc = etree.parse(filename)
 			#Parse XML schema
-			xmlschema_doc = etree.parse(self.main_data_path+"schemas/GarminTrainingCenterDatabase_v1-gpsbabel.xsd")
-			xmlschema = etree.XMLSchema(xmlschema_doc)
+			xmlschema = get_schema(self.main_data_path+"schemas/GarminTrainingCenterDatabase_v1-gpsbabel.xsd")
 			if (xmlschema.validate(xmldoc)):
 				#Valid file
 				self.xmldoc = xmldoc
@@ -117,7 +120,7 @@ class garmintcxv1():
 		if time is None:
 			return False
 		time = time[0].strftime("%Y-%m-%dT%H:%M:%SZ")
-		if self.parent.parent.ddbb.select("records","*","date_time_utc=\"%s\"" % (time)):
+		if self.parent.parent.duplicate_index.has_activity(time):
 			return True
 		else:
 			return False
@@ -155,8 +158,7 @@ class garmintcxv1():
 	def createGPXfile(self, gpxfile, activity):
 		""" Function to transform a Garmin Training Center v2 Track to a valid GPX+ file
 		"""
-		xslt_doc = etree.parse(self.data_path+"/translate_garmintcxv1.xsl")
-		transform = etree.XSLT(xslt_doc)
+		transform = get_transform(self.data_path+"/translate_garmintcxv1.xsl")
 		#xml_doc = etree.parse(filename)
 		xml_doc = activity
 		result_tree = transform(xml_doc)
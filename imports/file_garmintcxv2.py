@@ -21,11 +21,18 @@ import logging
 import os
 import traceback
 from lxml import etree
+from pytrainer.lib.xmlValidation import get_schema, get_transform
 from pytrainer.lib.date import Date
+from pytrainer.lib.gpx import Track
 
 from pytrainer.lib.xmlUtils import XMLParser
+from pytrainer.lib.sniffer import Signature
+
+TCXNS = "{http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2}"
 
 class garmintcxv2():
+    signatures = [Signature(root="TrainingCenterDatabase", namespace="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2")]
+
     def __init__(self, parent = None, data_path = None):
         if parent is not None:
             self.parent = parent
@@ -37,6 +44,8 @@ class garmintcxv2():
         self.xmldoc = None
         self.activitiesSummary = []
         self.activities = []
+        # Parsed activities, None when translated with XSLT instead
+        self.tracks = None
 
     def getXmldoc(self):
         ''' Function to return parsed xmlfile '''
@@ -89,8 +98,7 @@ class garmintcxv2():
 
     def validate(self, xmldoc, schema):
         logging.debug(">>")
-        xmlschema_doc = etree.parse(self.main_data_path + schema)
-        xmlschema = etree.XMLSchema(xmlschema_doc)
+        xmlschema = get_schema(self.main_data_path + schema)
         logging.debug("<<")
         return xmlschema.validate(xmldoc)
 
@@ -98,35 +106,102 @@ class garmintcxv2():
         logging.debug(">>")
         self.activities = self.getActivities()
         for activity in self.activities:
-            startTime = self.getDateTime(self.getStartTimeFromActivity(activity))
-            inDatabase = self.inDatabase(startTime)
-            sport = self.getSport(activity)
-            distance, duration  = self.getDetails(activity, startTime)
-            distance = distance / 1000.0
-            self.activitiesSummary.append((self.activities.index(activity),
-                                                                 inDatabase, 
-                                                                 startTime[1].strftime("%Y-%m-%dT%H:%M:%S"), 
-                                                                 "%0.2f" % distance , 
-                                                                 str(duration), 
-                                                                 sport,
-                                                                 ))
+            self.activitiesSummary.append(self.getActivitySummary(self.activities.index(activity), activity))
         logging.debug("<<")
 
+    def getActivitySummary(self, index, activity):
+        startTime = self.getDateTime(self.getStartTimeFromActivity(activity))
+        inDatabase = self.inDatabase(startTime)
+        sport = self.getSport(activity)
+        distance, duration  = self.getDetails(activity, startTime)
+        distance = distance / 1000.0
+        return (index,
+                inDatabase, 
+                startTime[1].strftime("%Y-%m-%dT%H:%M:%S"), 
+                "%0.2f" % distance , 
+                str(duration), 
+                sport,
+                )
+
+    def readFile(self, filename):
+        '''Stream the activities of a file into tracks, validating it on the way.
+        Each activity is dropped from the tree once summarized and parsed'''
+        logging.debug(">>")
+        schema = get_schema(self.main_data_path + "schemas/GarminTrainingCenterDatabase_v2.xsd")
+        self.tracks = []
+        for event, activity in etree.iterparse(filename, tag=TCXNS+"Activity", schema=schema):
+            self.activitiesSummary.append(self.getActivitySummary(len(self.tracks), activity))
+            self.tracks.append(self.parseActivity(activity))
+            activity.clear()
+        logging.debug("<<")
+
+    def parseActivity(self, activity):
+        '''Parse a Garmin Training Center v2 activity with the values translate_garmintcxv2.xsl
+        writes to GPX+'''
+        segments = []
+        laps = []
+        lap_start_times = []
+        for lap in activity.iterfind(TCXNS+"Lap"):
+            points = []
+            positions = []
+            for trackpoint in lap.iterfind(TCXNS+"Track/"+TCXNS+"Trackpoint"):
+                position = trackpoint.find(TCXNS+"Position")
+                if position is None:
+                    continue
+                lat = position.findtext(TCXNS+"LatitudeDegrees")
+                lon = position.findtext(TCXNS+"LongitudeDegrees")
+                ele = trackpoint.findtext(TCXNS+"AltitudeMeters")
+                hr = trackpoint.findtext(TCXNS+"HeartRateBpm/"+TCXNS+"Value")
+                cadence = trackpoint.findtext(TCXNS+"Cadence")
+                points.append((float(lat), float(lon), trackpoint.findtext(TCXNS+"Time"),
+                               float(ele) if ele else None,
+                               int(hr) if hr else None,
+                               int(cadence) if cadence else None))
+                positions.append((lat, lon))
+            start = positions[0] if positions else ("", "")
+            end = positions[-1] if positions else ("", "")
+            laps.append((lap.findtext(TCXNS+"TotalTimeSeconds"),
+                         end[0], end[1],
+                         lap.findtext(TCXNS+"Calories"),
+                         lap.findtext(TCXNS+"DistanceMeters"),
+                         start[0], start[1],
+                         lap.findtext(TCXNS+"Intensity").lower(),
+                         lap.findtext(TCXNS+"AverageHeartRateBpm/"+TCXNS+"Value"),
+                         lap.findtext(TCXNS+"MaximumHeartRateBpm/"+TCXNS+"Value"),
+                         lap.findtext(TCXNS+"MaximumSpeed"),
+                         lap.findtext(TCXNS+"TriggerMethod").lower()))
+            lap_start_times.append(lap.get("StartTime"))
+            segments.append(points)
+        return Track(self.getStartTimeFromActivity(activity), self.getSport(activity), segments, laps, lap_start_times)
+
     def testFile(self, filename):
         '''Check if file is valid TCXv2 one and if yes, retrieve activities from it'''
         logging.debug('>>')
         logging.debug("Testing %s" %filename)
         result = False
         try:
-            xmldoc = etree.parse(filename)
-            valid_xml = self.validate(xmldoc, "schemas/GarminTrainingCenterDatabase_v2.xsd")
-            if (valid_xml):
-                logging.debug("Valid TCXv2 file (%s)" %filename)
-                self.xmldoc = xmldoc
-                self.buildActivitiesSummary()
-                result = True
+            self.readFile(filename)
+            logging.debug("Valid TCXv2 file (%s)" %filename)
+            result = True
+        except etree.XMLSyntaxError as e:
+            logging.debug("Not a valid TCXv2 file (%s): %s" % (filename, e))
+            self.tracks = None
+            self.activitiesSummary = []
         except:
+            # Unexpected content, let the XSLT translation have a go at it
             logging.debug("Traceback: %s" % traceback.format_exc())
+            self.tracks = None
+            self.activitiesSummary = []
+            try:
+                xmldoc = etree.parse(filename)
+                valid_xml = self.validate(xmldoc, "schemas/GarminTrainingCenterDatabase_v2.xsd")
+                if (valid_xml):
+                    logging.debug("Valid TCXv2 file (%s), translating it with XSLT" %filename)
+                    self.xmldoc = xmldoc
+                    self.buildActivitiesSummary()
+                    result = True
+            except:
+                logging.debug("Traceback: %s" % traceback.format_exc())
         logging.debug('<<')
         return result
 
@@ -146,7 +221,7 @@ class garmintcxv2():
             time = startTime[0].strftime("%Y-%m-%dT%H:%M:%SZ")
             # No parent provided when unit testing (EAFP approach)
             try:
-                if self.parent.parent.ddbb.select("records","*","date_time_utc=\"%s\"" % (time)):
+                if self.parent.parent.duplicate_index.has_activity(time):
                     result = True
             except AttributeError:
                 logging.error("No parent attribute in current instance (testing?), skipping db check")
@@ -179,18 +254,29 @@ class garmintcxv2():
         sport = None
         gpxFile = None
         activityID = int(ID)
-        activitiesCount = len(self.activities)
+        activitiesCount = len(self.activitiesSummary)
         if activitiesCount > 0 and activityID < activitiesCount:
             gpxFile = "%s/garmin-tcxv2-%s-%d.gpx" % (self.tmpdir, file_id, activityID)
-            activity = self.activities[int(activityID)]
-            sport = self.getSport(activity)
-            self.createGPXfile(gpxFile, activity)
+            if self.tracks is not None:
+                track = self.tracks[activityID]
+                sport = track.sport
+                track.write(gpxFile)
+            else:
+                activity = self.activities[int(activityID)]
+                sport = self.getSport(activity)
+                self.createGPXfile(gpxFile, activity)
         return sport, gpxFile  
 
+    def getTrack(self, ID):
+        """ Returns the parsed track of an activity, None if translated with XSLT
+        """
+        if self.tracks is None:
+            return None
+        return self.tracks[int(ID)]
+
     def createGPXfile(self, gpxfile, activity):
         """ Function to transform a Garmin Training Center v2 Track to a valid GPX+ file"""
-        xslt_doc = etree.parse(self.data_path+"/translate_garmintcxv2.xsl")
-        transform = etree.XSLT(xslt_doc)
+        transform = get_transform(self.data_path+"/translate_garmintcxv2.xsl")
         xml_doc = activity
         result_tree = transform(xml_doc)
         result_tree.write(gpxfile, xml_declaration=True, encoding='UTF-8')
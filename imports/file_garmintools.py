@@ -24,9 +24,14 @@ import logging
 import os
 import StringIO
 from lxml import etree
+from pytrainer.lib.xmlValidation import get_schema, get_transform
 from pytrainer.lib.date import Date
+from pytrainer.lib.sniffer import Signature
 
 class garmintools():
+	#Dumps have several top elements, the first one a run
+	signatures = [Signature(root="run")]
+
 	def __init__(self, parent = None, data_path = None):
 		self.parent = parent
 		self.pytrainer_main = parent.parent
@@ -58,8 +63,7 @@ class garmintools():
 			#parse string as xml
 			xmldoc = etree.parse(fileString)
 			#Parse XML schema
-			xmlschema_doc = etree.parse(self.main_data_path+"schemas/garmintools.xsd")
-			xmlschema = etree.XMLSchema(xmlschema_doc)
+			xmlschema = get_schema(self.main_data_path+"schemas/garmintools.xsd")
 			if (xmlschema.validate(xmldoc)):
 				#Valid garmintools file
 				self.xmldoc = xmldoc
@@ -90,7 +94,7 @@ class garmintools():
 		if time is None:
 			return False
 		time = time[0].strftime("%Y-%m-%dT%H:%M:%SZ")
-		if self.parent.parent.ddbb.select("records","*","date_time_utc=\"%s\"" % (time)):
+		if self.parent.parent.duplicate_index.has_activity(time):
 			return True
 		else:
 			return False
@@ -151,8 +155,7 @@ class garmintools():
 	def createGPXfile(self, gpxfile, tree):
 		""" Function to transform a Garmintools dump file to a valid GPX+ file
 		"""
-		xslt_doc = etree.parse(self.data_path+"/translate_garmintools.xsl")
-		transform = etree.XSLT(xslt_doc)
+		transform = get_transform(self.data_path+"/translate_garmintools.xsl")
 		result_tree = transform(tree)
 		result_tree.write(gpxfile, xml_declaration=True, encoding='UTF-8')
 
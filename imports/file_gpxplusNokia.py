@@ -21,9 +21,13 @@ import logging
 import os
 #import StringIO
 from lxml import etree
+from pytrainer.lib.xmlValidation import get_schema
 from pytrainer.lib.date import Date
+from pytrainer.lib.sniffer import Signature
 
 class gpxplusNokia():
+    signatures = [Signature(root="gpx", namespace="http://www.topografix.com/GPX/1/1")]
+
     def __init__(self, parent = None, data_path = None):
         self.parent = parent
         self.pytrainer_main = parent.parent
@@ -51,8 +55,7 @@ class gpxplusNokia():
             #parse as xml
             xmldoc = etree.parse(filename)
             #Parse XML schema
-            xmlschema_doc = etree.parse(self.main_data_path+"schemas/Topografix_gpx11-Nokia.xsd")
-            xmlschema = etree.XMLSchema(xmlschema_doc)
+            xmlschema = get_schema(self.main_data_path+"schemas/Topografix_gpx11-Nokia.xsd")
             if (xmlschema.validate(xmldoc)):
                 #Valid gpx file
                 self.xmldoc = xmldoc
@@ -83,7 +86,7 @@ class gpxplusNokia():
         if time is None:
             return False
         time = time[0].strftime("%Y-%m-%dT%H:%M:%SZ")
-        if self.parent.parent.ddbb.select("records","*","date_time_utc=\"%s\"" % (time)):
+        if self.parent.parent.duplicate_index.has_activity(time):
             return True
         else:
             return False
@@ -24,10 +24,14 @@ import datetime
 from dateutil.tz import *
 from StringIO import StringIO
 from lxml import etree
+from pytrainer.lib.xmlValidation import get_schema
 
 from pytrainer.lib.date import Date
+from pytrainer.lib.sniffer import Signature
 
 class kml20():
+	signatures = [Signature(root="kml", namespace="http://earth.google.com/kml/2.0")]
+
 	def __init__(self, parent = None, data_path = None):
 		self.parent = parent
 		self.pytrainer_main = parent.parent
@@ -56,8 +60,7 @@ class kml20():
 			#parse filename as xml
 			xmldoc = etree.parse(filename)
 			#Parse XML schema
-			xmlschema_doc = etree.parse(self.main_data_path+"schemas/kml20-geodistance.xsd")
-			xmlschema = etree.XMLSchema(xmlschema_doc)
+			xmlschema = get_schema(self.main_data_path+"schemas/kml20-geodistance.xsd")
 			if (xmlschema.validate(xmldoc)):
 				self.activities.append(xmldoc) # Assuming one activity per file
 				#Valid file
@@ -90,7 +90,7 @@ class garmingpx():
 			only valid for GPX files with a single activity 
 		"""
 		time = self.detailsFromGPX(filename)
-		if self.pytrainer_main.ddbb.select("records","*","date_time_utc=\"%s\"" % (time)):
+		if self.pytrainer_main.duplicate_index.has_activity(time):
 			return True
 		else:
 			return False
@@ -22,6 +22,7 @@
 import os
 import logging
 from lxml import etree
+from pytrainer.lib.xmlValidation import get_transform
 
 from pytrainer.lib.xmlUtils import XMLParser
 from pytrainer.gui.dialogs import fileChooserDialog, guiFlush
@@ -104,7 +105,7 @@ class garminhrfile():
 		else:
 			time = timeElement.text
 			#comparing date and start time (sport may have been changed in DB after import)
-			if self.pytrainer_main.ddbb.select("records","*","date_time_utc=\"%s\"" % (time)):
+			if self.pytrainer_main.duplicate_index.has_activity(time):
 				logging.debug("Not importing track for time %s" % (time))
 				return False
 			else:
@@ -129,7 +130,6 @@ class garminhrfile():
 	def createGPXfile(self, gpxfile, track):
 		""" Function to transform a Garmin Training Center v1 Track to a valid GPX+ file
 		"""
-		xslt_doc = etree.parse(self.data_path+"/translate.xsl")
-		transform = etree.XSLT(xslt_doc)
+		transform = get_transform(self.data_path+"/translate.xsl")
 		result_tree = transform(track)
 		result_tree.write(gpxfile, xml_declaration=True, encoding='UTF-8')
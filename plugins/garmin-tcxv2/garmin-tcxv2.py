@@ -20,6 +20,7 @@
 import logging
 import os
 from lxml import etree
+from pytrainer.lib.xmlValidation import get_transform
 from pytrainer.lib.xmlUtils import XMLParser
 from pytrainer.gui.dialogs import fileChooserDialog, guiFlush
 
@@ -90,7 +91,7 @@ class garminTCXv2():
 	def inDatabase(self, activity):
 		#comparing date and start time (sport may have been changed in DB after import)
 		time = self.detailsFromTCX(activity)
-		if self.pytrainer_main.ddbb.select("records","*","date_time_utc=\"%s\"" % (time)):
+		if self.pytrainer_main.duplicate_index.has_activity(time):
 			return True
 		else:
 			return False
@@ -116,8 +117,7 @@ class garminTCXv2():
 	def createGPXfile(self, gpxfile, activity):
 		""" Function to transform a Garmin Training Center v2 Track to a valid GPX+ file
 		"""
-		xslt_doc = etree.parse(self.data_path+"/translate.xsl")
-		transform = etree.XSLT(xslt_doc)
+		transform = get_transform(self.data_path+"/translate.xsl")
 		#xml_doc = etree.parse(filename)
 		xml_doc = activity
 		result_tree = transform(xml_doc)
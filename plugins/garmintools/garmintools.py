@@ -24,6 +24,7 @@ import logging
 import os
 import StringIO
 from lxml import etree
+from pytrainer.lib.xmlValidation import get_transform
 
 from pytrainer.lib.xmlUtils import XMLParser
 from pytrainer.gui.dialogs import fileChooserDialog, guiFlush
@@ -94,7 +95,7 @@ class garmintools():
 	def inDatabase(self, tree):
 		#comparing date and start time (sport may have been changed in DB after import)
 		time = self.detailsFromFile(tree)
-		if self.pytrainer_main.ddbb.select("records","*","date_time_utc=\"%s\"" % (time)):
+		if self.pytrainer_main.duplicate_index.has_activity(time):
 			return True
 		else:
 			return False
@@ -126,8 +127,7 @@ class garmintools():
 	def createGPXfile(self, gpxfile, tree):
 		""" Function to transform a Garmintools dump file to a valid GPX+ file
 		"""
-		xslt_doc = etree.parse(self.data_path+"/translate.xsl")
-		transform = etree.XSLT(xslt_doc)
+		transform = get_transform(self.data_path+"/translate.xsl")
 		result_tree = transform(tree)
 		result_tree.write(gpxfile, xml_declaration=True, encoding='UTF-8')
 
@@ -30,6 +30,7 @@ import traceback
 import dateutil.parser
 
 from lxml import etree
+from pytrainer.lib.xmlValidation import get_transform
 from pytrainer.lib.xmlUtils import XMLParser
 from datetime import date, timedelta, datetime
 from dateutil.tz import * # for tzutc()
@@ -94,7 +95,6 @@ class garmintools_full():
 					if len(selectedFiles) > 0:
 						logging.info("Dumping "+str(len(selectedFiles))+" binary files found")
 						dumpFiles = self.dumpBinaries(selectedFiles)
-						self.listStringDBUTC = self.pytrainer_main.ddbb.select("records","date_time_utc")
 						if self.maxGap > 0:
 							logging.info("Starting import. Comparison will be made with "+str(self.maxGap)+" seconds interval")
 						else:
@@ -187,7 +187,7 @@ class garmintools_full():
 			startDatetime = dateutil.parser.parse(stringStartDatetime)
 			# converting to utc for proper comparison with date_time_utc
 			stringStartUTC = startDatetime.astimezone(tzutc()).strftime("%Y-%m-%dT%H:%M:%SZ")
-			if self.checkDupe(stringStartUTC, self.listStringDBUTC, int(self.maxGap)):
+			if self.pytrainer_main.duplicate_index.has_activity(stringStartUTC, int(self.maxGap)):
 				exists = True
 			else:
 				logging.info("Marking "+str(filename)+" | "+str(stringStartUTC)+" to import")
@@ -198,38 +198,6 @@ class garmintools_full():
 		logging.debug("<<")
 		return exists
 
-	def checkDupe(self, stringStartUTC, listStringStartUTC, gap):
-		""" Checks if there is any startUTC in DB between provided startUTC plus a defined gap:
-			Check for same day (as baselined to UTC)
-			startDatetime + delta (~ 3 mins) >= listDatetime[x]
-			args:
-				stringStartUTC
-				listStringStartUTC
-				gap
-			returns: True if any coincidence is found. False otherwise"""
-		logging.debug(">>")
-		found = False
-		if gap > 0:
-			# Retrieve date from 2010-01-14T11:34:49Z
-			stringStartDate = stringStartUTC[0:10]
-			for entry in listStringStartUTC:
-				#logging.debug("start: "+str(startDatetime)+" | entry: "+str(entry)+" | gap: "+str(datetimePlusDelta))
-				if entry[0] is not None:
-					if str(entry[0]).startswith(stringStartDate):
-						deltaGap = timedelta(seconds=gap)
-						datetimeStartUTC = datetime.strptime(stringStartUTC,"%Y-%m-%dT%H:%M:%SZ")
-						datetimeStartUTCDB = datetime.strptime(entry[0],"%Y-%m-%dT%H:%M:%SZ")
-						datetimePlusDelta = datetimeStartUTC + deltaGap
-						if datetimeStartUTC <= datetimeStartUTCDB and datetimeStartUTCDB <= datetimePlusDelta:
-							found = True
-							logging.debug("Found: "+str(stringStartUTC)+" <= "+str(entry[0])+" <= "+str(datetimePlusDelta))
-							break
-		else:
-			if (stringStartUTC,) in listStringStartUTC: # strange way to store results from DB
-				found = True
-		logging.debug("<<")
-		return found
-
 	def getSport(self, tree):
 		#return sport from file or overide if present
 		if self.sport:
@@ -255,8 +223,7 @@ class garmintools_full():
 	def createGPXfile(self, gpxfile, tree):
 		""" Function to transform a Garmintools dump file to a valid GPX+ file
 		"""
-		xslt_doc = etree.parse(self.data_path+"/translate.xsl")
-		transform = etree.XSLT(xslt_doc)
+		transform = get_transform(self.data_path+"/translate.xsl")
 		result_tree = transform(tree)
 		result_tree.write(gpxfile, xml_declaration=True, encoding='UTF-8')
 
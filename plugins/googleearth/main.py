@@ -22,6 +22,7 @@ import os
 import commands
 import logging
 from lxml import etree
+from pytrainer.lib.xmlValidation import get_transform
 from pytrainer.gui.dialogs import fileChooserDialog, guiFlush
 
 class googleearth():
@@ -96,8 +97,7 @@ class googleearth():
 		''' Function to transform a GPSBabel kml file to a valid GPX+ file
 		'''
 		#TODO!!
-		xslt_doc = etree.parse(self.data_path+"/translate.xsl")
-		transform = etree.XSLT(xslt_doc)
+		transform = get_transform(self.data_path+"/translate.xsl")
 		result_tree = transform(filename)
 		result_tree.write(gpxfile, xml_declaration=True, encoding='UTF-8')
 
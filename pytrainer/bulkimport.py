@@ -0,0 +1,294 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+"""Import many activity files at once without a display.
+
+Used by the pytrainer-import script. The directories given are searched
+recursively for files an importer recognises from their first bytes. The
+files are shared out to a pool of worker processes, each turning a file into
+the records and laps to insert like the import window does. Activities
+already in the database, or met earlier in the run, are skipped, and the
+others are inserted in batches, each in a single transaction. Activities
+can also be compared by their tracks, to skip those imported before from a
+file of another format.
+"""
+
+import bisect
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from optparse import OptionParser
+
+from pytrainer.core.duplicate import is_near, utc_seconds
+from pytrainer.headless import Headless
+from pytrainer.lib.sniffer import ImporterRegistry
+from pytrainer.record import Record
+
+# Where pytrainer runs from the source tree, holding the importers
+DATA_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + "/"
+# Activities inserted in each transaction
+BATCH_SIZE = 100
+
+def find_files(paths, importers):
+    """Get the files under paths that an importer may read.
+
+    Directories are searched recursively, files given directly are always
+    included.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                filename = os.path.join(dirpath, name)
+                if importers.candidates(filename):
+                    yield filename
+
+class ImportContext(object):
+
+    """Stands in for the import window as the parent of importers."""
+
+    def __init__(self, trainer):
+        self.parent = trainer
+
+class FileParser(object):
+
+    """Turns activity files into the records and laps to insert."""
+
+    def __init__(self, conf_dir, data_path, tolerance=0, compare_tracks=False):
+        self.trainer = Headless(conf_dir, data_path)
+        self.tolerance = tolerance
+        self.compare_tracks = compare_tracks
+        self.importers = ImporterRegistry(data_path)
+        self.record = Record(self.trainer.sport_service, data_path, self.trainer)
+        self.context = ImportContext(self.trainer)
+        self.parsed = 0
+
+    def parse(self, filename):
+        """Get the activities of a file that are not in the database yet.
+
+        The GPX file of each activity is written to the temporary directory.
+
+        Returns:
+            (list): the (list_options, laps) of each new activity, as
+                returned by Record.summaryFromGPX.
+            (int): the number of activities already in the database, or
+                starting within the tolerance of one.
+        Raises:
+            ValueError: no importer reads the file.
+        """
+        processClass = self.importers.identify(filename, self.context)
+        if processClass is None:
+            raise ValueError("unknown file format")
+        self.parsed += 1
+        #Unique among all workers, names the GPX files written
+        file_id = "%d-%d" % (os.getpid(), self.parsed)
+        activities = []
+        duplicates = 0
+        duplicate_index = self.trainer.duplicate_index
+        for activity_id, in_db, start_time, distance, duration, sport in processClass.getActivitiesSummary():
+            if in_db:
+                duplicates += 1
+                continue
+            gpx_file = processClass.getGPXFile(activity_id, file_id)[1]
+            if self.compare_tracks and duplicate_index.has_track_gpx(gpx_file):
+                logging.info("Track of activity %s of %s already in database" % (activity_id, filename))
+                os.remove(gpx_file)
+                duplicates += 1
+                continue
+            track = processClass.getTrack(activity_id) if hasattr(processClass, "getTrack") else None
+            list_options, laps = self.record.summaryFromGPX(gpx_file, (sport, ""), track)
+            if self.tolerance and duplicate_index.has_activity(list_options["date_time_utc"], self.tolerance):
+                os.remove(gpx_file)
+                duplicates += 1
+                continue
+            #As set by the import window
+            list_options["rcd_date"] = list_options["date_time_local"].strftime("%Y-%m-%d")
+            activities.append((list_options, laps))
+        return activities, duplicates
+
+_parser = None
+
+def _init_worker(conf_dir, data_path, tolerance, compare_tracks):
+    global _parser
+    _parser = FileParser(conf_dir, data_path, tolerance, compare_tracks)
+
+def _parse_file(filename):
+    try:
+        activities, duplicates = _parser.parse(filename)
+        return filename, activities, duplicates, None
+    except Exception as e:
+        logging.exception("Unable to import %s" % filename)
+        return filename, [], 0, str(e)
+
+class ImportSummary(object):
+
+    """Counts of what an import run did."""
+
+    def __init__(self):
+        self.files = 0
+        self.activities = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.failures = []
+        self.seconds = 0.0
+
+    def files_per_second(self):
+        return self.files / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return ("Imported %d of %d activities from %d files in %0.1f seconds (%0.1f files/s), "
+                "%d duplicates skipped, %d files failed") % (self.imported, self.activities, self.files,
+                self.seconds, self.files_per_second(), self.duplicates, len(self.failures))
+
+class Inserter(object):
+
+    """Inserts new activities in batches, skipping those starting within
+    the tolerance of one met before."""
+
+    def __init__(self, trainer, data_path, batch_size=BATCH_SIZE, tolerance=0):
+        self.record = Record(trainer.sport_service, data_path, trainer)
+        self.batch_size = batch_size
+        self.tolerance = tolerance
+        self.pending = []
+        #Sorted start times of the activities met, in seconds since the epoch
+        self.start_times = []
+
+    def add(self, activities):
+        """Queue activities for insertion.
+
+        Returns (int): the number of activities skipped as duplicates.
+        """
+        duplicates = 0
+        for list_options, laps in activities:
+            seconds = utc_seconds(list_options["date_time_utc"])
+            if is_near(self.start_times, seconds, self.tolerance):
+                duplicates += 1
+                os.remove(list_options["rcd_gpxfile"])
+            else:
+                bisect.insort(self.start_times, seconds)
+                self.pending.append((list_options, laps))
+        return duplicates
+
+    def flush(self, force=False):
+        """Insert the queued activities if a batch is full, or forced.
+
+        Returns (int): the number of activities inserted.
+        """
+        if not self.pending or (len(self.pending) < self.batch_size and not force):
+            return 0
+        batch, self.pending = self.pending, []
+        try:
+            self.record.insertRecords(batch)
+        finally:
+            for list_options, laps in batch:
+                os.remove(list_options["rcd_gpxfile"])
+        return len(batch)
+
+def run(options, progress=None):
+    """Import the activities in the files and directories of the options.
+
+    Args:
+        options: parsed command line options (see get_options).
+        progress: optional function called with (filename, activities,
+            duplicates, error) as each file is parsed.
+    Returns:
+        (ImportSummary): what was imported.
+    """
+    start_time = time.time()
+    summary = ImportSummary()
+    trainer = Headless(options.conf_dir, options.data_path)
+    try:
+        filenames = list(find_files(options.paths, ImporterRegistry(options.data_path)))
+        logging.info("Importing %d files with %d workers" % (len(filenames), options.jobs))
+        inserter = Inserter(trainer, options.data_path, options.batch_size, options.tolerance)
+        worker_args = (options.conf_dir, options.data_path, options.tolerance, options.compare_tracks)
+        if options.jobs <= 1 or len(filenames) <= 1:
+            _init_worker(*worker_args)
+            results = (_parse_file(filename) for filename in filenames)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(options.jobs, _init_worker, worker_args)
+            results = pool.imap_unordered(_parse_file, filenames)
+        try:
+            for filename, activities, duplicates, error in results:
+                summary.files += 1
+                summary.activities += len(activities) + duplicates
+                summary.duplicates += duplicates + inserter.add(activities)
+                if error is not None:
+                    summary.failures.append((filename, error))
+                summary.imported += inserter.flush()
+                if progress is not None:
+                    progress(filename, len(activities), duplicates, error)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        summary.imported += inserter.flush(force=True)
+    finally:
+        trainer.close()
+    summary.seconds = time.time() - start_time
+    return summary
+
+def get_options(args=None):
+    usage = '''usage: %prog [options] PATH...
+
+        Import the activities of files, and of the files found in
+        directories, into pytrainer.
+        For more help on valid options try:
+           %prog -h '''
+    parser = OptionParser(usage=usage)
+    parser.set_defaults(log_level=logging.ERROR, conf_dir=None, batch_size=BATCH_SIZE, tolerance=0,
+        compare_tracks=False, jobs=multiprocessing.cpu_count())
+    parser.add_option("-d", "--debug", action="store_const", const=logging.DEBUG, dest="log_level", help="enable logging at debug level")
+    parser.add_option("-i", "--info", action="store_const", const=logging.INFO, dest="log_level", help="enable logging at info level")
+    parser.add_option("-w", "--warn", action="store_const", const=logging.WARNING, dest="log_level", help="enable logging at warning level")
+    parser.add_option("--confdir", dest="conf_dir", help="Specify the directory where application configuration is stored.")
+    parser.add_option("--batch-size", dest="batch_size", type="int", help="Activities inserted in each transaction (default: %d)." % BATCH_SIZE)
+    parser.add_option("--tolerance", dest="tolerance", type="int", metavar="SECONDS", help="Skip activities starting within this many seconds of another one (default: 0, the same second).")
+    parser.add_option("--compare-tracks", action="store_true", dest="compare_tracks", help="Also skip activities whose track is already in the database, e.g. imported from a file of another format.")
+    parser.add_option("-j", "--jobs", dest="jobs", type="int", help="Number of worker processes (default: number of CPUs).")
+    (options, args) = parser.parse_args(args)
+    if not args:
+        parser.error("a file or directory to import is required")
+    if options.batch_size < 1:
+        parser.error("the batch size must be at least 1")
+    if options.tolerance < 0:
+        parser.error("the tolerance cannot be negative")
+    options.paths = args
+    options.data_path = DATA_PATH
+    return options
+
+def main(args=None, data_path=None):
+    options = get_options(args)
+    if data_path is not None:
+        options.data_path = data_path
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter('%(asctime)s|%(levelname)s|%(module)s|%(funcName)s|%(message)s'))
+    logging.getLogger('').addHandler(handler)
+    logging.getLogger('').setLevel(options.log_level)
+    def progress(filename, activities, duplicates, error):
+        if error is None:
+            print "%s: %d new, %d in database" % (filename, activities, duplicates)
+    summary = run(options, progress)
+    for filename, error in summary.failures:
+        print >> sys.stderr, "Failed to import %s: %s" % (filename, error)
+    print >> sys.stderr, summary
+    return 1 if summary.failures else 0
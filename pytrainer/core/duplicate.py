@@ -0,0 +1,136 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+"""Finding activities that are already in the database, for imports.
+
+The start times of all records are read once from the (indexed)
+date_time_utc column into a sorted list, and an activity is known if one
+starts within some seconds of it, found by bisection. The list is read again
+only after the database has changed.
+
+Tracks can be compared too: the hash of every track, normalised to its
+positions rounded to HASH_DECIMALS and its times to whole seconds, is kept
+in track_hashes. A track converted to another format, a TCX file saved as
+GPX say, has the same hash.
+"""
+
+import bisect
+import calendar
+import datetime
+import hashlib
+import logging
+
+import dateutil.parser
+
+from pytrainer.lib.gpx import timed_track_points
+
+# About a metre, below the differences between formats
+HASH_DECIMALS = 5
+
+def utc_seconds(value):
+    """Get the seconds since the epoch of a UTC time.
+
+    Args:
+        value: a datetime or its ISO 8601 text, e.g. 2013-02-09T10:07:06Z.
+            Naive times are taken as UTC.
+    Returns:
+        (int): the seconds, None if value is not a time.
+    """
+    if not isinstance(value, datetime.datetime):
+        try:
+            #Most times are in UTC, often with fractions of a second
+            if value.endswith("Z"):
+                value = datetime.datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")
+            else:
+                value = dateutil.parser.parse(value)
+        except (AttributeError, TypeError, ValueError):
+            return None
+    if value.tzinfo is not None:
+        return calendar.timegm(value.utctimetuple())
+    return calendar.timegm(value.timetuple())
+
+def track_hash(lats, lons, times):
+    """Get the hash of a track, the same for all its formats.
+
+    Args:
+        lats, lons: the positions of the trackpoints.
+        times: the texts of their UTC time elements, None if missing.
+    Returns:
+        (str): the hexadecimal SHA-1 of the normalised track.
+    """
+    digest = hashlib.sha1()
+    for lat, lon, time_ in zip(lats, lons, times):
+        digest.update("%.*f,%.*f,%s\n" % (HASH_DECIMALS, lat, HASH_DECIMALS, lon, time_[:19] if time_ else ""))
+    return digest.hexdigest()
+
+def is_near(start_times, seconds, tolerance=0):
+    """Whether a sorted list of times has one within tolerance of seconds."""
+    index = bisect.bisect_left(start_times, seconds - tolerance)
+    return index < len(start_times) and start_times[index] <= seconds + tolerance
+
+class DuplicateIndex(object):
+
+    """Tells whether activities are already in the database, and keeps the
+    hashes of the tracks up to date."""
+
+    def __init__(self, ddbb):
+        self._ddbb = ddbb
+        self._start_times = []
+        self._data_version = None
+
+    def get_start_times(self):
+        """Get the sorted start times of all records, in seconds since the
+        epoch."""
+        if self._data_version != self._ddbb.data_version:
+            rows = self._ddbb.select("records", "date_time_utc", "date_time_utc is not null")
+            self._start_times = sorted(seconds for seconds in (utc_seconds(row[0]) for row in rows) if seconds is not None)
+            self._data_version = self._ddbb.data_version
+            logging.debug("Loaded start times of %d records" % len(self._start_times))
+        return self._start_times
+
+    def has_activity(self, start_time, tolerance=0):
+        """Whether an activity starts within tolerance seconds of start_time.
+
+        Args:
+            start_time: UTC start time, as taken by utc_seconds.
+            tolerance (int): seconds either side of start_time.
+        """
+        seconds = utc_seconds(start_time)
+        if seconds is None:
+            return False
+        return is_near(self.get_start_times(), seconds, tolerance)
+
+    def has_track(self, hash_):
+        """Whether a track with this hash (see track_hash) is in the
+        database."""
+        return len(self._ddbb.select("track_hashes", "record", "hash='%s'" % hash_)) > 0
+
+    def has_track_gpx(self, gpxfile):
+        return self.has_track(track_hash(*timed_track_points(gpxfile)))
+
+    def add(self, id_record, lats, lons, times):
+        """Keep the hash of the track of an activity, replacing any previous
+        one."""
+        self.remove(id_record)
+        if not len(lats):
+            return
+        self._ddbb.insert_many("track_hashes", "record,hash", [(int(id_record), track_hash(lats, lons, times))])
+
+    def add_gpx(self, id_record, gpxfile):
+        self.add(id_record, *timed_track_points(gpxfile))
+
+    def remove(self, id_record):
+        self._ddbb.delete("track_hashes", "record=%d" % int(id_record))
@@ -0,0 +1,313 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+"""Repeated routes and segment leaderboards.
+
+Every track gets a fingerprint: its path resampled to FINGERPRINT_POINTS
+points evenly spaced along its length, kept as an encoded polyline in
+track_fingerprints. Tracks whose fingerprints are on average within
+ROUTE_TOLERANCE metres of each other follow the same route and share its
+route id, the id of the first record seen on it. Only the tracks with a
+similar length whose bounding box (from track_bounds) has every edge near
+the new one are compared, so a new track is clustered in a few queries
+however long the history is.
+
+Segments are stretches of road defined by their path. A track goes
+through a segment when it passes near its start and, after about the
+segment length, near its end. The candidate tracks come from the spatial
+index around both ends, and the best time of each activity is kept in
+segment_efforts for the leaderboards.
+"""
+
+import calendar
+import logging
+import math
+import os
+
+import dateutil.parser
+import numpy
+
+from pytrainer.core.spatial import SpatialIndex
+from pytrainer.lib.gpx import timed_track_points
+from pytrainer.lib.points import decodePoints, encodePoints
+
+FINGERPRINT_POINTS = 32
+# Mean distance in metres between the fingerprints of the same route
+ROUTE_TOLERANCE = 100.0
+# Tracks and segments on the same path differ in length by at most this
+LENGTH_TOLERANCE = 0.1
+# Distance in metres within which a track passes through a segment end,
+# about a second of cycling between trackpoints on either side
+SEGMENT_RADIUS = 30.0
+EARTH_RADIUS = 6371000.0
+
+def _degrees(metres):
+    return math.degrees(metres / EARTH_RADIUS)
+
+def distances(lats, lons, lat, lon):
+    """Get the distances in metres from locations to a location."""
+    lats = numpy.asarray(lats, dtype=numpy.float64)
+    lons = numpy.asarray(lons, dtype=numpy.float64)
+    #Longitude differences across the antimeridian wrap around
+    dx = numpy.radians((lons - lon + 180) % 360 - 180) * numpy.cos(numpy.radians((lats + lat) / 2))
+    dy = numpy.radians(lats - lat)
+    return EARTH_RADIUS * numpy.hypot(dx, dy)
+
+def cumulative_distance(lats, lons):
+    """Get the distance in metres along a path up to each of its points."""
+    lats = numpy.asarray(lats, dtype=numpy.float64)
+    lons = numpy.asarray(lons, dtype=numpy.float64)
+    if len(lats) < 2:
+        return numpy.zeros(len(lats))
+    steps = distances(lats[1:], lons[1:], lats[:-1], lons[:-1])
+    return numpy.concatenate(([0.0], numpy.cumsum(steps)))
+
+def fingerprint(lats, lons, points=FINGERPRINT_POINTS):
+    """Resample a path to points evenly spaced along its length.
+
+    Returns (tuple): the length in metres and the resampled latitude and
+    longitude arrays.
+    """
+    along = cumulative_distance(lats, lons)
+    length = along[-1]
+    if length == 0:
+        return 0.0, numpy.repeat(float(lats[0]), points), numpy.repeat(float(lons[0]), points)
+    #Repeated positions (pauses) would leave along non increasing
+    keep = numpy.concatenate(([True], numpy.diff(along) > 0))
+    targets = numpy.linspace(0, length, points)
+    return (length, numpy.interp(targets, along[keep], numpy.asarray(lats, dtype=numpy.float64)[keep]),
+            numpy.interp(targets, along[keep], numpy.asarray(lons, dtype=numpy.float64)[keep]))
+
+def encode_fingerprint(lats, lons):
+    return encodePoints(numpy.column_stack((lats, lons)))[0]
+
+def decode_fingerprint(points):
+    coords = numpy.array(decodePoints(points)).reshape(-1, 2)
+    return coords[:, 0], coords[:, 1]
+
+def fingerprint_distance(first, second):
+    """Get the mean distance in metres between the points of two
+    fingerprints, each a (latitudes, longitudes) pair."""
+    return float(numpy.mean(distances(first[0], first[1], second[0], second[1])))
+
+def closest_route(print_, candidates):
+    """Get the route of the candidate fingerprint closest to a fingerprint.
+
+    Args:
+        print_: (latitudes, longitudes) of the fingerprint.
+        candidates: (route, (latitudes, longitudes)) pairs.
+    Returns:
+        the route, or None if no candidate is within ROUTE_TOLERANCE.
+    """
+    best = None
+    for route, candidate in candidates:
+        distance = fingerprint_distance(print_, candidate)
+        if distance <= ROUTE_TOLERANCE and (best is None or distance < best[0]):
+            best = (distance, route)
+    return best[1] if best is not None else None
+
+def _passes(distance):
+    """Get the index of the closest point of each pass within SEGMENT_RADIUS."""
+    near = numpy.concatenate(([False], distance <= SEGMENT_RADIUS, [False]))
+    edges = numpy.flatnonzero(numpy.diff(near.astype(numpy.int8)))
+    return [start + int(numpy.argmin(distance[start:end])) for start, end in zip(edges[::2], edges[1::2])]
+
+def match_segment(lats, lons, segment):
+    """Find the times a path goes through a segment.
+
+    Args:
+        segment: dict with start_lat, start_lon, end_lat, end_lon and distance.
+    Returns (list): (start index, end index) of each pass, in order.
+    """
+    if not len(lats):
+        return []
+    starts = _passes(distances(lats, lons, segment["start_lat"], segment["start_lon"]))
+    ends = _passes(distances(lats, lons, segment["end_lat"], segment["end_lon"]))
+    if not starts or not ends:
+        return []
+    along = cumulative_distance(lats, lons)
+    shortest = segment["distance"] * (1 - LENGTH_TOLERANCE) - 2 * SEGMENT_RADIUS
+    longest = segment["distance"] * (1 + LENGTH_TOLERANCE) + 2 * SEGMENT_RADIUS
+    matches = []
+    for start in starts:
+        if matches and start < matches[-1][1]:
+            continue
+        for end in ends:
+            if end > start and along[end] - along[start] >= shortest:
+                if along[end] - along[start] <= longest:
+                    matches.append((start, end))
+                break
+    return matches
+
+def parse_time(text):
+    """Get the seconds since the epoch of a GPX time, UTC if no zone is given."""
+    date_time = dateutil.parser.parse(text)
+    if date_time.tzinfo is not None:
+        date_time = date_time.utctimetuple()
+    else:
+        date_time = date_time.timetuple()
+    return calendar.timegm(date_time)
+
+def best_time(times, matches):
+    """Get the shortest elapsed seconds of the matches of a segment with
+    known times, or None."""
+    elapsed = []
+    for start, end in matches:
+        if times[start] and times[end]:
+            try:
+                elapsed.append(parse_time(times[end]) - parse_time(times[start]))
+            except ValueError as e:
+                logging.debug("Invalid trackpoint time: %s" % e)
+    return min(elapsed) if elapsed else None
+
+class RouteIndex(object):
+
+    """Keeps the track fingerprints, routes and segment efforts up to date
+    and queries them.
+
+    Tracks must be added to the spatial index before being added here.
+    """
+
+    def __init__(self, ddbb, gpx_dir):
+        self._ddbb = ddbb
+        self._gpx_dir = gpx_dir
+        self._spatial_index = SpatialIndex(ddbb)
+
+    def add(self, id_record, lats, lons, times):
+        """Fingerprint the track of an activity, find its route and its
+        segment efforts, replacing any previous ones."""
+        id_record = int(id_record)
+        self.remove(id_record)
+        if len(lats) < 2:
+            return
+        length, print_lats, print_lons = fingerprint(lats, lons)
+        route = closest_route((print_lats, print_lons), self._route_candidates(id_record, lats, lons, length))
+        if route is None:
+            route = id_record
+        logging.debug("Record %d follows route %d" % (id_record, route))
+        self._ddbb.insert_many("track_fingerprints", "record,route,length,points",
+                               [(id_record, route, length, encode_fingerprint(print_lats, print_lons))])
+        self._add_efforts(id_record, lats, lons, times)
+
+    def add_gpx(self, id_record, gpxfile):
+        self.add(id_record, *timed_track_points(gpxfile))
+
+    def _route_candidates(self, id_record, lats, lons, length):
+        margin = _degrees(2 * ROUTE_TOLERANCE)
+        bounds = (("min_lat", min(lats)), ("min_lon", min(lons)), ("max_lat", max(lats)), ("max_lon", max(lons)))
+        #Degrees of longitude are shorter, so the margin stays conservative
+        condition = " and ".join(["%s between %r and %r" % (column, value - margin, value + margin) for column, value in bounds])
+        rows = self._ddbb.select("track_fingerprints", "route,points",
+                                 "record<>%d and length between %r and %r and record in (select record from track_bounds where %s)" % (
+                                 id_record, length * (1 - LENGTH_TOLERANCE), length * (1 + LENGTH_TOLERANCE), condition))
+        return [(route, decode_fingerprint(points)) for route, points in rows]
+
+    def _add_efforts(self, id_record, lats, lons, times):
+        margin = _degrees(SEGMENT_RADIUS)
+        condition = " and ".join(["%s between %r and %r" % (column, min(values) - margin, max(values) + margin)
+                                  for column, values in (("start_lat", lats), ("start_lon", lons), ("end_lat", lats), ("end_lon", lons))])
+        for segment in self._ddbb.select_dict("segments", ("id_segment", "start_lat", "start_lon", "end_lat", "end_lon", "distance"), condition):
+            self._add_effort(segment, id_record, lats, lons, times)
+
+    def _add_effort(self, segment, id_record, lats, lons, times):
+        elapsed = best_time(times, match_segment(lats, lons, segment))
+        if elapsed is not None:
+            logging.debug("Record %d went through segment %d in %d s" % (id_record, segment["id_segment"], elapsed))
+            self._ddbb.insert("segment_efforts", "segment,record,elapsed_time", [segment["id_segment"], id_record, elapsed])
+
+    def remove(self, id_record):
+        """Remove the track of an activity, the first record left on its
+        route becoming the route id."""
+        id_record = int(id_record)
+        self._ddbb.delete("track_fingerprints", "record=%d" % id_record)
+        self._ddbb.delete("segment_efforts", "record=%d" % id_record)
+        rows = self._ddbb.select("track_fingerprints", "min(record)", "route=%d" % id_record)
+        if rows and rows[0][0] is not None:
+            self._ddbb.update("track_fingerprints", "route", [rows[0][0]], "route=%d" % id_record)
+
+    def get_route(self, id_record):
+        """Get the route id of an activity, None if it has no track."""
+        rows = self._ddbb.select("track_fingerprints", "route", "record=%d" % int(id_record))
+        return rows[0][0] if rows else None
+
+    def get_route_records(self, id_record):
+        """Get the ids of the records following the same route as one."""
+        route = self.get_route(id_record)
+        if route is None:
+            return []
+        return sorted(row[0] for row in self._ddbb.select("track_fingerprints", "record", "route=%d" % route))
+
+    def route_condition(self, id_record, column="id_record"):
+        """Get an SQL condition for the records following the same route as
+        one, to use in queries on the records table."""
+        return "%s in (select record from track_fingerprints where route in (select route from track_fingerprints where record=%d))" % (
+                column, int(id_record))
+
+    def add_segment(self, name, lats, lons):
+        """Define a segment by its path and find it in all the tracks.
+
+        Returns (int): the id of the new segment.
+        """
+        logging.debug(">>")
+        segment = {"start_lat": float(lats[0]), "start_lon": float(lons[0]),
+                   "end_lat": float(lats[-1]), "end_lon": float(lons[-1]),
+                   "distance": float(cumulative_distance(lats, lons)[-1])}
+        self._ddbb.insert("segments", "name,start_lat,start_lon,end_lat,end_lon,distance",
+                          [name, segment["start_lat"], segment["start_lon"], segment["end_lat"], segment["end_lon"], segment["distance"]])
+        segment["id_segment"] = self._ddbb.lastRecord("segments")
+        for id_record in self._segment_candidates(segment):
+            gpxfile = os.path.join(self._gpx_dir, "%d.gpx" % id_record)
+            if not os.path.isfile(gpxfile):
+                continue
+            try:
+                lats, lons, times = timed_track_points(gpxfile)
+            except Exception as e:
+                logging.error("Unable to read %s for segment %s: %s" % (gpxfile, name, e))
+                continue
+            self._add_effort(segment, id_record, lats, lons, times)
+        logging.debug("<<")
+        return segment["id_segment"]
+
+    def _segment_candidates(self, segment):
+        """Get the records whose tracks pass near both ends of a segment and
+        are long enough to go through it."""
+        records = None
+        for lat, lon in ((segment["start_lat"], segment["start_lon"]), (segment["end_lat"], segment["end_lon"])):
+            margin = _degrees(SEGMENT_RADIUS)
+            near = set(self._spatial_index.get_records_in_area(lat - margin, lon - margin, lat + margin, lon + margin))
+            records = near if records is None else records & near
+        if not records:
+            return []
+        rows = self._ddbb.select("track_fingerprints", "record", "length >= %r and record in (%s)" % (
+                                 segment["distance"] * (1 - LENGTH_TOLERANCE), ",".join([str(record) for record in records])))
+        return sorted(row[0] for row in rows)
+
+    def remove_segment(self, id_segment):
+        self._ddbb.delete("segments", "id_segment=%d" % int(id_segment))
+        self._ddbb.delete("segment_efforts", "segment=%d" % int(id_segment))
+
+    def get_segments(self):
+        return self._ddbb.select_dict("segments", ("id_segment", "name", "start_lat", "start_lon", "end_lat", "end_lon", "distance"),
+                                      mod="order by name")
+
+    def get_best_efforts(self, id_segment, limit=10):
+        """Get the leaderboard of a segment.
+
+        Returns (list): (id_record, elapsed seconds) pairs, fastest first.
+        """
+        return [(row[0], row[1]) for row in self._ddbb.select("segment_efforts", "record,elapsed_time",
+                                                               "segment=%d" % int(id_segment),
+                                                               mod="order by elapsed_time, record limit %d" % int(limit))]
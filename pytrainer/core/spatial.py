@@ -0,0 +1,151 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+"""Spatial index of the activity tracks.
+
+The track_bounds table has the bounding box of each track and the
+track_cells table the geohash cells its segments pass through, at each of
+PRECISIONS (7 characters for cells about 150 m wide, 5 for about 5 km).
+Area queries look up the finest geohashes covering the area through the
+index on track_cells.geohash, for the tracks whose bounding box overlaps
+the area without being inside it.
+"""
+
+import logging
+
+import numpy
+
+from pytrainer.lib.gpx import track_points
+from pytrainer.util.raster import rasterize
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# Geohash lengths stored, finest first
+PRECISIONS = (7, 5)
+# Gaps between trackpoints of more than this many cells are not joined
+MAX_GAP = 8
+# Queries use shorter geohashes if the area needs more than this many
+MAX_QUERY_CELLS = 1024
+
+def _bits(precision):
+    """Get the number of longitude and latitude bits of a geohash."""
+    bits = 5 * precision
+    return (bits + 1) // 2, bits // 2
+
+def cell_coordinates(lats, lons, precision):
+    """Get the position of locations in units of geohash cells.
+
+    Returns (tuple): float x (longitude) and y (latitude) arrays.
+    """
+    lon_bits, lat_bits = _bits(precision)
+    x = (numpy.asarray(lons, dtype=numpy.float64) + 180.0) / 360.0 * 2 ** lon_bits
+    y = (numpy.asarray(lats, dtype=numpy.float64) + 90.0) / 180.0 * 2 ** lat_bits
+    return numpy.clip(x, 0, 2 ** lon_bits - 1e-9), numpy.clip(y, 0, 2 ** lat_bits - 1e-9)
+
+def geohashes(x, y, precision):
+    """Get the geohashes of cells.
+
+    Args:
+        x, y: integer arrays of cell coordinates, see cell_coordinates.
+    Returns:
+        (list): geohash strings.
+    """
+    lon_bits, lat_bits = _bits(precision)
+    x = numpy.asarray(x, dtype=numpy.int64)
+    y = numpy.asarray(y, dtype=numpy.int64)
+    code = numpy.zeros(len(x), dtype=numpy.int64)
+    #Bits alternate starting with longitude, most significant first
+    for bit in range(5 * precision):
+        if bit % 2 == 0:
+            code = (code << 1) | ((x >> (lon_bits - 1 - bit // 2)) & 1)
+        else:
+            code = (code << 1) | ((y >> (lat_bits - 1 - bit // 2)) & 1)
+    chars = numpy.array(list(BASE32))
+    digits = (code[:, numpy.newaxis] >> (5 * numpy.arange(precision - 1, -1, -1))) & 31
+    return ["".join(row) for row in chars[digits]]
+
+def track_cells(lats, lons, precision):
+    """Get the geohashes of the cells a track passes through, once each."""
+    if not len(lats):
+        return []
+    x, y = rasterize(*cell_coordinates(lats, lons, precision), max_gap=MAX_GAP)
+    cells = numpy.unique((x << 32) | y)
+    return geohashes(cells >> 32, cells & 0xffffffff, precision)
+
+def covering_cells(minlat, minlon, maxlat, maxlon):
+    """Get the geohashes covering an area, of the finest of PRECISIONS that
+    needs at most MAX_QUERY_CELLS.
+
+    Returns None if even the coarsest needs more.
+    """
+    for precision in PRECISIONS:
+        (x1, x2), (y1, y2) = cell_coordinates([minlat, maxlat], [minlon, maxlon], precision)
+        x1, x2, y1, y2 = int(x1), int(x2), int(y1), int(y2)
+        if (x2 - x1 + 1) * (y2 - y1 + 1) <= MAX_QUERY_CELLS:
+            x, y = numpy.meshgrid(numpy.arange(x1, x2 + 1), numpy.arange(y1, y2 + 1))
+            return geohashes(x.ravel(), y.ravel(), precision)
+    return None
+
+class SpatialIndex(object):
+
+    """Keeps the spatial index tables of the tracks up to date and queries
+    them."""
+
+    def __init__(self, ddbb):
+        self._ddbb = ddbb
+
+    def add(self, id_record, lats, lons):
+        """Index the track of an activity, replacing any previous one."""
+        logging.debug("Indexing track of record %s (%d points)" % (id_record, len(lats)))
+        self.remove(id_record)
+        if not len(lats):
+            return
+        self._ddbb.insert("track_bounds", "record,min_lat,min_lon,max_lat,max_lon",
+                          [int(id_record), min(lats), min(lons), max(lats), max(lons)])
+        rows = []
+        for precision in PRECISIONS:
+            rows.extend([(int(id_record), cell) for cell in track_cells(lats, lons, precision)])
+        self._ddbb.insert_many("track_cells", "record,geohash", rows)
+
+    def add_gpx(self, id_record, gpxfile):
+        """Index the track of an activity from its GPX file."""
+        lats, lons = track_points(gpxfile)
+        self.add(id_record, lats, lons)
+
+    def remove(self, id_record):
+        self._ddbb.delete("track_bounds", "record=%d" % int(id_record))
+        self._ddbb.delete("track_cells", "record=%d" % int(id_record))
+
+    def area_condition(self, minlat, minlon, maxlat, maxlon, column="id_record"):
+        """Get an SQL condition for the records whose tracks pass through an
+        area, to use in queries on the records table."""
+        minlat, minlon, maxlat, maxlon = float(minlat), float(minlon), float(maxlat), float(maxlon)
+        inside = "min_lat >= %r and max_lat <= %r and min_lon >= %r and max_lon <= %r" % (minlat, maxlat, minlon, maxlon)
+        overlap = "min_lat <= %r and max_lat >= %r and min_lon <= %r and max_lon >= %r" % (maxlat, minlat, maxlon, minlon)
+        cells = covering_cells(minlat, minlon, maxlat, maxlon)
+        if cells is None:
+            #Too large an area for cells to tell tracks apart
+            return "%s in (select record from track_bounds where %s)" % (column, overlap)
+        #Tracks within the area match without looking at their cells
+        return ("(%s in (select record from track_bounds where %s) or "
+                "%s in (select record from track_cells where geohash in (%s) and "
+                "record in (select record from track_bounds where %s and not (%s))))") % (
+                column, inside, column, ",".join(["'%s'" % cell for cell in cells]), overlap, inside)
+
+    def get_records_in_area(self, minlat, minlon, maxlat, maxlon):
+        """Get the ids of the records whose tracks pass through an area."""
+        rows = self._ddbb.select("track_bounds", "record",
+                                 self.area_condition(minlat, minlon, maxlat, maxlon, column="record"))
+        return sorted(row[0] for row in rows)
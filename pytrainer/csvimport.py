@@ -0,0 +1,333 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+"""Import records from delimited text files, e.g. spreadsheets saved as CSV.
+
+Used by the CSV tab of the import window and by the pytrainer-importcsv
+script. Rows are streamed from the file, the value of every mapped column
+is converted by a converter chosen once for the whole file, and the records
+are inserted in batches, all in a single transaction. Rows with a value that
+cannot be converted are rejected and reported with their line number, the
+others are imported.
+"""
+
+import csv
+import locale
+import logging
+import sys
+import time
+from optparse import OptionParser
+
+from pytrainer.core.sport import Sport
+from pytrainer.headless import Headless
+from pytrainer.lib.date import Date
+
+# Rows inserted at once
+BATCH_SIZE = 500
+# Bytes read to guess whether there is a header row
+SNIFF_SIZE = 1024
+
+def to_text(value):
+    return value
+
+def to_float(value):
+    return locale.atof(value)
+
+def to_int(value):
+    return locale.atoi(value)
+
+def to_duration(value):
+    """Get the seconds of a duration given as hh:mm:ss or in seconds."""
+    if value.count(":") == 2:
+        hours, minutes, seconds = value.split(":")
+        return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+    return locale.atoi(value)
+
+def to_date_time(value):
+    """Get the UTC and local times of a date, local if no time zone is given."""
+    try:
+        utc, local = Date().getDateTime(value)
+    except OverflowError:
+        raise ValueError("not a date")
+    if utc is None:
+        raise ValueError("not a date")
+    return utc, local
+
+# Record fields a column can be imported into, with their converters, in the
+# order of the import window
+FIELDS = [("date", to_date_time),
+          ("distance", to_float),
+          ("duration", to_duration),
+          ("title", to_text),
+          ("sport", to_text),
+          ("average", to_float),
+          ("maxspeed", to_float),
+          ("calories", to_int),
+          ("upositive", to_float),
+          ("unegative", to_float),
+          ("beats", to_float),
+          ("maxbeats", to_float),
+          ("pace", to_float),
+          ("maxpace", to_float),
+          ("comments", to_text)]
+FIELD_NAMES = [name for name, converter in FIELDS]
+# Columns of the records table filled in
+CELLS = ["date", "date_time_utc", "date_time_local", "sport", "distance", "duration", "time", "title",
+         "average", "maxspeed", "calories", "upositive", "unegative", "beats", "maxbeats", "pace",
+         "maxpace", "comments"]
+
+class RowError(ValueError):
+    pass
+
+def read_columns(filename, delimiter=",", has_header=None):
+    """Get the columns of a delimited file from its first rows.
+
+    Args:
+        has_header (bool): whether the first row is a header, guessed if
+            None.
+    Returns:
+        (bool): whether the first row is a header.
+        (list): the names of the columns, from the header if any.
+    """
+    with open(filename, "rb") as csvfile:
+        if has_header is None:
+            has_header = csv.Sniffer().has_header(csvfile.read(SNIFF_SIZE))
+            csvfile.seek(0)
+        first_row = next(csv.reader(csvfile, delimiter=delimiter), [])
+    if has_header:
+        return has_header, first_row
+    return has_header, [_("Column %d") % x for x in range(0, len(first_row))]
+
+class CsvImportResult(object):
+
+    """What an import of a file did."""
+
+    def __init__(self):
+        self.imported = 0
+        # (line number, reason) of every row not imported
+        self.rejected = []
+        self.seconds = 0.0
+
+    def __str__(self):
+        rate = self.imported / self.seconds if self.seconds > 0 else 0.0
+        return "Imported %d rows in %0.1f seconds (%0.0f rows/s), %d rows rejected" % (
+            self.imported, self.seconds, rate, len(self.rejected))
+
+class CsvImporter(object):
+
+    """Imports the rows of delimited files as records.
+
+    Args:
+        ddbb: the database.
+        sport_service (SportService): to find the sports, adding those that
+            do not exist yet.
+        columns (dict): the index of the column of each field imported, a
+            date is required.
+        delimiter (str): the delimiter of the columns.
+        has_header (bool): whether the first row is to be skipped.
+        sport (str): the sport of all records, instead of a column. Records
+            without one get the first sport, like in the import window.
+        encoding (str): the encoding of the file.
+    """
+
+    def __init__(self, ddbb, sport_service, columns, delimiter=",", has_header=False, sport=None,
+                 encoding="utf-8", batch_size=BATCH_SIZE):
+        if "date" not in columns:
+            raise ValueError("a date column is required")
+        for name in columns:
+            if name not in FIELD_NAMES:
+                raise ValueError("unknown field: %s" % name)
+        self._ddbb = ddbb
+        self._sport_service = sport_service
+        self.delimiter = delimiter
+        self.has_header = has_header
+        self.sport = sport.decode("utf-8") if isinstance(sport, str) else sport
+        self.encoding = encoding
+        self.batch_size = batch_size
+        self._converters = [(name, columns[name], converter) for name, converter in FIELDS if name in columns]
+        self._sport_ids = {}
+        self._default_sport_id = None
+
+    def _get_default_sport_id(self):
+        if self._default_sport_id is None:
+            sports = self._sport_service.get_all_sports()
+            if not sports:
+                raise RowError("no sport")
+            self._default_sport_id = sports[0].id
+        return self._default_sport_id
+
+    def _get_sport_id(self, name):
+        if name not in self._sport_ids:
+            sport = self._sport_service.get_sport_by_name(name)
+            if sport is None:
+                logging.debug("Adding sport '%s'", name)
+                sport = Sport()
+                sport.name = name
+                sport = self._sport_service.store_sport(sport)
+            self._sport_ids[name] = sport.id
+        return self._sport_ids[name]
+
+    def convert(self, row):
+        """Get the values of the record of a row, in the order of CELLS.
+
+        Raises RowError if a value cannot be converted.
+        """
+        values = {}
+        for name, index, converter in self._converters:
+            try:
+                value = row[index].decode(self.encoding).strip()
+            except IndexError:
+                raise RowError("no %s column" % name)
+            except UnicodeDecodeError:
+                raise RowError("%s is not %s text" % (name, self.encoding))
+            if not value:
+                continue
+            try:
+                values[name] = converter(value)
+            except ValueError:
+                raise RowError("invalid %s: %s" % (name, value))
+        if "date" not in values:
+            raise RowError("no date")
+        utc, local = values.pop("date")
+        values["date"] = local.strftime("%Y-%m-%d")
+        values["date_time_utc"] = utc.strftime("%Y-%m-%dT%H:%M:%SZ")
+        values["date_time_local"] = str(local)
+        values.setdefault("distance", 0)
+        if "duration" in values:
+            values["time"] = str(values["duration"])
+        sport = self.sport if self.sport is not None else values.get("sport")
+        values["sport"] = self._get_sport_id(sport) if sport else self._get_default_sport_id()
+        return [values.get(cell) for cell in CELLS]
+
+    def rows(self, csvfile, result):
+        """Stream the values of the records of a file, adding the rows
+        rejected to result."""
+        reader = csv.reader(csvfile, delimiter=self.delimiter)
+        if self.has_header:
+            next(reader, None)
+        for row in reader:
+            if not row:
+                continue
+            try:
+                yield self.convert(row)
+            except RowError as e:
+                logging.debug("Rejected line %d: %s" % (reader.line_num, e))
+                result.rejected.append((reader.line_num, str(e)))
+
+    def import_file(self, filename, progress=None):
+        """Import the rows of a file, all or none of them if the database
+        fails.
+
+        Args:
+            progress: optional function called with the number of rows
+                imported after each batch.
+        Returns:
+            (CsvImportResult): what was imported.
+        """
+        start_time = time.time()
+        result = CsvImportResult()
+        cells = ",".join(CELLS)
+        with open(filename, "rb") as csvfile:
+            with self._ddbb.transaction():
+                batch = []
+                for values in self.rows(csvfile, result):
+                    batch.append(values)
+                    if len(batch) >= self.batch_size:
+                        self._ddbb.insert_many("records", cells, batch)
+                        result.imported += len(batch)
+                        batch = []
+                        if progress is not None:
+                            progress(result.imported)
+                if batch:
+                    self._ddbb.insert_many("records", cells, batch)
+                    result.imported += len(batch)
+        result.seconds = time.time() - start_time
+        logging.info("Imported %d rows of %s, rejected %d" % (result.imported, filename, len(result.rejected)))
+        return result
+
+def parse_columns(specs, names):
+    """Get the index of the column of each field from FIELD=COLUMN specs,
+    COLUMN being the name of a column or its number from 1."""
+    columns = {}
+    for spec in specs:
+        field, sep, column = spec.partition("=")
+        if not sep or field not in FIELD_NAMES:
+            raise ValueError("invalid column: %s, expected FIELD=COLUMN with FIELD one of %s" % (spec, ", ".join(FIELD_NAMES)))
+        if column in names:
+            columns[field] = names.index(column)
+        elif column.isdigit() and 0 < int(column) <= len(names):
+            columns[field] = int(column) - 1
+        else:
+            raise ValueError("no column %s" % column)
+    return columns
+
+def get_options(args=None):
+    usage = '''usage: %prog [options] -c date=COLUMN [-c FIELD=COLUMN...] FILE
+
+        Import records from a delimited text file (e.g. CSV) into pytrainer.
+        Columns are given by the name in the header row or by number.
+        For more help on valid options try:
+           %prog -h '''
+    parser = OptionParser(usage=usage)
+    parser.set_defaults(log_level=logging.ERROR, conf_dir=None, delimiter=",", header=None, sport=None,
+        encoding="utf-8", columns=[], batch_size=BATCH_SIZE)
+    parser.add_option("-d", "--debug", action="store_const", const=logging.DEBUG, dest="log_level", help="enable logging at debug level")
+    parser.add_option("-i", "--info", action="store_const", const=logging.INFO, dest="log_level", help="enable logging at info level")
+    parser.add_option("-w", "--warn", action="store_const", const=logging.WARNING, dest="log_level", help="enable logging at warning level")
+    parser.add_option("--confdir", dest="conf_dir", help="Specify the directory where application configuration is stored.")
+    parser.add_option("-c", "--column", action="append", dest="columns", metavar="FIELD=COLUMN", help="Import a column into a field, one of %s." % ", ".join(FIELD_NAMES))
+    parser.add_option("--delimiter", dest="delimiter", help="Delimiter of the columns (default: ,), \\t for tabs.")
+    parser.add_option("--header", action="store_true", dest="header", help="The first row is a header (default: guessed).")
+    parser.add_option("--no-header", action="store_false", dest="header", help="The first row is not a header.")
+    parser.add_option("--sport", dest="sport", help="Sport of all records, instead of a column (default: the first sport).")
+    parser.add_option("--encoding", dest="encoding", help="Encoding of the file (default: utf-8).")
+    parser.add_option("--batch-size", dest="batch_size", type="int", help="Rows inserted at once (default: %d)." % BATCH_SIZE)
+    (options, args) = parser.parse_args(args)
+    if len(args) != 1:
+        parser.error("a file to import is required")
+    options.filename = args[0]
+    if options.delimiter == "\\t":
+        options.delimiter = "\t"
+    if len(options.delimiter) != 1:
+        parser.error("the delimiter must be one character")
+    if options.batch_size < 1:
+        parser.error("the batch size must be at least 1")
+    try:
+        options.header, names = read_columns(options.filename, options.delimiter, options.header)
+        options.columns = parse_columns(options.columns, names)
+    except (IOError, ValueError) as e:
+        parser.error(str(e))
+    if "date" not in options.columns:
+        parser.error("a date column is required")
+    return options
+
+def main(args=None):
+    options = get_options(args)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter('%(asctime)s|%(levelname)s|%(module)s|%(funcName)s|%(message)s'))
+    logging.getLogger('').addHandler(handler)
+    logging.getLogger('').setLevel(options.log_level)
+    trainer = Headless(options.conf_dir)
+    try:
+        importer = CsvImporter(trainer.ddbb, trainer.sport_service, options.columns, options.delimiter,
+            options.header, options.sport, options.encoding, options.batch_size)
+        result = importer.import_file(options.filename)
+    finally:
+        trainer.close()
+    for line, reason in result.rejected:
+        print >> sys.stderr, "%s:%d: %s" % (options.filename, line, reason)
+    print >> sys.stderr, result
+    return 1 if result.rejected else 0
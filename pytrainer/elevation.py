@@ -0,0 +1,319 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+"""Correct the elevation of many activities from SRTM data without a display.
+
+Used by the pytrainer-fixelevation script. Like the Elevation correction
+extension, the SRTM elevation of every trackpoint is added to the GPX file
+next to the recorded one. Activities are grouped by the SRTM tile their
+track is in and the groups are shared out to a pool of worker processes, so
+each tile is loaded by as few workers as possible. The new GPX files replace
+the old ones atomically, and the ascent and descent of all activities are
+updated in a single transaction once they are done. With --download the
+tiles the tracks need are first downloaded, several at once.
+"""
+
+import datetime
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+import numpy
+from lxml import etree
+
+from pytrainer.headless import Headless
+from pytrainer.lib.srtmdownload import TileDownloader
+from pytrainer.lib.srtmlayer import SRTM_DIR, SrtmLayer
+
+PYTRAINER_NS = "http://sourceforge.net/projects/pytrainer/GPX/0/1"
+# Activities a worker is given at once
+CHUNK_SIZE = 20
+
+def parse_date(value):
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+def elevation_change(elevations):
+    """Get the ascent and descent in metres along a list of elevations."""
+    steps = numpy.diff(elevations)
+    return float(steps[steps > 0].sum()), float(-steps[steps < 0].sum())
+
+def add_corrected_elevations(trackpoints, elevations):
+    """Set the corrected elevation of trackpoints, replacing any previous one.
+
+    Corrected elevations are kept in an extension, e.g.
+        <extensions>
+            <pytrainer:ele method="srtm_bilinear">31.1</pytrainer:ele>
+        </extensions>
+    """
+    for trackpoint, elevation in zip(trackpoints, elevations):
+        for previous in trackpoint.findall(".//{%s}ele" % PYTRAINER_NS):
+            previous.getparent().remove(previous)
+        #A trackpoint has a single extensions element, its last child
+        extensions_tag = "{%s}extensions" % etree.QName(trackpoint).namespace
+        extension = trackpoint.find(extensions_tag)
+        if extension is None:
+            extension = etree.SubElement(trackpoint, extensions_tag)
+        corrected = etree.SubElement(extension, "{%s}ele" % PYTRAINER_NS, method="srtm_bilinear")
+        corrected.text = str(float(elevation))
+
+def write_gpx(tree, gpx_file):
+    """Write a GPX tree, replacing gpx_file only once it is complete."""
+    fd, part_file = tempfile.mkstemp(suffix=".part", dir=os.path.dirname(gpx_file))
+    try:
+        with os.fdopen(fd, "w") as output:
+            tree.write(output, encoding=tree.docinfo.encoding or "UTF-8", xml_declaration=True, pretty_print=False)
+        os.rename(part_file, gpx_file)
+    except:
+        os.remove(part_file)
+        raise
+
+def fix_gpx(gpx_file, srtm):
+    """Add SRTM elevations to the trackpoints of a GPX file.
+
+    The file is left untouched unless every trackpoint gets an elevation.
+
+    Returns:
+        (tuple): the corrected ascent and descent in metres, or None if
+            SRTM data was not available for the whole track.
+    """
+    tree = etree.parse(gpx_file)
+    xmlns = tree.getroot().nsmap[None]
+    trackpoints = tree.findall("{%s}trk/{%s}trkseg/{%s}trkpt" % (xmlns, xmlns, xmlns))
+    if not trackpoints:
+        return None
+    lats = [float(trackpoint.get("lat")) for trackpoint in trackpoints]
+    lons = [float(trackpoint.get("lon")) for trackpoint in trackpoints]
+    elevations = srtm.get_elevations(lats, lons)
+    if numpy.isnan(elevations).any():
+        return None
+    add_corrected_elevations(trackpoints, elevations)
+    write_gpx(tree, gpx_file)
+    return elevation_change(elevations)
+
+def partition(ids, bounds, srtm, chunk_size=CHUNK_SIZE):
+    """Split activities into chunks of neighbouring tracks.
+
+    Args:
+        ids (list): the activities to split.
+        bounds (dict): (min_lat, min_lon, max_lat, max_lon) of the track
+            of each activity, those missing are kept together.
+        srtm (SrtmLayer): to get the tile of each track.
+        chunk_size (int): most activities in a chunk.
+    Returns:
+        (list): lists of activities, each in a single tile where possible.
+    """
+    def tile(id):
+        if id not in bounds:
+            return ""
+        min_lat, min_lon, max_lat, max_lon = bounds[id]
+        return srtm.get_srtm_filename((min_lat + max_lat) / 2.0, (min_lon + max_lon) / 2.0)
+    chunks = []
+    chunk = []
+    previous = None
+    for id in sorted(ids, key=lambda id: (tile(id), id)):
+        if chunk and (len(chunk) == chunk_size or tile(id) != previous):
+            chunks.append(chunk)
+            chunk = []
+        chunk.append(id)
+        previous = tile(id)
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def get_tile_names(bounds, srtm):
+    """Get the names of the SRTM tiles at the corners of track bounds."""
+    lats = []
+    lons = []
+    for min_lat, min_lon, max_lat, max_lon in bounds.values():
+        lats.extend([min_lat, min_lat, max_lat, max_lat])
+        lons.extend([min_lon, max_lon, min_lon, max_lon])
+    return srtm.get_srtm_tile_names(lats, lons)
+
+def download_tiles(tile_names, srtm_dir, servers=None):
+    """Download the SRTM tiles that are not there yet, several at once.
+
+    Returns:
+        (list): the names of the tiles that could not be downloaded.
+    """
+    def progress(tile_name, size_got, size_total):
+        logging.debug("%s: %d of %d bytes" % (tile_name, size_got, size_total))
+    downloader = TileDownloader(srtm_dir, servers=servers, progress=progress)
+    results = downloader.download_all(tile_names)
+    return sorted(tile_name for tile_name, path in results.items() if path is None)
+
+class ElevationFixer(object):
+
+    """Corrects the elevation of activities, one per worker process."""
+
+    def __init__(self, gpx_dir, srtm_dir=SRTM_DIR):
+        self.gpx_dir = gpx_dir
+        self.srtm = SrtmLayer(srtm_dir, download=False)
+
+    def fix(self, id_record):
+        """Correct the elevation of an activity.
+
+        Returns:
+            (tuple): (id_record, ascent, descent, error), error being None
+                unless the activity could not be corrected.
+        """
+        gpx_file = os.path.join(self.gpx_dir, "%s.gpx" % id_record)
+        try:
+            change = fix_gpx(gpx_file, self.srtm)
+        except Exception as e:
+            logging.exception("Unable to correct elevation of %s" % gpx_file)
+            return id_record, None, None, str(e)
+        if change is None:
+            return id_record, None, None, "SRTM data not available"
+        return (id_record,) + change + (None,)
+
+    def fix_all(self, ids):
+        return [self.fix(id_record) for id_record in ids]
+
+_fixer = None
+
+def _init_worker(gpx_dir, srtm_dir):
+    global _fixer
+    _fixer = ElevationFixer(gpx_dir, srtm_dir)
+
+def _fix_chunk(ids):
+    return _fixer.fix_all(ids)
+
+def get_record_ids(trainer, options):
+    """Get the activities with a track selected by the options."""
+    conditions = []
+    if options.ids:
+        conditions.append("id_record in (%s)" % ",".join(str(id) for id in options.ids))
+    if options.start is not None:
+        conditions.append("date>=\"%s\"" % options.start)
+    if options.end is not None:
+        conditions.append("date<=\"%s\"" % options.end)
+    if options.sport is not None:
+        sport = trainer.sport_service.get_sport_by_name(options.sport)
+        if sport is None:
+            raise ValueError("Unknown sport: %s" % options.sport)
+        conditions.append("sport=%d" % sport.id)
+    condition = " and ".join(conditions) if conditions else None
+    ids = [row[0] for row in trainer.ddbb.select("records", "id_record", condition, "order by id_record")]
+    return [id for id in ids if os.path.isfile(os.path.join(trainer.profile.gpxdir, "%s.gpx" % id))]
+
+def get_bounds(trainer, ids):
+    if not ids:
+        return {}
+    rows = trainer.ddbb.select("track_bounds", "record,min_lat,min_lon,max_lat,max_lon",
+                               "record in (%s)" % ",".join(str(id) for id in ids))
+    return dict((row[0], row[1:]) for row in rows)
+
+def run(options, progress=None):
+    """Correct the elevation of the activities selected by the options.
+
+    Args:
+        options: parsed command line options (see get_options).
+        progress: optional function called with (id_record, ascent,
+            descent, error) as each activity is done.
+    Returns:
+        (list): the (id_record, ascent, descent, error) result of each
+            activity.
+    """
+    trainer = Headless(options.conf_dir)
+    try:
+        ids = get_record_ids(trainer, options)
+        gpx_dir = trainer.profile.gpxdir
+        bounds = get_bounds(trainer, ids)
+        srtm = SrtmLayer(options.srtm_dir, download=False)
+        if options.download:
+            for tile_name in download_tiles(get_tile_names(bounds, srtm), options.srtm_dir):
+                logging.warning("Unable to download SRTM tile %s" % tile_name)
+        chunks = partition(ids, bounds, srtm)
+        logging.info("Correcting elevation of %d activities with %d workers" % (len(ids), options.jobs))
+        results = []
+        if options.jobs <= 1 or len(chunks) <= 1:
+            fixer = ElevationFixer(gpx_dir, options.srtm_dir)
+            results_per_chunk = (fixer.fix_all(chunk) for chunk in chunks)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(options.jobs, _init_worker, (gpx_dir, options.srtm_dir))
+            results_per_chunk = pool.imap_unordered(_fix_chunk, chunks)
+        try:
+            for chunk_results in results_per_chunk:
+                for result in chunk_results:
+                    results.append(result)
+                    if progress is not None:
+                        progress(*result)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        rows = [(ascent, descent, id_record) for id_record, ascent, descent, error in results if error is None]
+        if rows:
+            trainer.ddbb.update_many("records", "upositive,unegative", "id_record", rows)
+    finally:
+        trainer.close()
+    return results
+
+def get_options(args=None):
+    usage = '''usage: %prog [options] [ACTIVITY_ID...]
+
+        Correct the elevation of pytrainer activities from SRTM data,
+        all activities with a track unless some are selected.
+        For more help on valid options try:
+           %prog -h '''
+    parser = OptionParser(usage=usage)
+    parser.set_defaults(log_level=logging.ERROR, conf_dir=None, srtm_dir=SRTM_DIR, start=None, end=None,
+        sport=None, download=False, jobs=multiprocessing.cpu_count())
+    parser.add_option("-d", "--debug", action="store_const", const=logging.DEBUG, dest="log_level", help="enable logging at debug level")
+    parser.add_option("-i", "--info", action="store_const", const=logging.INFO, dest="log_level", help="enable logging at info level")
+    parser.add_option("-w", "--warn", action="store_const", const=logging.WARNING, dest="log_level", help="enable logging at warning level")
+    parser.add_option("--confdir", dest="conf_dir", help="Specify the directory where application configuration is stored.")
+    parser.add_option("--srtmdir", dest="srtm_dir", help="Directory of the SRTM GeoTIFF files (default: %s)." % SRTM_DIR)
+    parser.add_option("--download", action="store_true", dest="download", help="Download the SRTM tiles that are missing first.")
+    parser.add_option("--start", dest="start", metavar="YYYY-MM-DD", help="Only activities from this date.")
+    parser.add_option("--end", dest="end", metavar="YYYY-MM-DD", help="Only activities up to this date.")
+    parser.add_option("--sport", dest="sport", help="Only activities of this sport.")
+    parser.add_option("-j", "--jobs", dest="jobs", type="int", help="Number of worker processes (default: number of CPUs).")
+    (options, args) = parser.parse_args(args)
+    try:
+        options.ids = [int(arg) for arg in args]
+        options.start = parse_date(options.start) if options.start is not None else None
+        options.end = parse_date(options.end) if options.end is not None else None
+    except ValueError as e:
+        parser.error(str(e))
+    return options
+
+def main(args=None):
+    options = get_options(args)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter('%(asctime)s|%(levelname)s|%(module)s|%(funcName)s|%(message)s'))
+    logging.getLogger('').addHandler(handler)
+    logging.getLogger('').setLevel(options.log_level)
+    start_time = time.time()
+    try:
+        results = run(options)
+    except ValueError as e:
+        print >> sys.stderr, "Error: %s" % e
+        return 2
+    failed = 0
+    for id_record, ascent, descent, error in results:
+        if error is not None:
+            failed += 1
+            print >> sys.stderr, "Failed to correct activity %s: %s" % (id_record, error)
+        else:
+            print "%s: +%0.0f m -%0.0f m" % (id_record, ascent, descent)
+    print >> sys.stderr, "Corrected %d activities in %0.1f seconds" % (len(results) - failed, time.time() - start_time)
+    return 1 if failed else 0
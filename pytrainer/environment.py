@@ -39,6 +39,8 @@ class Environment(object):
         self.gpx_dir = self.conf_dir + "/gpx"
         self.extension_dir = self.conf_dir + "/extensions"
         self.plugin_dir = self.conf_dir + "/plugins"
+        self.tile_cache_dir = self.conf_dir + "/tilecache"
+        self.heatmap_dir = self.conf_dir + "/heatmap"
             
     def clear_temp_dir(self):
         """Remove all files from the tmp directory."""
@@ -59,6 +61,8 @@ class Environment(object):
         self._create_dir(self.extension_dir)
         self._create_dir(self.plugin_dir)
         self._create_dir(self.gpx_dir)
+        self._create_dir(self.tile_cache_dir)
+        self._create_dir(self.heatmap_dir)
             
     def _create_dir(self, dir_name):
         if not os.path.isdir(dir_name):
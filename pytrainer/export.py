@@ -0,0 +1,327 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+"""Render graphs to image files without a display.
+
+Used by the pytrainer-export script, e.g. to publish weekly reports from
+a scheduled job. Graphs are drawn with matplotlib's Agg backend by the same
+graph classes the GUI uses, spread over a pool of worker processes.
+"""
+
+import matplotlib
+matplotlib.use('Agg')
+import datetime
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from optparse import OptionParser
+
+from pytrainer.headless import Headless
+from pytrainer.lib.activity import Activity
+from pytrainer.gui.drawGraph import DrawGraph
+from pytrainer.weekgraph import WeekGraph, getDays
+from pytrainer.monthgraph import MonthGraph
+from pytrainer.yeargraph import YearGraph
+from pytrainer.util.date import DateRange
+
+SUMMARY_GRAPHS = ("week", "month", "year")
+GRAPHS = SUMMARY_GRAPHS + ("activity",)
+FORMATS = ("png", "svg")
+# Values of the summary graphs, in the order of the GUI's combo box
+VALUES = ("distance", "time", "beats", "average", "calories")
+DPI = 100
+
+def parse_date(value):
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+def parse_size(value):
+    """Parse a WIDTHxHEIGHT size in pixels."""
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+def summary_ranges(graph, date_range):
+    """Get the date ranges of the summary graphs covering a date range.
+
+    Args:
+        graph (str): one of "week", "month" or "year".
+        date_range (DateRange): the dates to cover.
+    Returns:
+        (list): a DateRange for each week, month or year touching date_range.
+    """
+    for_period = {
+        "week": DateRange.for_week_containing,
+        "month": DateRange.for_month_containing,
+        "year": DateRange.for_year_containing,
+    }[graph]
+    ranges = []
+    date = date_range.start_date
+    while date <= date_range.end_date:
+        period = for_period(date)
+        ranges.append(period)
+        date = period.end_date + datetime.timedelta(days=1)
+    return ranges
+
+def output_name(job, fmt):
+    """Get the file name a job is rendered to."""
+    graph, key = job
+    if graph == "activity":
+        name = "activity-%s" % key
+    elif graph == "week":
+        name = "week-%s" % key.start_date.strftime("%Y%m%d")
+    elif graph == "month":
+        name = "month-%s" % key.start_date.strftime("%Y-%m")
+    else:
+        name = "year-%s" % key.start_date.strftime("%Y")
+    return "%s.%s" % (name, fmt)
+
+class Exporter(object):
+
+    """Renders graphs of a pytrainer installation to files.
+
+    One Exporter is used per worker process; its graph objects (and so their
+    figures) are reused for every graph the worker renders.
+    """
+
+    def __init__(self, options, trainer=None):
+        self.options = options
+        self.trainer = trainer if trainer is not None else Headless(options.conf_dir)
+        self.sport_id = None
+        if options.sport is not None:
+            sport = self.trainer.sport_service.get_sport_by_name(options.sport)
+            if sport is None:
+                raise ValueError("Unknown sport: %s" % options.sport)
+            self.sport_id = sport.id
+        self.graphs = {}
+        self.grapher = None
+
+    def get_summary_graph(self, graph):
+        if graph not in self.graphs:
+            sports = self.trainer.sport_service.get_all_sports()
+            graph_class = {"week": WeekGraph, "month": MonthGraph, "year": YearGraph}[graph]
+            self.graphs[graph] = graph_class(sports, main=self.trainer)
+        return self.graphs[graph]
+
+    def get_records(self, date_range):
+        '''Same records as Record.getrecordPeriod'''
+        condition = "date>=\"%s\" and date<=\"%s\" and records.sport=sports.id_sports" % (date_range.start_date, date_range.end_date)
+        if self.sport_id is not None:
+            condition += " and sports.id_sports=\"%s\"" % self.sport_id
+        return self.trainer.ddbb.select("records,sports", "date,distance,time,beats,comments,average,calories,maxspeed,maxbeats, sports.name,upositive,unegative", condition)
+
+    def get_activity_ids(self, date_range):
+        condition = "date>=\"%s\" and date<=\"%s\"" % (date_range.start_date, date_range.end_date)
+        if self.sport_id is not None:
+            condition += " and sport=\"%s\"" % self.sport_id
+        ids = [row[0] for row in self.trainer.ddbb.select("records", "id_record", condition)]
+        #Only activities with a track have something to graph
+        return [id for id in ids if os.path.isfile("%s/%s.gpx" % (self.trainer.profile.gpxdir, id))]
+
+    def get_jobs(self, date_range):
+        """Get the (graph, key) pairs to render for a date range."""
+        jobs = []
+        for graph in self.options.graphs:
+            if graph == "activity":
+                jobs.extend([(graph, id) for id in self.get_activity_ids(date_range)])
+            else:
+                jobs.extend([(graph, period) for period in summary_ranges(graph, date_range)])
+        return jobs
+
+    def export(self, job):
+        """Render a job to the output directory.
+
+        Returns:
+            (str): the name of the file written, or None if there was nothing
+                to graph.
+        """
+        graph, key = job
+        if graph == "activity":
+            figure = self.draw_activity(key)
+        else:
+            figure = self.draw_summary(graph, key)
+        if figure is None:
+            return None
+        width, height = self.options.size
+        figure.set_size_inches(float(width) / DPI, float(height) / DPI)
+        filename = os.path.join(self.options.output_dir, output_name(job, self.options.format))
+        figure.savefig(filename, dpi=DPI, format=self.options.format)
+        return filename
+
+    def draw_summary(self, graph, date_range):
+        values = self.get_records(date_range)
+        if not len(values):
+            return None
+        timegraph = self.get_summary_graph(graph)
+        if graph == "week":
+            x_func = lambda x: getDays(date_range.start_date)
+        elif graph == "month":
+            x_func = lambda x: [u'%02d' % d for d in xrange(1, date_range.end_date.day + 1)]
+        else:
+            x_func = lambda x: ["%02d" % m for m in xrange(1, 13)]
+        timegraph.render(values, x_func, self.options.value, self.options.value2)
+        return timegraph.drawarea.figure
+
+    def draw_activity(self, id_record):
+        activity = Activity(self.trainer, id_record)
+        if activity.tracklist is None:
+            return None
+        activity.x_axis = self.options.x_axis
+        data = activity.distance_data if activity.x_axis == "distance" else activity.time_data
+        for name, graphdata in data.items():
+            graphdata.show_on_y1 = name in self.options.y1
+            graphdata.show_on_y2 = name in self.options.y2
+        activity.show_laps = self.options.laps
+        if self.grapher is None:
+            self.grapher = DrawGraph(pytrainer_main=self.trainer)
+        graph = self.grapher.get_graph(None)
+        #Size the figure first so the series are downsampled to the output width
+        width, height = self.options.size
+        graph.figure.set_size_inches(float(width) / DPI, float(height) / DPI)
+        self.grapher.drawActivityGraph(activity=activity, box=None)
+        if self.grapher.ax1 is None:
+            return None
+        return graph.figure
+
+_exporter = None
+
+def _init_worker(options):
+    global _exporter
+    _exporter = Exporter(options)
+
+def _export_job(job):
+    try:
+        return job, _exporter.export(job), None
+    except Exception as e:
+        logging.exception("Unable to export %s" % str(job))
+        return job, None, str(e)
+
+def run(options, date_range, progress=None):
+    """Export all graphs for a date range.
+
+    Args:
+        options: parsed command line options (see get_options).
+        date_range (DateRange): the dates to export graphs for.
+        progress: optional function called with (job, filename, error) as
+            each job finishes.
+    Returns:
+        (list): the (job, filename, error) result of each job.
+    """
+    exporter = Exporter(options)
+    jobs = exporter.get_jobs(date_range)
+    logging.info("Exporting %d graphs with %d workers" % (len(jobs), options.jobs))
+    if not os.path.isdir(options.output_dir):
+        os.makedirs(options.output_dir)
+    results = []
+    if options.jobs <= 1 or len(jobs) <= 1:
+        global _exporter
+        _exporter = exporter
+        for job in jobs:
+            results.append(_export_job(job))
+            if progress is not None:
+                progress(*results[-1])
+    else:
+        exporter.trainer.close()
+        pool = multiprocessing.Pool(options.jobs, _init_worker, (options,))
+        try:
+            #Activities are the slowest to render, start them first
+            for result in pool.imap_unordered(_export_job, sorted(jobs, key=lambda job: job[0] != "activity")):
+                results.append(result)
+                if progress is not None:
+                    progress(*result)
+        finally:
+            pool.close()
+            pool.join()
+    return results
+
+def get_options(args=None):
+    usage = '''usage: %prog [options] OUTPUT_DIR
+
+        Render pytrainer graphs to image files without a display.
+        For more help on valid options try:
+           %prog -h '''
+    parser = OptionParser(usage=usage)
+    parser.set_defaults(log_level=logging.ERROR, conf_dir=None, start=None, end=None, sport=None,
+        graphs=",".join(GRAPHS), format="png", size="800x600", value="distance", value2=None,
+        x_axis="distance", y1="elevation", y2="", laps=False, jobs=multiprocessing.cpu_count())
+    parser.add_option("-d", "--debug", action="store_const", const=logging.DEBUG, dest="log_level", help="enable logging at debug level")
+    parser.add_option("-i", "--info", action="store_const", const=logging.INFO, dest="log_level", help="enable logging at info level")
+    parser.add_option("-w", "--warn", action="store_const", const=logging.WARNING, dest="log_level", help="enable logging at warning level")
+    parser.add_option("--confdir", dest="conf_dir", help="Specify the directory where application configuration is stored.")
+    parser.add_option("--start", dest="start", metavar="YYYY-MM-DD", help="First date to export graphs for (default: date of the first activity).")
+    parser.add_option("--end", dest="end", metavar="YYYY-MM-DD", help="Last date to export graphs for (default: today).")
+    parser.add_option("--sport", dest="sport", help="Only graph activities of this sport.")
+    parser.add_option("--graphs", dest="graphs", metavar="LIST", help="Comma separated graphs to export, from: %s (default: all)." % ", ".join(GRAPHS))
+    parser.add_option("--format", dest="format", type="choice", choices=list(FORMATS), help="Image format, one of %s (default: png)." % ", ".join(FORMATS))
+    parser.add_option("--size", dest="size", metavar="WIDTHxHEIGHT", help="Image size in pixels (default: 800x600).")
+    parser.add_option("--value", dest="value", type="choice", choices=list(VALUES), help="Value of the summary graphs, one of %s (default: distance)." % ", ".join(VALUES))
+    parser.add_option("--value2", dest="value2", type="choice", choices=list(VALUES), help="Second value of the summary graphs.")
+    parser.add_option("--x-axis", dest="x_axis", type="choice", choices=["distance", "time"], help="X axis of activity graphs, distance (default) or time.")
+    parser.add_option("--y1", dest="y1", metavar="LIST", help="Comma separated activity data on the first y axis, e.g. elevation,speed,pace,hr (default: elevation).")
+    parser.add_option("--y2", dest="y2", metavar="LIST", help="Comma separated activity data on the second y axis.")
+    parser.add_option("--laps", action="store_true", dest="laps", help="Show laps on activity graphs.")
+    parser.add_option("-j", "--jobs", dest="jobs", type="int", help="Number of worker processes (default: number of CPUs).")
+    (options, args) = parser.parse_args(args)
+    if len(args) != 1:
+        parser.error("an output directory is required")
+    options.output_dir = args[0]
+    options.graphs = [graph.strip() for graph in options.graphs.split(",") if graph.strip()]
+    for graph in options.graphs:
+        if graph not in GRAPHS:
+            parser.error("unknown graph: %s" % graph)
+    try:
+        options.size = parse_size(options.size)
+        options.start = parse_date(options.start) if options.start is not None else None
+        options.end = parse_date(options.end) if options.end is not None else None
+    except ValueError as e:
+        parser.error(str(e))
+    #Summary values are indexes of the GUI's combo boxes, the second one starts with "None"
+    options.value = VALUES.index(options.value)
+    options.value2 = VALUES.index(options.value2) + 1 if options.value2 is not None else 0
+    options.y1 = [name.strip() for name in options.y1.split(",") if name.strip()]
+    options.y2 = [name.strip() for name in options.y2.split(",") if name.strip()]
+    return options
+
+def main(args=None):
+    options = get_options(args)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter('%(asctime)s|%(levelname)s|%(module)s|%(funcName)s|%(message)s'))
+    logging.getLogger('').addHandler(handler)
+    logging.getLogger('').setLevel(options.log_level)
+    end = options.end if options.end is not None else datetime.date.today()
+    start = options.start
+    if start is None:
+        trainer = Headless(options.conf_dir)
+        first = trainer.ddbb.select("records", "min(date)")
+        trainer.close()
+        start = parse_date(first[0][0]) if first and first[0][0] else end
+    start_time = time.time()
+    failed = 0
+    written = 0
+    try:
+        results = run(options, DateRange(start, end))
+    except ValueError as e:
+        print >> sys.stderr, "Error: %s" % e
+        return 2
+    for job, filename, error in results:
+        if error is not None:
+            failed += 1
+            print >> sys.stderr, "Failed to export %s: %s" % (output_name(job, options.format), error)
+        elif filename is not None:
+            written += 1
+            print filename
+    print >> sys.stderr, "Exported %d graphs in %0.1f seconds" % (written, time.time() - start_time)
+    return 1 if failed else 0
@@ -20,11 +20,10 @@ import os
 import re
 import logging
 import colorsys
-import math
 import traceback
 
-import pytrainer.lib.points as Points
 from pytrainer.lib.fileUtils import fileUtils
+from pytrainer.extensions import mapdata
 
 class Googlemaps:
     def __init__(self, data_path = None, waypoint = None, pytrainer_main=None):
@@ -35,16 +34,6 @@ class Googlemaps:
         self.htmlfile = "%s/googlemaps.html" % (self.pytrainer_main.profile.tmpdir)
         logging.debug("<<")
         
-    def colorLine(self, polyline, average, variance):
-        stdev = math.sqrt(variance)
-        for i in polyline:
-            speed = i[1]
-            speed = (speed - (average - 2*stdev))/(4*stdev)
-            speed = min(max(speed,0), 1)
-            rgb_tuple = colorsys.hsv_to_rgb(0.66-(speed*0.66), 1, 0.8)
-            rgb_tuple = (rgb_tuple[0] * 255,rgb_tuple[1] * 255,rgb_tuple[2] * 255)
-            i[2] = '#%02x%02x%02x' % rgb_tuple
-            
     def colorLineAbs(self, polyline):
         for i in polyline:
             speed = i[1]
@@ -69,10 +58,7 @@ class Googlemaps:
             render using embedded Webkit
         '''
         logging.debug(">>")
-        points = []
-        levels = []
         pointlist = []
-        polyline = []
 
         list_values = activity.tracks 
         # (accum distance, elevation, total duration, speed, lat, lon, bpm, cadence, corrected elevation)
@@ -81,48 +67,17 @@ class Googlemaps:
             minlat, minlon = float(list_values[0][4]),float(list_values[0][5])
             maxlat=minlat
             maxlon=minlon
-            
-            av_sum = 0
-            variance_sum = 0
-            n = 0
-            #logging.debug("\n, ".join(map(str, list_values)))
             for i in list_values:
-                if linetype==1:
-                    if i[3] is not None:
-                        val = i[3]
-                    else:
-                        val = 0
-                        logging.error("No valid speed value for trackpoint: distance: %s | lat: %s | lon: %s" %(i[0],i[4],i[5]))
-                elif linetype==2:
-                	val = i[6] if i[6] else 0
-                elif linetype==3:
-                	val = i[7] if i[7]!=None else 1
-                else:
-                    val = 1
-                    
-                variance_sum += (val)**2
-                av_sum += val
-                n += 1
-                
                 lat, lon = float(i[4]), float(i[5])
                 minlat = min(minlat, lat)
                 maxlat = max(maxlat, lat)
                 minlon = min(minlon, lon)
                 maxlon = max(maxlon, lon)
                 pointlist.append((lat,lon))
-                polyline.append(["new google.maps.LatLng(%s, %s)" % (lat, lon), val, ""])
-                
-            av_speed = av_sum / float(n)
-            variance = (variance_sum / float(n)) - av_speed**2
-            variance = max(variance, 16)
-
-            self.colorLine(polyline, av_speed, variance)
-            #self.colorLineAbs(polyline)
+            values = mapdata.track_values(list_values, linetype)
             
             logging.debug("minlat: %s, maxlat: %s" % (minlat, maxlat))
             logging.debug("minlon: %s, maxlon: %s" % (minlon, maxlon))
-            points,levels = Points.encodePoints(pointlist)
-            points = points.replace("\\","\\\\")
             logging.debug("Using Google Maps version 3 API")
             laps = activity.laps
             timeHours = int(activity.time) / 3600
@@ -132,23 +87,22 @@ class Googlemaps:
             finishinfo = "<div class='info_content'>%s: %s<br>%s: %s%s</div>" % (_("Time"), time, _("Distance"), activity.distance, activity.distance_unit)
             startinfo = startinfo.encode('ascii', 'xmlcharrefreplace') #Encode for html
             finishinfo = finishinfo.encode('ascii', 'xmlcharrefreplace') #Encode for html
-            self.createHtml_api3(polyline, minlat, minlon, maxlat, maxlon, startinfo, finishinfo, laps, linetype)
+            self.createHtml_api3(pointlist, values, minlat, minlon, maxlat, maxlon, startinfo, finishinfo, laps, linetype)
         else:
             self.createErrorHtml()
         return self.htmlfile
         logging.debug("<<")
 
-    def createHtml_api3(self,polyline, minlat, minlon, maxlat, maxlon, startinfo, finishinfo, laps, linetype):
+    def createHtml_api3(self,pointlist, values, minlat, minlon, maxlat, maxlon, startinfo, finishinfo, laps, linetype):
         '''
         Generate a Google maps html file using the v3 api
             documentation at http://code.google.com/apis/maps/documentation/v3
+        The track is written as an encoded polyline and packed values (see mapdata)
+        and drawn as one polyline per run of points of the same colour
         '''
         logging.debug(">>")
-        if self.waypoint is not None:
-            waypoints = self.waypoint.getAllWaypoints()
-            #TODO waypoints not supported in this function yet
-            #TODO sort polyline encoding (not supported in v3?)
-            #TODO check http://code.google.com/apis/maps/documentation/v3/overlays.html#Polylines for MVArray??
+        #TODO waypoints not supported in this function yet, get those in the track area with waypoint.getWaypointsInArea
+        #TODO check http://code.google.com/apis/maps/documentation/v3/overlays.html#Polylines for MVArray??
         content = '''
         <html>
         <head>
@@ -157,11 +111,13 @@ class Googlemaps:
         </style>
         <meta name="viewport" content="initial-scale=1.0, user-scalable=no" />
         <script type="text/javascript" src="http://maps.google.com/maps/api/js?sensor=false"></script>
-        <script type="text/javascript">
+        <script type="text/javascript">'''
+        content += mapdata.track_script(pointlist, values, linetype)
+        content += '''
           function initialize() {\n'''
-        content += "            var startlatlng = %s ;\n" % (polyline[0][0])
+        content += "            var startlatlng = new google.maps.LatLng(%s, %s);\n" % pointlist[0]
         content += "            var centerlatlng = new google.maps.LatLng(%f, %f);\n" % ((minlat+maxlat)/2., (minlon+maxlon)/2.)
-        content += "            var endlatlng = %s;\n" % (polyline[-1][0])
+        content += "            var endlatlng = new google.maps.LatLng(%s, %s);\n" % pointlist[-1]
         content += "            var swlatlng = new google.maps.LatLng(%f, %f);\n" % (minlat,minlon)
         content += "            var nelatlng = new google.maps.LatLng(%f, %f);\n" % (maxlat,maxlon)
         content += "            var startcontent = \"%s\";\n" % (startinfo)
@@ -261,41 +217,33 @@ class Googlemaps:
             var boundsBox = new google.maps.LatLngBounds(swlatlng, nelatlng );\n
             map.fitBounds(boundsBox);\n'''
             
-        pre = 0
-        for point in polyline:
-            if pre:
-                content += '''var polylineCoordinates = [\n'''
-                content += "                                       %s,\n" % (pre[0])
-                content += "                                       %s,\n" % (point[0])
-                content += '''            ];\n
-                    // Add a polyline.\n
-                    var polyline = new google.maps.Polyline({\n
-                            path: polylineCoordinates,\n
-                            strokeColor: \"%s\",\n
-                            strokeOpacity: 0.9,\n
-                            strokeWeight: 5,\n
-                            });\n
-                polyline.setMap(map);\n''' % point[2]
-                
-                contenttemplate = [
-                	"%s",
-                	"Speed: %0.1f km/h",
-                	"HR: %d bpm",
-                	"Cadence: %d",
-                ]
-                
-                content += '''
-                    google.maps.event.addListener(polyline, 'click', function(event) {
-                        var marker = new google.maps.InfoWindow({
-                          position: event.latLng, 
-                          content: "%s"
-                        });
-                        marker.setMap(map);
-                    });
-                    ''' % contenttemplate[linetype] % point[1]
-            pre = point
-        
         content += '''
+            for (var r = 0; r < runs.length; r++) {
+                addRun(map, runs[r]);
+            }\n'''
+        content += '''
+          }
+
+          function addRun(map, run) {
+            var path = [];
+            for (var i = run.start; i <= run.end; i++) {
+                path.push(new google.maps.LatLng(coords[i][0], coords[i][1]));
+            }
+            var polyline = new google.maps.Polyline({
+                path: path,
+                strokeColor: run.color,
+                strokeOpacity: 0.9,
+                strokeWeight: 5
+            });
+            polyline.setMap(map);
+            google.maps.event.addListener(polyline, 'click', function(event) {
+                var index = closestPoint(coords, run.start + 1, run.end, event.latLng.lat(), event.latLng.lng());
+                var marker = new google.maps.InfoWindow({
+                  position: event.latLng,
+                  content: valueLabel(index)
+                });
+                marker.setMap(map);
+            });
           }
 
         </script>
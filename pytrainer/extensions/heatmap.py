@@ -0,0 +1,198 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+"""Heatmap of all the tracks.
+
+Every track is rasterised onto a Web Mercator pixel grid at each zoom of
+ZOOMS, counting for each pixel the number of activities that passed
+through it. Counts are kept per 256 pixel tile on disk, so new activities
+are added by only reading their own GPX files, and rendered into
+transparent PNG tiles for a map overlay.
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+
+import numpy
+from matplotlib import cm
+from matplotlib.image import imsave
+
+from pytrainer.lib.gpx import track_points
+from pytrainer.util.raster import rasterize
+
+ZOOMS = range(2, 16)
+TILE_SIZE = 256
+# Gaps between trackpoints wider than this many pixels at the highest zoom
+# (lost signal, paused recording) are not drawn
+MAX_GAP = 64
+# Number of activities through a pixel that gets the hottest colour
+SATURATION = 20
+COLORMAP = "hot"
+
+def project(lats, lons, zoom):
+    """Get the Web Mercator pixel coordinates of locations at a zoom level."""
+    scale = TILE_SIZE * 2 ** zoom
+    lats = numpy.radians(numpy.clip(numpy.asarray(lats, dtype=numpy.float64), -85.0511, 85.0511))
+    x = (numpy.asarray(lons, dtype=numpy.float64) + 180.0) / 360.0 * scale
+    y = (1.0 - numpy.log(numpy.tan(lats) + 1.0 / numpy.cos(lats)) / numpy.pi) / 2.0 * scale
+    return numpy.clip(x, 0, scale - 1), numpy.clip(y, 0, scale - 1)
+
+def tile_pixels(px, py, zoom):
+    """Split pixels into tiles, each pixel once.
+
+    Returns (list): ((x, y) tile, pixel rows, pixel columns) tuples.
+    """
+    keys = numpy.unique((px << 32) | py)
+    px = keys >> 32
+    py = keys & 0xffffffff
+    tiles = (px // TILE_SIZE << 32) | (py // TILE_SIZE)
+    order = numpy.argsort(tiles, kind="mergesort")
+    tiles, px, py = tiles[order], px[order], py[order]
+    bounds = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(tiles)) + 1, [len(tiles)]))
+    result = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        tile = (int(tiles[start] >> 32), int(tiles[start] & 0xffffffff))
+        result.append((tile, py[start:end] % TILE_SIZE, px[start:end] % TILE_SIZE))
+    return result
+
+def render(counts):
+    """Get the RGBA image of a tile of counts, transparent where empty."""
+    level = numpy.clip(numpy.log1p(counts) / numpy.log1p(SATURATION), 0, 1)
+    image = cm.get_cmap(COLORMAP)(0.3 + 0.6 * level)
+    image[..., 3] = numpy.where(counts > 0, 0.5 + 0.5 * level, 0)
+    return image
+
+class Heatmap(object):
+
+    """Heatmap tiles under heatmap_dir.
+
+    Keeps the counts in counts/zoom/x/y.npz, the images in tiles/zoom/x/y.png
+    and the ids of the activities included and their bounds in state.json.
+    """
+
+    def __init__(self, heatmap_dir):
+        self.heatmap_dir = heatmap_dir
+        self.tile_dir = os.path.join(heatmap_dir, "tiles")
+        self._state_file = os.path.join(heatmap_dir, "state.json")
+        self._load_state()
+
+    def _load_state(self):
+        self.activities = set()
+        self.bounds = None
+        if os.path.isfile(self._state_file):
+            try:
+                with open(self._state_file) as state_file:
+                    state = json.load(state_file)
+                self.activities = set(state["activities"])
+                self.bounds = state["bounds"]
+            except (ValueError, KeyError) as e:
+                logging.error("Unable to read heatmap state, rebuilding: %s" % e)
+                self.clear()
+
+    def _save_state(self):
+        with open(self._state_file, "w") as state_file:
+            json.dump({"activities": sorted(self.activities), "bounds": self.bounds}, state_file)
+
+    def clear(self):
+        """Remove all activities from the heatmap."""
+        for name in ("counts", "tiles"):
+            if os.path.isdir(os.path.join(self.heatmap_dir, name)):
+                shutil.rmtree(os.path.join(self.heatmap_dir, name))
+        if os.path.isfile(self._state_file):
+            os.remove(self._state_file)
+        self.activities = set()
+        self.bounds = None
+
+    def _path(self, kind, zoom, x, y, extension):
+        return os.path.join(self.heatmap_dir, kind, str(zoom), str(x), "%d.%s" % (y, extension))
+
+    def _counts(self, zoom, x, y):
+        path = self._path("counts", zoom, x, y, "npz")
+        if os.path.isfile(path):
+            with numpy.load(path) as data:
+                return data["counts"]
+        return numpy.zeros((TILE_SIZE, TILE_SIZE), dtype=numpy.uint16)
+
+    def _write(self, path, write):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        write(path)
+
+    def update_from_dir(self, gpx_dir):
+        """Bring the heatmap in line with the <id>.gpx files of a directory.
+
+        Only the activities not yet included are read. If any included
+        activity is gone the heatmap is rebuilt from scratch.
+
+        Returns (int): the number of activities added.
+        """
+        logging.debug(">>")
+        gpx_files = {}
+        for filename in os.listdir(gpx_dir):
+            match = re.match(r"^(\d+)\.gpx$", filename)
+            if match:
+                gpx_files[int(match.group(1))] = os.path.join(gpx_dir, filename)
+        if self.activities - set(gpx_files):
+            logging.info("Activities removed from heatmap, rebuilding")
+            self.clear()
+        tracks = []
+        for id_record in sorted(set(gpx_files) - self.activities):
+            try:
+                tracks.append((id_record, track_points(gpx_files[id_record])))
+            except Exception as e:
+                logging.error("Unable to read %s for heatmap: %s" % (gpx_files[id_record], e))
+        self.add_tracks(tracks)
+        logging.debug("<<")
+        return len(tracks)
+
+    def add_tracks(self, tracks):
+        """Add tracks to the heatmap and render the tiles they touch.
+
+        Args:
+            tracks: (id, (latitudes, longitudes)) pairs.
+        """
+        if not os.path.isdir(self.heatmap_dir):
+            os.makedirs(self.heatmap_dir)
+        #Pixels of each track at the deepest zoom, shifted for the others
+        pixels = []
+        for id_record, (lats, lons) in tracks:
+            if len(lats):
+                x, y = project(lats, lons, ZOOMS[-1])
+                pixels.append(rasterize(x, y, MAX_GAP))
+        for zoom in ZOOMS:
+            counts = {}
+            shift = ZOOMS[-1] - zoom
+            for px, py in pixels:
+                for tile, rows, columns in tile_pixels(px >> shift, py >> shift, zoom):
+                    if tile not in counts:
+                        counts[tile] = self._counts(zoom, *tile)
+                    counts[tile][rows, columns] += 1
+            for (x, y), tile_counts in counts.items():
+                self._write(self._path("counts", zoom, x, y, "npz"), lambda path: numpy.savez_compressed(path, counts=tile_counts))
+                self._write(self._path("tiles", zoom, x, y, "png"), lambda path: imsave(path, render(tile_counts)))
+            logging.debug("Heatmap zoom %d: %d tiles updated" % (zoom, len(counts)))
+        for id_record, (lats, lons) in tracks:
+            self.activities.add(id_record)
+            if len(lats):
+                bounds = [min(lats), min(lons), max(lats), max(lons)]
+                if self.bounds is not None:
+                    bounds = [min(bounds[0], self.bounds[0]), min(bounds[1], self.bounds[1]),
+                              max(bounds[2], self.bounds[2]), max(bounds[3], self.bounds[3])]
+                self.bounds = bounds
+        self._save_state()
@@ -0,0 +1,189 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+"""Compact track data for the map pages.
+
+Instead of one JavaScript literal per trackpoint the map pages get the
+track as an encoded polyline plus the per point values used for colouring
+as a base64 packed float32 array. Both are decoded in the page by the
+functions in TRACK_JS.
+"""
+
+import array
+import base64
+import logging
+import math
+
+import pytrainer.lib.points as Points
+
+# Line types of the map line type combo box
+LINE_PLAIN = 0
+LINE_SPEED = 1
+LINE_HR = 2
+LINE_CADENCE = 3
+
+# Label of the value shown when a coloured track is clicked, by line type:
+# (prefix, suffix, decimals)
+VALUE_LABELS = [
+    ("", "", 0),
+    ("Speed: ", " km/h", 1),
+    ("HR: ", " bpm", 0),
+    ("Cadence: ", "", 0),
+]
+
+# Number of distinct colours a track is drawn with; consecutive points of
+# the same colour are drawn as one line
+COLOR_STEPS = 64
+
+def encode_track(pointlist):
+    """Encode (lat, lon) pairs as a polyline escaped for a JavaScript string."""
+    points, levels = Points.encodePoints(pointlist)
+    return points.replace("\\", "\\\\")
+
+def track_values(list_values, linetype):
+    """Get the value each trackpoint is coloured by.
+
+    Args:
+        list_values: activity.tracks rows (accum distance, elevation, total
+            duration, speed, lat, lon, bpm, cadence, corrected elevation).
+        linetype (int): one of LINE_PLAIN, LINE_SPEED, LINE_HR or LINE_CADENCE.
+    Returns:
+        (list): a float per trackpoint.
+    """
+    values = []
+    for i in list_values:
+        if linetype == LINE_SPEED:
+            if i[3] is not None:
+                val = i[3]
+            else:
+                val = 0
+                logging.error("No valid speed value for trackpoint: distance: %s | lat: %s | lon: %s" %(i[0],i[4],i[5]))
+        elif linetype == LINE_HR:
+            val = i[6] if i[6] else 0
+        elif linetype == LINE_CADENCE:
+            val = i[7] if i[7] != None else 1
+        else:
+            val = 1
+        values.append(float(val))
+    return values
+
+def value_stats(values):
+    """Get the average and standard deviation the colour scale is centred on.
+
+    The variance is at least 16 so near constant values do not spread over
+    the whole scale.
+    """
+    n = float(len(values))
+    average = sum(values) / n
+    variance = sum([v * v for v in values]) / n - average ** 2
+    return average, math.sqrt(max(variance, 16))
+
+def pack_values(values):
+    """Pack floats into a base64 string, unpacked by unpackFloat32 in TRACK_JS."""
+    return base64.b64encode(array.array('f', values).tostring())
+
+TRACK_JS = '''
+            // Decode an encoded polyline into [lat, lon] pairs
+            function decodePolyline(encoded) {
+                var coords = [];
+                var index = 0, lat = 0, lon = 0;
+                while (index < encoded.length) {
+                    var delta = [0, 0];
+                    for (var d = 0; d < 2; d++) {
+                        var result = 0, shift = 0, b;
+                        do {
+                            b = encoded.charCodeAt(index++) - 63;
+                            result |= (b & 31) << shift;
+                            shift += 5;
+                        } while (b >= 32);
+                        delta[d] = (result & 1) ? ~(result >> 1) : (result >> 1);
+                    }
+                    lat += delta[0];
+                    lon += delta[1];
+                    coords.push([lat * 1e-5, lon * 1e-5]);
+                }
+                return coords;
+            }
+
+            // Unpack a base64 string of float32 values
+            function unpackFloat32(packed) {
+                var bytes = atob(packed);
+                var buffer = new Uint8Array(bytes.length);
+                for (var i = 0; i < bytes.length; i++) {
+                    buffer[i] = bytes.charCodeAt(i);
+                }
+                return new Float32Array(buffer.buffer);
+            }
+
+            // Colour for a value, blue for low through to red for high values
+            function valueColor(value, average, stdev, steps) {
+                var v = (value - (average - 2 * stdev)) / (4 * stdev);
+                v = Math.round(Math.min(Math.max(v, 0), 1) * steps) / steps;
+                var h = (0.66 - v * 0.66) * 6, c = 0.8;
+                var x = c * (1 - Math.abs(h % 2 - 1));
+                var rgb = [[c, x, 0], [x, c, 0], [0, c, x], [0, x, c], [x, 0, c], [c, 0, x]][Math.floor(h) % 6];
+                var hex = "#";
+                for (var i = 0; i < 3; i++) {
+                    hex += ("0" + Math.floor(rgb[i] * 255).toString(16)).slice(-2);
+                }
+                return hex;
+            }
+
+            // Split the track into runs of consecutive segments of the same
+            // colour; a segment takes the colour of its last point
+            function colorRuns(values, average, stdev, steps) {
+                var runs = [];
+                var run = null;
+                for (var i = 1; i < values.length; i++) {
+                    var color = valueColor(values[i], average, stdev, steps);
+                    if (run === null || run.color != color) {
+                        run = {start: i - 1, end: i, color: color};
+                        runs.push(run);
+                    } else {
+                        run.end = i;
+                    }
+                }
+                return runs;
+            }
+
+            // Index of the point of coords[start..end] closest to lat, lon
+            function closestPoint(coords, start, end, lat, lon) {
+                var best = start, bestDistance = Infinity;
+                for (var i = start; i <= end; i++) {
+                    var distance = Math.pow(coords[i][0] - lat, 2) + Math.pow(coords[i][1] - lon, 2);
+                    if (distance < bestDistance) {
+                        best = i;
+                        bestDistance = distance;
+                    }
+                }
+                return best;
+            }
+'''
+
+def track_script(pointlist, values, linetype):
+    """Get the JavaScript declaring the track data of a map page.
+
+    Declares coords (the decoded [lat, lon] pairs), values, runs (see
+    colorRuns) and valueLabel(index), after the TRACK_JS functions.
+    """
+    average, stdev = value_stats(values)
+    prefix, suffix, decimals = VALUE_LABELS[linetype]
+    content = TRACK_JS
+    content += "            var coords = decodePolyline(\"%s\");\n" % encode_track(pointlist)
+    content += "            var values = unpackFloat32(\"%s\");\n" % pack_values(values)
+    content += "            var runs = colorRuns(values, %f, %f, %d);\n" % (average, stdev, COLOR_STEPS)
+    content += "            function valueLabel(index) { return \"%s\" + values[index].toFixed(%d) + \"%s\"; }\n" % (prefix, decimals, suffix)
+    return content
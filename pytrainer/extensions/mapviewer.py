@@ -50,6 +50,23 @@ class MapViewer:
 		#self.box.show_all()
 		logging.debug("<<")
 
+	def createLoadingHtml(self):
+		"""Page shown while the map is being drawn"""
+		htmlfile = "%s/loading.html" % (self.pytrainer_main.profile.tmpdir)
+		content = '''<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml">
+<head>
+<meta http-equiv="content-type" content="text/html; charset=utf-8"/>
+</head>
+<body style="font-family: sans-serif; color: #808080; text-align: center; padding-top: 100px">
+%s
+</body>
+</html>
+		''' % _("Loading map...")
+		file = fileUtils(htmlfile,content)
+		file.run()
+		return htmlfile
+
 	def createErrorHtml(self):
 		logging.debug(">>")
 		htmlfile = "%s/error.html" % (self.pytrainer_main.profile.tmpdir)
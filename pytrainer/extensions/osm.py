@@ -10,8 +10,10 @@ import urllib           # for downloading cached versions of openlayers.js and o
 import time             # Used for checking if local cached file is current
     
 from pytrainer.lib.gpx import Gpx
-import pytrainer.lib.points as Points
 from pytrainer.lib.fileUtils import fileUtils
+from pytrainer.extensions import mapdata
+from pytrainer.extensions import tilecache
+from pytrainer.extensions import heatmap as Heatmap
 from pytrainer.record import Record
 
 class Osm:
@@ -42,7 +44,16 @@ class Osm:
         webFile.close()
         localFile.close()
         logging.debug("<<")
-        
+
+    def mapnikLayer(self):
+        '''JavaScript creating the Mapnik layer as layerMapnik, with tiles
+        from the local tile cache if its server is running
+        '''
+        tile_server = tilecache.get_tile_server(self.pytrainer_main.profile)
+        if tile_server is None:
+            return 'layerMapnik = new OpenLayers.Layer.OSM.Mapnik("Mapnik");'
+        return 'layerMapnik = new OpenLayers.Layer.OSM("Mapnik", "%s", {numZoomLevels: 19});' % tile_server.layer_url
+
     def cacheUrls(self):
         ''' Store URL copies of needed files locally, 
             download new versions every ~14 days or if files does'nt exists
@@ -80,11 +91,7 @@ class Osm:
         render using embedded Webkit
         '''
         logging.debug(">>")
-        points = []
-        levels = []
         pointlist = []
-        polyline = []
-        attrlist = []
 
         try :
             list_values = activity.tracks
@@ -92,10 +99,7 @@ class Osm:
                 for i in list_values:
                     lat, lon = float(i[4]), float(i[5])
                     pointlist.append((lat,lon))
-                    polyline.append("[%s, %s]" % (lon, lat))
-                    attrlist.append((i[3],i[6])) # (Speed, HR)
-                points,levels = Points.encodePoints(pointlist)
-                points = points.replace("\\","\\\\")
+                values = mapdata.track_values(list_values, linetype)
                 laps = activity.laps
                 timeHours = int(activity.time) / 3600
                 timeMin = (float(activity.time) / 3600.0 - timeHours) * 60
@@ -106,7 +110,7 @@ class Osm:
                 startinfo = startinfo.encode('ascii', 'xmlcharrefreplace') #Encode for html
                 finishinfo = finishinfo.encode('ascii', 'xmlcharrefreplace') #Encode for html
 
-                self.createHtml_osm(polyline, startinfo, finishinfo, laps, attrlist, linetype)
+                self.createHtml_osm(pointlist, values, startinfo, finishinfo, laps, linetype)
             else:
                 self.createErrorHtml()
         except Exception as e:
@@ -190,7 +194,7 @@ class Osm:
                 } );
 
                 //Add open street maps layers
-                layerMapnik = new OpenLayers.Layer.OSM.Mapnik("Mapnik");
+                ''' + self.mapnikLayer() + '''
                 map.addLayer(layerMapnik);
 
                 //Add polygon drawing layer
@@ -270,9 +274,11 @@ class Osm:
         file.run()
         return self.htmlfile
         
-    def createHtml_osm(self, polyline, startinfo, finishinfo, laps, attrlist, linetype):
+    def createHtml_osm(self, pointlist, values, startinfo, finishinfo, laps, linetype):
         '''
         Generate OSM map html file using MapLayers
+        The track is written as an encoded polyline and packed values (see mapdata),
+        coloured by value unless linetype is mapdata.LINE_PLAIN
         '''
         logging.debug(">>")
 
@@ -290,7 +296,9 @@ class Osm:
                  to date with any necessary changes -->
             <script src="''' + self.URLS['OpenStreetMap.js'] + '''"></script>
 
-            <script type="text/javascript">
+            <script type="text/javascript">'''
+        content += mapdata.track_script(pointlist, values, linetype)
+        content += '''
                 //complex object of type OpenLayers.Map
                 var map;
 
@@ -331,7 +339,7 @@ class Osm:
         content+=''',\n        start : { url : "/start.png", coordinates : %s, popupInfo : "%s" },
                     finish : { url : "/finish.png", coordinates : %s, popupInfo : "%s" },
                     url : "file://%s/glade"''' \
-                    % (polyline[0], startinfo, polyline[-1], finishinfo, os.path.abspath(self.data_path))
+                    % ("[%s, %s]" % pointlist[0][::-1], startinfo, "[%s, %s]" % pointlist[-1][::-1], finishinfo, os.path.abspath(self.data_path))
 
         content+='''};\n
                 function init() {
@@ -368,51 +376,39 @@ class Osm:
                     pointRadius: 6,
                 };
 
-                //Build track object
-                var track =
-                    {
-                    "type":"Feature",
-                    "id":"OpenLayers.Feature.Vector_259",
-                    "properties":{},
-                    "geometry":
-                    {
-                        "type":"LineString",
-                        "coordinates":
-                            ['''
-        #Insert track points here
-        content+=",".join(polyline);
-        content+=''']
-                    },
-                    "crs":
-                        {
-                        "type":"OGC",
-                        "properties":
-                            {
-                            "urn":"urn:ogc:def:crs:OGC:1.3:CRS84"
-                            }
-                        }
-                    }
+                //Build track points, transformed from WGS 1984 to Spherical Mercator Projection
+                var points = [];
+                for (var i = 0; i < coords.length; i++) {
+                    points.push(new OpenLayers.Geometry.Point(coords[i][1], coords[i][0]).transform(pWGS, pMP));
+                }
+                var track = new OpenLayers.Geometry.LineString(points);
+                track.calculateBounds();
 
                 //Add open street maps layers
-                layerMapnik = new OpenLayers.Layer.OSM.Mapnik("Mapnik");
+                ''' + self.mapnikLayer() + '''
                 map.addLayer(layerMapnik);
 
                 //Create vector layer to add the data on to
                 var vector_layer = new OpenLayers.Layer.Vector();
                 vector_layer.setName('Track');
 
-                var geojson_format = new OpenLayers.Format.GeoJSON();
-                var feature = geojson_format.read(track,"Feature");
-
-                // transform from WGS 1984 to Spherical Mercator Projection
-                feature.geometry.transform(pWGS, pMP);
-
-                feature.geometry.calculateBounds();
-                var vector=new OpenLayers.Feature.Vector();
-                vector.geometry = feature.geometry;
-                vector.style=trackStyle;
-
-                vector_layer.addFeatures(vector);
+                '''
+        if linetype == mapdata.LINE_PLAIN:
+            content += '''
+                vector_layer.addFeatures(new OpenLayers.Feature.Vector(track, null, trackStyle));'''
+        else:
+            content += '''
+                //One line per run of points of the same colour
+                var features = [];
+                for (var r = 0; r < runs.length; r++) {
+                    var style = OpenLayers.Util.extend({}, trackStyle);
+                    style.strokeColor = runs[r].color;
+                    style.strokeOpacity = 0.9;
+                    features.push(new OpenLayers.Feature.Vector(
+                        new OpenLayers.Geometry.LineString(points.slice(runs[r].start, runs[r].end + 1)), null, style));
+                }
+                vector_layer.addFeatures(features);'''
+        content += '''
                 map.addLayer(vector_layer);
 
                 // Insert start/finish markers
@@ -440,7 +436,7 @@ class Osm:
                 map.addLayer(layerMarkers);
 
                 //zoom and center to the track layouts
-                map.zoomToExtent(feature.geometry.getBounds());
+                map.zoomToExtent(track.getBounds());
 
             }
         </script>
@@ -457,6 +453,78 @@ class Osm:
         file.run()
         logging.debug("<<")
 
+    def drawHeatmap(self, heatmap):
+        '''Draw the heatmap tiles of a heatmap.Heatmap over the OSM map
+        '''
+        logging.debug(">>")
+        if heatmap.bounds is None:
+            self.createErrorHtml()
+            logging.debug("<<")
+            return self.htmlfile
+        self.cacheUrls();
+        minlat, minlon, maxlat, maxlon = heatmap.bounds
+        content = '''<html>
+        <head>
+            <style type="text/css">
+                /* heatmap tiles only exist where there are tracks */
+                .olImageLoadError {
+                    display: none !important;
+                }
+            </style>
+            <script src="''' + self.URLS['OpenLayers.js'] + '''"></script>
+            <script src="''' + self.URLS['OpenStreetMap.js'] + '''"></script>
+
+            <script type="text/javascript">
+            var map;
+
+            function init() {
+                OpenLayers.ImgPath="''' + self.staticURLS['OpenLayers'] + '''img/";
+                OpenLayers.scriptLocation="''' + self.staticURLS['OpenLayers'] + '''";
+                OpenLayers._getScriptLocation=function() { return "''' + self.staticURLS['OpenLayers'] + '''";};
+
+                pWGS = new OpenLayers.Projection("EPSG:4326");
+                pMP = new OpenLayers.Projection("EPSG:900913");
+
+                map = new OpenLayers.Map ("map", {
+                    controls:[
+                        new OpenLayers.Control.Navigation(),
+                        new OpenLayers.Control.PanZoomBar(),
+                        new OpenLayers.Control.LayerSwitcher(),
+                        new OpenLayers.Control.Attribution()],
+                    maxExtent: new OpenLayers.Bounds(-20037508.34,-20037508.34,20037508.34,20037508.34),
+                    maxResolution: 156543.0399,
+                    numZoomLevels: 19,
+                    units: 'm',
+                    projection: pMP,
+                    displayProjection: pWGS
+                } );
+
+                ''' + self.mapnikLayer() + '''
+                map.addLayer(layerMapnik);
+
+                var layerHeatmap = new OpenLayers.Layer.OSM("Heatmap", "file://%s/${z}/${x}/${y}.png", {
+                    isBaseLayer: false,
+                    numZoomLevels: %d,
+                    transitionEffect: null,
+                    attribution: ""
+                });
+                map.addLayer(layerHeatmap);
+
+                var bounds = new OpenLayers.Bounds(%f, %f, %f, %f);
+                map.zoomToExtent(bounds.transform(pWGS, pMP));
+            }
+            </script>
+        </head>
+        <body onload="init();">
+            <div style="width:100%%; height:100%%" id="map"></div>
+        </body>
+        </html>
+        ''' % (heatmap.tile_dir, Heatmap.ZOOMS[-1] + 1, minlon, minlat, maxlon, maxlat)
+        file = fileUtils(self.htmlfile,content)
+        file.run()
+        logging.debug("<<")
+        return self.htmlfile
+
     def createErrorHtml(self,errMsg=None):
         logging.debug(">>")
         errMsg = errMsg or ''       # convert None to empty string
@@ -0,0 +1,295 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+"""Local cache of Open Street Map tiles.
+
+Tiles are kept on disk within a size budget, evicting the least recently
+used ones. The OSM map pages get their tiles through a loopback HTTP
+server (TileServer) that answers from the cache and only goes upstream
+for missing tiles, so maps already seen render without network access.
+"""
+
+import BaseHTTPServer
+import SocketServer
+import logging
+import math
+import os
+import re
+import threading
+import urllib2
+
+from pytrainer.lib.gpx import track_points
+from pytrainer.util.cache import LruCache
+
+TILE_URL = "http://tile.openstreetmap.org/%(zoom)d/%(x)d/%(y)d.png"
+# Template of the tile URLs of the local server, for OpenLayers.Layer.OSM
+LAYER_URL = "%s/${z}/${x}/${y}.png"
+MAX_ZOOM = 18
+# Disk budget in MB when the profile has none
+DEFAULT_CACHE_SIZE = 200
+# Tiles are prefetched up to this zoom, for at most this many tiles
+PREFETCH_MAX_ZOOM = 16
+PREFETCH_MAX_TILES = 300
+TIMEOUT = 10
+
+def tile_number(lat, lon, zoom):
+    """Get the x, y numbers of the tile containing a location."""
+    n = 2 ** zoom
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.log(math.tan(math.radians(lat)) + 1.0 / math.cos(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def tiles_for_bounds(minlat, minlon, maxlat, maxlon, zoom):
+    """Get the (zoom, x, y) of the tiles covering a bounding box."""
+    x1, y1 = tile_number(maxlat, minlon, zoom)
+    x2, y2 = tile_number(minlat, maxlon, zoom)
+    return [(zoom, x, y) for x in range(x1, x2 + 1) for y in range(y1, y2 + 1)]
+
+def prefetch_tiles(minlat, minlon, maxlat, maxlon, max_zoom=PREFETCH_MAX_ZOOM, max_tiles=PREFETCH_MAX_TILES):
+    """Get the tiles to prefetch for a bounding box.
+
+    Whole zoom levels are added from the world view inwards while the
+    total stays within max_tiles.
+    """
+    tiles = []
+    for zoom in range(max_zoom + 1):
+        level = tiles_for_bounds(minlat, minlon, maxlat, maxlon, zoom)
+        if len(tiles) + len(level) > max_tiles:
+            break
+        tiles.extend(level)
+    return tiles
+
+def track_bounds(gpxfile):
+    """Get (minlat, minlon, maxlat, maxlon) of the points of a GPX file,
+    or None if it has none."""
+    lats, lons = track_points(gpxfile)
+    if not lats:
+        return None
+    return min(lats), min(lons), max(lats), max(lons)
+
+class TileCache(object):
+
+    """Map tiles stored under cache_dir as zoom/x/y.png, within max_bytes.
+
+    Safe to use from several threads.
+    """
+
+    def __init__(self, cache_dir, max_bytes, url=TILE_URL, user_agent="pytrainer"):
+        self.cache_dir = cache_dir
+        self.url = url
+        self.user_agent = user_agent
+        self._lock = threading.Lock()
+        self._tiles = LruCache(max_bytes, sizeof=lambda size: size)
+        self._load()
+
+    def _load(self):
+        """Add the tiles already on disk, least recently used first."""
+        found = []
+        for dirpath, dirnames, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                match = re.match(r"^(\d+)/(\d+)/(\d+)\.png$", os.path.relpath(os.path.join(dirpath, filename), self.cache_dir).replace(os.sep, "/"))
+                if match:
+                    path = os.path.join(dirpath, filename)
+                    found.append((os.path.getmtime(path), tuple(int(n) for n in match.groups()), os.path.getsize(path)))
+        found.sort()
+        for mtime, key, size in found:
+            self._remove(self._tiles.put(key, size))
+        logging.debug("%d cached tiles, %d bytes" % (len(self._tiles), self._tiles.size))
+
+    @property
+    def size(self):
+        return self._tiles.size
+
+    def path(self, zoom, x, y):
+        return os.path.join(self.cache_dir, str(zoom), str(x), "%d.png" % y)
+
+    def __contains__(self, tile):
+        with self._lock:
+            return tile in self._tiles
+
+    def get(self, zoom, x, y, fetch=True):
+        """Get the image data of a tile.
+
+        Missing tiles are downloaded and stored if fetch is True, otherwise
+        None is returned. Download errors are raised.
+        """
+        key = (zoom, x, y)
+        with self._lock:
+            cached = self._tiles.get(key) is not None
+        if cached:
+            try:
+                with open(self.path(*key), "rb") as tile_file:
+                    data = tile_file.read()
+                os.utime(self.path(*key), None)
+                return data
+            except (IOError, OSError):
+                #Evicted by another thread meanwhile
+                logging.debug("Tile %s vanished from cache" % str(key))
+        if not fetch:
+            return None
+        data = self.download(zoom, x, y)
+        self.put(zoom, x, y, data)
+        return data
+
+    def download(self, zoom, x, y):
+        url = self.url % {"zoom": zoom, "x": x, "y": y}
+        logging.debug("Downloading tile %s" % url)
+        request = urllib2.Request(url, headers={"User-Agent": self.user_agent})
+        response = urllib2.urlopen(request, timeout=TIMEOUT)
+        try:
+            return response.read()
+        finally:
+            response.close()
+
+    def put(self, zoom, x, y, data):
+        """Store the image data of a tile, evicting old tiles if over budget."""
+        path = self.path(zoom, x, y)
+        with self._lock:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path + ".part", "wb") as tile_file:
+                tile_file.write(data)
+            os.rename(path + ".part", path)
+            self._remove(self._tiles.put((zoom, x, y), len(data)))
+
+    def _remove(self, evicted):
+        for key, size in evicted:
+            try:
+                os.remove(self.path(*key))
+            except OSError as e:
+                logging.debug("Unable to remove tile %s: %s" % (str(key), e))
+
+    def prefetch(self, tiles):
+        """Download the tiles not already cached.
+
+        Stops at the first download error, e.g. when offline.
+        Returns (int): the number of tiles downloaded.
+        """
+        count = 0
+        for tile in tiles:
+            if tile in self:
+                continue
+            try:
+                self.get(*tile)
+            except Exception as e:
+                logging.info("Tile prefetch stopped: %s" % e)
+                break
+            count += 1
+        return count
+
+class _TileRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        match = re.match(r"^/(\d+)/(\d+)/(\d+)\.png$", self.path)
+        if match is None or int(match.group(1)) > MAX_ZOOM:
+            self.send_error(404)
+            return
+        try:
+            data = self.server.cache.get(*[int(n) for n in match.groups()])
+        except Exception as e:
+            logging.debug("Tile %s not available: %s" % (self.path, e))
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "max-age=86400")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class TileServer(object):
+
+    """HTTP server on the loopback interface serving tiles from a TileCache."""
+
+    def __init__(self, cache, port=0):
+        self.cache = cache
+        self._server = _ThreadingHTTPServer(("127.0.0.1", port), _TileRequestHandler)
+        self._server.cache = cache
+        self._thread = threading.Thread(target=self._server.serve_forever, name="TileServer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d" % self._server.server_address[1]
+
+    @property
+    def layer_url(self):
+        return LAYER_URL % self.url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+_tile_cache = None
+_tile_server = None
+# Maps are drawn from several threads
+_lock = threading.RLock()
+
+def get_tile_cache(profile):
+    """Get the tile cache of a profile, shared by the whole process."""
+    global _tile_cache
+    with _lock:
+        if _tile_cache is None:
+            size = profile.getIntValue("pytraining", "map_tile_cache_size", default=DEFAULT_CACHE_SIZE) or DEFAULT_CACHE_SIZE
+            version = profile.pytrainer_main.version if profile.pytrainer_main is not None else ""
+            _tile_cache = TileCache(profile.tilecachedir, size * 1024 * 1024, user_agent="pytrainer/%s" % version)
+        return _tile_cache
+
+def get_tile_server(profile):
+    """Get the running tile server, starting it if needed.
+
+    Returns None if it cannot be started, maps then use the online tiles.
+    """
+    global _tile_server
+    with _lock:
+        if _tile_server is None:
+            try:
+                _tile_server = TileServer(get_tile_cache(profile))
+                logging.info("Serving map tiles from %s" % _tile_server.url)
+            except Exception as e:
+                logging.error("Unable to start tile server: %s" % e)
+                return None
+        return _tile_server
+
+def prefetch_track(profile, gpxfile):
+    """Download the tiles around a track in the background, unless disabled
+    in the profile.
+
+    Returns (threading.Thread): the prefetch thread, or None.
+    """
+    if profile.getValue("pytraining", "map_tile_prefetch") != "True":
+        return None
+    cache = get_tile_cache(profile)
+    def prefetch():
+        try:
+            bounds = track_bounds(gpxfile)
+            if bounds is not None:
+                count = cache.prefetch(prefetch_tiles(*bounds))
+                logging.info("Prefetched %d tiles for %s" % (count, gpxfile))
+        except Exception as e:
+            logging.error("Error prefetching tiles for %s: %s" % (gpxfile, e))
+    thread = threading.Thread(target=prefetch, name="TilePrefetch")
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -19,11 +19,15 @@
 from pytrainer.extension import Extension
 from pytrainer.lib.fileUtils import fileUtils
 import gtk
+import json
 import logging
 import os
 import re
 import webkit
 
+# Most waypoints shown on the map at once, when zoomed out over more
+MAX_MARKERS = 500
+
 class WaypointEditor:
 	def __init__(self, data_path = None, vbox = None, waypoint=None, parent=None):		
 		logging.debug(">>")
@@ -36,6 +40,7 @@ class WaypointEditor:
 		vbox.pack_start(scrolled_window, True, True)
 		vbox.show_all()
 		self.htmlfile = ""
+		self._loaded = False
 		self.waypoint=waypoint
 		self.pytrainer_main=parent
 		logging.debug("<<")
@@ -55,7 +60,8 @@ class WaypointEditor:
 					lon, lat = am.group(1), am.group(2) 
 					lon, lat = float(lon), float(lat) 
 					id_waypoint = self.waypoint.addWaypoint(lon, lat, "NEW WAYPOINT") 
-					self.pytrainer_main.refreshWaypointView(default_waypoint=id_waypoint)
+					self.updateMarker(id_waypoint)
+					self.pytrainer_main.refreshWaypointView(default_waypoint=id_waypoint, redrawmap=0)
 				else: 
 					raise ValueError("Error parsing addWaypoint parameters: %s" % args) 
 			elif fname == "updateWaypoint": 
@@ -71,11 +77,17 @@ class WaypointEditor:
 					if retorno: 
 						name, comment, sym = retorno[0][5], retorno[0][3], retorno[0][6] 
 						self.waypoint.updateWaypoint(id_waypoint, lat, lon, name, comment, sym) 
-						self.pytrainer_main.refreshWaypointView(default_waypoint=id_waypoint)
+						self.pytrainer_main.refreshWaypointView(default_waypoint=id_waypoint, redrawmap=0)
 					else: 
 						raise KeyError("Unknown waypoint id %d", id_waypoint) 
 				else: 
 					raise ValueError("Error parsing addWaypoint parameters: %s" % args) 
+			elif fname == "getWaypoints":
+				try:
+					minlon, minlat, maxlon, maxlat = [float(arg) for arg in args.split(",")]
+				except ValueError:
+					raise ValueError("Error parsing getWaypoints parameters: %s" % args)
+				self.loadArea(minlat, minlon, maxlat, maxlon)
 			else: 
 				raise ValueError("Unexpected function name %s" % fname) 
 		return False 
@@ -87,16 +99,57 @@ class WaypointEditor:
 		htmlfile = tmpdir+"/waypointeditor.html"
 		logging.debug("HTML file: "+str(htmlfile))
 		self.wkview.load_uri("file://"+htmlfile)
+		self._loaded = True
+		logging.debug("<<")
+
+	def _execute(self, function, *args):
+		"""Call a function of the map page, with the arguments as JSON"""
+		if self._loaded:
+			self.wkview.execute_script("%s(%s);" % (function, ",".join([json.dumps(arg) for arg in args])))
+
+	def _marker(self, id_waypoint, lat, lon, name, description, sym):
+		return {"id": int(id_waypoint), "lat": lat, "lon": lon, "name": name, "description": description, "sym": sym}
+
+	def showWaypoint(self, id_waypoint=None):
+		"""Center the map on a waypoint. The page is only created the first
+		time, it then loads the waypoints of the area shown by itself."""
+		logging.debug(">>")
+		if not self._loaded:
+			self.createHtml(id_waypoint)
+			self.drawMap()
+		elif id_waypoint is not None:
+			retorno = self.waypoint.getwaypointInfo(id_waypoint)
+			if retorno:
+				self._execute("centerOn", retorno[0][0], retorno[0][1])
 		logging.debug("<<")
+
+	def loadArea(self, minlat, minlon, maxlat, maxlon):
+		"""Show the markers of the waypoints in the area of the map, up to
+		MAX_MARKERS, and drop those outside"""
+		points = self.waypoint.getWaypointsInArea(minlat, minlon, maxlat, maxlon, limit=MAX_MARKERS)
+		logging.debug("%d waypoints in map area" % len(points))
+		self._execute("setWaypoints", [self._marker(p[0], p[1], p[2], p[6], p[4], p[7]) for p in points])
+
+	def updateMarker(self, id_waypoint):
+		"""Show a new or changed waypoint on the map"""
+		retorno = self.waypoint.getwaypointInfo(id_waypoint)
+		if retorno:
+			lat, lon, ele, comment, time, name, sym = retorno[0]
+			self._execute("setMarker", self._marker(id_waypoint, lat, lon, name, comment, sym))
+
+	def removeMarker(self, id_waypoint):
+		self._execute("removeMarker", int(id_waypoint))
 	
 	def createHtml(self,default_waypoint=None):
 		logging.debug(">>")
 		tmpdir = self.pytrainer_main.profile.tmpdir
 		filename = tmpdir+"/waypointeditor.html"
 	
-		points = self.waypoint.getAllWaypoints()
-		londef = 0
-		latdef = 0
+		if default_waypoint is not None:
+			retorno = self.waypoint.getwaypointInfo(default_waypoint)
+		else:
+			retorno = [p[1:] for p in self.waypoint.getWaypointsInArea(-90, -180, 90, 180, limit=1)]
+		latdef, londef = (retorno[0][0], retorno[0][1]) if retorno else (0, 0)
 		content = """
 
 <!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN"
@@ -109,29 +162,9 @@ class WaypointEditor:
     <script id="googleapiimport" src="http://maps.google.com/maps/api/js?sensor=false"
             type="text/javascript"></script>
     <script type="text/javascript">
-"""
-		i = 0
-		arrayjs = ""
-		if default_waypoint is None and points: 
-			default_waypoint = points[0][0]
-		for point in points:
-			if point[0] == default_waypoint:
-				londef = point[2]
-				latdef = point[1]
-			content += "lon = '%f';\n"%point[2]
-			content += "lat = '%f';\n"%point[1]
-			content += "name = '%s';\n"%point[6]
-			content += "description = '%s';\n"%point[4]
-			content += "sym = '%s';\n"%point[7]
-			content += "id = '%d';\n"%point[0]
-			content += """waypoint%d = Array (lon,lat,name,description,sym,id);\n"""%i
-			if i>0:
-				arrayjs+=","
-			arrayjs +="waypoint%d"%i
-			i = i+1
-		content += """waypointList = Array (%s);\n""" %arrayjs
-		content += """ 
 	is_addmode = 0;
+	//Markers on the map by waypoint id, only for the area shown
+	markers = {};
     //<![CDATA[
 
 	function addWaypoint(lon,lat) {
@@ -142,17 +175,19 @@ class WaypointEditor:
 		document.title = "call:updateWaypoint(" + lon + "," + lat + "," + id + ")"; 
   		}  	
 
+	function loadWaypoints() {
+		var bounds = map.getBounds();
+		var sw = bounds.getSouthWest();
+		var ne = bounds.getNorthEast();
+		document.title = "call:getWaypoints(" + sw.lng() + "," + sw.lat() + "," + ne.lng() + "," + ne.lat() + ")";
+		}
+
 	function createMarker(waypoint) {
-		var lon = waypoint[0];
-		var lat = waypoint[1];
-		var id = waypoint[5];
-		var sym = waypoint[4];
-		
-		var point = new GLatLng(lat,lon);
-		var text = "<b>"+waypoint[2]+"</b><br/>"+waypoint[3];
+		var id = waypoint.id;
+		var point = new GLatLng(waypoint.lat,waypoint.lon);
 
 		var icon = new GIcon();
-		if (sym=="Summit") {
+		if (waypoint.sym=="Summit") {
 			icon.image = \""""+os.path.abspath(self.data_path)+"""/glade/summit.png\";
 			}
 		else {
@@ -162,7 +197,7 @@ class WaypointEditor:
 		icon.iconAnchor = new GPoint(16, 16);
 		icon.infoWindowAnchor = new GPoint(5, 1);
 		
-		var markerD = new GMarker(point, {icon:icon, draggable: true}); 
+		var markerD = new GMarker(point, {icon:icon, draggable: true, title: waypoint.name || ""}); 
 		map.addOverlay(markerD);
 
 		markerD.enableDragging();
@@ -174,6 +209,39 @@ class WaypointEditor:
   		return markerD;
 		}
 
+	//Show a new or changed waypoint
+	function setMarker(waypoint) {
+		removeMarker(waypoint.id);
+		markers[waypoint.id] = createMarker(waypoint);
+		}
+
+	function removeMarker(id) {
+		if (markers[id]) {
+			map.removeOverlay(markers[id]);
+			delete markers[id];
+			}
+		}
+
+	//Show the waypoints of the area, keeping the markers already there
+	function setWaypoints(waypoints) {
+		var shown = {};
+		for (var i=0; i<waypoints.length; i++) {
+			shown[waypoints[i].id] = true;
+			if (!markers[waypoints[i].id]) {
+				markers[waypoints[i].id] = createMarker(waypoints[i]);
+				}
+			}
+		for (var id in markers) {
+			if (!shown[id]) {
+				removeMarker(id);
+				}
+			}
+		}
+
+	function centerOn(lat, lon) {
+		map.panTo(new GLatLng(lat, lon));
+		}
+
 	function load() {
 		if (GBrowserIsCompatible()) {
 			//Dibujamos el mapa
@@ -182,16 +250,10 @@ class WaypointEditor:
         		map.addControl(new GMapTypeControl());
 			map.addControl(new GScaleControl());
 	"""
-		if londef != 0:
-        		content +="""
+		content +="""
 				lon = %s;
 				lat = %s;
 				""" %(londef,latdef)
-		else:
-			 content += """
-				lon = 0;
-				lat = 0;
-				"""
 		content +="""
 			map.setCenter(new GLatLng(lat, lon), 11);
 
@@ -200,23 +262,17 @@ class WaypointEditor:
 			map.addControl(ovMap);
 			mini=ovMap.getOverviewMap();
 
-			//Dibujamos los waypoints
-			for (i=0; i<waypointList.length; i++){
-  				createMarker(waypointList[i]);
-				map.enableDragging();
-				}
+			//Dibujamos los waypoints del area visible
+			GEvent.addListener(map, "moveend", loadWaypoints);
+			loadWaypoints();
 
 			//Preparamos los eventos para anadir nuevos waypoints
 			GEvent.addListener(map, "click", function(marker, point) {
     				if (is_addmode==1){
 					map.enableDragging();
 					//map.addOverlay(new GMarker(point));
-					var lon = point.lng();
-					var lat = point.lat();
-				
-					var waypoint_id = addWaypoint(lon,lat);
-					var waypoint = Array (lon,lat,"","","",waypoint_id);
-  					createMarker(waypoint);
+					//The marker is set once the waypoint is stored
+					addWaypoint(point.lng(),point.lat());
 					is_addmode = 0;
 					}
 				});
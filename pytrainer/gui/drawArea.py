@@ -17,13 +17,21 @@
 #Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
 
 import matplotlib
-matplotlib.use('GTK')
 from matplotlib.figure import Figure
-from matplotlib.backends.backend_gtkagg import FigureCanvasGTKAgg as FigureCanvasGTK
-from matplotlib.backends.backend_gtkagg import NavigationToolbar2GTKAgg as NavigationToolbar
-import matplotlib.pyplot as plt
-import pylab 
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+try:
+    from matplotlib.backends.backend_gtkagg import FigureCanvasGTKAgg as FigureCanvasGTK
+    from matplotlib.backends.backend_gtkagg import NavigationToolbar2GTKAgg as NavigationToolbar
+except ImportError:
+    #No GTK, graphs can only be rendered off screen (see pytrainer.export)
+    FigureCanvasGTK = None
+    NavigationToolbar = None
 import logging
+from pytrainer.util.downsample import downsample, point_budget
+from pytrainer.util.cache import LruCache
+
+#Number of rendered graphs kept by each DrawArea
+RENDER_CACHE_SIZE = 12
 
 class DrawArea:
     def __init__(self, vbox = None, window = None):
@@ -32,11 +40,104 @@ class DrawArea:
         #self.axis = self.figure.add_subplot(111)
         self.vbox = vbox
         self.window = window
-        #self.canvas = FigureCanvasGTK(self.figure) # a gtk.DrawingArea
+        #Figure, canvas and toolbar are created on first use and then reused
+        self.figure = None
+        self.canvas = None
+        self.toolbar = None
+        #Full resolution data of the plotted lines, used to resample on zoom
+        self.sampledLines = []
+        #Rendered graphs by cache key and canvas size
+        self.renderCache = LruCache(RENDER_CACHE_SIZE)
+        #Cache key of what the figure holds and how to redraw what is
+        #shown when that is a cached image instead
+        self.figureKey = None
+        self.pendingDraw = None
         #self.drawDefault()
         self.NEARLY_ZERO = 0.0000000000000000000001
         logging.debug('<<')
 
+    def getFigure(self, cache_key=None):
+        ''' function to get an empty figure to draw in
+            the figure (and its canvas) is created once and cleared on later calls
+            if cache_key is given the rendered graph is cached under it
+            without a vbox the figure is rendered off screen, e.g. to be saved to a file
+        '''
+        if self.figure is None:
+            self.figure = Figure()
+            if self.vbox is None:
+                self.canvas = FigureCanvasAgg(self.figure)
+            else:
+                self.canvas = FigureCanvasGTK(self.figure) # a gtk.DrawingArea
+                self.canvas.show()
+                self.canvas.mpl_connect('draw_event', self.on_draw)
+            logging.debug("Created figure %s and canvas %s" % (str(self.figure), str(self.canvas)))
+        else:
+            self.figure.clf()
+        self.figureKey = cache_key
+        self.pendingDraw = None
+        return self.figure
+
+    def showCached(self, cache_key, redraw):
+        ''' function to show a previously rendered graph
+            returns True if the graph was in the cache
+            redraw is called to draw the graph for real if the canvas has to be rendered again (e.g. resized)
+        '''
+        if cache_key is None or self.canvas is None or getattr(self.canvas, 'window', None) is None:
+            return False
+        image = self.renderCache.get((cache_key, self.canvas.get_width_height()))
+        if image is None:
+            return False
+        logging.debug("Showing cached graph for %s" % str(cache_key))
+        self.showCanvas(draw=False)
+        self.canvas.restore_region(image)
+        self.canvas.blit(self.figure.bbox)
+        if cache_key != self.figureKey:
+            self.pendingDraw = redraw
+        else:
+            self.pendingDraw = None
+        return True
+
+    def on_draw(self, event):
+        if self.pendingDraw is not None:
+            #The figure does not hold what is shown, draw that instead
+            redraw = self.pendingDraw
+            self.pendingDraw = None
+            redraw()
+        elif self.figureKey is not None:
+            self.renderCache.put((self.figureKey, self.canvas.get_width_height()), self.canvas.copy_from_bbox(self.figure.bbox))
+
+    def showCanvas(self, toolbar=False, draw=True):
+        ''' function to display the canvas (and optionally the toolbar) in the vbox
+            widgets are only packed if they are not already there
+        '''
+        logging.debug('>>')
+        if self.vbox is None:
+            #Off screen, the figure is drawn when it is saved
+            logging.debug('<<')
+            return
+        self.removeVboxChildren()
+        widgets = [self.canvas]
+        if toolbar:
+            if self.toolbar is None:
+                self.toolbar = NavigationToolbar(self.canvas, self.window)
+            else:
+                #Forget the views of the previous graph
+                self.toolbar.update()
+            widgets.append(self.toolbar)
+        packed = [child for child in self.vbox.get_children() if child is self.canvas or child is self.toolbar]
+        if packed != widgets:
+            for child in packed:
+                self.vbox.remove(child)
+            self.vbox.pack_start(self.canvas, True, True)
+            if toolbar:
+                self.toolbar.show()
+                self.vbox.pack_start(self.toolbar, False, False)
+        if draw:
+            self.canvas.draw_idle()
+        for child in self.vbox.get_children():
+            logging.debug('Child available: '+str(child))
+        logging.debug('<<')
+
     def stadistics(self,type,xvalues,yvalues,xlabel,ylabel,title,color=None,zones=None):
         logging.debug('>>') 
         if len(xvalues[0]) < 1:
@@ -56,9 +157,7 @@ class DrawArea:
     def drawBars(self,xvalues,yvalues,xlabel,ylabel,title,color):
         logging.debug('>>') 
         logging.debug("Type: bars | title: "+str(title)+" | col: "+str(color)+" | xlabel: "+str(xlabel)+" | ylabel: "+str(ylabel))
-        self.removeVboxChildren()
-        #figure = Figure(figsize=(6,4), dpi=72)
-        figure = plt.figure()
+        figure = self.getFigure()
         logging.debug("Figure: %s" % str(figure) )
         numCols=len(xvalues[0])
         xmod = 0.4
@@ -137,17 +236,7 @@ class DrawArea:
         logging.debug("Setting x limits")
         axis.set_xlim(0, numCols)
         
-        canvas = FigureCanvasGTK(figure) # a gtk.DrawingArea
-        logging.debug("Got canvas: %s" % (str(canvas)))
-        canvas.show()
-        logging.debug("Adding canvas to vbox")
-        self.vbox.pack_start(canvas, True, True)
-        #toolbar = NavigationToolbar(canvas, self.window)
-        #self.vbox.pack_start(toolbar, False, False)
-
-        for child in self.vbox.get_children():
-            logging.debug('Child available: '+str(child))
-
+        self.showCanvas()
         logging.debug('<<')
 
     def getColor(self, x):
@@ -171,17 +260,17 @@ class DrawArea:
         else:
             return '%1.1f' % x
 
-    def drawStackedBars(self,xvalues,yvalues,ylabel,title, valuesAreTime=False, colors={}):
+    def drawStackedBars(self,xvalues,yvalues,ylabel,title, valuesAreTime=False, colors={}, cache_key=None):
         '''function to draw stacked bars
             xvalues needs to be a list of lists of strings, e.g. [0]["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
             yvalues needs to be a list of dicts e.g. [0]{'Kayak': {'Tue': 10.08, 'Fri': 17.579999999999998, 'Thu': 15.66, 'Sat': 30.619999999999997}, {'Run': {'Mon': 9.65, 'Sun': 15.59}}
+            cache_key identifies the graph in the rendered graph cache (see showCached)
         '''
         #TODO tidy
         logging.debug('>>') 
         logging.debug("Title: %s", (title, ))
         logging.debug("X values received: %s", str(xvalues))
         logging.debug("Y values received: %s", str(yvalues))
-        self.removeVboxChildren()
 
         #Check how many axes to draw
         if len(xvalues) == 1: #One axis
@@ -199,10 +288,9 @@ class DrawArea:
         if numRows == 0:
             return
         width = .8
-        #figure = plt.figure(figsize=(6,4), dpi=72) 
-        figure = plt.figure()
+        figure = self.getFigure(cache_key)
         logging.debug("Figure: %s" % str(figure) )
-        axis = plt.subplot(111)
+        axis = figure.add_subplot(111)
 
         ybottoms = [0] * numCols
         yheights = [0] * numCols
@@ -241,7 +329,7 @@ class DrawArea:
         axis.set_xticklabels('' * len(xvalues[0]))
         axis.set_ylabel(ylabel[0])
         if len(xvalues) == 1:
-            plt.title(title[0])
+            axis.set_title(title[0])
             axis.legend(loc=0)
             
         axis.set_xlim(0,numCols)
@@ -289,40 +377,32 @@ class DrawArea:
             ax2.set_xlim(0,numCols)
             ax2.set_ylabel(ylabel[1])
             ax2.legend(loc=0)
-            plt.title("%s vs %s" %(title[0],title[1]))
+            ax2.set_title("%s vs %s" %(title[0],title[1]))
 
         ## try to do some table stuff
         colLabels = xvalues[0]
         rowLabels = keys
         axis.table(cellText=cellText, cellLoc='center', rowLabels=rowLabels, colLabels=colLabels, loc='bottom')
-        plt.subplots_adjust(left=0.15,bottom=0.08+(0.03*numRows))
+        figure.subplots_adjust(left=0.15,bottom=0.08+(0.03*numRows))
         axis.grid(True)
-        canvas = FigureCanvasGTK(figure) # a gtk.DrawingArea
-        canvas.show()
-        self.vbox.pack_start(canvas, True, True)
-        #toolbar = NavigationToolbar(canvas, self.window)
-        #self.vbox.pack_start(toolbar, False, False)
-
-        for child in self.vbox.get_children():
-            logging.debug('Child available: '+str(child))
-
+        self.showCanvas()
         logging.debug('<<')
 
     def drawPlot(self,xvalues,yvalues,xlabel,ylabel,title,color,zones=None,xzones=None, ylimits=None, y1_linewidth=None):
         logging.debug('>>')  
         logging.debug("Type: plot | title: "+str(title)+" | col: "+str(color)+" | xlabel: "+str(xlabel)+" | ylabel: "+str(ylabel))
         logging.debug('xlabel: '+str(xlabel)+' | ylabel: '+str(ylabel)+' | title: '+str(title))
-        self.removeVboxChildren()
-        figure = plt.Figure()
+        figure = self.getFigure()
         logging.debug("Figure: %s" % str(figure) )
-        #figure.clf()
+        self.sampledLines = []
         i = 0
         for value in xvalues:
             if i<1:
                 logging.debug("i: %d, value: (%s) %s %s" % (i, str(value), str(xvalues), str(yvalues)) )
                 axis = figure.add_subplot(111)
                 logging.debug("Axis: %s" % str(axis) )
-                line = axis.plot(xvalues[i],yvalues[i], color=color[i])
+                line = axis.plot(*self.sample(axis, xvalues[i], yvalues[i], ylimits), color=color[i])
+                self.sampledLines.append((line[0], xvalues[i], yvalues[i], ylimits))
                 logging.debug("Axis plotted, Line: %s" % str(line) )
                 if y1_linewidth is not None:
                     line[0].set_linewidth(y1_linewidth)
@@ -346,7 +426,8 @@ class DrawArea:
             if i>=1:
                 ax2 = axis.twinx()
                 logging.debug("Axis2: Axis: %s" % str(ax2) )
-                ax2.plot(xvalues[i], yvalues[i], color=color[i])
+                line2 = ax2.plot(*self.sample(ax2, xvalues[i], yvalues[i]), color=color[i])
+                self.sampledLines.append((line2[0], xvalues[i], yvalues[i], None))
                 logging.debug("Axis2: plotted" )
                 for tl in ax2.get_yticklabels():
                     tl.set_color('%s' %color[i])
@@ -373,25 +454,27 @@ class DrawArea:
                 ylim_max = ylimits[1]
             axis.set_ylim(ylim_min, ylim_max)
 
-        canvas = FigureCanvasGTK(figure) # a gtk.DrawingArea
-        logging.debug("Canvas: %s" % str(canvas))
-        canvas.show()
-        self.vbox.pack_start(canvas, True, True)
-        toolbar = NavigationToolbar(canvas, self.window)
-        self.vbox.pack_start(toolbar, False, False)
-        
-        for child in self.vbox.get_children():
-            logging.debug('Child available: '+str(child))
-        
+        #Zooming with the toolbar resamples the lines for the new x range
+        axis.callbacks.connect('xlim_changed', self.on_xlim_changed)
+        self.showCanvas(toolbar=True)
         logging.debug('<<')
         return {'y1_min': ylim_min, 'y1_max': ylim_max, 'y1_linewidth': linewidth}
+
+    def sample(self, axis, xvalues, yvalues, ylimits=None, xlimits=None):
+        ''' function to reduce a series to the points the axis is wide enough to show '''
+        return downsample(xvalues, yvalues, point_budget(axis.bbox.width), xlim=xlimits, ylim=ylimits)
+
+    def on_xlim_changed(self, axis):
+        logging.debug('>>')
+        xlimits = axis.get_xlim()
+        for line, xvalues, yvalues, ylimits in self.sampledLines:
+            line.set_data(*self.sample(line.axes, xvalues, yvalues, ylimits, xlimits))
+        logging.debug('<<')
     
     def drawPie(self,xvalues,yvalues,xlabel,ylabel,title,color,zones=None):
         logging.debug('>>')
         logging.debug("Type: pie | title: "+str(title)+" | col: "+str(color)+" | xlabel: "+str(xlabel)+" | ylabel: "+str(ylabel))
-        self.removeVboxChildren()
-        #figure = Figure(figsize=(6,4), dpi=72)
-        figure = Figure()
+        figure = self.getFigure()
         logging.debug("Figure: %s" % str(figure) )
         axis = figure.add_subplot(111)
 
@@ -469,26 +552,17 @@ class DrawArea:
             explode.insert(0, 0)
         axis.pie(fracs, explode=explode, labels=labels, colors=colors, autopct='%1.1f%%', shadow=True)
 
-        canvas = FigureCanvasGTK(figure) # a gtk.DrawingArea
-        canvas.show()
-
-        for child in self.vbox.get_children():
-            logging.debug('Child available: '+str(child))
-
-        self.vbox.pack_start(canvas, True, True)
+        self.showCanvas()
         logging.debug('<<')
 
     def drawDefault(self):
         logging.debug('>>')
-        self.axis=self.figure.add_subplot(111)
+        self.axis=self.getFigure().add_subplot(111)
         self.axis.set_xlabel('Yepper')
         self.axis.set_ylabel('Flabber')
         self.axis.set_title('An Empty Graph')
         self.axis.grid(True)
-        self.canvas.destroy()
-        self.canvas = FigureCanvasGTK(self.figure) # a gtk.DrawingArea
-        self.canvas.show()
-        self.vbox.pack_start(self.canvas, True, True)
+        self.showCanvas()
         logging.debug('<<')
 
     def fill_over(self, ax, x, y, val, color, over=True):
@@ -526,6 +600,9 @@ class DrawArea:
         logging.debug('Vbox has %d children %s' % (len(vboxChildren), str(vboxChildren) ))
         # ToDo: check why vertical container is shared
         for child in vboxChildren:
+            #Keep our own canvas and toolbar, they are reused for the next graph
+            if child is self.canvas or child is self.toolbar:
+                continue
             #Remove all FigureCanvasGTK and NavigationToolbar2GTKAgg to stop double ups of graphs
             if isinstance(child, matplotlib.backends.backend_gtkagg.FigureCanvasGTK) or isinstance(child, matplotlib.backends.backend_gtkagg.NavigationToolbar2GTKAgg):
                 logging.debug('Removing child: '+str(child))
@@ -19,11 +19,242 @@
 import matplotlib
 #matplotlib.use('GTK')
 from matplotlib.figure import Figure
-from matplotlib.backends.backend_gtkagg import FigureCanvasGTKAgg as FigureCanvasGTK
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+try:
+    from matplotlib.backends.backend_gtkagg import FigureCanvasGTKAgg as FigureCanvasGTK
+except ImportError:
+    #No GTK, graphs can only be rendered off screen (see pytrainer.export)
+    FigureCanvasGTK = None
 #from matplotlib.backends.backend_gtkagg import NavigationToolbar2GTKAgg as NavigationToolbar
-import matplotlib.pyplot as plt
 #import pylab
 import logging
+from pytrainer.util.downsample import downsample, point_budget
+
+class GraphCanvas:
+    '''
+    Persistent matplotlib figure and canvas shown in a gtk.box
+
+    Series are kept as artists keyed by name so a redraw only updates what
+    changed. Span overlays (laps, heart rate zones) are animated artists that
+    are blitted over a cached copy of the rest of the graph. Line series are
+    downsampled to what the axes width can show, for the current view.
+
+    An offscreen GraphCanvas is not shown in any box and is only drawn when
+    its figure is saved, so everything is drawn in one pass, overlays too.
+    '''
+    OVERLAY_TYPES = ("vspan", "hspan")
+
+    def __init__(self, offscreen=False):
+        logging.debug('>>')
+        self.figure = Figure()
+        self.offscreen = offscreen
+        if offscreen:
+            self.canvas = FigureCanvasAgg(self.figure)
+        else:
+            self.canvas = FigureCanvasGTK(self.figure) # a gtk.DrawingArea
+            self.canvas.show()
+            self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.background = None
+        self.reset()
+        logging.debug('<<')
+
+    def reset(self):
+        '''Remove everything from the figure, keeping figure and canvas'''
+        self.figure.clf()
+        self.ax1 = self.figure.add_subplot(111)
+        self.ax2 = None
+        self.series = {}
+        self.used = set()
+        self.view = {False: (None, None), True: (None, None)}
+        self.texts = {}
+        self.stale_axes = set()
+        self.limited_axes = set()
+        self.needs_draw = True
+        self.needs_blit = False
+
+    def attach(self, box):
+        '''Make the canvas the only child of box'''
+        for child in box.get_children():
+            if child is not self.canvas:
+                logging.debug('Removing box child: '+str(child))
+                box.remove(child)
+        parent = self.canvas.get_parent()
+        if parent is not box:
+            if parent is not None:
+                parent.remove(self.canvas)
+            box.pack_start(self.canvas, True, True)
+
+    def get_axis(self, y2=False):
+        if not y2:
+            return self.ax1
+        if self.ax2 is None:
+            self.ax2 = self.ax1.twinx()
+            self.needs_draw = True
+        return self.ax2
+
+    def begin(self):
+        '''Start a pass, series not set again before finish() are removed'''
+        self.used = set()
+
+    def set_view(self, xlim=None, y1lim=None, y2lim=None):
+        '''Set the user requested limits line series are sampled for'''
+        self.view = {False: (xlim, y1lim), True: (xlim, y2lim)}
+
+    def _sample(self, axis, datalist, y2):
+        xlim, ylim = self.view[y2]
+        return downsample(datalist.x_values, datalist.y_values, point_budget(axis.bbox.width), xlim=xlim, ylim=ylim)
+
+    def set_series(self, name, datalist, y2=False):
+        '''Show datalist on the graph, reusing the artists of a previous pass where possible'''
+        key = (name, y2)
+        self.used.add(key)
+        color = datalist.y2linecolor if y2 else datalist.linecolor
+        style = (datalist.graphType, color, datalist.linewidth, datalist.ylabel)
+        values = None
+        if datalist.graphType == "plot":
+            #Resample when the view or the space available changes
+            axis = self.get_axis(y2)
+            style += (self.view[y2], point_budget(axis.bbox.width))
+        existing = self.series.get(key)
+        if existing is not None:
+            old_datalist, old_style, old_length, artists = existing
+            if old_datalist is datalist and old_style == style and old_length == len(datalist):
+                return
+            if old_style[0] == "plot" and datalist.graphType == "plot":
+                #Update the existing line in place
+                line = artists[0]
+                line.set_data(*self._sample(line.axes, datalist, y2))
+                line.set_color(color)
+                line.set_linewidth(datalist.linewidth)
+                line.set_label(datalist.ylabel)
+                self.series[key] = (datalist, style, len(datalist), artists)
+                self.stale_axes.add(line.axes)
+                self.needs_draw = True
+                return
+            self._remove(key)
+        axis = self.get_axis(y2)
+        if datalist.graphType == "plot":
+            values = self._sample(axis, datalist, y2)
+        artists = self._create(axis, datalist, color, values)
+        if artists is None:
+            return
+        self.series[key] = (datalist, style, len(datalist), artists)
+        if datalist.graphType in self.OVERLAY_TYPES:
+            self.needs_blit = True
+            #Labelled overlays (heart rate zones) change the legend
+            if datalist.labels:
+                self.needs_draw = True
+        else:
+            self.stale_axes.add(axis)
+            self.needs_draw = True
+
+    def _create(self, axis, datalist, color, values=None):
+        if datalist.graphType == "plot":
+            x_values, y_values = values
+            return axis.plot(x_values, y_values, linewidth=datalist.linewidth, color=color, label=datalist.ylabel)
+        elif datalist.graphType == "bar":
+            return list(axis.bar(datalist.x_values, datalist.y_values, datalist.bar_widths, datalist.bar_bottoms, color=color, label=datalist.ylabel, alpha=0.5))
+        elif datalist.graphType == "vspan":
+            return [axis.axvspan(datalist.x_values[i], datalist.x_values[i]+datalist.bar_widths[i], alpha=0.15, facecolor=color, animated=not self.offscreen)
+                    for i in xrange(len(datalist.x_values))]
+        elif datalist.graphType == "hspan":
+            return [axis.axhspan(datalist.x_values[i], datalist.y_values[i], alpha=0.25, facecolor=datalist.colors[i], label=datalist.labels[i], animated=not self.offscreen)
+                    for i in xrange(len(datalist.x_values))]
+        elif datalist.graphType == "date":
+            return axis.plot_date(datalist.x_values, datalist.y_values, color=color, label=datalist.ylabel, alpha=0.5)
+        print "Unknown/unimplemented graph type: %s" % datalist.graphType
+        return None
+
+    def _remove(self, key):
+        datalist, style, length, artists = self.series.pop(key)
+        for artist in artists:
+            if style[0] not in self.OVERLAY_TYPES:
+                self.stale_axes.add(artist.axes)
+            artist.remove()
+        if style[0] in self.OVERLAY_TYPES:
+            self.needs_blit = True
+            if datalist.labels:
+                self.needs_draw = True
+        else:
+            self.needs_draw = True
+
+    def finish(self):
+        '''Remove series not used in this pass and the right axis if it is empty'''
+        for key in [key for key in self.series if key not in self.used]:
+            self._remove(key)
+        if self.ax2 is not None and not [key for key in self.series if key[1]]:
+            self.figure.delaxes(self.ax2)
+            self.stale_axes.discard(self.ax2)
+            self.limited_axes.discard(self.ax2)
+            self.ax2 = None
+            self.needs_draw = True
+
+    def set_text(self, xlabel=None, title=None):
+        self._set_state('xlabel', xlabel, self.ax1.set_xlabel)
+        self._set_state('title', title, self.ax1.set_title)
+
+    def set_grid(self, xgrid=False, y1grid=False, y2grid=False):
+        self._set_state('xgrid', xgrid, self.ax1.xaxis.grid)
+        self._set_state('y1grid', y1grid, self.ax1.yaxis.grid)
+        if self.ax2 is not None:
+            self._set_state(('y2grid', self.ax2), y2grid, self.ax2.yaxis.grid)
+
+    def _set_state(self, name, value, setter):
+        if name in self.texts and self.texts[name] == value:
+            return
+        self.texts[name] = value
+        if value is not None:
+            setter(value)
+            self.needs_draw = True
+
+    def relimit(self):
+        '''Autoscale the axes whose series changed or that had user limits'''
+        for axis in self.stale_axes | self.limited_axes:
+            axis.relim()
+            axis.set_autoscale_on(True)
+            axis.autoscale_view()
+        self.stale_axes = set()
+        self.limited_axes = set()
+
+    def set_limits(self, axis, xlim=None, ylim=None):
+        if xlim is not None:
+            axis.set_xlim(xlim)
+        if ylim is not None:
+            axis.set_ylim(ylim)
+        self.limited_axes.add(axis)
+        self.needs_draw = True
+
+    def update_legends(self):
+        self.ax1.legend(loc = 'upper left', bbox_to_anchor = (0, 1))
+        if self.ax2 is not None:
+            self.ax2.legend(loc = 'upper right', bbox_to_anchor = (1, 1))
+
+    def redraw(self):
+        '''Redraw the canvas, only blitting the overlays if nothing else changed'''
+        if self.offscreen:
+            self.update_legends()
+        elif self.needs_draw or self.background is None:
+            logging.debug("Full redraw")
+            self.update_legends()
+            self.canvas.draw_idle()
+        elif self.needs_blit:
+            logging.debug("Blitting overlays")
+            self.canvas.restore_region(self.background)
+            self._draw_overlays()
+            self.canvas.blit(self.figure.bbox)
+        self.needs_draw = False
+        self.needs_blit = False
+
+    def _on_draw(self, event):
+        #Save everything but the overlays so these can be blitted later
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_overlays()
+
+    def _draw_overlays(self):
+        for datalist, style, length, artists in self.series.values():
+            if style[0] in self.OVERLAY_TYPES:
+                for artist in artists:
+                    artist.axes.draw_artist(artist)
 
 class DrawGraph:
     def __init__(self, parent = None, pytrainer_main = None):
@@ -33,8 +264,20 @@ class DrawGraph:
         #self.NEARLY_ZERO = 0.0000000000000000000001
         self.ax1 = None
         self.ax2 = None
+        #Persistent GraphCanvas for each box drawn in
+        self.graphs = {}
         logging.debug('<<')
 
+    def get_graph(self, box):
+        '''Get the GraphCanvas for box, creating it on first use
+            a box of None gets an offscreen GraphCanvas'''
+        if box not in self.graphs:
+            self.graphs[box] = GraphCanvas(offscreen=box is None)
+        graph = self.graphs[box]
+        if box is not None:
+            graph.attach(box)
+        return graph
+
     def draw(self, datalist=None, box=None, figure=None, title=None, y2=False, xgrid=False, ygrid=False):
         '''
             Draw a graph using supplied information into supplied gtk.box
@@ -51,100 +294,34 @@ class DrawGraph:
         if box is None:
             logging.error("Must supply a vbox or hbox to display the graph")
             return
+        graph = self.get_graph(box)
         #Check if have a graph object
         if figure is None:
-            #No figure, so create figure
-            figure = plt.figure()
-            self.ax1 = plt.axes()
-            #Reset second axis
-            self.ax2 = None
-        #Remove any existing plots
-        for child in box.get_children():
-            logging.debug('Removing box child: '+str(child))
-            box.remove(child)
+            #No figure, so start from an empty one
+            graph.reset()
+        self.ax1 = graph.ax1
+        self.ax2 = graph.ax2
+        figure = graph.figure
 
         if datalist is None:
             logging.debug("drawPlot called with no data")
+            box.remove(graph.canvas)
             return figure
 
-        if y2 and self.ax2 is None:
-            self.ax2 = plt.twinx()
-
-
-        #Create canvas
-        canvas = FigureCanvasGTK(figure) # a gtk.DrawingArea
-        canvas.show()
-
         #Display title etc
-        if datalist.xlabel is not None:
-            plt.xlabel(datalist.xlabel)
-        if title is not None:
-            plt.title(title)
+        graph.set_text(xlabel=datalist.xlabel, title=title)
+        name = "series%d" % len(graph.series)
+        graph.set_series(name, datalist, y2=y2)
+        self.ax2 = graph.ax2
         #Display grid
         if y2 and ygrid:
             self.ax2.grid(True)
         elif self.ax1 and ygrid:
             self.ax1.grid(True)
-        plt.gca().xaxis.grid(xgrid)
-        #Removed as now in legend
-        #plt.ylabel(datalist.ylabel)
-
-        #Determine graph type....
-        #print "Got graphtype: %s" % datalist.graphType
-        #print datalist.x_values
-        #print datalist.y_values
-        #print datalist.linewidth
-        #print datalist.linecolor
-        #print datalist.ylabel
-        if datalist.graphType == "plot":
-            #Plot data
-            if not y2:
-                #plt.plot(datalist.x_values, datalist.y_values, linewidth=datalist.linewidth, color=datalist.linecolor, label=datalist.ylabel )
-                self.ax1.plot(datalist.x_values, datalist.y_values, linewidth=datalist.linewidth, color=datalist.linecolor, label=datalist.ylabel )
-            else:
-                self.ax2.plot(datalist.x_values, datalist.y_values, linewidth=datalist.linewidth, color=datalist.y2linecolor, label=datalist.ylabel )
-        elif datalist.graphType == "bar":
-            if not y2:
-                self.ax1.bar(datalist.x_values, datalist.y_values, datalist.bar_widths, datalist.bar_bottoms, color=datalist.linecolor, label=datalist.ylabel, alpha=0.5)
-            else:
-                self.ax2.bar(datalist.x_values, datalist.y_values, datalist.bar_widths, datalist.bar_bottoms, color=datalist.y2linecolor, label=datalist.ylabel, alpha=0.5)
-        elif datalist.graphType == "vspan":
-            i = 0
-            while i < len(datalist.x_values):
-                #print datalist.x_values[i] , datalist.bar_widths[i]
-                if not y2:
-                    self.ax1.axvspan(datalist.x_values[i], datalist.x_values[i]+datalist.bar_widths[i], alpha=0.15, facecolor=datalist.linecolor)
-                else:
-                    self.ax2.axvspan(datalist.x_values[i], datalist.x_values[i]+datalist.bar_widths[i], alpha=0.15, facecolor=datalist.y2linecolor)
-                i += 1
-        elif datalist.graphType == "hspan":
-            i = 0
-            while i < len(datalist.x_values):
-                #print datalist.x_values[i] , datalist.y_values[i], datalist.labels[i], datalist.colors[i]
-                if not y2:
-                    self.ax1.axhspan(datalist.x_values[i], datalist.y_values[i], alpha=0.25, facecolor=datalist.colors[i], label=datalist.labels[i])
-                else:
-                    self.ax2.axhspan(datalist.x_values[i], datalist.y_values[i], alpha=0.25, facecolor=datalist.colors[i], label=datalist.labels[i])
-                i += 1
-        elif datalist.graphType == "date":
-            if not y2:
-                self.ax1.plot_date(datalist.x_values, datalist.y_values, color=datalist.linecolor, label=datalist.ylabel, alpha=0.5)
-            else:
-                self.ax2.plot_date(datalist.x_values, datalist.y_values, color=datalist.y2linecolor, label=datalist.ylabel, alpha=0.5)
-        else:
-            print "Unknown/unimplemented graph type: %s" % datalist.graphType
-            return figure
-        #Set axis limits
-        #plt.axis([datalist.min_x_value, datalist.max_x_value, datalist.min_y_value, datalist.max_y_value])
-        if self.ax1 is not None:
-            self.ax1.legend(loc = 'upper left', bbox_to_anchor = (0, 1))
-        if self.ax2 is not None:
-            self.ax2.legend(loc = 'upper right', bbox_to_anchor = (1, 1))
-        #axis.set_xlim(0, data.max_x_value)
-        #axis.set_ylim(0, data.max_y_value)
-
-        #Display plot
-        box.pack_start(canvas, True, True)
+        self.ax1.xaxis.grid(xgrid)
+        graph.update_legends()
+        graph.needs_draw = True
+        graph.redraw()
 
         logging.debug("<<")
         return figure
@@ -172,17 +349,19 @@ class DrawGraph:
     def drawActivityGraph(self, activity = None, box = None):
         '''
             Draw a multiple style graph using data in an activity (with multiple traces on each axis)
+
+            The graph for box is kept between calls, so toggling series, laps,
+            grids or limits only updates what changed
+            Without a box the graph is drawn off screen, see get_graph(None)
         '''
         logging.debug('>>')
-        if box is None:
-            logging.error("Must supply a vbox or hbox to display the graph")
-            return
         if activity is None:
             logging.error("Must supply data to graph graph")
             return
         #TODO Check that datalist is of type dict (and contains has correct items)
-        figure = None
-        datalist = []
+        graph = self.get_graph(box)
+        graph.begin()
+        graph.set_view(activity.x_limits_u, activity.y1_limits_u, activity.y2_limits_u)
         y1count = 0
         y2count = 0
 
@@ -191,44 +370,53 @@ class DrawGraph:
                 _title = "%s %s of %s on %s" % (str(activity.get_value_f('distance', "%0.2f")), activity.distance_unit, activity.sport_name, activity.date)
             else:
                 _title = "%s: %s %s of %s on %s" % (activity.title, str(activity.get_value_f('distance', "%0.2f")), activity.distance_unit, activity.sport_name, activity.date)
-
-            #Loop through data items and graph the selected ones
-            for item in activity.distance_data:
-                if activity.distance_data[item].show_on_y1:
-                    y1count += 1
-                    figure = self.draw(activity.distance_data[item], box=box, figure=figure, title=_title, xgrid=activity.x_grid, ygrid=activity.y1_grid)
-                if activity.distance_data[item].show_on_y2:
-                    y2count += 1
-                    figure = self.draw(activity.distance_data[item], box=box, figure=figure, title=_title, y2=True, xgrid=activity.x_grid, ygrid=activity.y2_grid)
-            #Display lap divisions if required
-            if activity.show_laps:
-                figure = self.draw(activity.lap_distance, box=box, figure=figure)
-
+            data = activity.distance_data
+            laps = getattr(activity, "lap_distance", None)
         elif activity.x_axis == "time":
             _time = "%d:%02d:%02d" % (activity.time_tuple)
             if activity.title is None or activity.title == "":
                 _title = "%s of %s on %s" % (_time, activity.sport_name, activity.date)
             else:
                 _title = "%s: %s of %s on %s" % (activity.title, _time, activity.sport_name, activity.date)
-            for item in activity.time_data:
-                if activity.time_data[item].show_on_y1:
-                    y1count += 1
-                    figure = self.draw(activity.time_data[item], box=box, figure=figure, title=_title, xgrid=activity.x_grid, ygrid=activity.y1_grid)
-                if activity.time_data[item].show_on_y2:
-                    y2count += 1
-                    figure = self.draw(activity.time_data[item], box=box, figure=figure, title=_title, y2=True, xgrid=activity.x_grid, ygrid=activity.y2_grid)
-            #Display lap divisions if required
-            if activity.show_laps:
-                figure = self.draw(activity.lap_time, box=box, figure=figure)
+            data = activity.time_data
+            laps = getattr(activity, "lap_time", None)
+        else:
+            logging.error("Unknown x axis: %s" % activity.x_axis)
+            return activity
+
+        #Loop through data items and graph the selected ones
+        xlabel = None
+        for item in data:
+            if data[item].show_on_y1:
+                y1count += 1
+                graph.set_series(item, data[item])
+                xlabel = data[item].xlabel
+            if data[item].show_on_y2:
+                y2count += 1
+                graph.set_series(item, data[item], y2=True)
+                xlabel = data[item].xlabel
+        #Display lap divisions if required
+        if activity.show_laps and laps is not None:
+            graph.set_series("laps", laps)
+        graph.finish()
+        graph.set_text(xlabel=xlabel, title=_title)
+        graph.set_grid(xgrid=activity.x_grid, y1grid=activity.y1_grid, y2grid=activity.y2_grid)
+        self.ax1 = graph.ax1
+        self.ax2 = graph.ax2
 
         #Sort out graph errors...
         if y1count == 0 and y2count == 0:
             logging.debug("No items to graph.. Removing graph")
-            figure = self.draw(None, box=box, figure=figure)
+            graph.reset()
+            if box is not None:
+                box.remove(graph.canvas)
+            self.ax1 = None
+            self.ax2 = None
         elif y1count == 0:
             logging.debug("No items on y1 axis... ")
             #TODO Sort
-        #Get axis limits..
+        #Get axis limits, only relimiting the axes that changed
+        graph.relimit()
         if self.ax1 is not None:
             activity.x_limits = self.ax1.get_xlim()
             activity.y1_limits = self.ax1.get_ylim()
@@ -243,17 +431,19 @@ class DrawGraph:
         #X Axis
         if activity.x_limits_u[0] is not None:
             if self.ax1 is not None:
-                self.ax1.set_xlim(activity.x_limits_u)
+                graph.set_limits(self.ax1, xlim=activity.x_limits_u)
             elif self.ax2 is not None:
-                self.ax2.set_xlim(activity.x_limits_u)
+                graph.set_limits(self.ax2, xlim=activity.x_limits_u)
         #Y1 Axis
         if activity.y1_limits_u[0] is not None:
             if self.ax1 is not None:
-                self.ax1.set_ylim(activity.y1_limits_u)
+                graph.set_limits(self.ax1, ylim=activity.y1_limits_u)
         #Y2 Axis
         if activity.y2_limits_u[0] is not None:
             if self.ax2 is not None:
-                self.ax2.set_ylim(activity.y2_limits_u)
+                graph.set_limits(self.ax2, ylim=activity.y2_limits_u)
+        if self.ax1 is not None:
+            graph.redraw()
 
-        return activity
         logging.debug('<<')
+        return activity
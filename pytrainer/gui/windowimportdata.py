@@ -7,14 +7,13 @@ import gobject
 import os, glob, sys
 import StringIO
 import logging
-import types
 from lxml import etree
-import csv
-import locale
 
 from pytrainer.plugins import Plugins
 from pytrainer.gui.dialogs import fileChooserDialog
-from pytrainer.lib.date import Date
+from pytrainer.csvimport import CsvImporter, read_columns, FIELD_NAMES as CSV_FIELD_NAMES
+from pytrainer.importjob import ImportWorker
+from pytrainer.util.background import LatestJobRunner
 
 class WindowImportdata(SimpleGladeApp):
     def __init__(self, sport_service, data_path = None, parent=None, config=None, pytrainer_main=None):
@@ -30,6 +29,12 @@ class WindowImportdata(SimpleGladeApp):
         self.files_store = None # gtk.ListStore containing gtk.TreeModelRow, see build_files_tree_view
         self.processClasses = []
         self.plugins = Plugins(data_path, self.parent.parent)
+        #Files are read, and activities inserted, in the background
+        self.import_jobs = LatestJobRunner(gobject.idle_add, name="Import")
+        self.import_worker = ImportWorker(self.pytrainer_main.environment.conf_dir, data_path)
+        self.unknown_files = []
+        self.imported_count = None
+        self.running_job = None
         SimpleGladeApp.__init__(self, self.glade_path, self.root, self.domain)
 
     def new(self):
@@ -249,42 +254,6 @@ class WindowImportdata(SimpleGladeApp):
         self.win_importdata.show_all()
         logging.debug('<<')
 
-    def validateFile(self, import_filename):
-        '''
-            Iterate through all supported types of file by reading processing files from import directory
-            Each processing file understands one type of file
-
-            If a processing file is found that recognises the selected file:
-                 returns the instantiated class
-            otherwise:
-                 returns None
-        '''
-        logging.debug('>>')
-        self.updateStatusbar(self.statusbarImportFile, _("Checking file type for: ") + import_filename)
-        #Get imports files_* files
-        fileList = glob.glob(self.data_path+"imports/file_*.py")
-        fileList.sort()
-        logging.debug("File filelist: %s" % fileList)
-        for processingFile in fileList:
-            directory, filename = os.path.split(processingFile)
-            filename = filename.rstrip('.py')
-            logging.debug("Trying: %s" % filename)
-            classname = filename.lstrip('file_')
-            #Import module
-            sys.path.insert(0, self.data_path + "imports")
-            module = __import__(filename)
-            processMain = getattr(module, classname)
-            #Instantiate module
-            processClass = processMain(self.parent, self.data_path)
-            isValid = processClass.testFile(import_filename)
-            if isValid:
-                logging.debug('<<')
-                return processClass
-            else:
-                processClass = None
-        logging.debug('<<')
-        return processClass
-
     def build_files_tree_view(self):
         ''' Build tree view to hold files from which the activities are read '''
         logging.debug('>>')
@@ -456,41 +425,160 @@ class WindowImportdata(SimpleGladeApp):
                 distance = item[3]
                 duration = item[4]
                 sport = item[5]
-                gpx_file = self.processClasses[file_id].getGPXFile(activity_id, file_id)[1]
+                processClass = self.processClasses[file_id]
+                gpx_file = processClass.getGPXFile(activity_id, file_id)[1]
                 in_db = item[8]
-                selectedActivities.append((activity_id, start_time, distance, duration, sport, gpx_file, file_id, in_db))
+                #Importers that parse the activities themselves hand them over, sparing a parse of the GPX file
+                track = processClass.getTrack(activity_id) if hasattr(processClass, "getTrack") else None
+                selectedActivities.append((activity_id, start_time, distance, duration, sport, gpx_file, file_id, in_db, track))
         logging.debug("Found %d selected activities to import" % len(selectedActivities))
         return selectedActivities
 
     def importSelectedActivities(self, activities):
         """
-            Function to import selected activity
+            Function to import selected activities, inserted in the background
+            once their details are accepted
+
+            Returns the number of activities being imported
         """
         logging.debug("Checking if activities are already present in database...")
-        for activity in activities:
-            if activity[7]:
-                logging.debug("Activity from %s (%s) already in database. Skipping import." % (activity[1], activity[5]))
-                activities.remove(activity)
-                self.updateActivity(activity[0], activity[6], status = False)
-
-        if len(activities) > 0:
-            logging.debug("Importing %d activities" % len(activities))
-            result = self.pytrainer_main.record.newMultiRecord(activities)
-            for activity in result:
-                if "db_id" in activity.keys() and type(activity["db_id"]) is types.IntType:
-                    #Activity imported correctly
-                    duration = "%0.0f:%0.0f:%02.0f" % (float(activity["rcd_time"][0]), float(activity["rcd_time"][1]), float(activity["rcd_time"][2]))
-                    self.updateActivity(activity["activity_id"], 
-                                        activity["file_id"],
-                                        status = False,
-                                        notes = _("Imported into database"),
-                                        sport = activity["rcd_sport"],
-                                        distance = activity["rcd_distance"],
-                                        duration = duration,
-                                        in_db = True)
-        else:
+        for activity in [activity for activity in activities if activity[7]]:
+            logging.debug("Activity from %s (%s) already in database. Skipping import." % (activity[1], activity[5]))
+            activities.remove(activity)
+            self.updateActivity(activity[0], activity[6], status = False)
+
+        if len(activities) == 0:
             logging.debug("No activities to import")
-        return len(activities)
+            return 0
+        logging.debug("Importing %d activities" % len(activities))
+        accepted = self.pytrainer_main.record.newMultiRecord(activities)
+        if len(accepted) > 0:
+            self.imported_count = 0
+            self.startJob(self.import_worker.insert, self.on_import_done, self.on_activity_imported, self.on_import_cancelled, accepted)
+        return len(accepted)
+
+    def startJob(self, work, done, progress, discard, *args):
+        ''' Run work(job, *args) in the background, the file tab waiting for it '''
+        self.setJobRunning(True)
+        self.running_job = self.import_jobs.submit(lambda job: work(job, *args), done, self.on_job_failed,
+                                                   discard=discard, progress=progress)
+
+    def setJobRunning(self, running):
+        if not running:
+            self.running_job = None
+        self.buttonFileCancel.set_sensitive(running)
+        self.buttonSelectFiles.set_sensitive(not running)
+        if running:
+            self.buttonRemoveSelectedFiles.set_sensitive(0)
+            self.buttonFileImport.set_sensitive(0)
+        else:
+            self.buttonRemoveSelectedFiles.set_sensitive(self.checkTreestoreForSelection(self.files_store))
+            self.buttonFileImport.set_sensitive(self.checkTreestoreForSelection(self.activities_store))
+
+    def on_job_failed(self, job, e):
+        #Activities may have been imported before the failure
+        self.pytrainer_main.ddbb.changed()
+        self.setJobRunning(False)
+        self.imported_count = None
+        self.updateStatusbar(self.statusbarImportFile, _("Import failed: %s") % e)
+
+    def on_file_scanned(self, job, index, filename, processClass, activitiesSummary):
+        ''' A file has been read in the background, list its activities '''
+        class_index = len(self.processClasses)
+        self.processClasses.append(processClass)
+        if processClass is None:
+            #Selected file not understood by any of the process files
+            logging.debug("File %s is of unknown or unsupported file type" % filename)
+            self.unknown_files.append(filename)
+            return
+        filetype = processClass.getFileType()
+        self.updateStatusbar(self.statusbarImportFile, _("Found file of type: %s") % filetype )
+        logging.debug("Found file of type: %s" % filetype)
+        activity_count = len(activitiesSummary)
+        logging.debug("%s activities in file: %s" % (str(activity_count), filename) )
+        #Add file to files treeview
+        iter = self.files_store.append()
+        self.files_store.set(
+            iter,
+            0, class_index,
+            1, True,
+            2, filename,
+            3, filetype,
+            4, activity_count
+            )
+        #Get activities in file
+        for activity in activitiesSummary:
+            #Add activity details to TreeView store to display
+            if not activity[1]:
+                note = ""
+            else:
+                note = _("Found in database")
+            activity_iter = self.activities_store.append()
+            # Status (#1) can be changed by user (via checkbox), we need another field to know if activity is in DB 
+            self.activities_store.set(
+                activity_iter,
+                0, activity[0],
+                1, not activity[1],
+                2, activity[2],
+                3, activity[3],
+                4, activity[4],
+                5, activity[5],
+                6, note,
+                7, class_index,
+                8, activity [1],
+                )
+
+    def on_scan_done(self, job, file_count):
+        self.setJobRunning(False)
+        self.updateStatusbar(self.statusbarImportFile, "")
+        if self.unknown_files:
+            #Display error
+            msg = _("File %s is of unknown or unsupported file type") % ", ".join(self.unknown_files)
+            self.unknown_files = []
+            md = gtk.MessageDialog(self.win_importdata, gtk.DIALOG_DESTROY_WITH_PARENT, gtk.MESSAGE_ERROR, gtk.BUTTONS_CLOSE, msg)
+            md.set_title("Error")
+            md.run()
+            md.destroy()
+
+    def on_activity_imported(self, job, activity, id_record):
+        ''' An activity has been committed in the background '''
+        #Changed through the connection of the job
+        self.pytrainer_main.ddbb.changed()
+        self.imported_count += 1
+        self.markImported(activity)
+        self.updateStatusbar(self.statusbarImportFile, _("Imported %d activities") % self.imported_count)
+
+    def on_import_cancelled(self, job, imported):
+        ''' A cancelled import has stopped, with the activities committed
+        until then, including any whose report was dropped '''
+        self.pytrainer_main.ddbb.changed()
+        for activity, id_record in imported:
+            self.markImported(activity)
+        if self.running_job is None:
+            self.updateStatusbar(self.statusbarImportFile, _("Import cancelled, %d activities imported") % len(imported))
+
+    def markImported(self, activity):
+        duration = "%0.0f:%0.0f:%02.0f" % (float(activity["rcd_time"][0]), float(activity["rcd_time"][1]), float(activity["rcd_time"][2]))
+        self.updateActivity(activity["activity_id"], 
+                            activity["file_id"],
+                            status = False,
+                            notes = _("Imported into database"),
+                            sport = activity["rcd_sport"],
+                            distance = activity["rcd_distance"],
+                            duration = duration,
+                            in_db = True)
+
+    def on_import_done(self, job, imported):
+        self.setJobRunning(False)
+        self.imported_count = None
+        importedActivities = len(imported)
+        # Preparing feedback for user
+        if importedActivities == 1:
+            msgImported = _("Imported one activity")
+        else:
+            msgImported = _("Imported %d activities") % importedActivities
+        self.updateStatusbar(self.statusbarImportFile, msgImported)
+        logging.debug(msgImported)
 
     def updateActivity(self, activityID, file_id, status = None, notes = None, sport = None, distance = None, duration = None, in_db = None):
         path = 0
@@ -512,6 +600,7 @@ class WindowImportdata(SimpleGladeApp):
 
     def close_window(self):
         logging.debug('--')
+        self.import_jobs.cancel()
         self.win_importdata.hide()
         self.quit()
 
@@ -632,6 +721,7 @@ class WindowImportdata(SimpleGladeApp):
         logging.debug('>>')
         selectedActivities = self.getSelectedActivities()
         selectedCount = len(selectedActivities)
+        self.buttonFileImport.set_sensitive(0) #Disable import button
         if selectedCount > 0:
             if selectedCount == 1:
                 msgImporting = _("Importing one activity")
@@ -639,93 +729,47 @@ class WindowImportdata(SimpleGladeApp):
                 msgImporting = _("Importing %d activities") % selectedCount
             self.updateStatusbar(self.statusbarImportFile, msgImporting)
             logging.debug(msgImporting)
-            while gtk.events_pending(): # This allows the GUI to update
-                gtk.main_iteration()    # before completion of this entire action
-            importedActivities = self.importSelectedActivities(selectedActivities)
-            # Preparing feedback for user
-            if importedActivities == 0:
+            inDBActivities = len([activity for activity in selectedActivities if activity[7]])
+            importingActivities = self.importSelectedActivities(selectedActivities)
+            # Preparing feedback for user, the rest once imported
+            if importingActivities == 0:
                 msgImported = _("No activity has been imported")
-            elif importedActivities == 1:
-                msgImported = _("Imported one activity")
-            elif importedActivities > 1:
-                msgImported = _("Imported %d activities") % importedActivities
-            discardedActivities = selectedCount - importedActivities
-            if discardedActivities > 0:
-                if discardedActivities == 1:
+                if inDBActivities == 1:
                     msgImported += _(" Activity selected was already present in DB")
-                else:
-                    msgImported += _(" %d selected activities were already present in DB") % discardedActivities
-            self.updateStatusbar(self.statusbarImportFile, msgImported)
-            logging.debug(msgImported)
-        self.buttonFileImport.set_sensitive(0) #Disable import button
+                elif inDBActivities > 1:
+                    msgImported += _(" %d selected activities were already present in DB") % inDBActivities
+                self.updateStatusbar(self.statusbarImportFile, msgImported)
+                logging.debug(msgImported)
+        logging.debug('<<')
+
+    def on_buttonFileCancel_clicked(self, widget):
+        ''' Stop reading files or importing activities, those imported are kept '''
+        logging.debug('>>')
+        self.import_jobs.cancel()
+        #Activities may have been imported, even one whose report is dropped
+        self.pytrainer_main.ddbb.changed()
+        self.setJobRunning(False)
+        self.unknown_files = []
+        if self.imported_count is not None:
+            msgCancelled = _("Import cancelled, %d activities imported") % self.imported_count
+            self.imported_count = None
+        else:
+            msgCancelled = _("Cancelled")
+        self.updateStatusbar(self.statusbarImportFile, msgCancelled)
         logging.debug('<<')
 
     def on_buttonSelectFiles_clicked(self, widget):
         logging.debug('>>')
         selectedFiles = fileChooserDialog(title=_("Choose a file (or files) to import activities from"), multiple=True).getFiles()
-        while gtk.events_pending(): # This allows the GUI to update
-            gtk.main_iteration()    # before completion of this entire action
         if selectedFiles is None or len(selectedFiles) == 0:
             #Nothing selected
             logging.debug("No files selected")
             logging.debug('<<')
             return
         logging.debug("%s files selected" % len(selectedFiles))
-        for filename in selectedFiles: #Multiple files
-            class_index = len(self.processClasses)
-            #Validate file
-            self.processClasses.append(self.validateFile(filename))
-            if self.processClasses[class_index] is not None:
-                filetype = self.processClasses[class_index].getFileType()
-                self.updateStatusbar(self.statusbarImportFile, _("Found file of type: %s") % filetype )
-                logging.debug("Found file of type: %s" % filetype)
-                activitiesSummary = self.processClasses[class_index].getActivitiesSummary()
-                activity_count = len(activitiesSummary)
-                logging.debug("%s activities in file: %s" % (str(activity_count), filename) )
-                #Add file to files treeview
-                iter = self.files_store.append()
-                self.files_store.set(
-                    iter,
-                    0, class_index,
-                    1, True,
-                    2, filename,
-                    3, self.processClasses[class_index].getFileType(),
-                    4, activity_count
-                    )
-                #File valid, so enable remove button
-                self.buttonRemoveSelectedFiles.set_sensitive(1)
-                #Get activities in file
-                for activity in activitiesSummary:
-                    #Add activity details to TreeView store to display
-                    if not activity[1]:
-                        #Activity selected, so enable import button
-                        self.buttonFileImport.set_sensitive(1)
-                        note = ""
-                    else:
-                        note = _("Found in database")
-                    activity_iter = self.activities_store.append()
-                    # Status (#1) can be changed by user (via checkbox), we need another field to know if activity is in DB 
-                    self.activities_store.set(
-                        activity_iter,
-                        0, activity[0],
-                        1, not activity[1],
-                        2, activity[2],
-                        3, activity[3],
-                        4, activity[4],
-                        5, activity[5],
-                        6, note,
-                        7, class_index,
-                        8, activity [1],
-                        )
-            else: #Selected file not understood by any of the process files
-                #Display error
-                logging.debug("File %s is of unknown or unsupported file type" % filename)
-                msg = _("File %s is of unknown or unsupported file type") % filename
-                md = gtk.MessageDialog(self.win_importdata, gtk.DIALOG_DESTROY_WITH_PARENT, gtk.MESSAGE_ERROR, gtk.BUTTONS_CLOSE, msg)
-                md.set_title("Error")
-                md.run()
-                md.destroy()
-                self.updateStatusbar(self.statusbarImportFile, "")
+        self.updateStatusbar(self.statusbarImportFile, _("Checking %d files") % len(selectedFiles))
+        #Files are identified and read in the background, listed as they are done
+        self.startJob(self.import_worker.scan, self.on_scan_done, self.on_file_scanned, None, selectedFiles)
         logging.debug('<<')
 
     def on_buttonFileClose_clicked(self, widget):
@@ -778,78 +822,30 @@ class WindowImportdata(SimpleGladeApp):
         else:
             self.delimiter = " "
 
-        #Read as delimited file
-        csvfile = open(self.CSVfilename, 'rb')
-        #See if file has header row
-        self.has_header = csv.Sniffer().has_header(csvfile.read(1024))
-        csvfile.seek(0)
-        reader = csv.DictReader(csvfile, delimiter=self.delimiter)
-        #Read file to determine fields (must be a better way of doing this)
-        for row in reader:
-            pass
-        #Build array of column names
-        if self.has_header:
-            #If the file has a header row, use the actual column names
-            columns = reader.fieldnames
-        else:
-            #Otherwise just label them with numbers
-            print len(reader.fieldnames)
-            columns = [_("Column %d") % x for x in range(0, len(reader.fieldnames))]
-
-        for column in columns:
-            self.cbCSVDate.append_text(column)
-            self.cbCSVDistance.append_text(column)
-            self.cbCSVDuration.append_text(column)
-            self.cbCSVTitle.append_text(column)
-            self.cbCSVSport.append_text(column)
-            self.cbCSVAvgSpeed.append_text(column)
-            self.cbCSVMaxSpeed.append_text(column)
-            self.cbCSVCal.append_text(column)
-            self.cbCSVAccent.append_text(column)
-            self.cbCSVDescent.append_text(column)
-            self.cbCSVHR.append_text(column)
-            self.cbCSVMaxHR.append_text(column)
-            self.cbCSVPace.append_text(column)
-            self.cbCSVMaxPace.append_text(column)
-            self.cbCSVComments.append_text(column)
-        self.cbCSVDate.set_active(0)
-        self.cbCSVDistance.set_active(0)
-        self.cbCSVDuration.set_active(0)
-        self.cbCSVTitle.set_active(0)
-        self.cbCSVSport.set_active(0)
-        self.cbCSVAvgSpeed.set_active(0)
-        self.cbCSVMaxSpeed.set_active(0)
-        self.cbCSVCal.set_active(0)
-        self.cbCSVAccent.set_active(0)
-        self.cbCSVDescent.set_active(0)
-        self.cbCSVHR.set_active(0)
-        self.cbCSVMaxHR.set_active(0)
-        self.cbCSVPace.set_active(0)
-        self.cbCSVMaxPace.set_active(0)
-        self.cbCSVComments.set_active(0)
+        #Only the first rows are read to get the columns
+        self.has_header, columns = read_columns(self.CSVfilename, self.delimiter)
+
+        for combo in self._csv_combos():
+            for column in columns:
+                combo.append_text(column)
+            combo.set_active(0)
         logging.debug('<<')
 
+    def _csv_combos(self):
+        """The column combo of each field, in the order of csvimport.FIELDS"""
+        return [self.cbCSVDate, self.cbCSVDistance, self.cbCSVDuration, self.cbCSVTitle, self.cbCSVSport,
+                self.cbCSVAvgSpeed, self.cbCSVMaxSpeed, self.cbCSVCal, self.cbCSVAccent, self.cbCSVDescent,
+                self.cbCSVHR, self.cbCSVMaxHR, self.cbCSVPace, self.cbCSVMaxPace, self.cbCSVComments]
 
     def on_buttonCSVImport_clicked(self, widget):
         logging.debug('>>')
-        #Determine values
-        dateCol = self.cbCSVDate.get_active()
-        distanceCol = self.cbCSVDistance.get_active()
-        durationCol = self.cbCSVDuration.get_active()
-        titleCol = self.cbCSVTitle.get_active()
-        sportCol = self.cbCSVSport.get_active()
-        avgspeedCol = self.cbCSVAvgSpeed.get_active()
-        maxspeedCol = self.cbCSVMaxSpeed.get_active()
-        calCol = self.cbCSVCal.get_active()
-        accCol = self.cbCSVAccent.get_active()
-        desCol = self.cbCSVDescent.get_active()
-        hrCol = self.cbCSVHR.get_active()
-        maxHRCol = self.cbCSVMaxHR.get_active()
-        paceCol = self.cbCSVPace.get_active()
-        maxPaceCol = self.cbCSVMaxPace.get_active()
-        commentsCol = self.cbCSVComments.get_active()
-
-        if dateCol == 0:
+        #Determine values, the first entry of each combo is no column
+        columns = {}
+        for name, combo in zip(CSV_FIELD_NAMES, self._csv_combos()):
+            if combo.get_active() > 0:
+                columns[name] = combo.get_active() - 1
+
+        if "date" not in columns:
             #Error need to have at least a date
             self.updateStatusbar(self.statusbarCSVImport, _("ERROR: Must define at least a date column"))
             return
@@ -858,132 +854,24 @@ class WindowImportdata(SimpleGladeApp):
         #Get selected file
         if not os.path.isfile(self.CSVfilename):
             return
-        #Read as delimited file
-        csvfile = open(self.CSVfilename, 'rb')
-        reader = csv.reader(csvfile, delimiter=self.delimiter)
-        #Process File
-
-        for i, row in enumerate(reader):
-            if self.has_header and i==0:
-                #Ignore first row
-                continue
-            if not row:
-                continue
-            data = {}
-            #Determine dates
-            _date = Date().getDateTime(row[dateCol-1])
-            #year, month, day = date.split("-")
-            date = _date[1].strftime("%Y-%m-%d")
-            zuluDateTime = _date[0].strftime("%Y-%m-%dT%H:%M:%SZ")
-            localDateTime = str(_date[1])
-            data['date'] = date
-            data['date_time_utc'] = zuluDateTime
-            data['date_time_local'] = localDateTime
-            if distanceCol:
-                try:
-                    data['distance'] = locale.atof(row[distanceCol-1])
-                except:
-                    data['distance'] = 0
-            else:
-                data['distance'] = 0
-            if durationCol:
-                #calculate duration in sec...
-                try:
-                    _duration = row[durationCol-1]
-                except:
-                    _duration = 0
-                if _duration.count(':') == 2:
-                    #Have 00:00:00 duration
-                    h, m, s = _duration.split(':')
-                    try:
-                        durationSec = int(h)*3600 + int(m)*60 + int(s)
-                    except:
-                        logging.debug("Error calculating duration for '%s'" % _duration)
-                        durationSec = None
-                else:
-                    try:
-                        durationSec = locale.atoi(_duration)
-                    except:
-                        #Unknown duration
-                        logging.debug("Could not determine duration for '%s'" % _duration)
-                        durationSec = None
-                if durationSec is not None:
-                    data['duration'] = durationSec
-                    data['time'] = str(durationSec)
-            if titleCol:
-                try:
-                    data['title'] = row[titleCol-1]
-                except:
-                    pass
-            if self.checkbCSVForceSport.get_active():
-                sport_id = self.pytrainer_main.record.getSportId(self.comboCSVForceSport.get_active_text(),add=True)
-                data['sport'] = sport_id
-            elif sportCol:
-                #retrieving sport id (adding sport if it doesn't exist yet)
-                sport_id = self.pytrainer_main.record.getSportId(row[sportCol-1],add=True)
-                data['sport'] = sport_id
-            else:
-                self.comboCSVForceSport.set_active(0)
-                sport_id = self.pytrainer_main.record.getSportId(self.comboCSVForceSport.get_active_text(),add=True)
-                data['sport'] = sport_id
-
-            if avgspeedCol:
-                #
-                try:
-                    data['average'] = locale.atof(row[avgspeedCol-1])
-                except:
-                    pass
-            if maxspeedCol:
-                try:
-                    data['maxspeed'] = locale.atof(row[maxspeedCol-1])
-                except:
-                    pass
-            if calCol:
-                try:
-                    data['calories'] = locale.atoi(row[calCol-1])
-                except:
-                    pass
-            if accCol:
-                try:
-                    data['upositive'] = locale.atof(row[accCol-1])
-                except:
-                    pass
-            if desCol:
-                try:
-                    data['unegative'] = locale.atof(row[desCol-1])
-                except:
-                    pass
-            if hrCol:
-                try:
-                    data['beats'] = locale.atof(row[hrCol-1])
-                except:
-                    pass
-            if maxHRCol:
-                try:
-                    data['maxbeats'] = locale.atof(row[maxHRCol-1])
-                except:
-                    pass
-            if paceCol:
-                try:
-                    data['pace'] = locale.atof(row[paceCol-1])
-                except:
-                    pass
-            if maxPaceCol:
-                try:
-                    data['maxpace'] = locale.atof(row[maxPaceCol-1])
-                except:
-                    pass
-            if commentsCol:
-                try:
-                    data['comments'] = row[commentsCol--1]
-                except:
-                    pass
-
-            #Insert into DB
-            logging.debug("Data", data)
-            self.pytrainer_main.ddbb.insert_dict('records', data)
+        if self.checkbCSVForceSport.get_active():
+            sport = self.comboCSVForceSport.get_active_text()
+        elif "sport" in columns:
+            sport = None
+        else:
+            self.comboCSVForceSport.set_active(0)
+            sport = self.comboCSVForceSport.get_active_text()
+        importer = CsvImporter(self.pytrainer_main.ddbb, self._sport_service, columns,
+                               self.delimiter, self.has_header, sport)
+        result = importer.import_file(self.CSVfilename)
+        for line, reason in result.rejected:
+            logging.warning("Rejected line %d of %s: %s" % (line, self.CSVfilename, reason))
         #Display message....
-        self.updateStatusbar(self.statusbarCSVImport, _("Import completed. %d rows processed") % i)
+        if result.rejected:
+            lines = ", ".join([str(line) for line, reason in result.rejected])
+            self.updateStatusbar(self.statusbarCSVImport, _("Import completed. %d rows imported, %d rows rejected (lines %s)") % (result.imported, len(result.rejected), lines))
+        else:
+            self.updateStatusbar(self.statusbarCSVImport, _("Import completed. %d rows processed") % result.imported)
         #Disable import button
         self.buttonCSVImport.set_sensitive(0)
         logging.debug('<<')
@@ -38,6 +38,7 @@ from pytrainer.lib.xmlUtils import XMLParser
 from pytrainer.extensions.googlemaps import Googlemaps
 from pytrainer.extensions.osm import Osm
 from pytrainer.lib.unitsconversor import *
+from pytrainer.util.background import LatestJobRunner
 
 from pytrainer.recordgraph import RecordGraph
 from pytrainer.daygraph import DayGraph
@@ -52,7 +53,7 @@ from pytrainer.core.equipment import EquipmentService
 
 from pytrainer.gui.drawGraph import DrawGraph
 from pytrainer.gui.windowcalendar import WindowCalendar
-from pytrainer.lib.listview import ListSearch
+from pytrainer.lib.listview import ListSearch, parse_area
 from pytrainer.lib.uc import UC
 
 
@@ -285,6 +286,7 @@ class Main(SimpleGladeApp):
         if not getattr(self, 'mapviewer', None):
             self.mapviewer = MapViewer(self.data_path, pytrainer_main=self.parent, box=self.map_vbox)
             self.mapviewer_fs = MapViewer(self.data_path, pytrainer_main=self.parent, box=self.map_vbox_old)
+            self.map_jobs = LatestJobRunner(gobject.idle_add, name="MapDrawer")
         #self.googlemaps = Googlemaps(self.data_path, self.map_vbox,waypoint, pytrainer_main=self.parent)
         #self.osm = Osm(self.data_path, self.map_vbox,waypoint, pytrainer_main=self.parent)
         #self.googlemaps_old = Googlemaps(self.data_path, self.map_vbox_old,waypoint, pytrainer_main=self.parent)
@@ -840,6 +842,14 @@ class Main(SimpleGladeApp):
                 3, str(project(d, activity)),
                 )
         self.analyticsTreeView.set_model(projected_store)
+
+        #Rank by time among the activities of the sport on the same route
+        route_records = self.pytrainer_main.ddbb.select_dict("records", ["id_record","duration"], "%s AND sport=%d" % (self.pytrainer_main.record.getRouteCondition(activity.id), activity.sport_id))
+        if route_records:
+            route_rank = 1 + len([r for r in route_records if r['duration'] is not None and r['duration'] < activity.time])
+            self.label_ranking_route.set_text("%s/%s" % (route_rank, len(route_records)))
+        else:
+            self.label_ranking_route.set_text("-")
             
         self.analytics_activity = activity
         self.on_change_rank_percentage()
@@ -1005,28 +1015,55 @@ class Main(SimpleGladeApp):
 
     def actualize_map(self,activity, full_screen=False):
         logging.debug(">>")
+        if full_screen:
+            logging.debug("Displaying in full screen mode")
+            mapviewer = self.mapviewer_fs
+        else:
+            logging.debug("Displaying in embedded mode")
+            mapviewer = self.mapviewer
         #Check which type of map viewer to use
         if self.radiobuttonOSM.get_active():
             #Use OSM to draw map
             logging.debug("Using OSM to draw map....")
-            htmlfile = Osm(data_path=self.data_path, waypoint=self.waypoint, pytrainer_main=self.parent).drawMap(activity, self.comboMapLineType.get_active())
+            drawer = Osm(data_path=self.data_path, waypoint=self.waypoint, pytrainer_main=self.parent)
         elif self.radiobuttonGMap.get_active():
             #Use Google to draw map
             logging.debug("Using Google to draw map")
-            htmlfile = Googlemaps(data_path=self.data_path, waypoint=self.waypoint, pytrainer_main=self.parent).drawMap(activity, self.comboMapLineType.get_active())
+            drawer = Googlemaps(data_path=self.data_path, waypoint=self.waypoint, pytrainer_main=self.parent)
         else:
             #Unknown map type...
             logging.error("Unknown map viewer requested")
-            htmlfile = self.mapviewer.createErrorHtml()
-        logging.debug("Displaying htmlfile: %s" % htmlfile)
-        if full_screen:
-            logging.debug("Displaying in full screen mode")
-            self.mapviewer_fs.display_map(htmlfile=htmlfile)
-        else:
-            logging.debug("Displaying in embedded mode")
-            self.mapviewer.display_map(htmlfile=htmlfile)
+            self.map_jobs.cancel()
+            mapviewer.display_map(htmlfile=mapviewer.createErrorHtml())
+            logging.debug("<<")
+            return
+        #The page is drawn in the background, in a file of its own until shown
+        htmlfile = drawer.htmlfile
+        linetype = self.comboMapLineType.get_active()
+        def draw(job):
+            job.check()
+            drawer.htmlfile = "%s.%d.part" % (htmlfile, job.number)
+            drawer.drawMap(activity, linetype)
+            if job.cancelled:
+                os.remove(drawer.htmlfile)
+                job.check()
+            return drawer.htmlfile
+        def show(job, partfile):
+            os.rename(partfile, htmlfile)
+            logging.debug("Displaying htmlfile: %s" % htmlfile)
+            mapviewer.display_map(htmlfile=htmlfile)
+        def failed(job, e):
+            mapviewer.display_map(htmlfile=mapviewer.createErrorHtml())
+        def discard(job, partfile):
+            os.remove(partfile)
+        mapviewer.display_map(htmlfile=mapviewer.createLoadingHtml())
+        self.map_jobs.submit(draw, show, failed, discard)
         logging.debug("<<")
 
+    def cancelMap(self):
+        """Stop drawing the map of the activity shown before"""
+        self.map_jobs.cancel()
+
     def actualize_weekview(self, record_list, date_range):
         logging.debug(">>")
         self.week_date.set_text("%s - %s (%d)" % (date_range.start_date.strftime("%a %d %b"), date_range.end_date.strftime("%a %d %b"), int(date_range.end_date.strftime("%V"))) )
@@ -1107,7 +1144,7 @@ class Main(SimpleGladeApp):
             self.weekview.set_sensitive(1)
         else:
             self.weekview.set_sensitive(0)
-        self.drawareaweek.drawgraph(record_list, date_range.start_date)
+        self.drawareaweek.drawgraph(record_list, date_range.start_date, period=(str(date_range), self.activeSport))
         logging.debug("<<")
 
     def actualize_monthview(self,record_list, nameMonth):
@@ -1191,9 +1228,10 @@ class Main(SimpleGladeApp):
             self.monthview.set_sensitive(0)
         logging.debug("<<")
 
-    def actualize_monthgraph(self,record_list, daysInMonth):
+    def actualize_monthgraph(self,record_list, daysInMonth, date_range=None):
         logging.debug(">>")
-        self.drawareamonth.drawgraph(record_list, daysInMonth)
+        period = (str(date_range), self.activeSport) if date_range is not None else None
+        self.drawareamonth.drawgraph(record_list, daysInMonth, period=period)
         logging.debug("<<")
 
     def actualize_yearview(self,record_list, year):
@@ -1277,9 +1315,10 @@ class Main(SimpleGladeApp):
             self.drawareayear.drawgraph([])
         logging.debug("<<")
 
-    def actualize_yeargraph(self,record_list):
+    def actualize_yeargraph(self,record_list, date_range=None):
         logging.debug(">>")
-        self.drawareayear.drawgraph(record_list)
+        period = (str(date_range), self.activeSport) if date_range is not None else None
+        self.drawareayear.drawgraph(record_list, period=period)
         logging.debug("<<")
 
     def actualize_athleteview(self, athlete):
@@ -1361,7 +1400,7 @@ class Main(SimpleGladeApp):
         
         store.set_sort_column_id(3, gtk.SORT_DESCENDING)
 
-        self.drawareatotal.drawgraph(record_list)
+        self.drawareatotal.drawgraph(record_list, period=("total",))
 
         logging.debug("<<")    
     
@@ -1477,8 +1516,7 @@ class Main(SimpleGladeApp):
             self.waypoint_description.set_text(str(record_list[default_id][4]))
             self.set_waypoint_type(str(record_list[default_id][7]))
         if redrawmap == 1:
-            self.waypointeditor.createHtml(default_waypoint)
-            self.waypointeditor.drawMap()
+            self.waypointeditor.showWaypoint(default_waypoint)
         logging.debug("<<")
 
     def set_waypoint_type(self, type):
@@ -1523,7 +1561,11 @@ class Main(SimpleGladeApp):
             _("Average"):"average",
             _("Calories"):"calories"
             }
-        self.listsearch.title = self.lsa_searchvalue.get_text()
+        self.listsearch.area = parse_area(self.lsa_searchvalue.get_text())
+        if self.listsearch.area is None:
+            self.listsearch.title = self.lsa_searchvalue.get_text()
+        else:
+            self.listsearch.title = ''
         self.listsearch.sport = self.lsa_sport.get_active()
         self.listsearch.past = self.lsa_past.get_active()
         self.listsearch.duration = self.lsa_duration.get_active()
@@ -1984,6 +2026,20 @@ class Main(SimpleGladeApp):
 
     def on_gpsplugins_activate(self,widget):
         self.parent.editGpsPlugins()
+
+    def on_heatmap_activate(self,widget):
+        self.parent.showHeatmap()
+
+    def show_heatmap(self, htmlfile):
+        logging.debug(">>")
+        heatmapwindow = gtk.Window()
+        heatmapwindow.set_title(_("Heatmap"))
+        vbox = gtk.VBox()
+        heatmapwindow.add(vbox)
+        MapViewer(self.data_path, pytrainer_main=self.parent, box=vbox).display_map(htmlfile=htmlfile)
+        heatmapwindow.resize(800,600)
+        heatmapwindow.show_all()
+        logging.debug("<<")
     #hasta aqui revisado
 
     def on_recordTreeView_button_press_event(self, treeview, event):
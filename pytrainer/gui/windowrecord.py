@@ -145,13 +145,15 @@ class WindowRecord(SimpleGladeApp):
         return selected_ids
     
     def getActivityData(self):
-        return self.activity_data
+        """The activities accepted for import, none if cancelled"""
+        return self.activity_data if self.accepted else []
         
     def populateMultiWindow(self, activities):
         logging.debug(">>")
         self.mode = "multiple_activities"
-        #activities (activity_id, start_time, distance, duration, sport, gpx_file, file_id)
+        #activities (activity_id, start_time, distance, duration, sport, gpx_file, file_id, in_db, track)
         self.activity_data = []
+        self.accepted = False
         #Make treeview
         self.store = self.build_tree_view()
         #Add data
@@ -183,6 +185,7 @@ class WindowRecord(SimpleGladeApp):
             details["rcd_sport"] = activity[4]
             details["rcd_gpxfile"] = activity[5]
             details["file_id"] = activity[6]
+            details["track"] = activity[8] if len(activity) > 8 else None
             self.activity_data.append(details)
         self.scrolledwindowEntries.show_all()
         #Hide some of the buttons
@@ -239,20 +242,13 @@ class WindowRecord(SimpleGladeApp):
                 self.activity_data[self.active_row]["rcd_maxbeats"] = self.rcd_maxbeats.get_text()
                 self.activity_data[self.active_row]["rcd_beats"] = self.rcd_beats.get_text()
                 self.activity_data[self.active_row]["rcd_calories"] = self.rcd_calories.get_text()
-            row = 0 
+            #Activities not viewed are completed, and all are inserted, in
+            #the background by the import window
+            selected_equipment_ids = self._get_selected_equipment_ids()
             for activity in self.activity_data:
-                index = self.activity_data.index(activity)
-                if activity["complete"] is False:
-                    #Did not view or modify this record - need to get all the details
-                    print "Activity incomplete.. " + activity["rcd_gpxfile"]
-                    self.update_activity_data(row, activity["rcd_gpxfile"], activity["rcd_sport"])
-                activity["rcd_title"] = activity["rcd_title"].replace("\"","'")
-                #Add activity to DB etc
-                laps = activity.pop("laps", ())
-                selected_equipment_ids = self._get_selected_equipment_ids()
-                self.activity_data[index]["db_id"] = self.parent.insertRecord(activity, laps, equipment=selected_equipment_ids)
-                row += 1
-            logging.debug("Processed %d rows of activity data" % row)
+                activity["equipment"] = selected_equipment_ids
+            self.accepted = True
+            logging.debug("Accepted %d rows of activity data" % len(self.activity_data))
         else:
             logging.debug("Single activity")
             list_options = {}
@@ -475,29 +471,7 @@ class WindowRecord(SimpleGladeApp):
 
     def update_activity_data(self, row, gpx_file, sport):
         logging.debug(">>")
-        self.activity_data[row]["rcd_comments"] = ""
-        gpx_summary, laps = self.parent.summaryFromGPX(gpx_file, (sport,""))
-        local_time = gpx_summary['date_time_local']
-        start_date = local_time.strftime("%Y-%m-%d")
-        start_time = local_time.strftime("%H:%M:%S")
-        self.activity_data[row]["rcd_date"] = start_date
-        self.activity_data[row]["rcd_starttime"] = start_time
-        self.activity_data[row]["date_time_local"] = gpx_summary['date_time_local']
-        self.activity_data[row]["date_time_utc"] = gpx_summary['date_time_utc']
-        self.activity_data[row]["rcd_time"] = gpx_summary["rcd_time"]
-        self.activity_data[row]["rcd_distance"] = gpx_summary["rcd_distance"]
-        self.activity_data[row]["rcd_average"] = gpx_summary["rcd_average"]
-        self.activity_data[row]["rcd_calories"] = gpx_summary["rcd_calories"]
-        self.activity_data[row]["rcd_beats"] = gpx_summary["rcd_beats"]
-        self.activity_data[row]["rcd_upositive"] = gpx_summary["rcd_upositive"]
-        self.activity_data[row]["rcd_unegative"] = gpx_summary["rcd_unegative"]
-        self.activity_data[row]["rcd_maxvel"] = gpx_summary["rcd_maxvel"]
-        self.activity_data[row]["rcd_maxpace"] = gpx_summary["rcd_maxpace"]
-        self.activity_data[row]["rcd_pace"] = gpx_summary["rcd_pace"]
-        self.activity_data[row]["rcd_maxbeats"] = gpx_summary["rcd_maxbeats"]
-        self.activity_data[row]["rcd_title"] = ""
-        self.activity_data[row]["laps"] = laps
-        self.activity_data[row]["complete"] = True
+        self.parent.completeActivity(self.activity_data[row])
         logging.debug("<<")
 
         
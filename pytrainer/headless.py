@@ -0,0 +1,54 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import logging
+import pytrainer.platform
+from pytrainer.environment import Environment
+from pytrainer.profile import Profile
+from pytrainer.lib.ddbb import DDBB
+from pytrainer.lib.date import Date
+from pytrainer.lib.uc import UC
+from pytrainer.core.sport import SportService
+from pytrainer.core.duplicate import DuplicateIndex
+
+class Headless(object):
+
+    """Stand-in for the main pyTrainer object for use without a GUI.
+
+    Provides the environment, profile, database and services that
+    activities and graphs expect from the main object, without importing
+    GTK or starting the main window. The database must already have been
+    set up by running pytrainer.
+    """
+
+    def __init__(self, conf_dir=None, data_path=None):
+        logging.debug('>>')
+        self.version = __import__('pytrainer').get_version()
+        self.environment = Environment(pytrainer.platform.get_platform(), conf_dir)
+        self.environment.create_directories()
+        self.data_path = data_path
+        self.date = Date()
+        self.profile = Profile(self.environment, self.data_path, self)
+        self.uc = UC()
+        self.ddbb = DDBB(self.profile, self)
+        logging.debug('connecting to DDBB')
+        self.ddbb.connect()
+        self.sport_service = SportService(self.ddbb)
+        self.duplicate_index = DuplicateIndex(self.ddbb)
+        logging.debug('<<')
+
+    def close(self):
+        self.ddbb.disconnect()
@@ -0,0 +1,102 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+"""The work of the import window, done in a background thread.
+
+Run as jobs of a LatestJobRunner (see pytrainer.util.background), which
+report their progress file by file, or activity by activity, and stop at the
+next one once cancelled. A job opens a database connection of its own, as
+connections cannot be shared between threads. Each activity is inserted in
+a transaction of its own, so those inserted before a job is cancelled, or
+fails, are kept: a cancelled insert job still returns them.
+"""
+
+import logging
+
+from pytrainer.bulkimport import ImportContext
+from pytrainer.headless import Headless
+from pytrainer.lib.sniffer import ImporterRegistry
+from pytrainer.record import Record
+
+class ImportWorker(object):
+
+    """Finds and inserts the activities of files for the import window.
+
+    Args:
+        conf_dir (str): the configuration directory, with the database.
+        data_path (str): where pytrainer is installed, with the importers.
+    """
+
+    def __init__(self, conf_dir, data_path):
+        self.conf_dir = conf_dir
+        self.data_path = data_path
+
+    def scan(self, job, filenames):
+        """Identify files and read the summary of their activities.
+
+        job.report(index, filename, processClass, summary) is called after
+        each file, processClass being None if no importer reads it, and
+        summary the list returned by its getActivitiesSummary.
+
+        Returns (int): the number of files read.
+        """
+        trainer = Headless(self.conf_dir, self.data_path)
+        try:
+            importers = ImporterRegistry(self.data_path)
+            context = ImportContext(trainer)
+            for index, filename in enumerate(filenames):
+                job.check()
+                try:
+                    processClass = importers.identify(filename, context)
+                    summary = processClass.getActivitiesSummary() if processClass is not None else []
+                except Exception:
+                    logging.exception("Unable to read %s" % filename)
+                    processClass, summary = None, []
+                job.report(index, filename, processClass, summary)
+        finally:
+            trainer.close()
+        return len(filenames)
+
+    def insert(self, job, activities):
+        """Insert the activities accepted in the multiple activities window.
+
+        The details of activities not viewed there are read from their GPX
+        file first. job.report(activity, id_record) is called after each
+        activity is committed. Once the job is cancelled it stops before the
+        next activity, returning those committed rather than raising, so
+        the runner hands them to its discard callback.
+
+        Returns (list): the (activity, id_record) of each activity committed.
+        """
+        trainer = Headless(self.conf_dir, self.data_path)
+        try:
+            record = Record(trainer.sport_service, self.data_path, trainer)
+            imported = []
+            for activity in activities:
+                if job.cancelled:
+                    break
+                if not activity["complete"]:
+                    record.completeActivity(activity)
+                activity["rcd_title"] = activity["rcd_title"].replace("\"","'")
+                laps = activity.pop("laps", ())
+                equipment = activity.pop("equipment", None)
+                with trainer.ddbb.transaction():
+                    id_record = record.insertRecord(activity, laps, equipment=equipment)
+                imported.append((activity, id_record))
+                job.report(activity, id_record)
+        finally:
+            trainer.close()
+        return imported
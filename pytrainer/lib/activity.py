@@ -391,7 +391,7 @@ class Activity:
 			for lap in laps:
 				lap_keys = ", ".join(map(str, lap.keys()))
 				lap_values = lap.values()
-				self.pytrainer_main.record.insertLaps(lap_keys,lap.values())
+				self.pytrainer_main.ddbb.insert("laps", lap_keys, lap_values)
 		logging.debug("<<")
 		return laps
 
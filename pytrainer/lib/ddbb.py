@@ -98,8 +98,53 @@ tablesList = {  "records":{     "id_record":"integer primary key autoincrement",
                                      "id": "integer primary key autoincrement",
                                      "record_id": "int",
                                      "equipment_id": "int",
-                                     }
+                                     },
+                        "track_bounds": {
+                                     "record": "integer primary key",
+                                     "min_lat": "float",
+                                     "min_lon": "float",
+                                     "max_lat": "float",
+                                     "max_lon": "float",
+                                     },
+                        "track_cells": {
+                                     "record": "integer",
+                                     "geohash": "char(7)",
+                                     },
+                        "track_fingerprints": {
+                                     "record": "integer primary key",
+                                     "route": "integer",
+                                     "length": "float",
+                                     "points": "varchar(500)",
+                                     },
+                        "track_hashes": {
+                                     "record": "integer primary key",
+                                     "hash": "char(40)",
+                                     },
+                        "segments": {
+                                     "id_segment": "integer primary key autoincrement",
+                                     "name": "varchar(200)",
+                                     "start_lat": "float",
+                                     "start_lon": "float",
+                                     "end_lat": "float",
+                                     "end_lon": "float",
+                                     "distance": "float",
+                                     },
+                        "segment_efforts": {
+                                     "segment": "integer",
+                                     "record": "integer",
+                                     "elapsed_time": "float",
+                                     },
                         }
+#Indexes to create with the tables: name -> (table, columns)
+tablesIndexes = { "records_date_time_utc": ("records", "date_time_utc"),
+                  "track_cells_geohash": ("track_cells", "geohash"),
+                  "track_cells_record": ("track_cells", "record"),
+                  "track_fingerprints_route": ("track_fingerprints", "route"),
+                  "segment_efforts_segment": ("segment_efforts", "segment"),
+                  "segment_efforts_record": ("segment_efforts", "record"),
+                  "waypoints_lat_lon": ("waypoints", "lat, lon"),
+                  "track_hashes_hash": ("track_hashes", "hash"),
+}
 tablesDefaultData = { "sports": [
     ({ "name": u"Mountain Bike", "weight": 0.0, "color": "0000ff" } ),
     ({ "name": u"Bike", "weight": 0.0, "color": "00ff00"}),
@@ -125,6 +170,8 @@ class DDBB:
         ddbb_user = self.configuration.getValue("pytraining","prf_ddbbuser")
         ddbb_pass = self.configuration.getValue("pytraining","prf_ddbbpass")
         self.ddbbObject = Sql(ddbb_host,ddbb,ddbb_user,ddbb_pass,self.configuration)
+        #Incremented on every change so cached results (e.g. rendered graphs) can be invalidated
+        self.data_version = 0
         
     def get_connection_url(self):
         return self.ddbbObject.get_connection_url()
@@ -235,9 +282,20 @@ class DDBB:
         print "Unknown datatype: (%s) for data (%s)" % (cell_type, value)
         return None
 
+    def changed(self):
+        """Invalidate cached results after changes made through another
+        connection, e.g. by a background job."""
+        self.data_version += 1
+
     def insert(self,table,cells,values):
+        self.data_version += 1
         self.ddbbObject.insert(table,cells,values)
 
+    def insert_many(self, table, cells, rows):
+        """Insert several rows of values for the same cells at once."""
+        self.data_version += 1
+        self.ddbbObject.insert_many(table, cells, rows)
+
     def insert_dict(self, table, data):
         logging.debug(">>")
         global tablesList
@@ -256,15 +314,34 @@ class DDBB:
         #Create string of cell names for sql...
         #TODO fix sql objects so dont need to join...
         cells_string = ",".join(cells)
+        self.data_version += 1
         self.ddbbObject.insert(table,cells_string,values)
         logging.debug("<<")
 
+    def transaction(self):
+        """Get a context manager making the changes in its block in a single
+        transaction, e.g. to insert many records at once.
+        """
+        self.data_version += 1
+        return self.ddbbObject.transaction()
+
     def delete(self,table,condition):
+        self.data_version += 1
         self.ddbbObject.delete(table,condition)
 
     def update(self,table,cells,value,condition):
+        self.data_version += 1
         self.ddbbObject.update(table,cells,value,condition)
 
+    def update_many(self, table, cells, key, rows):
+        """Update several rows at once, in a single transaction.
+
+        Each row holds the values of the cells followed by the value of
+        the key column of the row to update.
+        """
+        self.data_version += 1
+        self.ddbbObject.update_many(table, cells, key, rows)
+
     def update_dict(self, table, data, condition):
         logging.debug(">>")
         global tablesList
@@ -283,6 +360,7 @@ class DDBB:
         #Create string of cell names for sql...
         #TODO fix sql objects so dont need to join...
         cells_string = ",".join(cells)
+        self.data_version += 1
         self.ddbbObject.update(table,cells_string,values,condition)
         logging.debug("<<")
 
@@ -301,6 +379,8 @@ class DDBB:
                 logging.debug("Adding default data to %s" % entry)
                 for data_dict in tablesDefaultData[entry]:
                     self.insert_dict(entry, data_dict)
+        for name, (table, columns) in tablesIndexes.items():
+            self.ddbbObject.freeExec("create index %s on %s (%s)" % (name, table, columns))
                 
     def create_backup(self):
         """Create a backup of the current database."""
@@ -0,0 +1,389 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+"""Read Garmin FIT (Flexible and Interoperable data Transfer) activity files.
+
+A FIT file is a header followed by a stream of messages. Definition
+messages describe the layout of the data messages of a local message type
+that follow them, so each data message is decoded with a struct compiled
+once per definition. Only the fields of the messages pytrainer uses are
+unpacked (file_id, session, lap and record); the rest are skipped.
+"""
+
+import bisect
+import datetime
+import logging
+import math
+import struct
+
+#Seconds from the UNIX epoch to the FIT one, 1989-12-31T00:00:00Z
+FIT_EPOCH = 631065600
+SEMICIRCLES = 180.0 / 2 ** 31
+#File types in file_id messages
+FILE_TYPE_ACTIVITY = 4
+
+class FitError(Exception):
+    """Raised for files that are not FIT or are truncated."""
+
+def _scaled(scale, offset=0):
+    return lambda value: float(value) / scale - offset
+
+def _degrees(value):
+    return value * SEMICIRCLES
+
+def _time(value):
+    return datetime.datetime.utcfromtimestamp(value + FIT_EPOCH)
+
+def _enum(names):
+    return lambda value: names.get(value, value)
+
+SPORTS = _enum({0: "generic", 1: "running", 2: "cycling", 3: "transition",
+                4: "fitness_equipment", 5: "swimming", 6: "basketball",
+                7: "soccer", 8: "tennis", 9: "american_football",
+                10: "training", 11: "walking", 12: "cross_country_skiing",
+                13: "alpine_skiing", 14: "snowboarding", 15: "rowing",
+                16: "mountaineering", 17: "hiking", 18: "multisport",
+                19: "paddling"})
+INTENSITIES = _enum({0: "active", 1: "rest", 2: "warmup", 3: "cooldown"})
+LAP_TRIGGERS = _enum({0: "manual", 1: "time", 2: "distance",
+                      3: "position_start", 4: "position_lap",
+                      5: "position_waypoint", 6: "position_marked",
+                      7: "session_end", 8: "fitness_equipment"})
+
+#Fields decoded, by global message number: (message name, {field number:
+#(field name, conversion)})
+MESSAGES = {
+    0: ("file_id", {
+        0: ("type", None),
+        1: ("manufacturer", None),
+        2: ("product", None),
+        3: ("serial_number", None),
+        4: ("time_created", _time),
+    }),
+    18: ("session", {
+        253: ("timestamp", _time),
+        254: ("message_index", None),
+        2: ("start_time", _time),
+        3: ("start_position_lat", _degrees),
+        4: ("start_position_long", _degrees),
+        5: ("sport", SPORTS),
+        7: ("total_elapsed_time", _scaled(1000)),
+        8: ("total_timer_time", _scaled(1000)),
+        9: ("total_distance", _scaled(100)),
+        11: ("total_calories", None),
+        14: ("avg_speed", _scaled(1000)),
+        15: ("max_speed", _scaled(1000)),
+        16: ("avg_heart_rate", None),
+        17: ("max_heart_rate", None),
+        124: ("enhanced_avg_speed", _scaled(1000)),
+        125: ("enhanced_max_speed", _scaled(1000)),
+    }),
+    19: ("lap", {
+        253: ("timestamp", _time),
+        254: ("message_index", None),
+        2: ("start_time", _time),
+        3: ("start_position_lat", _degrees),
+        4: ("start_position_long", _degrees),
+        5: ("end_position_lat", _degrees),
+        6: ("end_position_long", _degrees),
+        7: ("total_elapsed_time", _scaled(1000)),
+        8: ("total_timer_time", _scaled(1000)),
+        9: ("total_distance", _scaled(100)),
+        11: ("total_calories", None),
+        13: ("avg_speed", _scaled(1000)),
+        14: ("max_speed", _scaled(1000)),
+        15: ("avg_heart_rate", None),
+        16: ("max_heart_rate", None),
+        17: ("avg_cadence", None),
+        23: ("intensity", INTENSITIES),
+        24: ("lap_trigger", LAP_TRIGGERS),
+        25: ("sport", SPORTS),
+        110: ("enhanced_avg_speed", _scaled(1000)),
+        111: ("enhanced_max_speed", _scaled(1000)),
+    }),
+    20: ("record", {
+        253: ("timestamp", _time),
+        0: ("position_lat", _degrees),
+        1: ("position_long", _degrees),
+        2: ("altitude", _scaled(5, 500)),
+        3: ("heart_rate", None),
+        4: ("cadence", None),
+        5: ("distance", _scaled(100)),
+        6: ("speed", _scaled(1000)),
+        7: ("power", None),
+        13: ("temperature", None),
+        73: ("enhanced_speed", _scaled(1000)),
+        78: ("enhanced_altitude", _scaled(5, 500)),
+    }),
+}
+#Fields replaced by their enhanced (wider) version when present
+ENHANCED = (("enhanced_altitude", "altitude"), ("enhanced_speed", "speed"),
+            ("enhanced_avg_speed", "avg_speed"), ("enhanced_max_speed", "max_speed"))
+
+#struct format and invalid value by base type number, the low 5 bits of
+#the base type
+BASE_TYPES = {
+    0x00: ("B", 0xFF),                 #enum
+    0x01: ("b", 0x7F),                 #sint8
+    0x02: ("B", 0xFF),                 #uint8
+    0x03: ("h", 0x7FFF),               #sint16
+    0x04: ("H", 0xFFFF),               #uint16
+    0x05: ("i", 0x7FFFFFFF),           #sint32
+    0x06: ("I", 0xFFFFFFFF),           #uint32
+    0x07: ("s", None),                 #string
+    0x08: ("f", None),                 #float32, invalid is NaN
+    0x09: ("d", None),                 #float64, invalid is NaN
+    0x0A: ("B", 0x00),                 #uint8z
+    0x0B: ("H", 0x0000),               #uint16z
+    0x0C: ("I", 0x00000000),           #uint32z
+    0x0D: ("B", 0xFF),                 #byte
+    0x0E: ("q", 0x7FFFFFFFFFFFFFFF),   #sint64
+    0x0F: ("Q", 0xFFFFFFFFFFFFFFFF),   #uint64
+    0x10: ("Q", 0x0000000000000000),   #uint64z
+}
+
+TIMESTAMP_FIELD = 253
+HEADER_DEFINITION = 0x40
+HEADER_DEVELOPER_DATA = 0x20
+HEADER_COMPRESSED_TIMESTAMP = 0x80
+HEADER_LOCAL_TYPE = 0x0F
+
+class Definition(object):
+
+    """The layout of the data messages of a local message type.
+
+    Fields not in MESSAGES, or whose size does not match their base type,
+    are skipped as padding by the compiled struct.
+    """
+
+    def __init__(self, global_number, big_endian, fields, developer_size=0):
+        self.global_number = global_number
+        self.name, profile = MESSAGES.get(global_number, (None, {}))
+        formats = [">" if big_endian else "<"]
+        self.fields = []
+        for number, size, base_type in fields:
+            type_format, invalid = BASE_TYPES.get(base_type & 0x1F, (None, None))
+            known = number in profile and type_format is not None
+            if known and type_format == "s":
+                formats.append("%ds" % size)
+            elif known and size == struct.calcsize(type_format):
+                formats.append(type_format)
+            else:
+                formats.append("%dx" % size)
+                continue
+            name, convert = profile[number]
+            self.fields.append((number, name, convert, invalid))
+        formats.append("%dx" % developer_size)
+        self.struct = struct.Struct("".join(formats))
+        self.size = self.struct.size
+
+    def decode(self, data):
+        """Get the (raw timestamp, {field name: value}) of a data message.
+
+        Invalid values are left out.
+        """
+        timestamp = None
+        values = {}
+        for (number, name, convert, invalid), value in zip(self.fields, self.struct.unpack(data)):
+            if isinstance(value, str):
+                value = value.split("\0", 1)[0]
+                if not value:
+                    continue
+            elif value == invalid or (isinstance(value, float) and math.isnan(value)):
+                continue
+            if number == TIMESTAMP_FIELD:
+                timestamp = value
+            values[name] = convert(value) if convert is not None else value
+        return timestamp, values
+
+class FitReader(object):
+
+    """Streams the messages of a FIT file.
+
+    Iterating yields (message name, {field name: value}) for the messages
+    in MESSAGES, in file order. Chained FIT files are read one after the
+    other.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    def _read(self, size):
+        data = self.fileobj.read(size)
+        if len(data) != size:
+            raise FitError("Truncated FIT file")
+        return data
+
+    def _read_header(self):
+        """Check the file header, returns the size of the data following it,
+        or None at the end of the file."""
+        header_size = self.fileobj.read(1)
+        if not header_size:
+            return None
+        header_size = ord(header_size)
+        if header_size < 12:
+            raise FitError("Bad FIT header size %d" % header_size)
+        header = self._read(header_size - 1)
+        protocol, profile, data_size, signature = struct.unpack("<BHI4s", header[:11])
+        if signature != ".FIT":
+            raise FitError("Not a FIT file")
+        logging.debug("FIT protocol %d.%d, profile %d" % (protocol >> 4, protocol & 0x0F, profile))
+        return data_size
+
+    def _read_definition(self, header):
+        """Returns the definition following a record header and its size."""
+        data = self._read(5)
+        big_endian = ord(data[1]) == 1
+        global_number, field_count = struct.unpack(">HB" if big_endian else "<HB", data[2:])
+        data = self._read(3 * field_count)
+        fields = [struct.unpack("BBB", data[i:i + 3]) for i in range(0, len(data), 3)]
+        size = 5 + len(data)
+        developer_size = 0
+        if header & HEADER_DEVELOPER_DATA:
+            data = self._read(ord(self._read(1)) * 3)
+            developer_size = sum(ord(data[i]) for i in range(1, len(data), 3))
+            size += 1 + len(data)
+        return Definition(global_number, big_endian, fields, developer_size), size
+
+    def __iter__(self):
+        while True:
+            data_size = self._read_header()
+            if data_size is None:
+                return
+            definitions = {}
+            last_timestamp = None
+            position = 0
+            while position < data_size:
+                header = ord(self._read(1))
+                position += 1
+                if header & HEADER_COMPRESSED_TIMESTAMP:
+                    local_type = (header >> 5) & 0x03
+                    offset = header & 0x1F
+                    if last_timestamp is None:
+                        raise FitError("Compressed timestamp without a reference")
+                    timestamp = (last_timestamp & ~0x1F) + offset
+                    if offset < (last_timestamp & 0x1F):
+                        timestamp += 0x20
+                    last_timestamp = timestamp
+                else:
+                    local_type = header & HEADER_LOCAL_TYPE
+                    timestamp = None
+                    if header & HEADER_DEFINITION:
+                        definitions[local_type], size = self._read_definition(header)
+                        position += size
+                        continue
+                definition = definitions.get(local_type)
+                if definition is None:
+                    raise FitError("Data message of undefined local type %d" % local_type)
+                data = self._read(definition.size)
+                position += definition.size
+                if definition.name is None:
+                    continue
+                raw_timestamp, values = definition.decode(data)
+                if raw_timestamp is not None:
+                    last_timestamp = raw_timestamp
+                elif timestamp is not None:
+                    values["timestamp"] = _time(timestamp)
+                for enhanced, field in ENHANCED:
+                    if enhanced in values:
+                        values[field] = values.pop(enhanced)
+                yield definition.name, values
+            #File CRC
+            self._read(2)
+
+def _start_time(message):
+    start_time = message.get("start_time")
+    if start_time is None and "timestamp" in message:
+        elapsed = message.get("total_elapsed_time", 0)
+        start_time = message["timestamp"] - datetime.timedelta(seconds=elapsed)
+    return start_time
+
+def _group(parents, children, key, child_time):
+    """Add each child to the last parent started by its time, or the first."""
+    starts = [parent["start_time"] for parent in parents]
+    for parent in parents:
+        parent[key] = []
+    for child in children:
+        index = bisect.bisect_right(starts, child_time(child)) - 1
+        parents[max(index, 0)][key].append(child)
+
+class FitActivity(object):
+
+    """The sessions of a FIT activity file.
+
+    Each session is a dict of its fields, with its laps in "laps", and each
+    lap holds its records in "records". Times are naive UTC datetimes,
+    positions in degrees, distances in metres and speeds in m/s.
+
+    Laps (sessions) missing from the file are made up from the records
+    (laps) they would hold.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file_id = None
+        sessions = []
+        laps = []
+        records = []
+        with open(filename, "rb") as fit_file:
+            for name, values in FitReader(fit_file):
+                if name == "record":
+                    if "timestamp" in values:
+                        records.append(values)
+                elif name == "lap" or name == "session":
+                    values["start_time"] = _start_time(values)
+                    if values["start_time"] is not None:
+                        (laps if name == "lap" else sessions).append(values)
+                elif name == "file_id" and self.file_id is None:
+                    self.file_id = values
+        if self.file_id is None:
+            raise FitError("No file_id message in %s" % filename)
+        if not laps and records:
+            laps = [self._lap_from_records(records)]
+        if not sessions and laps:
+            sessions = [self._session_from_laps(laps)]
+        laps.sort(key=lambda lap: lap["start_time"])
+        sessions.sort(key=lambda session: session["start_time"])
+        if laps:
+            _group(laps, records, "records", lambda record: record["timestamp"])
+        if sessions:
+            _group(sessions, laps, "laps", lambda lap: lap["start_time"])
+        self.sessions = sessions
+
+    @property
+    def is_activity(self):
+        return self.file_id.get("type") == FILE_TYPE_ACTIVITY
+
+    def _lap_from_records(self, records):
+        start_time = records[0]["timestamp"]
+        end_time = records[-1]["timestamp"]
+        elapsed = (end_time - start_time).total_seconds()
+        lap = {"start_time": start_time,
+               "timestamp": end_time,
+               "total_elapsed_time": elapsed,
+               "total_timer_time": elapsed,
+               "lap_trigger": "session_end"}
+        distances = [record["distance"] for record in records if "distance" in record]
+        if distances:
+            lap["total_distance"] = distances[-1]
+        return lap
+
+    def _session_from_laps(self, laps):
+        session = {"start_time": min(lap["start_time"] for lap in laps)}
+        sports = [lap["sport"] for lap in laps if "sport" in lap]
+        if sports:
+            session["sport"] = sports[0]
+        return session
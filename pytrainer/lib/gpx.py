@@ -54,8 +54,131 @@ summaryTag = gpxdataNS.substitute(tag="summary")
 pytrainerNS = string.Template(".//{http://sourceforge.net/projects/pytrainer/GPX/0/1}$tag")
 pyt_eleTag = pytrainerNS.substitute(tag="ele")
 
+def _iter_track_points(filename):
+    """Stream the trackpoints of a GPX file with a valid position.
+
+    Yields (lat, lon, element) tuples, the element is cleared afterwards.
+    """
+    for event, element in etree.iterparse(filename, tag="{*}trkpt"):
+        try:
+            lat, lon = float(element.get("lat")), float(element.get("lon"))
+        except (TypeError, ValueError):
+            lat = None
+        if lat is not None:
+            yield lat, lon, element
+        element.clear()
+
+def track_points(filename):
+    """Get the latitudes and longitudes of the trackpoints of a GPX file.
+
+    Streams the file instead of building the whole tree, for when only
+    the positions are needed. Points without a valid position are skipped.
+
+    Returns (tuple): a list of latitudes and a list of longitudes.
+    """
+    lats = []
+    lons = []
+    for lat, lon, element in _iter_track_points(filename):
+        lats.append(lat)
+        lons.append(lon)
+    return lats, lons
+
+def timed_track_points(filename):
+    """Get the positions and times of the trackpoints of a GPX file.
+
+    Like track_points, the times are left as the text of the time element
+    (None if missing) so only those needed get parsed.
+
+    Returns (tuple): lists of latitudes, longitudes and times.
+    """
+    lats = []
+    lons = []
+    times = []
+    for lat, lon, element in _iter_track_points(filename):
+        lats.append(lat)
+        lons.append(lon)
+        time_element = element.find("{*}time")
+        times.append(time_element.text.strip() if time_element is not None and time_element.text else None)
+    return lats, lons, times
+
+class Track(object):
+    """An activity parsed by an importer, to get the values of a Gpx from
+    without writing a GPX+ file and parsing it again.
+
+        time: start time, as the text of a GPX time element.
+        sport: name of the sport.
+        segments: the trackpoints of each lap, (lat, lon, time, ele, hr,
+            cadence) tuples of floats, ints and text, None if missing.
+        laps: a tuple for each lap, as returned by Gpx.getLaps.
+        lap_start_times: the start time of each lap, as text.
+    """
+
+    def __init__(self, time, sport, segments, laps, lap_start_times):
+        self.time = time
+        self.sport = sport
+        self.segments = segments
+        self.laps = laps
+        self.lap_start_times = lap_start_times
+
+    def write(self, filename):
+        """Write the track as a GPX+ file, with the content the importers
+        XSLT stylesheets produce."""
+        gpxNS = "http://www.topografix.com/GPX/1/1"
+        dataNS = "http://www.cluetrust.com/XML/GPXDATA/1/0"
+        def serialize(value):
+            #Full precision for floats
+            return repr(value) if isinstance(value, float) else str(value)
+        def element(parent, ns, tag, text=None, **attributes):
+            child = etree.SubElement(parent, "{%s}%s" % (ns, tag),
+                                     dict((key, serialize(attribute)) for key, attribute in attributes.items()))
+            if text is not None:
+                child.text = serialize(text)
+            return child
+        gpx = etree.Element("{%s}gpx" % gpxNS, nsmap={None: gpxNS, "gpxdata": dataNS},
+                            creator="pytrainer http://sourceforge.net/projects/pytrainer", version="1.1")
+        metadata = element(gpx, gpxNS, "metadata")
+        element(metadata, gpxNS, "name", "%s%s" % (self.sport, self.time[:10]))
+        element(metadata, gpxNS, "link", href="http://sourceforge.net/projects/pytrainer")
+        element(metadata, gpxNS, "time", self.time)
+        trk = element(gpx, gpxNS, "trk")
+        for points, lap in zip(self.segments, self.laps):
+            trkseg = element(trk, gpxNS, "trkseg")
+            for lat, lon, time_, ele, hr, cadence in points:
+                trkpt = element(trkseg, gpxNS, "trkpt", lat=lat, lon=lon)
+                if ele is not None:
+                    element(trkpt, gpxNS, "ele", ele)
+                if time_ is not None:
+                    element(trkpt, gpxNS, "time", time_)
+                if hr is not None or cadence is not None:
+                    extensions = element(trkpt, gpxNS, "extensions")
+                    if hr is not None:
+                        element(extensions, dataNS, "hr", hr)
+                    if cadence is not None:
+                        element(extensions, dataNS, "cadence", cadence)
+            extensions = element(trkseg, gpxNS, "extensions")
+            element(extensions, dataNS, "sportType", self.sport)
+            element(extensions, dataNS, "calories", lap[3])
+        extensions = element(gpx, gpxNS, "extensions")
+        for index, (lap, start_time) in enumerate(zip(self.laps, self.lap_start_times)):
+            (elapsed_time, end_lat, end_lon, calories, distance, start_lat, start_lon,
+             intensity, avg_hr, max_hr, max_speed, trigger) = lap
+            gpx_lap = element(extensions, dataNS, "lap")
+            element(gpx_lap, dataNS, "index", index + 1)
+            element(gpx_lap, dataNS, "startPoint", lat=start_lat, lon=start_lon)
+            element(gpx_lap, dataNS, "endPoint", lat=end_lat, lon=end_lon)
+            element(gpx_lap, dataNS, "startTime", start_time)
+            element(gpx_lap, dataNS, "elapsedTime", elapsed_time)
+            element(gpx_lap, dataNS, "calories", calories)
+            element(gpx_lap, dataNS, "distance", distance)
+            element(gpx_lap, dataNS, "summary", max_speed, name="MaximumSpeed", kind="max")
+            element(gpx_lap, dataNS, "summary", avg_hr, name="AverageHeartRateBpm", kind="avg")
+            element(gpx_lap, dataNS, "summary", max_hr, name="MaximumHeartRateBpm", kind="max")
+            element(gpx_lap, dataNS, "trigger", kind=trigger)
+            element(gpx_lap, dataNS, "intensity", intensity)
+        etree.ElementTree(gpx).write(filename, xml_declaration=True, encoding="UTF-8", pretty_print=True)
+
 class Gpx:
-    def __init__(self, data_path = None, filename = None, trkname = None):
+    def __init__(self, data_path = None, filename = None, trkname = None, track = None):
         logging.debug(">>")
         #print("GPX init-ing")
         global mainNS, timeTag, trackTag, trackPointTag, trackPointTagLast, trackSegTag, elevationTag, nameTag
@@ -79,7 +202,11 @@ class Gpx:
         #self.Date = Date()
         self.calories= 0
         self.tree = None
-        if filename != None:
+        self.track = track
+        if track is not None:
+            logging.debug("getting values from parsed track...")
+            self.Values = self._getValues()
+        elif filename != None:
             if not os.path.isfile(self.filename):
                 return None
             logging.debug("parsing content from "+self.filename)
@@ -160,10 +287,12 @@ class Gpx:
     def getLaps(self):
         logging.debug(">>")
         lapInfo = []
-        if self.tree is None:
+        if self.track is not None:
+            laps = self.track.laps
+        elif self.tree is None:
             return lapInfo
-        tree  = self.tree
-        laps = tree.findall(lapTag)
+        else:
+            laps = self.tree.findall(lapTag)
         logging.debug("Found %d laps" % len(laps))
         if len(laps) == 0:
             #Found no laps, so add single lap with totals
@@ -173,6 +302,8 @@ class Gpx:
             lon = self.trkpoints[-1]['lon']
             logging.debug("total_time: %s" %self.total_time)
             lapInfo.append((self.total_time, lat, lon, self.calories, self.total_dist*1000, stLat, stLon, "active", self.hr_average, self.maxhr, self.maxvel, "manual"))
+        elif self.track is not None:
+            lapInfo = list(laps)
         else:
             for lap in laps:
                 endPoint = lap.find(endPointTag)
@@ -224,24 +355,80 @@ class Gpx:
         logging.debug("<<")
         return lapInfo
 
+    def _readLapTotals(self):
+        """Get the calories, distance and elapsed time of each lap, as text."""
+        if self.track is not None:
+            return [(lap[3], lap[4], lap[0]) for lap in self.track.laps]
+        return [(lap.findtext(calorieTag), lap.findtext(distanceTag), lap.findtext(elapsedTimeTag))
+                for lap in self.tree.findall(lapTag)]
+
+    def _readStartTime(self):
+        if self.track is not None:
+            return self.track.time
+        return self.tree.find(timeTag).text
+
+    def _readTrackPoints(self):
+        """Get the values of every trackpoint.
+
+        Returns a list of (lat, lon, time, ele, hr, cadence, corrected ele)
+        tuples, lat and lon None if not valid, the time as text and other
+        missing values None.
+        """
+        if self.track is not None:
+            return [(lat, lon, time_, ele, hr, cadence, None)
+                    for points in self.track.segments
+                    for lat, lon, time_, ele, hr, cadence in points]
+        values = []
+        for trkpoint in self.tree.findall(trackPointTag):
+            try:
+                lat = float(trkpoint.get("lat"))
+                lon = float(trkpoint.get("lon"))
+            except Exception as e:
+                logging.debug(str(e))
+                values.append((None, None, None, None, None, None, None))
+                continue
+            #get the heart rate value from the gpx extended format file
+            hrResult = trkpoint.find(hrTag)
+            hr = int(hrResult.text) if hrResult is not None else None
+            #get the cadence (if present)
+            cadResult = trkpoint.find(cadTag)
+            cadence = int(cadResult.text) if cadResult is not None else None
+            timeResult = trkpoint.find(timeTag)
+            time_ = timeResult.text if timeResult is not None else None
+            #get the elevation
+            eleResult = trkpoint.find(elevationTag)
+            ele = None
+            if eleResult is not None:
+                try:
+                    ele = float(eleResult.text)
+                except Exception as e:
+                    logging.debug(str(e))
+            #Get corrected elevation if it exists
+            correctedEleResult = trkpoint.find(pyt_eleTag)
+            corEle = None
+            if correctedEleResult is not None:
+                try:
+                    corEle = float(correctedEleResult.text)
+                except Exception as e:
+                    logging.debug(str(e))
+            values.append((lat, lon, time_, ele, hr, cadence, corEle))
+        return values
+
     def _getValues(self):
         '''
         Migrated to eTree XML processing 26 Nov 2009 - jblance
         '''
         logging.debug(">>")
-        tree  = self.tree
         # Calories data comes within laps. Maybe more than one, adding them together - dgranda 20100114
         # Distance data comes within laps where present as well - dgranda 20110204
-        laps = tree.findall(lapTag)
+        laps = self._readLapTotals()
         if laps is not None and laps != "":
             totalDistance = 0
             totalDuration = 0
-            for lap in laps:
-                lapCalories = lap.findtext(calorieTag)                
-                self.calories += int(lapCalories)
-                lapDistance = lap.findtext(distanceTag)
+            for lapCalories, lapDistance, lapDuration_tmp in laps:
+                if lapCalories:
+                    self.calories += int(lapCalories)
                 totalDistance += float(lapDistance)
-                lapDuration_tmp = lap.findtext(elapsedTimeTag)
                 # When retrieving data from TCX file -> seconds (float)
                 # When retrieving data from GPX+ file -> hh:mm:ss
                 # EAFP -> http://docs.python.org/glossary.html
@@ -268,13 +455,13 @@ class Gpx:
         total_hr = 0
         tmp_alt = 0
         len_validhrpoints = 0
-        trkpoints = tree.findall(trackPointTag)
+        trkpoints = self._readTrackPoints()
         if trkpoints is None or len(trkpoints) == 0:
             logging.debug( "No trkpoints found in file")
             return retorno
         logging.debug("%d trkpoints in file" % len(trkpoints))
 
-        date_ = tree.find(timeTag).text
+        date_ = self._readStartTime()
         if date_ is None:
             logging.info("time tag is blank")
             self.date = None
@@ -285,38 +472,18 @@ class Gpx:
         waiting_points = []
         logging.debug("date: %s | start_time: %s | mk_time: %s" % (self.date, self.start_time, mk_time))
 
-        for i, trkpoint in enumerate(trkpoints):
-            #Get data from trkpoint
-            try:
-                lat = float(trkpoint.get("lat"))
-                lon = float(trkpoint.get("lon"))
-            except Exception as e:
-                logging.debug(str(e))
-                lat = lon = None
+        for i, (lat, lon, date_, ele, hr, cadence, corEle) in enumerate(trkpoints):
             if lat is None or lat == "" or lat == 0 or lon is None or lon == "" or lon == 0:
                 logging.debug("lat or lon is blank or zero")
                 continue
-            #get the heart rate value from the gpx extended format file
-            hrResult = trkpoint.find(hrTag)
-            if hrResult is not None:
-                hr = int(hrResult.text)
+            if hr is not None:
                 len_validhrpoints += 1
                 total_hr += hr          #TODO fix
                 if hr>self.maxhr:
                     self.maxhr = hr
-            else:
-                hr = None
-            #get the cadence (if present)
-            cadResult = trkpoint.find(cadTag)
-            if cadResult is not None:
-                cadence = int(cadResult.text)
-            else:
-                cadence = None
 
             #get the time
-            timeResult = trkpoint.find(timeTag)
-            if timeResult is not None:
-                date_ = timeResult.text
+            if date_ is not None:
                 mk_time = self.getDateTime(date_)[0]
                 time_ = time.mktime(mk_time.timetuple()) #Convert date to seconds
                 if i == 0:
@@ -335,32 +502,14 @@ class Gpx:
                 time_ = None
                 time_elapsed = None
 
-            #get the elevation
-            eleResult = trkpoint.find(elevationTag)
+            #Calculate elevation change
             rel_alt = 0
-            if eleResult is not None:
+            if ele is not None and i != 0:
                 try:
-                    ele = float(eleResult.text)
-                    #Calculate elevation change
-                    if i != 0:
-                        rel_alt = ele - self.trkpoints[i-1]['ele'] if self.trkpoints[i-1]['ele'] is not None else 0
+                    rel_alt = ele - self.trkpoints[i-1]['ele'] if self.trkpoints[i-1]['ele'] is not None else 0
                 except Exception as e:
                     logging.debug(str(e))
                     ele = None
-            else:
-                ele = None
-                
-            #Get corrected elevation if it exists
-            correctedEleResult = trkpoint.find(pyt_eleTag)
-            if correctedEleResult is not None:
-                try:
-                    corEle = float(correctedEleResult.text)
-                    #Calculate elevation change
-                except Exception as e:
-                    logging.debug(str(e))
-                    corEle = None
-            else:
-                corEle = None
 
             #Calculate climb or decent amount
             #Allow for some 'jitter' in height here
@@ -512,14 +661,19 @@ class Gpx:
         returns: tuple (string with start time as UTC timezone - 2008-03-22T12:17:43Z, datetime of time in local timezone)
         '''
         logging.debug(">>")
-        date_time = self.tree.find(timeTag) #returns first instance found
+        if self.track is not None:
+            date_time = self.track.time
+        else:
+            date_time = self.tree.find(timeTag) #returns first instance found
+            if date_time is not None:
+                date_time = date_time.text
         if date_time is None:
             print "Problems when retrieving start time from "+gpxFile+". Please check data integrity"
             return 0
-        dateTime = self.getDateTime(date_time.text)
+        dateTime = self.getDateTime(date_time)
         zuluDateTime = dateTime[0].strftime("%Y-%m-%dT%H:%M:%SZ")
         localDateTime = dateTime[1]
-        logging.debug(gpxFile+" | "+ date_time.text +" | " + zuluDateTime + " | " + str(localDateTime))
+        logging.debug(gpxFile+" | "+ date_time +" | " + zuluDateTime + " | " + str(localDateTime))
         #print localDateTime
         #return date_time.text
         logging.debug("<<")
@@ -17,7 +17,8 @@
 #Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
 
 import logging
-import gtk
+import re
+from matplotlib.colors import colorConverter, rgb2hex
 
 class GraphData:
     '''
@@ -89,21 +90,21 @@ class GraphData:
 
     def get_color(self, color):
         '''
-        
+            Convert a gtk color string or color name to a matplotlib #rrggbb string
         '''
         if color is None:
             return None
+        #Hex colors as written by gtk, e.g. #rgb, #rrggbb or 13 digit #rrrrggggbbbb
+        if re.match("^#([0-9a-fA-F]{3}){1,4}$", color):
+            width = (len(color) - 1) / 3
+            channels = [color[1+i*width:1+(i+1)*width] for i in range(3)]
+            return "#%s" % "".join([(c*2)[:2] for c in channels]).lower()
         try:
-            #Generate 13 digit color string from supplied color
-            col = gtk.gdk.color_parse(color).to_string()
+            #Color names
+            return rgb2hex(colorConverter.to_rgb(color))
         except ValueError:
             logging.debug("Unable to parse color from '%s'" % color)
             return None
-                
-        #Create matplotlib color string
-        _color = "#%s%s%s" % (col[1:3], col[5:7], col[9:11])
-        #logging.debug("%s color saved as: %s" % (color, _color))
-        return _color
         
     def set_color(self, y1color, y2color = None):
         ''' 
@@ -1,4 +1,5 @@
 import datetime
+import re
 
 UC_LISTDISTANCE = {False : [[_('All Distances'), [0.0,999999.9]],
                             ['<1 km', [0.0, 1.0]],
@@ -15,6 +16,22 @@ UC_LISTDISTANCE = {False : [[_('All Distances'), [0.0,999999.9]],
                             ['20-50 mi', [32.18688, 80.4672]],
                             ['>50 mi', [80.4672, 999999.9]]] 
                     }
+# Search text selecting the activities through an area instead of by title:
+# area:min_lat,min_lon,max_lat,max_lon
+AREA_SEARCH = re.compile(r"^\s*area:\s*(-?[\d.]+)\s*,\s*(-?[\d.]+)\s*,\s*(-?[\d.]+)\s*,\s*(-?[\d.]+)\s*$")
+
+def parse_area(text):
+    """Get the (min_lat, min_lon, max_lat, max_lon) of an area search text,
+    or None if it is not one"""
+    match = AREA_SEARCH.match(text)
+    if match is None:
+        return None
+    try:
+        lat1, lon1, lat2, lon2 = [float(value) for value in match.groups()]
+    except ValueError:
+        return None
+    return min(lat1, lat2), min(lon1, lon2), max(lat1, lat2), max(lon1, lon2)
+
 class ListSearch(object):
     """ Builds SQLite condition out of search parameters"""
     def __init__(self, sport_service, parent = None, pytrainer_main = None):
@@ -23,6 +40,7 @@ class ListSearch(object):
         self.uc = self.pytrainer_main.uc
         """ Initialize all query parameters to valid default values""" 
         self.title = ''
+        self.area = None
         self.sport = 0
         self.past = 0
         self.duration = 0
@@ -69,6 +87,13 @@ class ListSearch(object):
         if self.title != "":
             _search = "title like '%" +self.title + "%'"
             _add_and = True
+        if self.area is not None:
+            _here = self.pytrainer_main.record.getAreaCondition(*self.area)
+            if _add_and:
+                _search += " and " + _here
+            else:
+                _search = _here
+            _add_and = True
         if self.sport > 0:
             _sport = self.listSport[self.sport-1].id
             _here = "sport=%s" % _sport
@@ -175,6 +200,7 @@ class ListSearch(object):
     def reset_lsa(self):
         """ Reset all query parameters to default values """
         self.title = ''
+        self.area = None
         self.sport = 0
         self.past = 0
         self.duration = 0
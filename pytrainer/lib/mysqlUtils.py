@@ -21,6 +21,7 @@
 import _mysql_exceptions
 import MySQLdb
 import logging
+from contextlib import contextmanager
 
 # Fixed some issues with MySql tables creation (email from Jonas Liljenfeldt)
 class Sql:
@@ -30,6 +31,8 @@ class Sql:
         self.ddbb_host = host
         self.ddbb = ddbb
         self.db = None
+        # Depth of nested transactions, changes are only committed outside them
+        self.transaction_depth = 0
         
     def get_connection_url(self):
         return "mysql://{user}:{passwd}@{host}/{db}".format(user=self.ddbb_user, passwd=self.ddbb_pass, host=self.ddbb_host, db=self.ddbb)
@@ -75,6 +78,23 @@ class Sql:
     def disconnect(self):
         self.db.close()
     
+    def _commit(self):
+        if self.transaction_depth == 0:
+            self.db.commit()
+
+    @contextmanager
+    def transaction(self):
+        self.transaction_depth += 1
+        try:
+            yield
+        except:
+            self.transaction_depth -= 1
+            if self.transaction_depth == 0:
+                self.db.rollback()
+            raise
+        self.transaction_depth -= 1
+        self._commit()
+
     def createDDBB(self):
         self.db.query("create database %s" %self.ddbb)
         
@@ -125,6 +145,18 @@ class Sql:
         sql = '''insert into %s (%s) values (%s)'''  %(table,cells,string)
         self.db.query(sql)
 
+    def insert_many(self, table, cells, rows):
+        cur = self.db.cursor()
+        sql = "insert into %s (%s) values (%s)" % (table, cells, ",".join(["%s"] * len(cells.split(","))))
+        cur.executemany(sql, rows)
+        self._commit()
+
+    def update_many(self, table, cells, key, rows):
+        cur = self.db.cursor()
+        sql = "update %s set %s where %s=%%s" % (table, ",".join(["%s=%%s" % cell for cell in cells.split(",")]), key)
+        cur.executemany(sql, rows)
+        self._commit()
+
     def freeExec(self,sql):
         #self.db.query(sql)
         cur = self.db.cursor()
@@ -132,7 +164,7 @@ class Sql:
         retorno = []
         for row in cur.fetchall():
             retorno.append(row)
-            self.db.commit()
+            self._commit()
         return retorno
     
     def delete(self,table,condition):
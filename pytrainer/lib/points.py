@@ -2,7 +2,19 @@
 Matt King, 2005-06-16
 """
 
-import random
+import numpy
+
+# Levels are given to this fraction of the points, least significant first;
+# the remaining points get the highest level
+LEVEL_FRACTIONS = (('?', 0.65), ('@', 0.27), ('A', 0.05))
+TOP_LEVEL = 'B'
+
+# Characters of the encoding are 5 bit chunks offset by this value
+CHUNK_OFFSET = 63
+# Chunks with this bit set are followed by another chunk of the same value
+CONTINUATION = 0x20
+# Enough 5 bit chunks for any zigzag encoded coordinate delta
+MAX_CHUNKS = 7
 
 def decodePoints(points):
     """Decodes a string of locations encoded using the GMap encoding
@@ -10,101 +22,102 @@ def decodePoints(points):
     returns an array of lat/lon pairs [lat1,lon1,lat2,lon2,...]"""
     if not points:
         return []
-    Ch = len(points)
-    pb = 0
-    locations = []
-    Ka = 0
-    Pa = 0
-    while pb < Ch:
-        oc = 0
-        Fa = 0
-        while 1:
-            ub = ord(points[pb])-63
-            pb += 1
-            Fa |= (ub&31)<<oc
-            oc += 5
-            if ub < 32: break
-        if Fa & 1: i = ~(Fa>>1)
-        else: i = Fa>>1
-        Ka = Ka+i
-        locations.append(Ka*1.0E-5)
-
-        oc = 0
-        Fa = 0
-        while 1:
-            ub = ord(points[pb])-63
-            pb += 1
-            Fa |= (ub&31)<<oc
-            oc += 5
-            if ub < 32: break
-        if Fa & 1: i = ~(Fa>>1)
-        else: i = Fa>>1
-        Pa = Pa+i
-
-        locations.append(Pa*1.0E-5)
-
-    return locations
-
+    if isinstance(points, unicode):
+        #As read back from the database, the buffer of unicode is not its text
+        points = points.encode("ascii")
+    chunks = numpy.frombuffer(points, dtype=numpy.uint8).astype(numpy.int64) - CHUNK_OFFSET
+    #Each value ends with a chunk without the continuation bit
+    ends = numpy.flatnonzero(chunks < CONTINUATION)
+    if len(ends) < 2:
+        return []
+    #An incomplete value or lat without lon at the end is ignored
+    ends = ends[:len(ends) - len(ends) % 2]
+    chunks = chunks[:ends[-1] + 1]
+    starts = numpy.concatenate(([0], ends[:-1] + 1))
+    position = numpy.arange(len(chunks)) - numpy.repeat(starts, ends - starts + 1)
+    values = numpy.add.reduceat((chunks & 31) << (5 * position), starts)
+    #Undo the zigzag encoding of the signs
+    deltas = (values >> 1) ^ -(values & 1)
+    locations = numpy.cumsum(deltas.reshape(-1, 2), axis=0) * 1.0E-5
+    return locations.ravel().tolist()
 
 def encodePoints(locations):
     """Encodes lat/lon locations into a Gmap polyline encoding.
-    Accepts an array of lat/lon pairs [lat1,lon1,lat2,lon2,...] and
+    Accepts an array of lat/lon pairs [(lat1,lon1),(lat2,lon2),...] and
     returns 2 strings, the encoded points and the corresponding levels"""
-    points = []
-    levels = []
-    xo = yo = 0
-    for i in locations:
-        y = int(float(i[0])*100000)
-        yd = y - yo
-        yo = y
-        f = (abs(yd) << 1) - (yd<0)
-        while 1:
-            e = f & 31
-            f >>= 5
-            if f:
-                e |= 32
-            points.append(chr(e+63))
-            if f == 0: break
+    coords = numpy.asarray(locations, dtype=numpy.float64).reshape(-1, 2)
+    if not len(coords):
+        return "", ""
+    values = numpy.round(coords * 100000).astype(numpy.int64)
+    deltas = numpy.diff(values, axis=0, prepend=numpy.zeros((1, 2), dtype=numpy.int64)).ravel()
+    #Zigzag encode so small negative deltas have few significant bits
+    zigzag = (deltas << 1) ^ (deltas >> 63)
+    #Split into 5 bit chunks, least significant first
+    shifts = 5 * numpy.arange(MAX_CHUNKS)
+    shifted = zigzag[:, numpy.newaxis] >> shifts
+    count = numpy.maximum((shifted > 0).sum(axis=1), 1)
+    chunks = (shifted & 31) + CHUNK_OFFSET
+    chunks[numpy.arange(MAX_CHUNKS) < (count - 1)[:, numpy.newaxis]] += CONTINUATION
+    points = chunks[numpy.arange(MAX_CHUNKS) < count[:, numpy.newaxis]].astype(numpy.uint8).tostring()
+    return points, encodeLevels(coords)
+
+def significance(coords):
+    """Get how much each point matters to the shape of a line.
+
+    This is the area of the triangle a point forms with its neighbours
+    (the measure of Visvalingam-Whyatt line simplification), with longitude
+    scaled to the width of a degree at the mean latitude. The first and last
+    points are infinitely significant.
 
-        x = int(float(i[1])*100000)
-        xd = x - xo
-        xo = x
-        f = (abs(xd) << 1) - (xd<0)
-        while 1:
-            e = f & 31
-            f >>= 5
-            if f:
-                e |= 32
-            points.append(chr(e+63))
-            if f == 0: break
+    Args:
+        coords (numpy.ndarray): (lat, lon) rows.
+    Returns:
+        (numpy.ndarray): a significance for each point.
+    """
+    result = numpy.empty(len(coords))
+    result[[0, -1]] = numpy.inf
+    if len(coords) < 3:
+        return result
+    y = coords[:, 0]
+    x = coords[:, 1] * numpy.cos(numpy.radians(y.mean()))
+    result[1:-1] = 0.5 * numpy.abs((x[:-2] - x[2:]) * (y[1:-1] - y[:-2]) - (x[:-2] - x[1:-1]) * (y[2:] - y[:-2]))
+    return result
 
-        levels.append(nextLevel())
-    levels[0] = 'B'
-    levels[-1] = 'B'
-    return "".join(points), "".join(levels)
+def encodeLevels(coords):
+    """Get the zoom level of each point, from its significance.
 
-def nextLevel():
-    r = random.random()
-    if r < 0.65: return '?'
-    if r < 0.92: return '@'
-    if r < 0.97: return 'A'
-    return 'B'
+    Levels are handed out in the LEVEL_FRACTIONS proportions, so the most
+    significant points are shown at more zoom levels. Ties are broken by
+    position, so the result is deterministic.
+    """
+    ranks = numpy.empty(len(coords), dtype=numpy.int64)
+    ranks[numpy.argsort(significance(coords), kind="mergesort")] = numpy.arange(len(coords))
+    levels = numpy.empty(len(coords), dtype="S1")
+    levels[:] = TOP_LEVEL
+    lower = 0.0
+    for level, fraction in LEVEL_FRACTIONS:
+        upper = lower + fraction
+        levels[(ranks >= lower * len(coords)) & (ranks < upper * len(coords))] = level
+        lower = upper
+    levels[[0, -1]] = TOP_LEVEL
+    return levels.tostring()
 
 if __name__ == '__main__':
+    import math
+    import timeit
     locs = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
-    locs = [(37.4419, -122.1419),(37.4519, -122.1519),( 37.4619, -122.1819)]
     points, levels = encodePoints(locs)
     print points
     print levels
+    assert(points == "_p~iF~ps|U_ulLnnqC_mqNvxq`@")
     decodedLocs = decodePoints(points)
-    print decodePoints(points)
-    def _cmpFloat(x,y):
-        if abs(x-y) > 0.0001: return 0
-        return 1
-
-    assert(len(locs) == len(decodedLocs))
+    print decodedLocs
     assert(len(levels) == 3)
     for i in range(len(locs)):
-        assert(_cmpFloat(locs[i], decodedLocs[i]))
-
-    
+        assert(abs(locs[i][0] - decodedLocs[2*i]) < 0.00001)
+        assert(abs(locs[i][1] - decodedLocs[2*i+1]) < 0.00001)
+    #Benchmark on a long track
+    track = [(43.5 + 0.01 * math.sin(i / 500.0), -5.6 + 0.00001 * i) for i in xrange(50000)]
+    encoded = encodePoints(track)[0]
+    print "encodePoints 50k points: %0.1f ms" % (min(timeit.repeat(lambda: encodePoints(track), number=1, repeat=5)) * 1000)
+    print "decodePoints 50k points: %0.1f ms" % (min(timeit.repeat(lambda: decodePoints(encoded), number=1, repeat=5)) * 1000)
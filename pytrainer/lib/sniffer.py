@@ -0,0 +1,164 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+"""Detect the format of files to import from their first bytes.
+
+Each importer in the imports directory declares the signatures of the files
+it reads in a signatures class attribute. Checking a file then costs a
+single small read, and only the importers whose signatures match have their
+(expensive) testFile called.
+"""
+
+import glob
+import logging
+import os
+import sys
+
+from lxml import etree
+
+HEAD_SIZE = 4096
+# Longest prolog (declaration, comments, doctype) read looking for the root element
+MAX_HEAD_SIZE = 65536
+
+class FileHead(object):
+
+    """The first bytes of a file, with the root element if it is XML."""
+
+    def __init__(self, filename, size=HEAD_SIZE):
+        self.filename = filename
+        self.extension = os.path.splitext(filename)[1].lower()
+        with open(filename, "rb") as head_file:
+            self.data = head_file.read(size)
+            self.namespace, self.root = self._find_root(self.data)
+            while self.root is None and self._is_xml() and len(self.data) < MAX_HEAD_SIZE:
+                more = head_file.read(len(self.data))
+                if not more:
+                    break
+                self.data += more
+                self.namespace, self.root = self._find_root(self.data)
+
+    def _is_xml(self):
+        return self.data.lstrip("\xef\xbb\xbf \t\r\n").startswith("<")
+
+    def _find_root(self, data):
+        """Get the namespace and name of the first element in data."""
+        if not self._is_xml():
+            return None, None
+        parser = etree.XMLPullParser(events=("start",))
+        try:
+            parser.feed(data)
+        except etree.XMLSyntaxError:
+            #Truncated, or a fragment with several top elements
+            pass
+        for event, element in parser.read_events():
+            tag = etree.QName(element)
+            return tag.namespace, tag.localname
+        return None, None
+
+class Signature(object):
+
+    """What the files of a format look like.
+
+    Every criterion given must match:
+        extensions: file name extensions, e.g. (".gpx",).
+        magic: bytes found at offset magic_offset.
+        root: name of the root (first) element of XML files.
+        namespace: namespace of the root element, None for no namespace if
+            root is given.
+    """
+
+    def __init__(self, extensions=None, magic=None, magic_offset=0, root=None, namespace=None):
+        self.extensions = tuple(extension.lower() for extension in extensions) if extensions else None
+        self.magic = magic
+        self.magic_offset = magic_offset
+        self.root = root
+        self.namespace = namespace
+
+    def matches(self, head):
+        if self.extensions is not None and head.extension not in self.extensions:
+            return False
+        if self.magic is not None and head.data[self.magic_offset:self.magic_offset + len(self.magic)] != self.magic:
+            return False
+        if self.root is not None and (head.root != self.root or head.namespace != self.namespace):
+            return False
+        return True
+
+def importer_name(filename):
+    """Get the class name of an importer from its file name, file_<name>.py."""
+    return os.path.splitext(os.path.basename(filename))[0][len("file_"):]
+
+class ImporterRegistry(object):
+
+    """The importers of a pytrainer installation and their signatures.
+
+    Importers are loaded from data_path/imports/file_*.py once, and kept in
+    the order of their file names.
+    """
+
+    def __init__(self, data_path):
+        self.data_path = data_path
+        self.importers = self._load()
+
+    def _load(self):
+        importers = []
+        imports_path = os.path.join(self.data_path, "imports")
+        if imports_path not in sys.path:
+            sys.path.insert(0, imports_path)
+        for processingFile in sorted(glob.glob(os.path.join(imports_path, "file_*.py"))):
+            module_name = os.path.splitext(os.path.basename(processingFile))[0]
+            try:
+                module = __import__(module_name)
+                importers.append(getattr(module, importer_name(processingFile)))
+            except Exception as e:
+                logging.error("Unable to load importer %s: %s" % (module_name, e))
+        return importers
+
+    def candidates(self, filename):
+        """Get the importer classes whose signatures match a file.
+
+        Importers without signatures match every file, after the others.
+        """
+        try:
+            head = FileHead(filename)
+        except IOError as e:
+            logging.error("Unable to read %s: %s" % (filename, e))
+            return []
+        matching = []
+        unknown = []
+        for importer in self.importers:
+            signatures = getattr(importer, "signatures", None)
+            if signatures is None:
+                unknown.append(importer)
+            elif any(signature.matches(head) for signature in signatures):
+                matching.append(importer)
+        logging.debug("Importers for %s: %s" % (filename, [importer.__name__ for importer in matching + unknown]))
+        return matching + unknown
+
+    def identify(self, filename, parent=None):
+        """Get an importer that reads a file.
+
+        The importers whose signatures match are instantiated and their
+        testFile called in turn.
+
+        Returns:
+            the instance of the first importer whose testFile accepts the
+            file, or None.
+        """
+        for importer in self.candidates(filename):
+            processClass = importer(parent, self.data_path)
+            if processClass.testFile(filename):
+                return processClass
+        return None
@@ -21,6 +21,7 @@
 import logging
 import sys, traceback, commands
 import datetime
+from contextlib import contextmanager
 try:
     from sqlite3 import dbapi2 as sqlite
 except ImportError:
@@ -31,6 +32,8 @@ except ImportError:
 class Sql:
     def __init__(self,host=None, ddbb = None, user = None, password = None, configuration = None):
         self.db = None
+        # Depth of nested transactions, changes are only committed outside them
+        self.transaction_depth = 0
         confdir = configuration.confdir
         self.ddbb = "%s/pytrainer.ddbb" %confdir
         
@@ -51,6 +54,28 @@ class Sql:
     def disconnect(self):
         self.db.close()
     
+    def _commit(self):
+        if self.transaction_depth == 0:
+            self.db.commit()
+
+    @contextmanager
+    def transaction(self):
+        """Make the changes in the block in a single transaction.
+
+        They are committed together at the end of the outermost block, or
+        rolled back if it raises.
+        """
+        self.transaction_depth += 1
+        try:
+            yield
+        except:
+            self.transaction_depth -= 1
+            if self.transaction_depth == 0:
+                self.db.rollback()
+            raise
+        self.transaction_depth -= 1
+        self._commit()
+
     def createDDBB(self):
         pass
         
@@ -97,9 +122,21 @@ class Sql:
         sql = "insert into %s (%s) values (%s)"  %(table,cells,string)
         logging.debug('SQL sentence: '+str(sql))
         cur.execute(sql)
-        self.db.commit()
+        self._commit()
         logging.debug('<<')
         
+    def insert_many(self, table, cells, rows):
+        cur = self.db.cursor()
+        sql = "insert into %s (%s) values (%s)" % (table, cells, ",".join(["?"] * len(cells.split(","))))
+        cur.executemany(sql, rows)
+        self._commit()
+
+    def update_many(self, table, cells, key, rows):
+        cur = self.db.cursor()
+        sql = "update %s set %s where %s=?" % (table, ",".join(["%s=?" % cell for cell in cells.split(",")]), key)
+        cur.executemany(sql, rows)
+        self._commit()
+
     def _to_sql_value(self, value):
         logging.debug('>>')
         logging.debug('Value: %s | type: %s ' %(value,type(value)))
@@ -121,14 +158,14 @@ class Sql:
         retorno = []
         for row in cur:
             retorno.append(row)
-        self.db.commit()
+        self._commit()
         return retorno
 
     def delete(self,table,condition):
         cur = self.db.cursor()  
         sql = "delete from %s where %s"  %(table,condition)
         cur.execute(sql)
-        self.db.commit()
+        self._commit()
 
     def update(self,table,cells,values, condition):
         cur = self.db.cursor()  
@@ -144,7 +181,7 @@ class Sql:
         string +=" where %s" %condition
         sql = "update %s set %s" %(table,string)
         cur.execute(sql)
-        self.db.commit()
+        self._commit()
 
     def select(self,table,cells,condition, mod=None):
         cur = self.db.cursor()
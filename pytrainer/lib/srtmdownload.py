@@ -15,11 +15,14 @@
 #Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
 
 import os
-import gtk
+import shutil
+import threading
 import urllib2
 import zipfile
-from cStringIO import StringIO
 import logging
+from multiprocessing.pool import ThreadPool
+
+from pytrainer.lib.srtmtiff import tile_paths
 
 """
 A list of servers providing SRTM data in GeoTIFF.
@@ -33,113 +36,214 @@ srtm_server_list = [
     {'url' : 'http://hypersphere.telascience.org/elevation/cgiar_srtm_v4/tiff/zip/', 'ext' : '.ZIP', 'active' : False }
     ]
 
-global loopActive
+SRTM_DIR = os.path.expanduser('~/.pytrainer/SRTM_data')
+CHUNK_SIZE = 64 * 1024
+#Tiles downloaded at once
+DOWNLOAD_JOBS = 4
+TIMEOUT = 60
+
+class DownloadCancelled(Exception):
+    pass
+
+class TileDownloader(object):
+    """
+    Downloads zipped GeoTIFF tiles from the SRTM servers.
+
+    Archives are streamed to a .part file next to the tile, which an
+    interrupted download resumes from with an HTTP Range request. Once
+    complete the archive is checked and the GeoTIFF extracted from it.
 
-class DownloadLoop:
-    """ 
-    Download GeoTIFF in partial chunks. Between chunks check gtk.min_iteration
-    and update progressbar. Threadless Implementation.
+    Progress is reported by calling progress(tile_name, size_got,
+    size_total), size_total being 0 if unknown, from the thread
+    downloading the tile. cancel() stops all downloads at their next
+    chunk, leaving the .part files to be resumed.
     """
-    srtm_dir = os.path.expanduser('~/.pytrainer/SRTM_data')
-    
-    def __init__(self, progressbar, label, tile_name):
-        self.progressbar = progressbar
-        self.label = label
-        self.tile_name = tile_name
-    
-    def run(self):
+
+    def __init__(self, srtm_dir=SRTM_DIR, servers=None, progress=None, chunk_size=CHUNK_SIZE):
+        self.srtm_dir = srtm_dir
+        if servers is None:
+            servers = [server for server in srtm_server_list if server['active']]
+        self.servers = servers
+        self.progress = progress
+        self.chunk_size = chunk_size
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def tile_path(self, tile_name):
+        return os.path.join(self.srtm_dir, '%s.tif' % tile_name)
+
+    def has_tile(self, tile_name):
+        """Whether a tile is already there, as GeoTIFF or converted."""
+        tif_path = self.tile_path(tile_name)
+        return os.path.isfile(tif_path) or all(os.path.isfile(path) for path in tile_paths(tif_path))
+
+    def download(self, tile_name):
+        """
+        Downloads a tile, trying each server in turn.
+
+        Returns (str): the path of the GeoTIFF file, or None if no server
+        provided it.
+        """
         logging.debug(">>")
-        global loopActive
-        
-        #print 'Loop started', loopActive
-                
-        srtm_filename = '%s.tif' % self.tile_name
         if not os.path.isdir(self.srtm_dir):
-            os.mkdir(self.srtm_dir)             
-        
-        urlfile = self.get_urlfile()
-        if not urlfile:
-            return False
-        
-        try:
-            size_total = int(urlfile.info().getheader('Content-Length').strip())
-        except:
-            size_total = 0
-
-        if size_total == 0:
-            loopActive = False
-        #print 'Total size:', size_total
-        
-        size_chunk = 4096 #8192
-        size_got = 0
-        zobj = StringIO()  
-        
-        while loopActive:
-            while gtk.events_pending():
-                gtk.main_iteration(block = False)            
-            chunk = urlfile.read(size_chunk)
-            size_got+= size_chunk
-            if chunk:
-                zobj.write( chunk )
-                size_rel = min (1.0, size_got / (1.0 * size_total))
-                #print "Read %s Percent." % (round(100*size_rel, 1))
-                self.progressbar.set_fraction( size_rel )                
-            else:
-                loopActive = False                
-        if size_rel == 1.0:
-            print "start unzip"
-            z = zipfile.ZipFile(zobj)
-            srtm_path = os.path.join(self.srtm_dir, srtm_filename)
-            out_file = open(srtm_path, 'w')
-            out_file.write(z.read(srtm_filename))
-            z.close()
-            zobj.close
-            out_file.close()
+            try:
+                os.makedirs(self.srtm_dir)
+            except OSError:
+                #Created by another download meanwhile
+                if not os.path.isdir(self.srtm_dir):
+                    raise
+        for server in self.servers:
+            if self.cancelled:
+                break
+            url = '%s%s%s' % (server['url'], tile_name, server['ext'])
+            #Named after the server, a partial archive is only resumed from the same one
+            part_path = os.path.join(self.srtm_dir, '%s%s.part' % (tile_name, server['ext']))
+            try:
+                self._fetch(tile_name, url, part_path)
+                self._extract(tile_name, part_path)
+            except DownloadCancelled:
+                logging.debug("Download of %s cancelled" % url)
+                break
+            except zipfile.BadZipfile as e:
+                logging.debug("Bad archive from %s: %s" % (url, e))
+                os.remove(part_path)
+                continue
+            except IOError as e:
+                #urllib2 errors are IOErrors too
+                logging.debug("%s FAILED: %s" % (url, e))
+                continue
+            os.remove(part_path)
             logging.debug("<<")
-            return True     # Hooray, got file                    
+            return self.tile_path(tile_name)
         logging.debug("<<")
-        return False
-            
-    def get_urlfile(self):
-        """  Go through SRTM Servers """
-        logging.debug('--')
-        for server in srtm_server_list:
-            url = '%s%s%s' % (server['url'], self.tile_name, server['ext']) 
-            print "Attempting to get URL: %s" % url
-            logging.debug("Attempting to get URL: %s" % url)
+        return None
+
+    def download_all(self, tile_names, jobs=DOWNLOAD_JOBS):
+        """
+        Downloads several tiles concurrently, skipping those already there.
+
+        Returns (dict): path of the GeoTIFF file, or None, by tile name.
+        """
+        results = {}
+        missing = []
+        for tile_name in set(tile_names):
+            if self.has_tile(tile_name):
+                results[tile_name] = self.tile_path(tile_name)
+            else:
+                missing.append(tile_name)
+        if len(missing) == 1 or jobs <= 1:
+            results.update((tile_name, self.download(tile_name)) for tile_name in missing)
+        elif missing:
+            pool = ThreadPool(min(jobs, len(missing)))
             try:
-                urlfile = urllib2.urlopen( url )
-                self.label.set_text(str(url))
-                return urlfile
-            except:
-                print '%s FAILED' % url
-                logging.debug('%s FAILED' % url)
-                pass
+                results.update(zip(missing, pool.map(self.download, missing)))
+            finally:
+                pool.close()
+                pool.join()
+        return results
 
+    def _report(self, tile_name, size_got, size_total):
+        if self.progress is not None:
+            self.progress(tile_name, size_got, size_total)
 
-def main_quit(obj):
-    logging.debug("--")
-    global loopActive
-    print 'main_quit entered'
-    loopActive = False
+    def _fetch(self, tile_name, url, part_path):
+        """Downloads url to part_path, resuming from what it holds."""
+        logging.debug("Attempting to get URL: %s" % url)
+        size_got = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+        request = urllib2.Request(url)
+        if size_got:
+            request.add_header('Range', 'bytes=%d-' % size_got)
+        try:
+            urlfile = urllib2.urlopen(request, timeout=TIMEOUT)
+        except urllib2.HTTPError as e:
+            if e.code == 416:
+                #Nothing left, the archive is already complete
+                return
+            raise
+        try:
+            try:
+                size_left = int(urlfile.info().getheader('Content-Length').strip())
+            except (AttributeError, ValueError):
+                size_left = 0
+            #Anything but a partial content response holds the whole archive
+            if urlfile.getcode() != 206:
+                size_got = 0
+            size_total = size_got + size_left if size_left else 0
+            with open(part_path, 'ab' if size_got else 'wb') as part_file:
+                self._report(tile_name, size_got, size_total)
+                while True:
+                    if self.cancelled:
+                        raise DownloadCancelled()
+                    chunk = urlfile.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    part_file.write(chunk)
+                    size_got += len(chunk)
+                    self._report(tile_name, size_got, size_total)
+        finally:
+            urlfile.close()
+        if size_total and size_got != size_total:
+            raise IOError("Download of %s incomplete: %d of %d bytes" % (url, size_got, size_total))
+
+    def _extract(self, tile_name, part_path):
+        """Checks the archive and extracts the GeoTIFF file from it."""
+        tif_name = '%s.tif' % tile_name
+        tif_path = self.tile_path(tile_name)
+        archive = zipfile.ZipFile(part_path)
+        try:
+            bad_member = archive.testzip()
+            if bad_member is not None:
+                raise zipfile.BadZipfile("CRC error in %s" % bad_member)
+            try:
+                member = archive.open(tif_name)
+            except KeyError:
+                raise zipfile.BadZipfile("%s not in archive" % tif_name)
+            try:
+                with open(tif_path + '.part', 'wb') as tif_file:
+                    shutil.copyfileobj(member, tif_file, self.chunk_size)
+            finally:
+                member.close()
+        finally:
+            archive.close()
+        os.rename(tif_path + '.part', tif_path)
 
 def download(tile_name):
+    """
+    Downloads a tile showing its progress in a dialog.
+
+    Returns (bool): whether the tile was downloaded.
+    """
     logging.debug(">>")
-    global loopActive
-    loopActive = True
-    result = False
+    import gtk
     window = gtk.Dialog()
     window.set_title('Download GeoTIFF')
     labelH = gtk.Label('<b>Downloading Tile %s</b>' % tile_name)
     labelH.set_use_markup(True)
     labelH.set_alignment(0, 1)
-    
+
     label = gtk.Label('Searching for Server ...')
     progressbar = gtk.ProgressBar()
 
-    window.connect('destroy', main_quit)
+    def progress(tile_name, size_got, size_total):
+        label.set_text('%d kB' % (size_got / 1024))
+        if size_total:
+            progressbar.set_fraction(min(1.0, size_got / (1.0 * size_total)))
+        else:
+            progressbar.pulse()
+        #Threadless, keep the dialog responsive between chunks
+        while gtk.events_pending():
+            gtk.main_iteration(block = False)
+
+    downloader = TileDownloader(progress=progress)
+    window.connect('destroy', lambda obj: downloader.cancel())
     button = gtk.Button(stock=gtk.STOCK_CANCEL)
-    button.connect("clicked", main_quit)
+    button.connect("clicked", lambda obj: downloader.cancel())
 
     window.vbox.pack_start(labelH, expand=False, padding=3)
     window.vbox.pack_start(label, expand=False, padding=3)
@@ -147,8 +251,7 @@ def download(tile_name):
     window.action_area.pack_start(button, expand=False)
     window.show_all()
 
-    lp = DownloadLoop(progressbar, label, tile_name)
-    result = lp.run()
+    result = downloader.download(tile_name) is not None
     try:
         window.destroy()
     except:
@@ -3,57 +3,212 @@ import os, stat, sys
 import logging
 
 import random, re, urllib2, zipfile
+from collections import OrderedDict
 from math import floor, ceil
 from cStringIO import StringIO
-from osgeo import gdal, gdalnumeric
 
-from pytrainer.lib.srtmtiff import SrtmTiff
-import srtmdownload
+import numpy
+
+from pytrainer.lib import srtmdownload
+from pytrainer.lib.srtmdownload import SRTM_DIR
+from pytrainer.lib.srtmtiff import SrtmTiff, bilinear_interpolation, tile_paths
+
+#Enough for the four tiles around a corner
+CACHE_BYTES = 4 * 6000 * 6000 * 2
+#Tiles are numbered from 1, 72 around the globe
+TILE_COLUMNS = 72
+
+class TileCache(object):
+    """
+    Least recently used tiles, up to a number of bytes of tile data.
+
+    The most recently used tile is kept even if it is larger than the
+    budget on its own.
+    """
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._tiles = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._tiles
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def get(self, key):
+        tile = self._tiles.pop(key, None)
+        if tile is not None:
+            self._tiles[key] = tile
+        return tile
+
+    def put(self, key, tile):
+        if key in self._tiles:
+            self.nbytes -= self._tiles.pop(key).nbytes
+        self._tiles[key] = tile
+        self.nbytes += tile.nbytes
+        while self.nbytes > self.max_bytes and len(self._tiles) > 1:
+            evicted_key, evicted = self._tiles.popitem(last=False)
+            logging.debug("Evicting SRTM tile %s" % evicted_key)
+            self.nbytes -= evicted.nbytes
 
 class SrtmLayer(object):
     """
     Provides an interface to SRTM elevation data stored in GeoTIFF files.
     Files are automaticly downloaded from mirror server and cached.
-    
+
     Sample usage:
-    
+
         >>> lat = 52.25
         >>> lon = 16.75
         >>> srtm = SrtmLayer()
         >>> ele = srtm.get_elevation(lat, lon)
         >>> round(ele, 4)
         63.9979
-        
+
     """
-    _cache = {}
-      
+
+    def __init__(self, srtm_dir=SRTM_DIR, max_bytes=CACHE_BYTES, download=True):
+        self.srtm_dir = srtm_dir
+        #Whether to download missing tiles, showing their progress in a dialog
+        self.download = download
+        self._cache = TileCache(max_bytes)
+        #Tiles that could not be downloaded, not to try again
+        self._missing = set()
+
     def get_srtm_filename(self, lat, lon):
         """
         Filename of GeoTIFF file containing data with given coordinates.
         """
         colmin = floor((6000 * (180 + lon)) / 5)
         rowmin = floor((6000 * (60 - lat)) / 5)
-    
+
         ilon = ceil(colmin / 6000.0)
         ilat = ceil(rowmin / 6000.0)
-        
+
         return 'srtm_%02d_%02d.tif' % (ilon, ilat)
-        
-    def get_elevation(self, lat, lon):
+
+    def get_srtm_tiles(self, lats, lons):
         """
-        Returns the elevation in metres of point (lat, lon).
+        (column, row) numbers of the GeoTIFF files containing each point.
+        """
+        colmin = numpy.floor((6000 * (180 + numpy.asarray(lons, dtype=numpy.float64))) / 5)
+        rowmin = numpy.floor((6000 * (60 - numpy.asarray(lats, dtype=numpy.float64))) / 5)
+        return numpy.ceil(colmin / 6000.0).astype(int), numpy.ceil(rowmin / 6000.0).astype(int)
+
+    def get_srtm_tile_names(self, lats, lons):
         """
-        srtm_filename = self.get_srtm_filename(lat, lon)
-        if srtm_filename not in self._cache:
-            srtm_path = os.path.join(os.path.expanduser('~/.pytrainer/SRTM_data'), srtm_filename)
-            if not os.path.isfile(srtm_path):
-                result = srtmdownload.download( srtm_filename[:-4] )
-                if not result:
-                    return False
+        Names of the tiles containing any of the points, as downloaded.
+        """
+        ilons, ilats = self.get_srtm_tiles(lats, lons)
+        return sorted(set('srtm_%02d_%02d' % tile for tile in zip(ilons, ilats)))
+
+    def _get_tile(self, srtm_filename):
+        """
+        The SrtmTiff for a file, downloading it if needed, or None if it
+        is not available.
+        """
+        srtm = self._cache.get(srtm_filename)
+        if srtm is not None:
+            return srtm
+        if srtm_filename in self._missing:
+            return None
+        srtm_path = os.path.join(self.srtm_dir, srtm_filename)
+        data_path, header_path = tile_paths(srtm_path)
+        converted = os.path.isfile(data_path) and os.path.isfile(header_path)
+        if not converted and not os.path.isfile(srtm_path):
+            if not self.download:
+                self._missing.add(srtm_filename)
+                return None
+            result = srtmdownload.download(srtm_filename[:-4])
+            if not result:
+                self._missing.add(srtm_filename)
+                return None
+        else:
+            logging.debug("File already downloaded (%s)" % srtm_filename)
+        srtm = SrtmTiff(srtm_path)
+        self._cache.put(srtm_filename, srtm)
+        return srtm
+
+    def _get_neighbour(self, ilon, ilat, dlon, dlat):
+        """
+        The SrtmTiff dlon tiles east and dlat tiles south of a tile, or
+        None if it is not available.
+        """
+        ilon = (ilon + dlon - 1) % TILE_COLUMNS + 1
+        return self._get_tile('srtm_%02d_%02d.tif' % (ilon, ilat + dlat))
+
+    def _get_values(self, ilon, ilat, srtm, rows, columns):
+        """
+        Values of a tile at integer positions, which may be one past its
+        last row or column, in the first of the tiles next to it.
+        """
+        data = srtm.tile['data']
+        ysize, xsize = data.shape
+        south = rows >= ysize
+        east = columns >= xsize
+        values = numpy.empty(len(rows))
+        inside = ~(south | east)
+        values[inside] = data[rows[inside], columns[inside]]
+        for dlon, dlat, points in ((1, 0, east & ~south), (0, 1, south & ~east), (1, 1, south & east)):
+            if not points.any():
+                continue
+            neighbour = self._get_neighbour(ilon, ilat, dlon, dlat)
+            if neighbour is None:
+                #Without the neighbour, repeat the edge of this tile
+                values[points] = data[numpy.minimum(rows[points], ysize - 1),
+                                      numpy.minimum(columns[points], xsize - 1)]
             else:
-                print "File already downloaded (%s)" % srtm_filename
-                            
-            self._cache[srtm_filename] = SrtmTiff(srtm_path)
-        
-        srtm = self._cache[srtm_filename]
-        return srtm.get_elevation(lat, lon)
+                values[points] = neighbour.tile['data'][rows[points] - dlat * ysize,
+                                                        columns[points] - dlon * xsize]
+        return values
+
+    def _interpolate(self, ilon, ilat, srtm, lats, lons):
+        """
+        Elevations of points in a tile, reading the tiles next to it for
+        points in its last row or column.
+        """
+        rows_f, columns_f = srtm.pos_from_lat_lon(lats, lons)
+        ysize, xsize = srtm.tile['data'].shape
+        rows = numpy.clip(numpy.floor(rows_f).astype(numpy.intp), 0, ysize - 1)
+        columns = numpy.clip(numpy.floor(columns_f).astype(numpy.intp), 0, xsize - 1)
+        tl = self._get_values(ilon, ilat, srtm, rows, columns)
+        tr = self._get_values(ilon, ilat, srtm, rows, columns + 1)
+        bl = self._get_values(ilon, ilat, srtm, rows + 1, columns)
+        br = self._get_values(ilon, ilat, srtm, rows + 1, columns + 1)
+        return bilinear_interpolation(tl, tr, bl, br, rows_f - rows, columns_f - columns)
+
+    def get_elevations(self, lats, lons):
+        """
+        Returns (float array) the elevations in metres of many points, NaN
+        for those whose data is not available.
+
+        Points are grouped by tile, so each tile is looked up once.
+        """
+        lats = numpy.asarray(lats, dtype=numpy.float64)
+        lons = numpy.asarray(lons, dtype=numpy.float64)
+        elevations = numpy.empty(len(lats))
+        elevations.fill(numpy.nan)
+        if not len(lats):
+            return elevations
+        ilons, ilats = self.get_srtm_tiles(lats, lons)
+        tiles, groups = numpy.unique(ilons * 100 + ilats, return_inverse=True)
+        for group, tile in enumerate(tiles):
+            ilon, ilat = divmod(tile, 100)
+            srtm = self._get_tile('srtm_%02d_%02d.tif' % (ilon, ilat))
+            if srtm is None:
+                continue
+            points = groups == group
+            elevations[points] = self._interpolate(ilon, ilat, srtm, lats[points], lons[points])
+        return elevations
+
+    def get_elevation(self, lat, lon):
+        """
+        Returns the elevation in metres of point (lat, lon), or False if
+        its data is not available.
+        """
+        elevation = self.get_elevations([lat], [lon])[0]
+        if numpy.isnan(elevation):
+            return False
+        return float(elevation)
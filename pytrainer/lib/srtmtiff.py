@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 
+import json
 import logging
-from math import floor
-from osgeo import gdal, gdalnumeric
+import os
+
+import numpy
 
 # from gpxtools
 def bilinear_interpolation(tl, tr, bl, br, a, b):
@@ -33,27 +35,66 @@ def bilinear_interpolation(tl, tr, bl, br, a, b):
     b4 = tl - bl - tr + br
 
     return b1 + b2 * a + b3 * b + b4 * a * b
-    
+
+def interpolate(data, rows, columns):
+    """
+    Bilinear interpolation of a grid at many positions at once.
+
+    :Parameters:
+        data : 2D array
+            grid values
+        rows, columns : float arrays
+            positions in the grid, in pixels
+
+    :Returns: (float array)
+        interpolated values
+    """
+    rows = numpy.asarray(rows, dtype=numpy.float64)
+    columns = numpy.asarray(columns, dtype=numpy.float64)
+    row = numpy.clip(numpy.floor(rows).astype(numpy.intp), 0, data.shape[0] - 2)
+    column = numpy.clip(numpy.floor(columns).astype(numpy.intp), 0, data.shape[1] - 2)
+    #As floats, int16 differences could overflow
+    tl = data[row, column].astype(numpy.float64)
+    tr = data[row, column + 1].astype(numpy.float64)
+    bl = data[row + 1, column].astype(numpy.float64)
+    br = data[row + 1, column + 1].astype(numpy.float64)
+    return bilinear_interpolation(tl, tr, bl, br, rows - row, columns - column)
+
+def tile_paths(filename):
+    """
+    Paths of the .npy data and .json header files of a GeoTIFF file.
+    """
+    base = os.path.splitext(filename)[0]
+    return base + '.npy', base + '.json'
 
 class SrtmTiff(object):
     """
     Provides an interface to SRTM elevation data stored in GeoTIFF file.
-    
+
+    On first use the GeoTIFF data is converted to a flat .npy file, with
+    its georeference in a .json file alongside, which later loads are
+    memory mapped from: only the parts of a tile that are used are read.
+
     Based on code from `eleserver` code by grahamjones139.
     http://code.google.com/p/eleserver/
     """
-    tile = {}
-    
+
     def __init__(self, filename):
         """
-        Reads the GeoTIFF files into memory ready for processing.
+        Maps the tile data of the GeoTIFF file into memory ready for
+        processing.
         """
         self.tile = self.load_tile(filename)
-    
+
+    @property
+    def nbytes(self):
+        """Size in bytes of the tile data."""
+        return self.tile['data'].nbytes
+
     def load_tile(self, filename):
         """
-        Loads a GeoTIFF tile from disk and returns a dictionary containing
-        the file data, plus metadata about the tile.
+        Loads a tile from disk and returns a dictionary containing the
+        file data, plus metadata about the tile.
 
         The dictionary returned by this function contains the following data:
             xsize - the width of the tile in pixels.
@@ -63,18 +104,22 @@ class SrtmTiff(object):
             lat_pixel - the height of one pixel in degrees latitude.
             lon_pixel - the width of one pixel in degrees longitude.
             N, S, E, W - the bounding box for this tile in degrees.
-            data - a two dimensional array containing the tile data.
+            data - a two dimensional, read only, memory mapped array
+                   containing the tile data.
 
         """
-        dataset = gdal.Open(filename)
-        geotransform = dataset.GetGeoTransform()
-        xsize = dataset.RasterXSize
-        ysize = dataset.RasterYSize
+        data_path, header_path = tile_paths(filename)
+        if not (os.path.isfile(data_path) and os.path.isfile(header_path)):
+            self.convert(filename, data_path, header_path)
+        with open(header_path) as header_file:
+            geotransform = json.load(header_file)['geotransform']
+        data = numpy.load(data_path, mmap_mode='r')
+        ysize, xsize = data.shape
         lon_origin = geotransform[0]
         lat_origin = geotransform[3]
         lon_pixel = geotransform[1]
         lat_pixel = geotransform[5]
-        
+
         retdict = {
             'xsize': xsize,
             'ysize': ysize,
@@ -86,60 +131,51 @@ class SrtmTiff(object):
             'S': lat_origin + lat_pixel*ysize,
             'E': lon_origin + lon_pixel*xsize,
             'W': lon_origin,
-            'dataset': dataset,
+            'data': data,
             }
-        
-        return retdict  
 
-    def pos_from_lat_lon(self, lat, lon):
+        return retdict
+
+    def convert(self, filename, data_path, header_path):
+        """
+        Converts a GeoTIFF file to the .npy data and .json header files
+        tiles are loaded from.
+        """
+        logging.debug("Converting %s" % filename)
+        #GDAL is only needed to read GeoTIFF files
+        from osgeo import gdal, gdalnumeric
+        dataset = gdal.Open(filename)
+        data = gdalnumeric.DatasetReadAsArray(dataset).astype(numpy.int16)
+        #Written aside and renamed, so an interrupted conversion is not used
+        with open(data_path + '.part', 'wb') as data_file:
+            numpy.save(data_file, data)
+        os.rename(data_path + '.part', data_path)
+        with open(header_path + '.part', 'w') as header_file:
+            json.dump({'geotransform': list(dataset.GetGeoTransform())}, header_file)
+        os.rename(header_path + '.part', header_path)
+
+    def pos_from_lat_lon(self, lats, lons):
         """
-        Converts coordinates (lat,lon) into the appropriate (row,column)
-        position in the GeoTIFF tile data stored in td.
+        Converts coordinates into fractional (row, column) positions in
+        the GeoTIFF tile data.
         """
         td = self.tile
-        N = td['N']
-        S = td['S']
-        E = td['E']
-        W = td['W']
-        lat_pixel = td['lat_pixel']
-        lon_pixel = td['lon_pixel']
-        xsize = td['xsize']
-        ysize = td['ysize']
-        
-        rowno_f = (lat-N)/lat_pixel
-        colno_f = (lon-W)/lon_pixel
-        rowno = int(floor(rowno_f))
-        colno = int(floor(colno_f))
-
-        # Error checking to correct any rounding errors.
-        if (rowno<0):
-            rowno = 0
-        if (rowno>(xsize-1)):
-            rowno = xsize-1
-        if (colno<0):
-            colno = 0
-        if (colno>(ysize-1)):
-            colno = xsize-1
-            
-        return (rowno, colno, rowno_f, colno_f)
-    
+        rows = (numpy.asarray(lats, dtype=numpy.float64) - td['N']) / td['lat_pixel']
+        columns = (numpy.asarray(lons, dtype=numpy.float64) - td['W']) / td['lon_pixel']
+        return rows, columns
+
+    def get_elevations(self, lats, lons):
+        """
+        Returns (float array) the elevations in metres of points in the
+        tile, interpolating the SRTM data bilinearly.
+        """
+        #Points in the last row or column are extrapolated from the one
+        #before, SrtmLayer reads the neighbour tiles instead
+        rows, columns = self.pos_from_lat_lon(lats, lons)
+        return interpolate(self.tile['data'], rows, columns)
+
     def get_elevation(self, lat, lon):
         """
         Returns the elevation in metres of point (lat, lon).
-        
-        Uses bilinar interpolation to interpolate the SRTM data to the
-        required point.
         """
-        row, col, row_f, col_f = self.pos_from_lat_lon(lat, lon)
-
-        # NOTE - THIS IS A FIDDLE TO STOP ERRORS AT THE EDGE OF
-        # TILES - IT IS NO CORRECT - WE SHOULD GET TWO POINTS 
-        # FROM THE NEXT TILE.
-        if row==5999: row=5998
-        if col==5999: col=5998
-
-        htarr = gdalnumeric.DatasetReadAsArray(self.tile['dataset'], col, row, 2, 2)
-        height = bilinear_interpolation(htarr[0][0], htarr[0][1], htarr[1][0], htarr[1][1],
-                                       row_f-row, col_f-col)
-
-        return height
+        return float(self.get_elevations([lat], [lon])[0])
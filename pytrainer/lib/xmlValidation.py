@@ -17,14 +17,41 @@
 #Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
 
 import logging
+import os
+import threading
 from lxml import etree
 
+#Compiled schemas and stylesheets by real path, with the mtime they were compiled at
+_schemas = {}
+_transforms = {}
+_lock = threading.Lock()
+
+def _get_compiled(cache, path, compile):
+	path = os.path.realpath(path)
+	mtime = os.path.getmtime(path)
+	with _lock:
+		entry = cache.get(path)
+	if entry is not None and entry[0] == mtime:
+		return entry[1]
+	logging.debug("Compiling %s" % path)
+	compiled = compile(etree.parse(path))
+	with _lock:
+		cache[path] = (mtime, compiled)
+	return compiled
+
+def get_schema(path):
+	'''Get the compiled XML schema of an XSD file, compiled again only if the file changes'''
+	return _get_compiled(_schemas, path, etree.XMLSchema)
+
+def get_transform(path):
+	'''Get the compiled XSLT stylesheet of a file, compiled again only if the file changes'''
+	return _get_compiled(_transforms, path, etree.XSLT)
+
 class xmlValidator():
 	def validateXSL(self, filename, xslfile):
 		try:
 			doc = etree.parse(filename)
-			xsl_doc = etree.parse(xslfile)
-			xsl = etree.XMLSchema(xsl_doc)
+			xsl = get_schema(xslfile)
 		except:
 			logging.error("Error attempting to parse %s or %s" % (filename, xslfile))
 			return False
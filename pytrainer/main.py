@@ -44,8 +44,11 @@ from importdata import Importdata
 from plugins import Plugins
 from profile import Profile
 from pytrainer.core.sport import SportService
+from pytrainer.core.duplicate import DuplicateIndex
 from athlete import Athlete
 from stats import Stats
+from extensions.heatmap import Heatmap
+from extensions.osm import Osm
 
 from gui.windowmain import Main
 from gui.warning import Warning
@@ -56,6 +59,8 @@ from lib.uc import UC
 
 class pyTrainer:
     def __init__(self,filename = None, data_path = None):
+        #Let other threads (map drawing, tile server) run along the GTK main loop
+        gobject.threads_init()
         # Based in Django's approach -> http://code.djangoproject.com/svn/django/trunk/django/__init__.py
         self.version = __import__('pytrainer').get_version()
         #Process command line options
@@ -65,6 +70,8 @@ class pyTrainer:
         self.environment.create_directories()
         self.set_logging(self.startup_options.log_level, self.startup_options.log_type)
         logging.debug('>>')
+        #Only on startup, background jobs and scripts may be using it later
+        self.environment.clear_temp_dir()
         logging.debug("pytrainer version %s" % (self.version))
         self.data_path = data_path
         self.date = Date()
@@ -81,6 +88,8 @@ class pyTrainer:
         initialize_data(self.ddbb, self.environment.conf_dir)
             
         self._sport_service = SportService(self.ddbb)
+        #Shared by importers to find activities already in the database
+        self.duplicate_index = DuplicateIndex(self.ddbb)
         self.record = Record(self._sport_service, data_path, self)
         self.athlete = Athlete(data_path,self)
         self.stats = Stats(self._sport_service, self)
@@ -256,7 +265,7 @@ class pyTrainer:
              record_list = self.record.getrecordPeriod(date_range, sport_id)
              nameMonth, daysInMonth = self.date.getNameMonth(date_selected)
              self.windowmain.actualize_monthview(record_list, nameMonth)
-             self.windowmain.actualize_monthgraph(record_list, daysInMonth)
+             self.windowmain.actualize_monthgraph(record_list, daysInMonth, date_range)
         elif view=="year":
              logging.debug('year view')
              date_range = DateRange.for_year_containing(date_selected)
@@ -264,7 +273,7 @@ class pyTrainer:
              sport_id = self.record.getSportId(sport)
              record_list = self.record.getrecordPeriod(date_range, sport_id)
              self.windowmain.actualize_yearview(record_list, date_selected.year)
-             self.windowmain.actualize_yeargraph(record_list)
+             self.windowmain.actualize_yeargraph(record_list, date_range)
         elif view=="listview":
             logging.debug('list view')
             self.refreshListView()
@@ -297,6 +306,8 @@ class pyTrainer:
                 id_record = None
                 view="info"
         activity = self.activitypool.get_activity(id_record)
+        if view!="map":
+            self.windowmain.cancelMap()
         if view=="info":
             self.windowmain.actualize_recordview(activity)
         if view=="graphs":
@@ -382,6 +393,15 @@ class pyTrainer:
         self.refreshGraphView(self.windowmain.selected_view)
         logging.debug('<<')
 
+    def showHeatmap(self):
+        logging.debug('>>')
+        heatmap = Heatmap(self.profile.heatmapdir)
+        added = heatmap.update_from_dir(self.profile.gpxdir)
+        logging.debug('Added %d activities to heatmap' % added)
+        htmlfile = Osm(data_path=self.data_path, pytrainer_main=self).drawHeatmap(heatmap)
+        self.windowmain.show_heatmap(htmlfile)
+        logging.debug('<<')
+
     def editGpsPlugins(self):
         logging.debug('>>')
         activeplugins_before = self.plugins.getActivePlugins()
@@ -465,7 +485,8 @@ class pyTrainer:
         logging.debug('>>')
         if confirm:
              self.waypoint.removeWaypoint(id_waypoint)
-             self.refreshWaypointView()
+             self.windowmain.waypointeditor.removeMarker(id_waypoint)
+             self.refreshWaypointView(redrawmap=0)
         else:
              msg = _("Delete this waypoint?")
              params = [id_waypoint,True]
@@ -477,6 +498,7 @@ class pyTrainer:
     def updateWaypoint(self,id_waypoint,lat,lon,name,desc,sym):
         logging.debug('>>')
         self.waypoint.updateWaypoint(id_waypoint,lat,lon,name,desc,sym)
+        self.windowmain.waypointeditor.updateMarker(id_waypoint)
         self.refreshWaypointView(id_waypoint)
         logging.debug('<<')
 
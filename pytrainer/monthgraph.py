@@ -36,8 +36,8 @@ class MonthGraph(TimeGraph):
         self.combovalue2 = combovalue2
         self.KEY_FORMAT = "%d"
         
-    def drawgraph(self,values, daysInMonth):
-        TimeGraph.drawgraph(self, values, x_func=lambda x: list([u'%02d' % d for d in xrange(1,daysInMonth+1)]))
+    def drawgraph(self,values, daysInMonth, period=None):
+        TimeGraph.drawgraph(self, values, x_func=lambda x: list([u'%02d' % d for d in xrange(1,daysInMonth+1)]), period=period)
 
     def get_values2(self,values,value_selected,daysInMonth):
         #hacemos una relacion entre el value_selected y los values / we make a relation between value_selected and the values
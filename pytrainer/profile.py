@@ -38,10 +38,10 @@ class Profile:
         self.gpxdir = environment.gpx_dir
         self.extensiondir = environment.extension_dir
         self.plugindir = environment.plugin_dir
+        self.tilecachedir = environment.tile_cache_dir
+        self.heatmapdir = environment.heatmap_dir
         self.uc = UC()
         self.profilewindow = None
-        
-        environment.clear_temp_dir()
 
         #Profile Options and Defaults
         self.profile_options = {
@@ -65,6 +65,8 @@ class Profile:
             "default_viewer":"0",
             "window_size":"800, 640",
             "activitypool_size": "10",
+            "map_tile_cache_size": "200",
+            "map_tile_prefetch": "True",
             }
 
         #Parse pytrainer configuration file
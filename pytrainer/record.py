@@ -22,14 +22,16 @@ import shutil
 import logging
 import traceback
 
-from gui.windowrecord import WindowRecord
-from gui.dialogselecttrack import DialogSelectTrack
 from lib.ddbb import DDBB
 from lib.xmlUtils import XMLParser
 from lib.date import Date
-from lib.gpx import Gpx
+from lib.gpx import Gpx, timed_track_points
 from pytrainer.core.equipment import EquipmentService
 from pytrainer.core.sport import Sport
+from pytrainer.core.spatial import SpatialIndex
+from pytrainer.core.route import RouteIndex
+from pytrainer.core.duplicate import DuplicateIndex
+from pytrainer.extensions import tilecache
 
 class Record:
 	def __init__(self, sport_service, data_path = None, parent = None):
@@ -38,6 +40,9 @@ class Record:
 		self.parent = parent
 		self.pytrainer_main = parent
 		self._equipment_service = EquipmentService(self.pytrainer_main.ddbb)
+		self._spatial_index = SpatialIndex(self.pytrainer_main.ddbb)
+		self._route_index = RouteIndex(self.pytrainer_main.ddbb, self.pytrainer_main.profile.gpxdir)
+		self._duplicate_index = DuplicateIndex(self.pytrainer_main.ddbb)
 		self.data_path = data_path
 		logging.debug('setting date...')
 		self.date = Date()
@@ -45,6 +50,8 @@ class Record:
 
 	def newRecord(self, date, title=None, distance=None, time=None, upositive=None, unegative=None, bpm=None, calories=None, comment=None):
 		logging.debug('>>')
+		#Windows are imported when needed, so records can be handled without a display
+		from gui.windowrecord import WindowRecord
 		sports = self._sport_service.get_all_sports()
 		self.recordwindow = WindowRecord(self._equipment_service, self.data_path, sports, self, self.format_date(date), title, distance, time, upositive, unegative, bpm, calories, comment)
 		self.recordwindow.run()
@@ -52,6 +59,7 @@ class Record:
 
 	def newMultiRecord(self, activities):
 		logging.debug('>>')
+		from gui.windowrecord import WindowRecord
 		sports = self._sport_service.get_all_sports()
 		self.recordwindow = WindowRecord(self._equipment_service, self.data_path, sports, parent=self, windowTitle=_("Modify details before importing"))
 		self.recordwindow.populateMultiWindow(activities)
@@ -61,6 +69,7 @@ class Record:
 
 	def editRecord(self,id_record):
 		logging.debug('>>')
+		from gui.windowrecord import WindowRecord
 		activity = self.pytrainer_main.activitypool.get_activity(id_record)
 		record_equipment = self.get_record_equipment(id_record)
 		sports = self._sport_service.get_all_sports()
@@ -79,6 +88,9 @@ class Record:
 		if os.path.isfile(gpxfile):
 			os.remove(gpxfile)
 			logging.debug('removed gpxfile '+gpxfile)
+		self._spatial_index.remove(id_record)
+		self._route_index.remove(id_record)
+		self._duplicate_index.remove(id_record)
 		logging.debug('<<')
 
 	def pace_to_float(self, value):
@@ -148,7 +160,7 @@ class Record:
 		logging.debug('<<')
 		return keys,values
 
-	def insertRecord(self, list_options, laps=None, equipment=None):
+	def insertRecord(self, list_options, laps=None, equipment=None, prefetch_tiles=True):
 		logging.debug('>>')
 		#Create entry for activity in records table
 		if list_options is None:
@@ -178,10 +190,45 @@ class Record:
 			#logging.debug('Moving '+gpxOrig+' to '+gpxNew)
 			shutil.copy(gpxOrig, gpxNew)
 			logging.debug('Copying '+gpxOrig+' to '+gpxNew)
+			self._index_track(id_record, gpxNew)
+			if prefetch_tiles:
+				tilecache.prefetch_track(self.pytrainer_main.profile, gpxNew)
 		#self.parent.refreshListRecords()
 		logging.debug('<<')
 		return self.pytrainer_main.ddbb.lastRecord("records")
 
+	def insertRecords(self, activities):
+		"""Insert many activities in a single transaction, without prefetching map tiles
+		args: list of (list_options, laps) as returned by summaryFromGPX
+		returns: list of the ids of the new records"""
+		logging.debug('>>')
+		ids = []
+		with self.pytrainer_main.ddbb.transaction():
+			for list_options, laps in activities:
+				ids.append(self.insertRecord(list_options, laps, prefetch_tiles=False))
+		logging.debug('<<')
+		return ids
+
+	def completeActivity(self, activity):
+		"""Fill in the details of an activity to import from its GPX file
+		args: activity (dict) with rcd_gpxfile, rcd_sport and optionally the track
+			parsed by its importer, as kept by the multiple activities window"""
+		logging.debug('>>')
+		activity["rcd_comments"] = ""
+		#The parsed track is only needed once
+		track = activity.pop("track", None)
+		gpx_summary, laps = self.summaryFromGPX(activity["rcd_gpxfile"], (activity["rcd_sport"],""), track)
+		local_time = gpx_summary['date_time_local']
+		activity["rcd_date"] = local_time.strftime("%Y-%m-%d")
+		activity["rcd_starttime"] = local_time.strftime("%H:%M:%S")
+		for key in ("date_time_local", "date_time_utc", "rcd_time", "rcd_distance", "rcd_average", "rcd_calories",
+				"rcd_beats", "rcd_upositive", "rcd_unegative", "rcd_maxvel", "rcd_maxpace", "rcd_pace", "rcd_maxbeats"):
+			activity[key] = gpx_summary[key]
+		activity["rcd_title"] = ""
+		activity["laps"] = laps
+		activity["complete"] = True
+		logging.debug('<<')
+
 	def insertNewRecord(self, gpxOrig, entry): #TODO consolidate with insertRecord
 		"""29.03.2008 - dgranda
 		Moves GPX file to store destination and updates database
@@ -234,14 +281,18 @@ class Record:
 		logging.debug('<<')
 		return lap_avg_hr, lap_max_hr
 
-	def summaryFromGPX(self, gpxOrig, entry):
+	def summaryFromGPX(self, gpxOrig, entry, track=None):
 		"""29.03.2008 - dgranda
 		Retrieves info which will be stored in DB from GPX file
-		args: path to source GPX file
+		args: path to source GPX file, track already parsed by an importer (optional,
+			spares parsing the GPX file)
 		returns: list with fields and values, list of laps
 		"""
 		logging.debug('>>')
-		gpx = Gpx(self.data_path,gpxOrig)
+		if track is not None:
+			gpx = Gpx(self.data_path, track=track)
+		else:
+			gpx = Gpx(self.data_path,gpxOrig)
 		distance, time, maxspeed, maxheartrate = gpx.getMaxValues()
 		#if time == 0: #invalid record
 		#	print "Invalid record"
@@ -309,6 +360,7 @@ class Record:
 		if os.path.isfile(gpxOrig):
 			if gpxfile != gpxOrig:
 				shutil.copy2(gpxOrig, gpxfile)
+				self._index_track(id_record, gpxfile)
 		else:
 			if (list_options["rcd_gpxfile"]==""):
 				logging.debug('Activity not based in GPX file') # ein?
@@ -320,6 +372,44 @@ class Record:
 		self.pytrainer_main.refreshListView()
 		logging.debug('<<')
 
+	def _index_track(self, id_record, gpxfile):
+		try:
+			lats, lons, times = timed_track_points(gpxfile)
+			self._spatial_index.add(id_record, lats, lons)
+			self._route_index.add(id_record, lats, lons, times)
+			self._duplicate_index.add(id_record, lats, lons, times)
+		except Exception as e:
+			logging.error('Unable to index track of record %s: %s' % (id_record, e))
+
+	def getRecordsInArea(self, minlat, minlon, maxlat, maxlon):
+		"""Get the ids of the records whose tracks pass through an area"""
+		return self._spatial_index.get_records_in_area(minlat, minlon, maxlat, maxlon)
+
+	def getAreaCondition(self, minlat, minlon, maxlat, maxlon):
+		"""Get an SQL condition on the records table for the records whose
+		tracks pass through an area"""
+		return self._spatial_index.area_condition(minlat, minlon, maxlat, maxlon)
+
+	def getRouteCondition(self, id_record):
+		"""Get an SQL condition on the records table for the records
+		following the same route as one"""
+		return self._route_index.route_condition(id_record)
+
+	def addSegment(self, name, lats, lons):
+		"""Define a segment by its path, returns its id"""
+		return self._route_index.add_segment(name, lats, lons)
+
+	def removeSegment(self, id_segment):
+		self._route_index.remove_segment(id_segment)
+
+	def getSegments(self):
+		return self._route_index.get_segments()
+
+	def getSegmentLeaderboard(self, id_segment, limit=10):
+		"""Get the (id_record, elapsed seconds) of the fastest activities
+		through a segment"""
+		return self._route_index.get_best_efforts(id_segment, limit)
+
 	def parseFloatRecord(self,string):
 		logging.debug('--')
 		if string != "":
@@ -552,6 +642,7 @@ class Record:
 	def _select_trkfromgpx(self,gpxfile,tracks):  #TODO remove? - should never have multiple tracks per GPX file
 		logging.debug('>>')
 		logging.debug('Track dialog '+ self.data_path +'|'+ gpxfile)
+		from gui.dialogselecttrack import DialogSelectTrack
 		selectrckdialog = DialogSelectTrack(self.data_path, tracks,self.__actualize_fromgpx, gpxfile)
 		logging.debug('Launching window...')
 		selectrckdialog.run()
@@ -0,0 +1,101 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import gettext
+import os
+import shutil
+import tempfile
+import unittest
+
+gettext.install("pytrainer", unicode=1)
+
+from pytrainer.bulkimport import find_files, get_options, run
+from pytrainer.headless import Headless
+from pytrainer.lib.sniffer import ImporterRegistry
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "imports")
+
+class BulkImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.archive = os.path.join(self.conf_dir, "archive")
+        os.makedirs(os.path.join(self.archive, "2013", "02"))
+        shutil.copy(os.path.join(SAMPLES_DIR, "sample.fit"), os.path.join(self.archive, "2013", "02"))
+        shutil.copy(os.path.join(SAMPLES_DIR, "sample.tcx"), self.archive)
+        with open(os.path.join(self.archive, "notes.txt"), "w") as notes:
+            notes.write("Not an activity")
+        self.trainer = Headless(self.conf_dir)
+        self.trainer.ddbb.create_tables()
+
+    def tearDown(self):
+        self.trainer.close()
+        shutil.rmtree(self.conf_dir)
+
+    def get_options(self, *args):
+        return get_options(["--confdir", self.conf_dir] + list(args))
+
+    def test_find_files_should_skip_unknown_formats(self):
+        options = self.get_options(self.archive)
+        files = list(find_files([self.archive], ImporterRegistry(options.data_path)))
+        self.assertEquals([os.path.join(self.archive, "sample.tcx"),
+                           os.path.join(self.archive, "2013", "02", "sample.fit")], files)
+
+    def test_run_should_insert_records_and_laps(self):
+        summary = run(self.get_options("-j", "1", self.archive))
+        self.assertEquals(2, summary.files)
+        self.assertEquals(2, summary.imported)
+        self.assertEquals([], summary.failures)
+        records = self.trainer.ddbb.select("records", "id_record, date_time_utc", mod="order by date_time_utc")
+        self.assertEquals(2, len(records))
+        self.assertEquals(u"2013-02-09T10:07:06Z", records[1][1])
+        self.assertEquals(18, len(self.trainer.ddbb.select("laps", "id_lap", "record=%d" % records[1][0])))
+        for id_record, date_time_utc in records:
+            self.assertTrue(os.path.isfile(os.path.join(self.trainer.profile.gpxdir, "%d.gpx" % id_record)))
+        self.assertEquals([], os.listdir(self.trainer.profile.tmpdir))
+
+    def test_run_should_skip_duplicates(self):
+        copy = os.path.join(self.archive, "copy.fit")
+        shutil.copy(os.path.join(SAMPLES_DIR, "sample.fit"), copy)
+        summary = run(self.get_options("-j", "1", self.archive))
+        self.assertEquals(2, summary.imported)
+        self.assertEquals(1, summary.duplicates)
+        summary = run(self.get_options("-j", "2", self.archive))
+        self.assertEquals(0, summary.imported)
+        self.assertEquals(3, summary.duplicates)
+        self.assertEquals(2, len(self.trainer.ddbb.select("records", "id_record")))
+
+    def test_run_should_skip_tracks_already_imported(self):
+        run(self.get_options("-j", "1", self.archive))
+        #Start times no longer match
+        self.trainer.ddbb.update("records", "date_time_utc", ["2000-01-01T00:00:00Z"], "1=1")
+        summary = run(self.get_options("-j", "1", "--compare-tracks", self.archive))
+        self.assertEquals(0, summary.imported)
+        self.assertEquals(2, summary.duplicates)
+        self.assertEquals([], os.listdir(self.trainer.profile.tmpdir))
+
+    def test_run_should_report_unreadable_files(self):
+        broken = os.path.join(self.archive, "broken.fit")
+        with open(os.path.join(SAMPLES_DIR, "sample.fit"), "rb") as sample:
+            header = sample.read(14)
+        with open(broken, "wb") as output:
+            output.write(header)
+        summary = run(self.get_options("-j", "1", self.archive))
+        self.assertEquals(2, summary.imported)
+        self.assertEquals([broken], [filename for filename, error in summary.failures])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import datetime
+import gettext
+import shutil
+import tempfile
+import unittest
+
+from dateutil.tz import tzoffset, tzutc
+
+gettext.install("pytrainer", unicode=1)
+
+from pytrainer.core.duplicate import DuplicateIndex, track_hash, utc_seconds
+from pytrainer.headless import Headless
+
+# 2013-02-09T10:07:06Z
+START = 1360404426
+
+class UtcSecondsTest(unittest.TestCase):
+
+    def test_text(self):
+        self.assertEquals(START, utc_seconds("2013-02-09T10:07:06Z"))
+        self.assertEquals(START, utc_seconds("2013-02-09T10:07:06.000Z"))
+        self.assertEquals(START, utc_seconds("2013-02-09T11:07:06+01:00"))
+
+    def test_datetime(self):
+        self.assertEquals(START, utc_seconds(datetime.datetime(2013, 2, 9, 10, 7, 6)))
+        self.assertEquals(START, utc_seconds(datetime.datetime(2013, 2, 9, 10, 7, 6, tzinfo=tzutc())))
+        self.assertEquals(START, utc_seconds(datetime.datetime(2013, 2, 9, 12, 7, 6, tzinfo=tzoffset(None, 7200))))
+
+    def test_not_a_time(self):
+        self.assertEquals(None, utc_seconds(None))
+        self.assertEquals(None, utc_seconds("yesterday"))
+
+class TrackHashTest(unittest.TestCase):
+
+    def test_same_track_in_other_format(self):
+        self.assertEquals(track_hash([43.5401918, 43.5402], [-5.6505951, -5.6506], ["2013-02-09T10:07:06Z", "2013-02-09T10:07:07Z"]),
+                          track_hash([43.540191818, 43.5402], [-5.650595147, -5.6506], ["2013-02-09T10:07:06.000Z", "2013-02-09T10:07:07.000Z"]))
+
+    def test_other_track(self):
+        self.assertNotEquals(track_hash([43.5401918], [-5.6505951], ["2013-02-09T10:07:06Z"]),
+                             track_hash([43.5401918], [-5.6505951], ["2013-02-09T10:07:07Z"]))
+
+class DuplicateIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.trainer = Headless(self.conf_dir)
+        self.trainer.ddbb.create_tables()
+        for date_time_utc in ("2013-02-09T10:07:06Z", "2012-01-02T08:00:00Z", None):
+            self.trainer.ddbb.insert("records", "date,sport,date_time_utc", ["2013-02-09", 1, date_time_utc])
+        self.index = DuplicateIndex(self.trainer.ddbb)
+
+    def tearDown(self):
+        self.trainer.close()
+        shutil.rmtree(self.conf_dir)
+
+    def test_has_activity(self):
+        self.assertTrue(self.index.has_activity("2013-02-09T10:07:06Z"))
+        self.assertTrue(self.index.has_activity(datetime.datetime(2012, 1, 2, 9, 0, 0, tzinfo=tzoffset(None, 3600))))
+        self.assertFalse(self.index.has_activity("2013-02-09T10:07:07Z"))
+        self.assertFalse(self.index.has_activity(None))
+
+    def test_has_activity_within_tolerance(self):
+        self.assertTrue(self.index.has_activity("2013-02-09T10:09:00Z", 120))
+        self.assertTrue(self.index.has_activity("2013-02-09T10:05:06Z", 120))
+        self.assertFalse(self.index.has_activity("2013-02-09T10:09:07Z", 120))
+
+    def test_start_times_reloaded_after_changes(self):
+        self.assertEquals([1325491200, START], self.index.get_start_times())
+        self.trainer.ddbb.insert("records", "date,sport,date_time_utc", ["2013-02-10", 1, "2013-02-10T10:00:00Z"])
+        self.assertTrue(self.index.has_activity("2013-02-10T10:00:00Z"))
+
+    def test_has_track(self):
+        lats, lons, times = [43.5, 43.6], [-5.6, -5.7], ["2013-02-09T10:07:06Z", "2013-02-09T10:07:07Z"]
+        self.index.add(1, lats, lons, times)
+        self.assertTrue(self.index.has_track(track_hash(lats, lons, times)))
+        self.assertFalse(self.index.has_track(track_hash(lats[:1], lons[:1], times[:1])))
+        self.index.remove(1)
+        self.assertFalse(self.index.has_track(track_hash(lats, lons, times)))
+
+if __name__ == '__main__':
+    unittest.main()
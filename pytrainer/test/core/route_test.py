@@ -0,0 +1,116 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from pytrainer.core.route import RouteIndex, fingerprint, fingerprint_distance, match_segment, parse_time
+from pytrainer.core.spatial import SpatialIndex
+from pytrainer.headless import Headless
+
+def times(count, step, start=0):
+    return ["2012-01-26T18:%02d:%02dZ" % divmod(start + i * step, 60) for i in range(count)]
+
+# About 1 km east along 43.5 N in 101 points, 10 m apart
+LATS = [43.5] * 101
+LONS = list(numpy.linspace(-5.7, -5.6876, 101))
+
+class RouteFunctionsTest(unittest.TestCase):
+
+    def test_fingerprint_should_resample_evenly(self):
+        length, lats, lons = fingerprint([43.5, 43.5, 43.5, 43.5], [-5.7, -5.699, -5.699, -5.69], points=5)
+        self.assertAlmostEquals(806.6, length, 0)
+        self.assertEquals([-5.7, -5.6975, -5.695, -5.6925, -5.69], [round(lon, 6) for lon in lons])
+
+    def test_same_path_should_have_close_fingerprints(self):
+        sparse = fingerprint(LATS[::10], LONS[::10])
+        dense = fingerprint(LATS, LONS)
+        shifted = fingerprint([43.501] * 101, LONS)
+        self.assertTrue(fingerprint_distance(sparse[1:], dense[1:]) < 1)
+        self.assertAlmostEquals(111, fingerprint_distance(shifted[1:], dense[1:]), 0)
+
+    def test_match_segment(self):
+        segment = {"start_lat": 43.5, "start_lon": LONS[20], "end_lat": 43.5, "end_lon": LONS[60], "distance": 400.0}
+        #There and back goes through the segment once, in its direction
+        self.assertEquals([(20, 60)], match_segment(LATS + LATS[::-1], LONS + LONS[::-1], segment))
+        self.assertEquals([(20, 60), (121, 161)], match_segment(LATS * 2, LONS * 2, segment))
+        #The end is too far along the path
+        segment["distance"] = 200.0
+        self.assertEquals([], match_segment(LATS, LONS, segment))
+
+    def test_parse_time(self):
+        self.assertEquals(1327597860, parse_time("2012-01-26T18:11:00+01:00"))
+        self.assertEquals(1327597860, parse_time("2012-01-26T17:11:00Z"))
+
+class RouteIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.trainer = Headless(self.conf_dir)
+        self.trainer.ddbb.create_tables()
+        self.spatial_index = SpatialIndex(self.trainer.ddbb)
+        self.index = RouteIndex(self.trainer.ddbb, self.trainer.profile.gpxdir)
+
+    def tearDown(self):
+        self.trainer.close()
+        shutil.rmtree(self.conf_dir)
+
+    def add(self, id_record, lats, lons, times):
+        with open(os.path.join(self.trainer.profile.gpxdir, "%d.gpx" % id_record), "w") as gpx_file:
+            gpx_file.write('<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>')
+            for lat, lon, time in zip(lats, lons, times):
+                gpx_file.write('<trkpt lat="%r" lon="%r"><time>%s</time></trkpt>' % (lat, lon, time))
+            gpx_file.write('</trkseg></trk></gpx>')
+        self.spatial_index.add(id_record, lats, lons)
+        self.index.add(id_record, lats, lons, times)
+
+    def test_same_route_should_be_clustered(self):
+        self.add(1, LATS, LONS, times(101, 3))
+        self.add(2, LATS[::5], LONS[::5], times(21, 12))
+        self.add(3, LATS[::-1], LONS[::-1], times(101, 3))
+        self.add(4, LATS[:60], LONS[:60], times(60, 3))
+        self.assertEquals([1, 2], self.index.get_route_records(2))
+        self.assertEquals([3], self.index.get_route_records(3))
+        self.assertEquals([4], self.index.get_route_records(4))
+        self.assertEquals([1, 2], sorted(row[0] for row in self.trainer.ddbb.select("track_fingerprints", "record", self.index.route_condition(1, "record"))))
+
+    def test_remove_should_keep_route(self):
+        self.add(1, LATS, LONS, times(101, 3))
+        self.add(2, LATS, LONS, times(101, 3))
+        self.add(3, LATS, LONS, times(101, 3))
+        self.index.remove(1)
+        self.assertEquals(2, self.index.get_route(3))
+        self.assertEquals([2, 3], self.index.get_route_records(3))
+
+    def test_segment_leaderboard(self):
+        self.add(1, LATS, LONS, times(101, 3))
+        self.add(2, LATS, LONS, times(101, 2))
+        self.add(3, [43.6] * 101, LONS, times(101, 1))
+        id_segment = self.index.add_segment(u"Sprint", LATS[20:61], LONS[20:61])
+        self.assertEquals([(2, 80), (1, 120)], self.index.get_best_efforts(id_segment))
+        #New activities are matched against the existing segments
+        self.add(4, LATS, LONS, times(101, 1))
+        self.assertEquals([(4, 40), (2, 80)], self.index.get_best_efforts(id_segment, limit=2))
+        self.assertEquals([u"Sprint"], [segment["name"] for segment in self.index.get_segments()])
+        self.index.remove(4)
+        self.assertEquals([(2, 80), (1, 120)], self.index.get_best_efforts(id_segment))
+
+if __name__ == '__main__':
+    unittest.main()
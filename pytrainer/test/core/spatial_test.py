@@ -0,0 +1,91 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from pytrainer.core.spatial import SpatialIndex, cell_coordinates, covering_cells, geohashes, track_cells
+from pytrainer.headless import Headless
+
+class GeohashTest(unittest.TestCase):
+
+    def test_geohashes(self):
+        x, y = cell_coordinates([57.64911], [10.40744], 11)
+        self.assertEquals(["u4pruydqqvj"], geohashes(x.astype(int), y.astype(int), 11))
+
+    def test_track_cells_should_cover_segments(self):
+        #1 km east in 2 segments over 9 cells of about 110 m at this latitude
+        cells = track_cells([43.5, 43.5, 43.5], [-5.7, -5.69385, -5.6877], 7)
+        self.assertTrue(9 <= len(cells) <= 10)
+        self.assertEquals(len(cells), len(set(cells)))
+
+    def test_track_cells_should_not_join_gaps(self):
+        self.assertEquals(2, len(track_cells([43.5, 43.5], [-5.7, -5.6877], 7)))
+
+    def test_covering_cells_should_use_coarser_cells_for_large_areas(self):
+        self.assertEquals(7, len(covering_cells(43.5, -5.7, 43.51, -5.69)[0]))
+        self.assertEquals(5, len(covering_cells(43.0, -6.0, 43.5, -5.5)[0]))
+        self.assertEquals(None, covering_cells(30.0, -10.0, 50.0, 10.0))
+
+class SpatialIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.trainer = Headless(self.conf_dir)
+        self.trainer.ddbb.create_tables()
+        self.index = SpatialIndex(self.trainer.ddbb)
+        #An east-west and a north-south track crossing at 43.5, -5.7
+        self.index.add(1, [43.5] * 11, list(numpy.linspace(-5.75, -5.65, 11)))
+        self.index.add(2, list(numpy.linspace(43.45, 43.55, 11)), [-5.7] * 11)
+
+    def tearDown(self):
+        self.trainer.close()
+        shutil.rmtree(self.conf_dir)
+
+    def test_get_records_in_area(self):
+        self.assertEquals([1, 2], self.index.get_records_in_area(43.49, -5.71, 43.51, -5.69))
+        self.assertEquals([1], self.index.get_records_in_area(43.49, -5.66, 43.51, -5.64))
+        self.assertEquals([2], self.index.get_records_in_area(43.53, -5.71, 43.54, -5.69))
+        self.assertEquals([], self.index.get_records_in_area(43.53, -5.68, 43.54, -5.66))
+
+    def test_tracks_inside_large_area_should_match(self):
+        self.assertEquals([1, 2], self.index.get_records_in_area(40.0, -10.0, 45.0, 0.0))
+
+    def test_add_should_replace_previous_track(self):
+        self.index.add(1, [40.0, 40.01], [-3.0, -3.0])
+        self.assertEquals([2], self.index.get_records_in_area(43.49, -5.71, 43.51, -5.69))
+        self.assertEquals([1], self.index.get_records_in_area(39.9, -3.1, 40.1, -2.9))
+
+    def test_remove(self):
+        self.index.remove(2)
+        self.assertEquals([1], self.index.get_records_in_area(43.49, -5.71, 43.51, -5.69))
+        self.assertEquals([], self.trainer.ddbb.select("track_cells", "geohash", "record=2"))
+
+    def test_area_condition_should_filter_records(self):
+        for date in ("2012-01-01", "2012-01-02", "2012-01-03"):
+            self.trainer.ddbb.insert("records", "date", [date])
+        condition = self.index.area_condition(43.53, -5.71, 43.54, -5.69)
+        self.assertEquals([(2,)], self.trainer.ddbb.select("records", "id_record", condition))
+
+    def test_add_gpx(self):
+        self.index.add_gpx(3, "pytrainer/test/lib/gpxplus_sample.gpx")
+        self.assertEquals([3], self.index.get_records_in_area(43.52, -5.66, 43.53, -5.64))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import gettext
+import os
+import shutil
+import tempfile
+import unittest
+
+gettext.install("pytrainer", unicode=1)
+
+from pytrainer.csvimport import CsvImporter, get_options, read_columns
+from pytrainer.headless import Headless
+
+CSV = """Date,Sport,Distance,Duration,Calories,Notes
+2013-02-09T10:07:06Z,Run,10.5,0:50:00,700,Easy
+2013-02-10T09:00:00Z,Cycling,40,7200,,
+yesterday,Run,5,0:25:00,300,
+2013-02-12T09:00:00Z,Run,five,0:25:00,300,
+
+2013-02-13T09:00:00Z,Run,5,0:25:00,300,Last
+"""
+
+class CsvImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.conf_dir, "records.csv")
+        with open(self.filename, "w") as csvfile:
+            csvfile.write(CSV)
+        self.trainer = Headless(self.conf_dir)
+        self.trainer.ddbb.create_tables()
+
+    def tearDown(self):
+        self.trainer.close()
+        shutil.rmtree(self.conf_dir)
+
+    def import_file(self, columns, sport=None, batch_size=2):
+        importer = CsvImporter(self.trainer.ddbb, self.trainer.sport_service, columns, ",", True, sport,
+                               batch_size=batch_size)
+        return importer.import_file(self.filename)
+
+    def test_read_columns(self):
+        with open(self.filename, "w") as csvfile:
+            csvfile.write("Date;Distance;Duration\n2013-02-09;10.5;3000\n2013-02-10;40;7200\n")
+        self.assertEquals((True, ["Date", "Distance", "Duration"]), read_columns(self.filename, ";"))
+
+    def test_import_should_convert_values(self):
+        result = self.import_file({"date": 0, "sport": 1, "distance": 2, "duration": 3, "calories": 4, "comments": 5})
+        self.assertEquals(3, result.imported)
+        records = self.trainer.ddbb.select("records", "date_time_utc, sport, distance, duration, time, calories, comments",
+                                           mod="order by date_time_utc")
+        self.assertEquals(u"2013-02-09T10:07:06Z", records[0][0])
+        self.assertEquals((10.5, 3000, u"3000", 700, u"Easy"), tuple(records[0][2:]))
+        self.assertEquals((40, 7200, u"7200", None, None), tuple(records[1][2:]))
+        run = self.trainer.sport_service.get_sport_by_name(u"Run")
+        cycling = self.trainer.sport_service.get_sport_by_name(u"Cycling")
+        self.assertEquals([run.id, cycling.id, run.id], [record[1] for record in records])
+
+    def test_import_should_reject_rows_with_invalid_values(self):
+        result = self.import_file({"date": 0, "distance": 2})
+        self.assertEquals([4, 5], [line for line, reason in result.rejected])
+        self.assertEquals("invalid distance: five", result.rejected[1][1])
+        self.assertEquals(3, len(self.trainer.ddbb.select("records", "id_record")))
+
+    def test_import_should_use_sport_given(self):
+        self.import_file({"date": 0, "sport": 1}, sport="Hiking")
+        hiking = self.trainer.sport_service.get_sport_by_name(u"Hiking")
+        self.assertEquals([(hiking.id,)] * 4, self.trainer.ddbb.select("records", "sport"))
+
+    def test_import_should_default_to_first_sport(self):
+        self.import_file({"date": 0})
+        first = self.trainer.sport_service.get_all_sports()[0]
+        self.assertEquals([(first.id,)] * 4, self.trainer.ddbb.select("records", "sport"))
+
+    def test_import_should_reject_rows_without_sport_if_there_are_none(self):
+        self.trainer.ddbb.delete("sports", "1=1")
+        result = self.import_file({"date": 0})
+        self.assertEquals((2, "no sport"), result.rejected[0])
+        self.assertEquals(0, result.imported)
+
+    def test_get_options_should_find_columns_by_name_or_number(self):
+        options = get_options(["--header", "-c", "date=Date", "-c", "distance=3", self.filename])
+        self.assertEquals({"date": 0, "distance": 2}, options.columns)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import gettext
+import os
+import shutil
+import tempfile
+import unittest
+
+from lxml import etree
+
+gettext.install("pytrainer", unicode=1)
+
+from pytrainer.elevation import PYTRAINER_NS, elevation_change, get_options, get_tile_names, partition, run
+from pytrainer.headless import Headless
+from pytrainer.lib.srtmlayer import SrtmLayer
+from pytrainer.test.lib.srtmtiff_test import write_tile
+
+def write_gpx(gpx_file, points):
+    with open(gpx_file, "w") as output:
+        output.write('<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>')
+        for lat, lon in points:
+            output.write('<trkpt lat="%r" lon="%r"><ele>100</ele></trkpt>' % (lat, lon))
+        output.write('</trkseg></trk></gpx>')
+
+class ElevationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.srtm_dir = os.path.join(self.conf_dir, "srtm")
+        os.mkdir(self.srtm_dir)
+        #Tile 37 04 spans 0 to 5 E, 40 to 45 N
+        write_tile(self.srtm_dir, 37, 4)
+        trainer = Headless(self.conf_dir)
+        trainer.ddbb.create_tables()
+        for date in ("2012-01-02", "2012-01-04", "2012-02-10"):
+            trainer.ddbb.insert("records", "date,sport,distance,upositive,unegative", [date, 1, 10.0, 0.0, 0.0])
+        #Up the slope and back, out of the SRTM data, and no track
+        write_gpx(os.path.join(trainer.profile.gpxdir, "1.gpx"), [(44.5, 0.5), (43.0, 1.0), (44.5, 0.5)])
+        write_gpx(os.path.join(trainer.profile.gpxdir, "2.gpx"), [(44.5, 20.5), (44.5, 20.6)])
+        self.gpx_dir = trainer.profile.gpxdir
+        self.trainer = trainer
+
+    def tearDown(self):
+        self.trainer.close()
+        shutil.rmtree(self.conf_dir)
+
+    def get_options(self, *args):
+        return get_options(["--confdir", self.conf_dir, "--srtmdir", self.srtm_dir] + list(args))
+
+    def corrected_elevations(self, id_record):
+        tree = etree.parse(os.path.join(self.gpx_dir, "%d.gpx" % id_record))
+        return [float(ele.text) for ele in tree.iterfind(".//{%s}ele" % PYTRAINER_NS)]
+
+    def test_elevation_change(self):
+        self.assertEquals((15.0, 30.0), elevation_change([100, 110, 90, 95, 85]))
+
+    def test_partition_should_group_tracks_by_tile(self):
+        bounds = {1: (44.0, 1.0, 44.5, 1.5), 2: (44.0, 21.0, 44.5, 21.5), 3: (42.0, 2.0, 42.5, 2.5), 5: (41.0, 3.0, 41.5, 3.5)}
+        chunks = partition([5, 4, 3, 2, 1], bounds, SrtmLayer(self.srtm_dir, download=False), chunk_size=2)
+        self.assertEquals([[4], [1, 3], [5], [2]], chunks)
+
+    def test_get_tile_names_should_cover_track_bounds(self):
+        bounds = {1: (44.0, 1.0, 44.5, 1.5), 2: (39.5, 4.5, 40.5, 5.5)}
+        self.assertEquals(["srtm_37_04", "srtm_37_05", "srtm_38_04", "srtm_38_05"],
+                          get_tile_names(bounds, SrtmLayer(self.srtm_dir, download=False)))
+
+    def test_run_should_correct_tracks_and_update_records(self):
+        results = run(self.get_options("-j", "1"))
+        self.assertEquals([1, 2], [result[0] for result in results])
+        self.assertEquals(None, results[0][3])
+        self.assertEquals("SRTM data not available", results[1][3])
+        elevations = self.corrected_elevations(1)
+        self.assertEquals(3, len(elevations))
+        ascent = elevations[1] - elevations[0]
+        self.assertTrue(ascent > 0)
+        self.assertAlmostEquals(ascent, results[0][1])
+        self.assertAlmostEquals(ascent, results[0][2])
+        self.assertEquals([], self.corrected_elevations(2))
+        upositive, unegative = self.trainer.ddbb.select("records", "upositive,unegative", "id_record=1")[0]
+        self.assertAlmostEquals(ascent, upositive)
+        self.assertAlmostEquals(ascent, unegative)
+        self.assertEquals([(0.0, 0.0)], self.trainer.ddbb.select("records", "upositive,unegative", "id_record=2"))
+        #Running again replaces the corrected elevations
+        run(self.get_options("-j", "1", "1"))
+        self.assertEquals(elevations, self.corrected_elevations(1))
+        self.assertEquals(["1.gpx", "2.gpx"], sorted(os.listdir(self.gpx_dir)))
+
+    def test_run_with_worker_pool(self):
+        write_gpx(os.path.join(self.gpx_dir, "3.gpx"), [(44.5, 0.5), (44.0, 1.0)])
+        results = run(self.get_options("-j", "2", "--start", "2012-01-03"))
+        self.assertEquals([2, 3], sorted(result[0] for result in results))
+        self.assertEquals(2, len(self.corrected_elevations(3)))
+
+if __name__ == '__main__':
+    unittest.main()
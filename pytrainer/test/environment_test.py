@@ -68,6 +68,14 @@ class Test(unittest.TestCase):
     def test_get_plugin_dir(self):
         environment = Environment(PLATFORM, TEST_DIR_NAME)
         self.assertEquals(TEST_DIR_NAME + "/plugins", environment.plugin_dir)
+
+    def test_get_tile_cache_dir(self):
+        environment = Environment(PLATFORM, TEST_DIR_NAME)
+        self.assertEquals(TEST_DIR_NAME + "/tilecache", environment.tile_cache_dir)
+
+    def test_get_heatmap_dir(self):
+        environment = Environment(PLATFORM, TEST_DIR_NAME)
+        self.assertEquals(TEST_DIR_NAME + "/heatmap", environment.heatmap_dir)
         
 
 if __name__ == "__main__":
@@ -0,0 +1,95 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import unittest
+import datetime
+import gettext
+import os
+import shutil
+import tempfile
+
+gettext.install("pytrainer", unicode=1)
+
+from pytrainer.export import Exporter, get_options, output_name, run, summary_ranges
+from pytrainer.headless import Headless
+from pytrainer.util.date import DateRange
+
+class ExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.conf_dir, "out")
+        trainer = Headless(self.conf_dir)
+        trainer.ddbb.create_tables()
+        for date, sport, distance in (("2012-01-02", 1, 10.5), ("2012-01-04", 3, 5.2), ("2012-02-10", 3, 8.0)):
+            trainer.ddbb.insert("records", "date,sport,distance,time,beats,average,calories,date_time_utc",
+                                [date, sport, distance, 3600, 140, distance, 500, date + "T10:00:00Z"])
+        #Last record gets a track
+        trainer.ddbb.insert("laps", "record,lap_number,elapsed_time,distance", [3, 0, "3600", 8000.0])
+        shutil.copy("pytrainer/test/lib/gpxplus_sample.gpx", os.path.join(trainer.profile.gpxdir, "3.gpx"))
+        trainer.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.conf_dir)
+
+    def get_options(self, *args):
+        return get_options(["--confdir", self.conf_dir, "-j", "1"] + list(args) + [self.output_dir])
+
+    def test_summary_ranges_should_cover_date_range(self):
+        ranges = summary_ranges("month", DateRange(datetime.date(2011, 12, 20), datetime.date(2012, 2, 1)))
+        self.assertEquals([datetime.date(2011, 12, 1), datetime.date(2012, 1, 1), datetime.date(2012, 2, 1)],
+                          [r.start_date for r in ranges])
+        self.assertEquals(datetime.date(2012, 2, 29), ranges[-1].end_date)
+
+    def test_get_options_should_map_values_to_combo_box_indexes(self):
+        options = self.get_options("--value", "time", "--value2", "distance", "--size", "640x480")
+        self.assertEquals(1, options.value)
+        self.assertEquals(1, options.value2)
+        self.assertEquals((640, 480), options.size)
+
+    def test_get_jobs_should_only_graph_activities_with_tracks(self):
+        exporter = Exporter(self.get_options("--graphs", "activity,year"))
+        jobs = exporter.get_jobs(DateRange(datetime.date(2012, 1, 1), datetime.date(2012, 12, 31)))
+        self.assertEquals([("activity", 3), "year"], [jobs[0], jobs[1][0]])
+        self.assertEquals(2, len(jobs))
+
+    def test_run_should_write_summary_and_activity_graphs(self):
+        options = self.get_options("--graphs", "month,activity", "--y2", "hr")
+        results = run(options, DateRange(datetime.date(2012, 1, 1), datetime.date(2012, 3, 31)))
+        files = sorted(os.path.basename(filename) for job, filename, error in results if filename is not None)
+        self.assertEquals(["activity-3.png", "month-2012-01.png", "month-2012-02.png"], files)
+        self.assertEquals([None] * 4, [error for job, filename, error in results])
+        with open(os.path.join(self.output_dir, "month-2012-01.png"), "rb") as image:
+            self.assertEquals("\x89PNG", image.read(4))
+
+    def test_run_should_write_svg_with_worker_pool(self):
+        options = get_options(["--confdir", self.conf_dir, "-j", "2", "--graphs", "week", "--format", "svg",
+                               "--sport", "Run", self.output_dir])
+        results = run(options, DateRange(datetime.date(2012, 1, 2), datetime.date(2012, 2, 12)))
+        files = [filename for job, filename, error in results if filename is not None]
+        self.assertEquals(2, len(files))
+        self.assertTrue(all(filename.endswith(".svg") for filename in files))
+
+    def test_unknown_sport_should_be_rejected(self):
+        self.assertRaises(ValueError, Exporter, self.get_options("--sport", "Curling"))
+
+    def test_output_name(self):
+        week = DateRange(datetime.date(2012, 1, 2), datetime.date(2012, 1, 8))
+        self.assertEquals("week-20120102.svg", output_name(("week", week), "svg"))
+        self.assertEquals("activity-7.png", output_name(("activity", 7), "png"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from pytrainer.extensions.heatmap import Heatmap, ZOOMS, project, tile_pixels
+
+class HeatmapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.gpx_dir = os.path.join(self.tmp_dir, "gpx")
+        os.mkdir(self.gpx_dir)
+        self.heatmap_dir = os.path.join(self.tmp_dir, "heatmap")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def add_gpx(self, id_record):
+        shutil.copy("pytrainer/test/lib/gpxplus_sample.gpx", os.path.join(self.gpx_dir, "%d.gpx" % id_record))
+
+    def test_project(self):
+        x, y = project([0.0, 85.0511], [0.0, -180.0], 1)
+        self.assertEquals([256.0, 0.0], x.tolist())
+        self.assertAlmostEquals(256.0, y[0])
+        self.assertAlmostEquals(0.0, y[1], 2)
+
+    def test_tile_pixels_should_count_pixels_once(self):
+        tiles = tile_pixels(numpy.array([1, 1, 300]), numpy.array([2, 2, 3]), 1)
+        self.assertEquals([(0, 0), (1, 0)], [tile for tile, rows, columns in tiles])
+        self.assertEquals([2], tiles[0][1].tolist())
+        self.assertEquals([44], tiles[1][2].tolist())
+
+    def test_update_should_only_add_new_activities(self):
+        self.add_gpx(1)
+        heatmap = Heatmap(self.heatmap_dir)
+        self.assertEquals(1, heatmap.update_from_dir(self.gpx_dir))
+        self.add_gpx(2)
+        heatmap = Heatmap(self.heatmap_dir)
+        self.assertEquals(1, heatmap.update_from_dir(self.gpx_dir))
+        self.assertEquals(0, heatmap.update_from_dir(self.gpx_dir))
+        self.assertEquals(set([1, 2]), heatmap.activities)
+        self.assertAlmostEquals(43.513015, heatmap.bounds[0], 5)
+        for zoom in ZOOMS:
+            self.assertTrue(os.listdir(os.path.join(heatmap.tile_dir, str(zoom))))
+        counts = heatmap._counts(2, 1, 1)
+        self.assertEquals(2, counts.max())
+
+    def test_removed_activity_should_rebuild(self):
+        self.add_gpx(1)
+        self.add_gpx(2)
+        heatmap = Heatmap(self.heatmap_dir)
+        heatmap.update_from_dir(self.gpx_dir)
+        os.remove(os.path.join(self.gpx_dir, "2.gpx"))
+        self.assertEquals(1, heatmap.update_from_dir(self.gpx_dir))
+        self.assertEquals(set([1]), heatmap.activities)
+        self.assertEquals(1, heatmap._counts(2, 1, 1).max())
+
+if __name__ == '__main__':
+    unittest.main()
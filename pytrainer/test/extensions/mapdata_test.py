@@ -0,0 +1,55 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import unittest
+import array
+import base64
+from pytrainer.extensions import mapdata
+
+class MapDataTest(unittest.TestCase):
+
+    def setUp(self):
+        # (accum distance, elevation, total duration, speed, lat, lon, bpm, cadence, corrected elevation)
+        self.tracks = [
+            (0.0, 10, 0, None, 43.5, -5.6, 120, None, None),
+            (0.1, 11, 30, 12.0, 43.501, -5.601, None, 80, None),
+            (0.2, 12, 60, 14.5, 43.502, -5.602, 150, 82, None),
+        ]
+
+    def test_track_values_should_pick_value_by_line_type(self):
+        self.assertEquals([1.0, 1.0, 1.0], mapdata.track_values(self.tracks, mapdata.LINE_PLAIN))
+        self.assertEquals([0.0, 12.0, 14.5], mapdata.track_values(self.tracks, mapdata.LINE_SPEED))
+        self.assertEquals([120.0, 0.0, 150.0], mapdata.track_values(self.tracks, mapdata.LINE_HR))
+        self.assertEquals([1.0, 80.0, 82.0], mapdata.track_values(self.tracks, mapdata.LINE_CADENCE))
+
+    def test_value_stats_should_have_minimum_variance(self):
+        self.assertEquals((5.0, 4.0), mapdata.value_stats([5.0, 5.0]))
+        average, stdev = mapdata.value_stats([0.0, 20.0])
+        self.assertEquals(10.0, average)
+        self.assertAlmostEquals(10.0, stdev)
+
+    def test_pack_values_should_be_base64_float32(self):
+        packed = mapdata.pack_values([1.5, -2.0, 140.0])
+        self.assertEquals([1.5, -2.0, 140.0], array.array('f', base64.b64decode(packed)).tolist())
+
+    def test_track_script_should_not_contain_per_point_literals(self):
+        pointlist = [(t[4], t[5]) for t in self.tracks] * 100
+        script = mapdata.track_script(pointlist, [1.0] * len(pointlist), mapdata.LINE_PLAIN)
+        self.assertTrue("decodePolyline(\"" in script)
+        self.assertFalse("43.501" in script)
+
+if __name__ == '__main__':
+    unittest.main()
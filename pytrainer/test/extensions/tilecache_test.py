@@ -0,0 +1,119 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import BaseHTTPServer
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib2
+
+from pytrainer.extensions.tilecache import TileCache, TileServer, prefetch_tiles, tile_number, track_bounds
+
+class _UpstreamHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        data = "tile" + self.path
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class TileCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.upstream = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), _UpstreamHandler)
+        self.upstream.requests = []
+        thread = threading.Thread(target=self.upstream.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = "http://127.0.0.1:%d/%%(zoom)d/%%(x)d/%%(y)d.png" % self.upstream.server_address[1]
+
+    def tearDown(self):
+        self.stop_upstream()
+        shutil.rmtree(self.cache_dir)
+
+    def stop_upstream(self):
+        if self.upstream is not None:
+            self.upstream.shutdown()
+            self.upstream.server_close()
+            self.upstream = None
+
+    def test_tile_number(self):
+        self.assertEquals((0, 0), tile_number(51.5, -0.12, 0))
+        self.assertEquals((511, 340), tile_number(51.5074, -0.1278, 10))
+
+    def test_prefetch_tiles_should_add_whole_zoom_levels(self):
+        tiles = prefetch_tiles(43.0, -5.0, 43.5, -4.5, max_tiles=20)
+        self.assertEquals((0, 0, 0), tiles[0])
+        zooms = sorted(set(zoom for zoom, x, y in tiles))
+        self.assertEquals(range(len(zooms)), zooms)
+        self.assertTrue(len(tiles) <= 20)
+
+    def test_get_should_download_once(self):
+        cache = TileCache(self.cache_dir, 1000, url=self.url)
+        self.assertEquals("tile/3/1/2.png", cache.get(3, 1, 2))
+        self.assertEquals("tile/3/1/2.png", cache.get(3, 1, 2))
+        self.assertEquals(["/3/1/2.png"], self.upstream.requests)
+        self.assertTrue(os.path.isfile(os.path.join(self.cache_dir, "3", "1", "2.png")))
+
+    def test_cached_tiles_should_be_available_offline(self):
+        TileCache(self.cache_dir, 1000, url=self.url).get(3, 1, 2)
+        self.stop_upstream()
+        cache = TileCache(self.cache_dir, 1000, url=self.url)
+        self.assertEquals("tile/3/1/2.png", cache.get(3, 1, 2))
+        self.assertEquals(None, cache.get(3, 1, 3, fetch=False))
+        self.assertRaises(urllib2.URLError, cache.get, 3, 1, 3)
+
+    def test_least_recently_used_tiles_should_be_evicted(self):
+        cache = TileCache(self.cache_dir, 3 * len("tile/3/1/2.png"), url=self.url)
+        cache.get(3, 1, 2)
+        cache.get(3, 1, 3)
+        cache.get(3, 1, 4)
+        cache.get(3, 1, 2)
+        cache.get(3, 1, 5)
+        self.assertFalse((3, 1, 3) in cache)
+        self.assertFalse(os.path.exists(cache.path(3, 1, 3)))
+        self.assertTrue((3, 1, 2) in cache)
+        self.assertEquals(3 * len("tile/3/1/2.png"), cache.size)
+
+    def test_prefetch_should_skip_cached_tiles(self):
+        cache = TileCache(self.cache_dir, 10000, url=self.url)
+        cache.get(0, 0, 0)
+        bounds = track_bounds("pytrainer/test/lib/gpxplus_sample.gpx")
+        tiles = prefetch_tiles(*bounds, max_tiles=10)
+        self.assertEquals(len(tiles) - 1, cache.prefetch(tiles))
+        self.assertEquals(len(tiles), len(self.upstream.requests))
+
+    def test_server_should_serve_tiles(self):
+        server = TileServer(TileCache(self.cache_dir, 1000, url=self.url))
+        try:
+            self.assertEquals("tile/3/1/2.png", urllib2.urlopen(server.url + "/3/1/2.png").read())
+            self.stop_upstream()
+            self.assertEquals("tile/3/1/2.png", urllib2.urlopen(server.url + "/3/1/2.png").read())
+            self.assertRaises(urllib2.HTTPError, urllib2.urlopen, server.url + "/3/1/3.png")
+            self.assertRaises(urllib2.HTTPError, urllib2.urlopen, server.url + "/index.html")
+        finally:
+            server.stop()
+
+if __name__ == '__main__':
+    unittest.main()
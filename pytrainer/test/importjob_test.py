@@ -0,0 +1,90 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import gettext
+import os
+import shutil
+import tempfile
+import unittest
+
+gettext.install("pytrainer", unicode=1)
+
+from pytrainer.bulkimport import DATA_PATH
+from pytrainer.headless import Headless
+from pytrainer.importjob import ImportWorker
+from pytrainer.util.background import Job
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "imports")
+
+class ImportWorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.trainer = Headless(self.conf_dir)
+        self.trainer.ddbb.create_tables()
+        self.worker = ImportWorker(self.conf_dir, DATA_PATH)
+        self.reports = []
+        self.job = Job(1, lambda job, *args: self.reports.append(args))
+
+    def tearDown(self):
+        self.trainer.close()
+        shutil.rmtree(self.conf_dir)
+
+    def scan(self):
+        notes = os.path.join(self.conf_dir, "notes.txt")
+        with open(notes, "w") as output:
+            output.write("Not an activity")
+        filenames = [os.path.join(SAMPLES_DIR, "sample.fit"), notes, os.path.join(SAMPLES_DIR, "sample.tcx")]
+        self.assertEquals(3, self.worker.scan(self.job, filenames))
+        return self.reports
+
+    def accepted_activities(self):
+        """Activities as accepted in the multiple activities window"""
+        activities = []
+        for index, filename, processClass, summary in self.scan():
+            if processClass is None:
+                continue
+            for activity_id, in_db, start_time, distance, duration, sport in summary:
+                activities.append({"complete": False, "activity_id": activity_id, "file_id": index,
+                                   "rcd_sport": sport, "rcd_gpxfile": processClass.getGPXFile(activity_id, index)[1]})
+        self.reports = []
+        return activities
+
+    def test_scan_should_report_each_file(self):
+        reports = self.scan()
+        self.assertEquals([0, 1, 2], [report[0] for report in reports])
+        self.assertEquals(None, reports[1][2])
+        self.assertEquals([1, 0, 1], [len(report[3]) for report in reports])
+        self.assertFalse(reports[0][3][0][1])
+
+    def test_insert_should_commit_each_activity(self):
+        imported = self.worker.insert(self.job, self.accepted_activities())
+        self.assertEquals(2, len(imported))
+        self.assertEquals(imported, self.reports)
+        ids = [id_record for activity, id_record in imported]
+        self.assertEquals(sorted(ids), sorted(row[0] for row in self.trainer.ddbb.select("records", "id_record")))
+
+    def test_cancelled_insert_should_keep_activities_inserted(self):
+        def report(job, activity, id_record):
+            job.cancel()
+        activities = self.accepted_activities()
+        self.job = Job(1, report)
+        imported = self.worker.insert(self.job, activities)
+        self.assertEquals([activities[0]], [activity for activity, id_record in imported])
+        self.assertEquals([(imported[0][1],)], self.trainer.ddbb.select("records", "id_record"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,21 +6,59 @@ __license__ = "GPL v2 or later"
 
 import unittest
 import os
+import shutil
+import tempfile
 from lxml import etree
 from imports.file_garminfit import garminfit
 
 class GarminFitTest(unittest.TestCase):
+
+    def setUp(self):
+        current_path = os.path.dirname(os.path.abspath(__file__))
+        self.data_path = os.path.dirname(os.path.dirname(os.path.dirname(current_path))) + "/"
+        self.fit_file = current_path + "/sample.fit"
+        self.tcx_file = current_path + "/sample.tcx"
+
     def test_parse_fit_file(self):
+        garmin_fit = garminfit(None, self.data_path)
+        self.assertTrue(garmin_fit.testFile(self.fit_file))
+        self.assertEquals(1, len(garmin_fit.getActivities()))
+
+    def test_not_fit_file(self):
+        garmin_fit = garminfit(None, self.data_path)
+        self.assertFalse(garmin_fit.testFile(self.tcx_file))
+
+    def test_workout_summary(self):
+        summary = [(0, False, '2013-02-09T11:07:06', '17.05', '01:18:21', 'Running')]
+        garmin_fit = garminfit(None, self.data_path)
+        garmin_fit.testFile(self.fit_file)
+        self.assertEquals(summary, garmin_fit.activitiesSummary)
+
+    def test_gpx_file(self):
+        tmpdir = tempfile.mkdtemp()
         try:
-            current_path = os.path.dirname(os.path.abspath(__file__))
-            data_path = os.path.dirname(os.path.dirname(os.path.dirname(current_path))) + "/"
-            fit_file = current_path + "/sample.fit"
-            garmin_fit = garminfit(None, data_path)
-            xmldoc = etree.fromstring(garmin_fit.fromFIT2TCXv2(fit_file))
-            valid_xml = garmin_fit.validate(xmldoc, "schemas/GarminTrainingCenterDatabase_v2.xsd")
-            self.assertTrue(valid_xml)
-        except():
-            self.fail()
+            garmin_fit = garminfit(None, self.data_path)
+            garmin_fit.tmpdir = tmpdir
+            garmin_fit.testFile(self.fit_file)
+            sport, gpx_file = garmin_fit.getGPXFile(0, 1)
+            self.assertEquals('Running', sport)
+            gpx = etree.parse(gpx_file)
+            ns = {'gpx': 'http://www.topografix.com/GPX/1/1',
+                  'gpxdata': 'http://www.cluetrust.com/XML/GPXDATA/1/0'}
+            self.assertEquals('2013-02-09T10:07:06Z', gpx.findtext('gpx:metadata/gpx:time', namespaces=ns))
+            self.assertEquals(18, len(gpx.findall('gpx:trk/gpx:trkseg', namespaces=ns)))
+            self.assertEquals(940, len(gpx.findall('.//gpx:trkpt', namespaces=ns)))
+            trkpt = gpx.find('.//gpx:trkpt', namespaces=ns)
+            self.assertEquals('53.0', trkpt.findtext('gpx:ele', namespaces=ns))
+            self.assertEquals('2013-02-09T10:07:03Z', trkpt.findtext('gpx:time', namespaces=ns))
+            self.assertEquals('82', trkpt.findtext('gpx:extensions/gpxdata:hr', namespaces=ns))
+            lap = gpx.find('gpx:extensions/gpxdata:lap', namespaces=ns)
+            self.assertEquals('1000.0', lap.findtext('gpxdata:distance', namespaces=ns))
+            self.assertEquals('303.95', lap.findtext('gpxdata:elapsedTime', namespaces=ns))
+            self.assertEquals('60', lap.findtext('gpxdata:calories', namespaces=ns))
+            self.assertEquals('distance', lap.find('gpxdata:trigger', namespaces=ns).get('kind'))
+        finally:
+            shutil.rmtree(tmpdir)
 
 if __name__ == '__main__':
     unittest.main()
@@ -6,8 +6,11 @@ __license__ = "GPL v2 or later"
 
 import unittest
 import os
+import shutil
+import tempfile
 from lxml import etree
 from imports.file_garmintcxv2 import garmintcxv2
+from pytrainer.lib.gpx import Gpx
 
 class GarminTCXv2Test(unittest.TestCase):
     def test_valid_file(self):
@@ -35,5 +38,49 @@ class GarminTCXv2Test(unittest.TestCase):
         except():
             self.fail()
 
+    def test_streamed_summary(self):
+        summary = [(0, False, '2012-10-14T12:02:42', '10.12', '00:39:51', 'Running')]
+        current_path = os.path.dirname(os.path.abspath(__file__))
+        data_path = os.path.dirname(os.path.dirname(os.path.dirname(current_path))) + "/"
+        garmin_tcxv2 = garmintcxv2(None, data_path)
+        self.assertTrue(garmin_tcxv2.testFile(current_path + "/sample.tcx"))
+        self.assertEquals(summary, garmin_tcxv2.activitiesSummary)
+        self.assertEquals(1, len(garmin_tcxv2.tracks))
+
+    def test_not_tcx_file(self):
+        current_path = os.path.dirname(os.path.abspath(__file__))
+        data_path = os.path.dirname(os.path.dirname(os.path.dirname(current_path))) + "/"
+        garmin_tcxv2 = garmintcxv2(None, data_path)
+        self.assertFalse(garmin_tcxv2.testFile(data_path + "pytrainer/test/lib/gpxplus_sample.gpx"))
+        self.assertEquals([], garmin_tcxv2.activitiesSummary)
+
+    def test_track_as_translated(self):
+        current_path = os.path.dirname(os.path.abspath(__file__))
+        data_path = os.path.dirname(os.path.dirname(os.path.dirname(current_path))) + "/"
+        tcx_file = current_path + "/sample.tcx"
+        tmpdir = tempfile.mkdtemp()
+        try:
+            garmin_tcxv2 = garmintcxv2(None, data_path)
+            garmin_tcxv2.tmpdir = tmpdir
+            garmin_tcxv2.testFile(tcx_file)
+            parsed = Gpx(None, track=garmin_tcxv2.getTrack(0))
+            activity = etree.parse(tcx_file).find(".//{http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2}Activity")
+            garmin_tcxv2.createGPXfile(tmpdir + "/translated.gpx", activity)
+            translated = Gpx(None, tmpdir + "/translated.gpx")
+            sport, gpx_file = garmin_tcxv2.getGPXFile(0, 1)
+            written = Gpx(None, gpx_file)
+            self.assertEquals('Running', sport)
+            for gpx in (translated, written):
+                self.assertEquals(parsed.getMaxValues(), gpx.getMaxValues())
+                self.assertEquals(parsed.getUnevenness(), gpx.getUnevenness())
+                self.assertEquals(parsed.getCalories(), gpx.getCalories())
+                self.assertEquals(parsed.getHeartRateAverage(), gpx.getHeartRateAverage())
+                self.assertEquals(parsed.getTrackList(), gpx.getTrackList())
+                self.assertEquals(parsed.getStartTimeFromGPX(gpx_file), gpx.getStartTimeFromGPX(gpx_file))
+            self.assertEquals(parsed.getLaps(), written.getLaps())
+            self.assertEquals(11, len(parsed.getLaps()))
+        finally:
+            shutil.rmtree(tmpdir)
+
 if __name__ == '__main__':
     unittest.main()
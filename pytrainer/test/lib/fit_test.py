@@ -0,0 +1,156 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import collections
+import datetime
+import os
+import struct
+import tempfile
+import unittest
+from cStringIO import StringIO
+
+from pytrainer.lib.fit import FitActivity, FitError, FitReader
+
+SAMPLE_FIT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "imports", "sample.fit")
+
+def fit_file(*messages):
+    data = "".join(messages)
+    return struct.pack("<BBHI4s", 12, 0x10, 100, len(data), ".FIT") + data + "\0\0"
+
+def definition(local_type, global_number, fields, big_endian=False, developer_fields=None):
+    header = 0x40 | local_type
+    if developer_fields is not None:
+        header |= 0x20
+    message = struct.pack(">BBBHB" if big_endian else "<BBBHB", header, 0, int(big_endian),
+                          global_number, len(fields))
+    message += "".join(struct.pack("BBB", *field) for field in fields)
+    if developer_fields is not None:
+        message += chr(len(developer_fields))
+        message += "".join(struct.pack("BBB", *field) for field in developer_fields)
+    return message
+
+def data(local_type, format, *values):
+    return chr(local_type) + struct.pack(format, *values)
+
+#Record: timestamp, position_lat, position_long, heart_rate
+RECORD_FIELDS = [(253, 4, 0x86), (0, 4, 0x85), (1, 4, 0x85), (3, 1, 0x02)]
+
+class FitReaderTest(unittest.TestCase):
+
+    def read(self, content):
+        return list(FitReader(StringIO(content)))
+
+    def test_sample_messages(self):
+        with open(SAMPLE_FIT, "rb") as sample:
+            counts = collections.Counter(name for name, values in FitReader(sample))
+        self.assertEquals({"file_id": 1, "session": 1, "lap": 18, "record": 960}, dict(counts))
+
+    def test_record_values(self):
+        content = fit_file(definition(0, 20, RECORD_FIELDS),
+                           data(0, "<IiiB", 1000, 2 ** 30, -2 ** 29, 150))
+        name, values = self.read(content)[0]
+        self.assertEquals("record", name)
+        self.assertEquals(datetime.datetime(1989, 12, 31, 0, 16, 40), values["timestamp"])
+        self.assertEquals(90.0, values["position_lat"])
+        self.assertEquals(-45.0, values["position_long"])
+        self.assertEquals(150, values["heart_rate"])
+
+    def test_invalid_values_left_out(self):
+        content = fit_file(definition(0, 20, RECORD_FIELDS),
+                           data(0, "<IiiB", 1000, 0x7FFFFFFF, 0x7FFFFFFF, 0xFF))
+        name, values = self.read(content)[0]
+        self.assertEquals(["timestamp"], values.keys())
+
+    def test_big_endian(self):
+        content = fit_file(definition(0, 20, RECORD_FIELDS, big_endian=True),
+                           data(0, ">IiiB", 1000, 2 ** 30, -2 ** 29, 150))
+        name, values = self.read(content)[0]
+        self.assertEquals("record", name)
+        self.assertEquals(90.0, values["position_lat"])
+
+    def test_compressed_timestamps(self):
+        #Heart rate only, timed by the offset in the header
+        content = fit_file(definition(0, 20, RECORD_FIELDS),
+                           data(0, "<IiiB", 1000, 0, 0, 150),
+                           definition(1, 20, [(3, 1, 0x02)]),
+                           chr(0x80 | 1 << 5 | (1002 & 0x1F)) + chr(151),
+                           #Offset wrapping around 32 seconds
+                           chr(0x80 | 1 << 5 | (1030 & 0x1F)) + chr(152))
+        records = [values for name, values in self.read(content)]
+        self.assertEquals([0, 2, 30], [(record["timestamp"] - records[0]["timestamp"]).seconds
+                                       for record in records])
+        self.assertEquals([150, 151, 152], [record["heart_rate"] for record in records])
+
+    def test_unknown_and_developer_fields_skipped(self):
+        content = fit_file(definition(0, 20, [(253, 4, 0x86), (99, 2, 0x84), (3, 1, 0x02)],
+                                      developer_fields=[(0, 3, 0)]),
+                           data(0, "<IHB3s", 1000, 7, 150, "abc"),
+                           definition(1, 999, [(0, 2, 0x84)]),
+                           data(1, "<H", 1))
+        messages = self.read(content)
+        self.assertEquals(1, len(messages))
+        self.assertEquals(150, messages[0][1]["heart_rate"])
+
+    def test_not_fit(self):
+        self.assertRaises(FitError, self.read, "<?xml version='1.0'?><gpx/>")
+
+    def test_truncated(self):
+        content = fit_file(definition(0, 20, RECORD_FIELDS),
+                           data(0, "<IiiB", 1000, 0, 0, 150))
+        self.assertRaises(FitError, self.read, content[:-6])
+
+class FitActivityTest(unittest.TestCase):
+
+    def test_sample_activity(self):
+        activity = FitActivity(SAMPLE_FIT)
+        self.assertTrue(activity.is_activity)
+        self.assertEquals(1, len(activity.sessions))
+        session = activity.sessions[0]
+        self.assertEquals("running", session["sport"])
+        self.assertEquals(datetime.datetime(2013, 2, 9, 10, 7, 6), session["start_time"])
+        self.assertAlmostEquals(17052.2, session["total_distance"])
+        self.assertEquals(18, len(session["laps"]))
+        self.assertEquals(960, sum(len(lap["records"]) for lap in session["laps"]))
+        lap = session["laps"][0]
+        self.assertAlmostEquals(1000.0, lap["total_distance"])
+        self.assertEquals(73, len(lap["records"]))
+        record = lap["records"][0]
+        self.assertAlmostEquals(53.0, record["altitude"])
+        self.assertAlmostEquals(43.540191818, record["position_lat"])
+        self.assertAlmostEquals(-5.650595147, record["position_long"])
+
+    def test_laps_and_session_made_up(self):
+        content = fit_file(definition(0, 0, [(0, 1, 0x00)]),
+                           data(0, "<B", 4),
+                           definition(1, 20, RECORD_FIELDS + [(5, 4, 0x86)]),
+                           data(1, "<IiiBI", 1000, 0, 0, 150, 0),
+                           data(1, "<IiiBI", 1060, 0, 0, 150, 25000))
+        fd, filename = tempfile.mkstemp(suffix=".fit")
+        try:
+            os.write(fd, content)
+            os.close(fd)
+            activity = FitActivity(filename)
+        finally:
+            os.remove(filename)
+        self.assertEquals(1, len(activity.sessions))
+        lap = activity.sessions[0]["laps"][0]
+        self.assertEquals(60, lap["total_elapsed_time"])
+        self.assertEquals(250, lap["total_distance"])
+        self.assertEquals(2, len(lap["records"]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import gettext
+import unittest
+
+gettext.install("pytrainer", unicode=1)
+
+from pytrainer.lib.listview import parse_area
+
+class ParseAreaTest(unittest.TestCase):
+
+    def test_parse_area_should_order_corners(self):
+        self.assertEquals((43.5, -5.7, 43.6, -5.6), parse_area("area: 43.6,-5.6, 43.5,-5.7"))
+
+    def test_parse_area_should_ignore_titles(self):
+        self.assertEquals(None, parse_area("Morning run"))
+        self.assertEquals(None, parse_area("area:1,2,3"))
+
+if __name__ == '__main__':
+    unittest.main()
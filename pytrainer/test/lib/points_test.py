@@ -0,0 +1,63 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import math
+import unittest
+
+from pytrainer.lib.points import decodePoints, encodePoints
+
+class PointsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.track = [(43.5 + 0.01 * math.sin(i / 50.0), -5.6 + 0.00003 * i) for i in range(1000)]
+
+    def test_encode_should_match_reference_encoding(self):
+        points, levels = encodePoints([(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)])
+        self.assertEquals("_p~iF~ps|U_ulLnnqC_mqNvxq`@", points)
+        self.assertEquals(3, len(levels))
+
+    def test_decode_should_accept_unicode(self):
+        self.assertEquals([38.5, -120.2], decodePoints(u"_p~iF~ps|U")[:2])
+        self.assertEquals(decodePoints("_p~iF~ps|U_ulLnnqC_mqNvxq`@"), decodePoints(u"_p~iF~ps|U_ulLnnqC_mqNvxq`@"))
+
+    def test_encode_should_round_coordinates(self):
+        points, levels = encodePoints([(0.000019, -0.000019)])
+        self.assertEquals([0.00002, -0.00002], decodePoints(points))
+
+    def test_decode_should_round_trip(self):
+        decoded = decodePoints(encodePoints(self.track)[0])
+        self.assertEquals(2 * len(self.track), len(decoded))
+        for i, (lat, lon) in enumerate(self.track):
+            self.assertAlmostEquals(lat, decoded[2 * i], 5)
+            self.assertAlmostEquals(lon, decoded[2 * i + 1], 5)
+
+    def test_decode_should_ignore_incomplete_point(self):
+        self.assertEquals(2, len(decodePoints("_p~iF~ps|U_ulL")))
+        self.assertEquals([], decodePoints(""))
+
+    def test_levels_should_be_deterministic(self):
+        levels = encodePoints(self.track)[1]
+        self.assertEquals(levels, encodePoints(self.track)[1])
+        self.assertEquals(len(self.track), len(levels))
+        self.assertEquals("B", levels[0])
+        self.assertEquals("B", levels[-1])
+        self.assertTrue(levels.count("?") > levels.count("A"))
+
+    def test_empty_track(self):
+        self.assertEquals(("", ""), encodePoints([]))
+
+if __name__ == '__main__':
+    unittest.main()
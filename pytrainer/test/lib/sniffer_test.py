@@ -0,0 +1,81 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pytrainer.lib.sniffer import FileHead, ImporterRegistry, Signature
+
+TEST_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.dirname(os.path.dirname(TEST_PATH)) + "/"
+TCX_FILE = os.path.join(TEST_PATH, "imports", "sample.tcx")
+FIT_FILE = os.path.join(TEST_PATH, "imports", "sample.fit")
+GPX_FILE = os.path.join(TEST_PATH, "lib", "gpxplus_sample.gpx")
+
+class SnifferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, content):
+        filename = os.path.join(self.tmp_dir, name)
+        with open(filename, "wb") as output:
+            output.write(content)
+        return filename
+
+    def test_head_should_find_root_element(self):
+        head = FileHead(TCX_FILE)
+        self.assertEquals(("http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2", "TrainingCenterDatabase"),
+                          (head.namespace, head.root))
+        self.assertEquals(".tcx", head.extension)
+        self.assertEquals((None, None), (FileHead(FIT_FILE).namespace, FileHead(FIT_FILE).root))
+
+    def test_head_should_read_past_long_prolog(self):
+        filename = self.write("long.gpx", '<?xml version="1.0"?>\n<!-- %s -->\n<gpx xmlns="http://www.topografix.com/GPX/1/1"/>' % ("x" * 10000))
+        self.assertEquals("gpx", FileHead(filename).root)
+
+    def test_head_of_fragment_should_be_first_element(self):
+        filename = self.write("dump.xml", '<run track="1"><lap/></run>\n<track/>')
+        self.assertEquals((None, "run"), (FileHead(filename).namespace, FileHead(filename).root))
+
+    def test_signature_matches(self):
+        head = FileHead(self.write("ACTIVITY.FIT", "\x0e\x10\x00\x00\x00\x00\x00\x00.FIT"))
+        self.assertTrue(Signature(magic=".FIT", magic_offset=8).matches(head))
+        self.assertTrue(Signature(extensions=(".fit",), magic=".FIT", magic_offset=8).matches(head))
+        self.assertFalse(Signature(extensions=(".fit",), magic="\x0c").matches(head))
+        self.assertFalse(Signature(root="gpx").matches(head))
+
+    def test_registry_should_only_offer_matching_importers(self):
+        registry = ImporterRegistry(DATA_PATH)
+        self.assertEquals(["garmintcxv2"], [importer.__name__ for importer in registry.candidates(TCX_FILE)])
+        self.assertEquals(["garminfit"], [importer.__name__ for importer in registry.candidates(FIT_FILE)])
+        self.assertEquals(["gpxplus", "gpxplusNokia"], [importer.__name__ for importer in registry.candidates(GPX_FILE)])
+        self.assertEquals([], registry.candidates(self.write("notes.txt", "Nothing to import")))
+
+    def test_registry_should_identify_file(self):
+        registry = ImporterRegistry(DATA_PATH)
+        processClass = registry.identify(TCX_FILE)
+        self.assertEquals("garmintcxv2", processClass.__class__.__name__)
+        self.assertEquals(1, len(processClass.getActivitiesSummary()))
+        self.assertEquals(None, registry.identify(self.write("notes.txt", "Nothing to import")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import BaseHTTPServer
+import SocketServer
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import zipfile
+from cStringIO import StringIO
+
+from pytrainer.lib.srtmdownload import TileDownloader
+
+def archive(tile_name, data):
+    zobj = StringIO()
+    z = zipfile.ZipFile(zobj, 'w', zipfile.ZIP_DEFLATED)
+    z.writestr('%s.tif' % tile_name, data)
+    z.close()
+    return zobj.getvalue()
+
+class TileHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    """Serves the files of its server, honouring Range requests if asked to."""
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.getheader('Range')))
+        content = self.server.files.get(self.path)
+        if content is None:
+            self.send_error(404)
+            return
+        start = 0
+        range_header = self.headers.getheader('Range')
+        if range_header and self.server.ranges:
+            start = int(range_header.split('=')[1].rstrip('-'))
+            if start >= len(content):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, len(content) - 1, len(content)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def log_message(self, *args):
+        pass
+
+class TileServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, files, ranges=True):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), TileHandler)
+        self.files = files
+        self.ranges = ranges
+        self.requests = []
+
+    def server_config(self, path='/srtm/'):
+        return {'url': 'http://127.0.0.1:%d%s' % (self.server_address[1], path), 'ext': '.zip', 'active': True}
+
+class TileDownloaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.srtm_dir = tempfile.mkdtemp()
+        self.data = dict((name, os.urandom(50000)) for name in ('srtm_37_04', 'srtm_38_04', 'srtm_37_05'))
+        self.archives = dict(('/srtm/%s.zip' % name, archive(name, data)) for name, data in self.data.items())
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(self.srtm_dir)
+
+    def start_server(self, files, ranges=True):
+        server = TileServer(files, ranges)
+        thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.servers.append(server)
+        return server
+
+    def read_tile(self, name):
+        with open(os.path.join(self.srtm_dir, '%s.tif' % name), 'rb') as tif_file:
+            return tif_file.read()
+
+    def test_download_should_extract_tile(self):
+        server = self.start_server(self.archives)
+        progress = []
+        downloader = TileDownloader(self.srtm_dir, [server.server_config()], lambda *args: progress.append(args), chunk_size=4096)
+        path = downloader.download('srtm_37_04')
+        self.assertEquals(os.path.join(self.srtm_dir, 'srtm_37_04.tif'), path)
+        self.assertEquals(self.data['srtm_37_04'], self.read_tile('srtm_37_04'))
+        self.assertEquals(['srtm_37_04.tif'], os.listdir(self.srtm_dir))
+        size = len(self.archives['/srtm/srtm_37_04.zip'])
+        self.assertEquals((0, size), progress[0][1:])
+        self.assertEquals((size, size), progress[-1][1:])
+
+    def test_download_should_resume_partial_archive(self):
+        server = self.start_server(self.archives)
+        content = self.archives['/srtm/srtm_37_04.zip']
+        with open(os.path.join(self.srtm_dir, 'srtm_37_04.zip.part'), 'wb') as part_file:
+            part_file.write(content[:1000])
+        downloader = TileDownloader(self.srtm_dir, [server.server_config()])
+        self.assertTrue(downloader.download('srtm_37_04') is not None)
+        self.assertEquals([('/srtm/srtm_37_04.zip', 'bytes=1000-')], server.requests)
+        self.assertEquals(self.data['srtm_37_04'], self.read_tile('srtm_37_04'))
+
+    def test_download_should_restart_if_range_is_ignored(self):
+        server = self.start_server(self.archives, ranges=False)
+        with open(os.path.join(self.srtm_dir, 'srtm_37_04.zip.part'), 'wb') as part_file:
+            part_file.write('garbage')
+        downloader = TileDownloader(self.srtm_dir, [server.server_config()])
+        self.assertTrue(downloader.download('srtm_37_04') is not None)
+        self.assertEquals(self.data['srtm_37_04'], self.read_tile('srtm_37_04'))
+
+    def test_download_should_try_next_server(self):
+        broken = dict((path, content[:-100] + '\0' * 100) for path, content in self.archives.items())
+        bad_server = self.start_server(broken)
+        server = self.start_server(self.archives)
+        downloader = TileDownloader(self.srtm_dir, [server.server_config('/missing/'), bad_server.server_config(), server.server_config()])
+        self.assertTrue(downloader.download('srtm_37_04') is not None)
+        self.assertEquals(self.data['srtm_37_04'], self.read_tile('srtm_37_04'))
+        self.assertEquals(['srtm_37_04.tif'], os.listdir(self.srtm_dir))
+
+    def test_download_should_fail_without_tile(self):
+        server = self.start_server(self.archives)
+        downloader = TileDownloader(self.srtm_dir, [server.server_config()])
+        self.assertEquals(None, downloader.download('srtm_01_01'))
+
+    def test_cancelled_download_should_keep_partial_archive(self):
+        server = self.start_server(self.archives)
+        downloader = TileDownloader(self.srtm_dir, [server.server_config()], chunk_size=4096)
+        def progress(tile_name, size_got, size_total):
+            if size_got >= 8192:
+                downloader.cancel()
+        downloader.progress = progress
+        self.assertEquals(None, downloader.download('srtm_37_04'))
+        self.assertEquals(8192, os.path.getsize(os.path.join(self.srtm_dir, 'srtm_37_04.zip.part')))
+
+    def test_download_all_should_fetch_missing_tiles_concurrently(self):
+        server = self.start_server(self.archives)
+        with open(os.path.join(self.srtm_dir, 'srtm_37_05.tif'), 'wb') as tif_file:
+            tif_file.write('there')
+        downloader = TileDownloader(self.srtm_dir, [server.server_config()])
+        results = downloader.download_all(['srtm_37_04', 'srtm_38_04', 'srtm_37_05', 'srtm_01_01'])
+        self.assertEquals(['srtm_01_01', 'srtm_37_04', 'srtm_37_05', 'srtm_38_04'], sorted(results))
+        self.assertEquals(None, results['srtm_01_01'])
+        self.assertEquals(self.data['srtm_38_04'], self.read_tile('srtm_38_04'))
+        self.assertEquals(3, len(server.requests))
+
+if __name__ == '__main__':
+    unittest.main()
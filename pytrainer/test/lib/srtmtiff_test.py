@@ -0,0 +1,111 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from pytrainer.lib.srtmlayer import SrtmLayer, TileCache
+from pytrainer.lib.srtmtiff import SrtmTiff, bilinear_interpolation, interpolate, tile_paths
+
+DATA = numpy.array([[10, 20, 30],
+                    [40, 50, 60],
+                    [70, 80, 90]], dtype=numpy.int16)
+
+def write_tile(srtm_dir, ilon, ilat, data=DATA):
+    """Writes a converted 5 degree tile of 3x3 pixels, as if from a GeoTIFF file."""
+    data_path, header_path = tile_paths(os.path.join(srtm_dir, 'srtm_%02d_%02d.tif' % (ilon, ilat)))
+    numpy.save(data_path, data)
+    with open(header_path, 'w') as header_file:
+        json.dump({'geotransform': [-185.0 + 5 * ilon, 5 / 3.0, 0, 65.0 - 5 * ilat, 0, -5 / 3.0]}, header_file)
+
+class InterpolateTest(unittest.TestCase):
+
+    def test_interpolate_should_match_bilinear_interpolation(self):
+        rows = [0.0, 0.25, 1.5, 0.9]
+        columns = [0.0, 0.75, 1.5, 0.1]
+        expected = [bilinear_interpolation(10.0, 20.0, 40.0, 50.0, 0.0, 0.0),
+                    bilinear_interpolation(10.0, 20.0, 40.0, 50.0, 0.25, 0.75),
+                    bilinear_interpolation(50.0, 60.0, 80.0, 90.0, 0.5, 0.5),
+                    bilinear_interpolation(10.0, 20.0, 40.0, 50.0, 0.9, 0.1)]
+        self.assertEquals(expected, list(interpolate(DATA, rows, columns)))
+
+    def test_interpolate_should_use_last_cells_at_edges(self):
+        self.assertEquals([90.0, 10.0], list(interpolate(DATA, [2.0, 0.0], [2.0, 0.0])))
+
+    def test_interpolate_should_not_overflow(self):
+        data = numpy.array([[-32000, 32000], [32000, -32000]], dtype=numpy.int16)
+        self.assertEquals([0.0], list(interpolate(data, [0.5], [0.5])))
+
+class SrtmLayerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.srtm_dir = tempfile.mkdtemp()
+        #Tile 37 04 spans 0 to 5 E, 40 to 45 N
+        write_tile(self.srtm_dir, 37, 4)
+        self.layer = SrtmLayer(self.srtm_dir)
+        #Not to try downloading tiles that are not there
+        self.layer._missing.update(['srtm_37_05.tif', 'srtm_38_05.tif'])
+
+    def tearDown(self):
+        shutil.rmtree(self.srtm_dir)
+
+    def test_tiles_should_be_memory_mapped(self):
+        srtm = SrtmTiff(os.path.join(self.srtm_dir, 'srtm_37_04.tif'))
+        self.assertTrue(isinstance(srtm.tile['data'], numpy.memmap))
+        self.assertEquals(45.0, srtm.tile['N'])
+        self.assertAlmostEquals(5.0, srtm.tile['E'])
+
+    def test_get_elevations_should_group_points_by_tile(self):
+        write_tile(self.srtm_dir, 38, 4, DATA * 2)
+        elevations = self.layer.get_elevations([45 - 5 / 3.0, 45 - 5 / 3.0, 42.0], [5 / 3.0, 5 + 5 / 3.0, 5 / 3.0])
+        self.assertEquals([50.0, 100.0], [round(elevation, 6) for elevation in elevations[:2]])
+        self.assertAlmostEquals(bilinear_interpolation(50.0, 60.0, 80.0, 90.0, 0.8, 0.0), elevations[2])
+        self.assertAlmostEquals(50.0, self.layer.get_elevation(45 - 5 / 3.0, 5 / 3.0))
+
+    def test_get_elevations_should_read_neighbour_tile_at_edge(self):
+        write_tile(self.srtm_dir, 38, 4, DATA * 2)
+        elevation = self.layer.get_elevations([44.5], [4.5])[0]
+        self.assertAlmostEquals(bilinear_interpolation(30.0, 20.0, 60.0, 80.0, 0.3, 0.7), elevation)
+
+    def test_get_elevations_should_repeat_edge_without_neighbour(self):
+        self.layer._missing.add('srtm_38_04.tif')
+        elevations = self.layer.get_elevations([44.5, 44.5], [4.5, 5.5])
+        self.assertAlmostEquals(39.0, elevations[0])
+        self.assertTrue(numpy.isnan(elevations[1]))
+        self.assertEquals(False, self.layer.get_elevation(44.5, 5.5))
+
+class TileCacheTest(unittest.TestCase):
+
+    def test_least_recently_used_tiles_should_be_evicted(self):
+        tiles = dict((name, SrtmTiff.__new__(SrtmTiff)) for name in "abc")
+        for tile in tiles.values():
+            tile.tile = {'data': DATA}
+        cache = TileCache(max_bytes=2 * DATA.nbytes)
+        cache.put("a", tiles["a"])
+        cache.put("b", tiles["b"])
+        self.assertTrue(cache.get("a") is tiles["a"])
+        cache.put("c", tiles["c"])
+        self.assertEquals(None, cache.get("b"))
+        self.assertEquals(2, len(cache))
+        self.assertEquals(2 * DATA.nbytes, cache.nbytes)
+
+if __name__ == '__main__':
+    unittest.main()
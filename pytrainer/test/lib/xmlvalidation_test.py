@@ -0,0 +1,73 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from lxml import etree
+
+from pytrainer.lib.xmlValidation import get_schema, get_transform
+
+SCHEMA = '''<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+  <xsd:element name="%s" type="xsd:string"/>
+</xsd:schema>'''
+
+STYLESHEET = '''<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+  <xsl:template match="/"><out><xsl:value-of select="/in"/></out></xsl:template>
+</xsl:stylesheet>'''
+
+class XmlValidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, content, mtime=None):
+        filename = os.path.join(self.tmp_dir, name)
+        with open(filename, "w") as output:
+            output.write(content)
+        if mtime is not None:
+            os.utime(filename, (mtime, mtime))
+        return filename
+
+    def test_schema_should_be_compiled_once(self):
+        xsd = self.write("a.xsd", SCHEMA % "run", mtime=1000000000)
+        schema = get_schema(xsd)
+        self.assertTrue(schema.validate(etree.fromstring("<run>x</run>")))
+        #The same file through another path
+        self.assertTrue(get_schema(os.path.join(self.tmp_dir, ".", "a.xsd")) is schema)
+
+    def test_schema_should_be_compiled_again_when_changed(self):
+        xsd = self.write("b.xsd", SCHEMA % "run", mtime=1000000000)
+        schema = get_schema(xsd)
+        self.write("b.xsd", SCHEMA % "ride", mtime=1000000100)
+        changed = get_schema(xsd)
+        self.assertFalse(changed is schema)
+        self.assertTrue(changed.validate(etree.fromstring("<ride>x</ride>")))
+        self.assertFalse(changed.validate(etree.fromstring("<run>x</run>")))
+
+    def test_transform_should_be_compiled_once(self):
+        xsl = self.write("c.xsl", STYLESHEET)
+        transform = get_transform(xsl)
+        self.assertTrue(get_transform(xsl) is transform)
+        self.assertEquals("<out>x</out>", etree.tostring(transform(etree.fromstring("<in>x</in>")).getroot()))
+
+if __name__ == '__main__':
+    unittest.main()
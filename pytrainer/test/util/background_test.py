@@ -0,0 +1,99 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import Queue
+import threading
+import unittest
+
+from pytrainer.util.background import LatestJobRunner
+
+class LatestJobRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        #Stands for the GUI main loop
+        self.dispatched = Queue.Queue()
+        self.runner = LatestJobRunner(lambda function, *args: self.dispatched.put((function, args)))
+        self.results = []
+
+    def run_dispatched(self):
+        function, args = self.dispatched.get(timeout=5)
+        function(*args)
+
+    def done(self, job, result):
+        self.results.append(("done", job.number, result))
+
+    def failed(self, job, e):
+        self.results.append(("failed", job.number, str(e)))
+
+    def discard(self, job, result):
+        self.results.append(("discard", job.number, result))
+
+    def test_done_should_get_result(self):
+        self.runner.submit(lambda job: "page", self.done)
+        self.run_dispatched()
+        self.assertEquals([("done", 1, "page")], self.results)
+
+    def test_failed_should_get_exception(self):
+        def work(job):
+            raise ValueError("no track")
+        self.runner.submit(work, self.done, self.failed)
+        self.run_dispatched()
+        self.assertEquals([("failed", 1, "no track")], self.results)
+
+    def test_new_job_should_cancel_previous(self):
+        started = threading.Event()
+        resume = threading.Event()
+        def slow(job):
+            started.set()
+            resume.wait(5)
+            job.check()
+            return "old"
+        first = self.runner.submit(slow, self.done)
+        started.wait(5)
+        self.runner.submit(lambda job: "new", self.done)
+        self.assertTrue(first.cancelled)
+        resume.set()
+        self.run_dispatched()
+        self.assertEquals([("done", 2, "new")], self.results)
+        self.assertTrue(self.dispatched.empty())
+
+    def test_result_of_job_cancelled_after_finishing_should_be_discarded(self):
+        self.runner.submit(lambda job: "page", self.done, discard=self.discard)
+        function, args = self.dispatched.get(timeout=5)
+        self.runner.cancel()
+        function(*args)
+        self.assertEquals([("discard", 1, "page")], self.results)
+
+    def test_progress_should_be_reported_until_cancelled(self):
+        reported = threading.Event()
+        resume = threading.Event()
+        def work(job):
+            job.report(1, "first.tcx")
+            reported.set()
+            resume.wait(5)
+            job.report(2, "second.tcx")
+            return 2
+        progress = lambda job, count, filename: self.results.append(("progress", count, filename))
+        self.runner.submit(work, self.done, progress=progress)
+        reported.wait(5)
+        self.run_dispatched()
+        self.runner.cancel()
+        resume.set()
+        self.run_dispatched()
+        self.assertEquals([("progress", 1, "first.tcx")], self.results)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import unittest
+import datetime
+from pytrainer.util.bucket import bucket_by_period, parse_day_numbers, DAY_OF_WEEK, DAY_OF_MONTH, MONTH, YEAR
+
+class BucketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dates = ["2012-10-14", "2012-10-14", "2012-10-15", "2013-02-01", "2012-10-14"]
+        self.sports = ["Run", "Run", "Run", "Bike", "Bike"]
+        self.values = [10.0, 5.0, 7.0, 30.0, 20.0]
+
+    def test_parse_day_numbers_should_accept_strings_and_dates(self):
+        days = parse_day_numbers(["1970-01-02", datetime.date(1970, 1, 1)])
+        self.assertEquals([1, 0], list(days))
+
+    def test_bucket_by_day_of_month_should_sum_per_sport(self):
+        result = bucket_by_period(self.dates, self.sports, self.values, DAY_OF_MONTH)
+        self.assertEquals({"Run": {u"14": 15.0, u"15": 7.0}, "Bike": {u"01": 30.0, u"14": 20.0}}, result)
+
+    def test_bucket_by_month_should_average_when_requested(self):
+        result = bucket_by_period(self.dates, self.sports, self.values, MONTH, average=True)
+        self.assertEquals({"Run": {u"10": 22.0 / 3}, "Bike": {u"02": 30.0, u"10": 20.0}}, result)
+
+    def test_bucket_by_year_should_label_with_full_year(self):
+        result = bucket_by_period(self.dates, self.sports, self.values, YEAR)
+        self.assertEquals({"Run": {u"2012": 22.0}, "Bike": {u"2012": 20.0, u"2013": 30.0}}, result)
+
+    def test_bucket_by_day_of_week_should_match_strftime(self):
+        result = bucket_by_period(self.dates, self.sports, self.values, DAY_OF_WEEK)
+        sunday = unicode(datetime.date(2012, 10, 14).strftime("%a"))
+        monday = unicode(datetime.date(2012, 10, 15).strftime("%a"))
+        friday = unicode(datetime.date(2013, 2, 1).strftime("%a"))
+        self.assertEquals({"Run": {sunday: 15.0, monday: 7.0}, "Bike": {friday: 30.0, sunday: 20.0}}, result)
+
+    def test_bucket_by_period_should_return_empty_dict_for_no_dates(self):
+        self.assertEquals({}, bucket_by_period([], [], [], MONTH))
+
+    def test_bucket_by_period_should_reject_unknown_format(self):
+        self.assertRaises(ValueError, bucket_by_period, self.dates, self.sports, self.values, "%j")
+
+if __name__ == '__main__':
+    unittest.main()
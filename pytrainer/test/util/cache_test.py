@@ -0,0 +1,68 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import unittest
+from pytrainer.util.cache import LruCache
+
+class LruCacheTest(unittest.TestCase):
+
+    def test_constructor_should_reject_non_positive_size(self):
+        self.assertRaises(ValueError, LruCache, 0)
+
+    def test_get_should_return_default_for_missing_key(self):
+        cache = LruCache(2)
+        self.assertEquals(None, cache.get("a"))
+        self.assertEquals(1, cache.get("a", 1))
+
+    def test_put_should_evict_least_recently_used(self):
+        cache = LruCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        evicted = cache.put("c", 3)
+        self.assertEquals([("b", 2)], evicted)
+        self.assertEquals(["a", "c"], cache.keys())
+
+    def test_put_should_replace_existing_key(self):
+        cache = LruCache(2)
+        cache.put("a", 1)
+        cache.put("a", 2)
+        self.assertEquals(1, len(cache))
+        self.assertEquals(2, cache.get("a"))
+
+    def test_sizeof_should_budget_by_value_size(self):
+        cache = LruCache(10, sizeof=len)
+        cache.put("a", "xxxx")
+        cache.put("b", "xxxx")
+        cache.put("c", "xxxx")
+        self.assertEquals(["b", "c"], cache.keys())
+        self.assertEquals(8, cache.size)
+
+    def test_put_should_keep_single_entry_over_budget(self):
+        cache = LruCache(2, sizeof=len)
+        cache.put("a", "xxxx")
+        self.assertTrue("a" in cache)
+
+    def test_pop_should_release_size(self):
+        cache = LruCache(10, sizeof=len)
+        cache.put("a", "xxxx")
+        self.assertEquals("xxxx", cache.pop("a"))
+        self.assertEquals(0, cache.size)
+        cache.clear()
+        self.assertEquals(0, len(cache))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import unittest
+import datetime
+import numpy
+from pytrainer.util.downsample import downsample, lttb_indices, point_budget
+
+class DownsampleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.x = numpy.arange(40000, dtype=float)
+        self.y = numpy.sin(self.x / 500.0) * 50 + 120
+        self.y[12345] = 250 # a spike that must survive
+        self.y[30000] = -10
+
+    def test_lttb_indices_should_keep_first_and_last_points(self):
+        indices = lttb_indices(self.x, self.y, 100)
+        self.assertEquals(100, len(indices))
+        self.assertEquals(0, indices[0])
+        self.assertEquals(39999, indices[-1])
+        self.assertTrue(numpy.all(numpy.diff(indices) > 0))
+
+    def test_lttb_indices_should_return_everything_below_threshold(self):
+        self.assertEquals([0, 1, 2], list(lttb_indices(self.x[:3], self.y[:3], 10)))
+
+    def test_downsample_should_respect_budget_and_keep_extrema(self):
+        x, y = downsample(self.x, self.y, 1000)
+        self.assertTrue(len(x) <= 1002)
+        self.assertEquals(250, max(y))
+        self.assertEquals(-10, min(y))
+
+    def test_downsample_should_only_sample_visible_range(self):
+        x, y = downsample(self.x, self.y, 1000, xlim=(10000, 11000))
+        self.assertEquals(9999, x[0])
+        self.assertEquals(11001, x[-1])
+
+    def test_downsample_should_keep_extrema_inside_zoomed_range(self):
+        x, y = downsample(self.x, self.y, 100, xlim=(12000, 13000), ylim=(100, 200))
+        self.assertTrue(12345 in x)
+
+    def test_downsample_should_leave_short_series_alone(self):
+        x, y = downsample([1, 2, 3], [4, 5, 6], 100)
+        self.assertEquals([1, 2, 3], list(x))
+        self.assertEquals([4, 5, 6], list(y))
+
+    def test_downsample_should_leave_date_series_alone(self):
+        dates = [datetime.date(2012, 1, d) for d in xrange(1, 4)]
+        x, y = downsample(dates, [1, 2, 3], 2)
+        self.assertTrue(x is dates)
+
+    def test_point_budget_should_have_a_minimum(self):
+        self.assertEquals(point_budget(100), point_budget(1))
+        self.assertTrue(point_budget(1000) > point_budget(500))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import unittest
+
+import numpy
+
+from pytrainer.util.raster import rasterize
+
+class RasterizeTest(unittest.TestCase):
+
+    def test_rasterize_should_join_points(self):
+        x, y = rasterize(numpy.array([0.5, 10.5]), numpy.array([0.5, 0.5]), 64)
+        self.assertEquals(range(11), sorted(set(x.tolist())))
+        self.assertEquals([0], sorted(set(y.tolist())))
+
+    def test_rasterize_should_not_join_gaps(self):
+        x, y = rasterize(numpy.array([0.5, 1000.5]), numpy.array([0.5, 0.5]), 64)
+        self.assertEquals([0, 1000], x.tolist())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import gettext
+import shutil
+import tempfile
+import unittest
+
+gettext.install("pytrainer", unicode=1)
+
+from pytrainer.headless import Headless
+from pytrainer.waypoint import Waypoint
+
+class WaypointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.trainer = Headless(self.conf_dir)
+        self.trainer.ddbb.create_tables()
+        self.waypoint = Waypoint(parent=self.trainer)
+        self.summit = self.waypoint.addWaypoint(lat=43.5, lon=-5.7, name=u"Summit")
+        self.bridge = self.waypoint.addWaypoint(lat=43.51, lon=-5.69, name=u"Bridge")
+        self.island = self.waypoint.addWaypoint(lat=-17.5, lon=179.9, name=u"Island")
+
+    def tearDown(self):
+        self.trainer.close()
+        shutil.rmtree(self.conf_dir)
+
+    def ids(self, waypoints):
+        return [waypoint[0] for waypoint in waypoints]
+
+    def test_get_waypoints_in_area(self):
+        self.assertEquals([self.bridge, self.summit], self.ids(self.waypoint.getWaypointsInArea(43.4, -5.8, 43.6, -5.6)))
+        self.assertEquals([self.summit], self.ids(self.waypoint.getWaypointsInArea(43.4, -5.8, 43.505, -5.6)))
+        self.assertEquals([self.bridge], self.ids(self.waypoint.getWaypointsInArea(43.4, -5.8, 43.6, -5.6, limit=1)))
+
+    def test_get_waypoints_in_area_across_antimeridian(self):
+        self.assertEquals([self.island], self.ids(self.waypoint.getWaypointsInArea(-20, 179, -15, -179)))
+
+    def test_get_nearest_waypoint(self):
+        self.assertEquals(self.summit, self.waypoint.getNearestWaypoint(43.502, -5.702)[0])
+        self.assertEquals(self.bridge, self.waypoint.getNearestWaypoint(43.7, -5.5)[0])
+        self.assertEquals(self.island, self.waypoint.getNearestWaypoint(-20, 170)[0])
+        self.assertEquals(self.island, self.waypoint.getNearestWaypoint(-17.5, -179.9)[0])
+
+    def test_get_nearest_waypoint_without_waypoints(self):
+        for id_waypoint in (self.summit, self.bridge, self.island):
+            self.waypoint.removeWaypoint(id_waypoint)
+        self.assertEquals(None, self.waypoint.getNearestWaypoint(43.5, -5.7))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,13 +16,14 @@
 #along with this program; if not, write to the Free Software
 #Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
 
-import datetime
 import logging
 from gui.drawArea import DrawArea
+from pytrainer.util.bucket import bucket_by_period
 
 class TimeGraph(object):
     def __init__(self, sports, vbox = None, window = None, combovalue = None, combovalue2 = None, main = None):
         self.drawarea = DrawArea(vbox, window)
+        self.pytrainer_main = main
         self.SPORT_FIELD = 9
         self.sport_colors = dict([(sport.name, sport.color.to_hex_string()) for sport in sports])
 
@@ -49,35 +50,19 @@ class TimeGraph(object):
             return self.getFloatValue(record[value_sel])
     
     def get_values(self, values, value_selected, key_format, sportfield=9):
-        valueDict = {} #Stores the totals
-        valueCount = {} #Counts the totals to allow for averaging if needed
-        sportColors = {}
-
+        dates = []
+        sports = []
+        graph_values = []
         for record in values:
             if record[0]:
-                day = unicode(datetime.datetime.strptime(record[0], "%Y-%m-%d").strftime(key_format)) # Gives year for this record
-                sport = record[sportfield]
-                value = self.getValue(record, value_selected)
-                if sport in valueDict: #Already got this sport
-                    if day in valueDict[sport]: #Already got this sport on this day
-                        valueDict[sport][day] += value
-                        valueCount[sport][day] += 1
-                    else: #New day for this sport
-                        valueDict[sport][day] = value
-                        valueCount[sport][day] = 1
-                else: #New sport
-                    valueDict[sport] = {day: value}
-                    valueCount[sport] = {day: 1}
+                dates.append(record[0])
+                sports.append(record[sportfield])
+                graph_values.append(self.getValue(record, value_selected))
             else:
                 logging.debug("No date string found, skipping entry: " + str(record))
-                
-        if value_selected in (2, 3):
-            total = {}
-            count = {}
-            for sport in valueDict.keys():
-                for day in valueDict[sport].keys():
-                    if valueCount[sport][day] > 1: #Only average if 2 or more entries on this day
-                        valueDict[sport][day] /= valueCount[sport][day]
+
+        #Average heart rate and speed, sum everything else
+        valueDict = bucket_by_period(dates, sports, graph_values, key_format, average=value_selected in (2, 3))
 
         if value_selected == 1: #Values are of time type
             valuesAreTime=True
@@ -86,7 +71,27 @@ class TimeGraph(object):
 
         return valueDict, valuesAreTime
 
-    def drawgraph(self,values, extra=None, x_func=None):
+    def get_cache_key(self, period, value_selected, value_selected2):
+        '''Key of the rendered graph cache, None if the graph cannot be cached
+            period identifies the records graphed, e.g. date range and sport'''
+        if period is None or self.pytrainer_main is None:
+            return None
+        return (self.__class__.__name__, period, value_selected, value_selected2,
+                self.pytrainer_main.ddbb.data_version, tuple(sorted(self.sport_colors.items())))
+
+    def drawgraph(self,values, extra=None, x_func=None, period=None):
+        value_selected = self.combovalue.get_active()
+        value_selected2 = self.combovalue2.get_active()
+        if value_selected < 0:
+            self.combovalue.set_active(0)
+            value_selected = 0
+        cache_key = self.get_cache_key(period, value_selected, value_selected2)
+        redraw = lambda: self.render(values, x_func, value_selected, value_selected2, cache_key)
+        if self.drawarea.showCached(cache_key, redraw):
+            return
+        redraw()
+
+    def render(self, values, x_func, value_selected, value_selected2, cache_key=None):
         xval = []
         yval = []
         xlab = []
@@ -94,11 +99,6 @@ class TimeGraph(object):
         tit = []
         
         valsAreTime = []
-        value_selected = self.combovalue.get_active()
-        value_selected2 = self.combovalue2.get_active()
-        if value_selected < 0:
-            self.combovalue.set_active(0)
-            value_selected = 0
 
         y1,ylabel,title,y2 = self.get_value_params(value_selected)
         ylab.append(ylabel)
@@ -124,7 +124,7 @@ class TimeGraph(object):
             xlab.append(xvalues)
             valsAreTime.append(valuesAreTime)
         #Draw chart
-        self.drawarea.drawStackedBars(xlab,yval,ylab,tit,valsAreTime, colors = self.sport_colors)
+        self.drawarea.drawStackedBars(xlab,yval,ylab,tit,valsAreTime, colors = self.sport_colors, cache_key = cache_key)
 
     def get_value_params(self,value):
         return self.value_params[value]
@@ -41,8 +41,8 @@ class TotalGraph(TimeGraph):
             years |= set([str(x) for x in xrange(int(min(s.keys())), int(max(s.keys()))+1)])
         return sorted(list(years))
 
-    def drawgraph(self,values):
-        TimeGraph.drawgraph(self, values, x_func=self.getYears)
+    def drawgraph(self,values, period=None):
+        TimeGraph.drawgraph(self, values, x_func=self.getYears, period=period)
 
     def getValue(self,record,value_selected):
         #hacemos una relacion entre el value_selected y los values / we make a relation between value_selected and the values
@@ -0,0 +1,17 @@
+-- spatial index of tracks added in version 1.11.0
+
+create table track_bounds (
+	record integer primary key,
+	min_lat float,
+	min_lon float,
+	max_lat float,
+	max_lon float
+);
+
+create table track_cells (
+	record integer,
+	geohash char(7)
+);
+
+create index track_cells_geohash on track_cells (geohash);
+create index track_cells_record on track_cells (record);
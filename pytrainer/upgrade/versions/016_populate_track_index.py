@@ -0,0 +1,34 @@
+from pytrainer.upgrade.context import UPGRADE_CONTEXT
+from pytrainer.core.spatial import PRECISIONS, track_cells
+from pytrainer.lib.gpx import track_points
+from sqlalchemy.sql.expression import text
+import logging
+import os
+import sqlalchemy
+
+# spatial index of tracks added in version 1.11.0
+
+def upgrade(migrate_engine=None):
+    if migrate_engine is None:
+        # sqlalchemy-migrate 0.5.4 does not provide migrate engine to upgrade scripts
+        migrate_engine = sqlalchemy.create_engine(UPGRADE_CONTEXT.db_url)
+    logging.info("Populating track_bounds and track_cells tables")
+    records = migrate_engine.execute("select id_record from records")
+    record_ids = [record["id_record"] for record in records]
+    records.close()
+    for record_id in record_ids:
+        gpx_file = os.path.join(UPGRADE_CONTEXT.conf_dir, "gpx", "%d.gpx" % record_id)
+        if not os.path.isfile(gpx_file):
+            continue
+        try:
+            lats, lons = track_points(gpx_file)
+        except Exception as e:
+            logging.info("Error reading track of record_id %s: %s" % (record_id, e))
+            continue
+        if not lats:
+            continue
+        logging.debug("indexing track of record %s", record_id)
+        migrate_engine.execute(text("insert into track_bounds (record, min_lat, min_lon, max_lat, max_lon) values (:record, :min_lat, :min_lon, :max_lat, :max_lon)"),
+                               record=record_id, min_lat=min(lats), min_lon=min(lons), max_lat=max(lats), max_lon=max(lons))
+        migrate_engine.execute(text("insert into track_cells (record, geohash) values (:record, :geohash)"),
+                               [{"record": record_id, "geohash": cell} for precision in PRECISIONS for cell in track_cells(lats, lons, precision)])
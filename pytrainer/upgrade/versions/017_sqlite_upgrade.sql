@@ -0,0 +1,28 @@
+-- routes and segments added in version 1.11.0
+
+create table track_fingerprints (
+	record integer primary key,
+	route integer,
+	length float,
+	points varchar(500)
+);
+
+create table segments (
+	id_segment integer primary key autoincrement,
+	name varchar(200),
+	start_lat float,
+	start_lon float,
+	end_lat float,
+	end_lon float,
+	distance float
+);
+
+create table segment_efforts (
+	segment integer,
+	record integer,
+	elapsed_time float
+);
+
+create index track_fingerprints_route on track_fingerprints (route);
+create index segment_efforts_segment on segment_efforts (segment);
+create index segment_efforts_record on segment_efforts (record);
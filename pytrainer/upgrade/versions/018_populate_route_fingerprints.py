@@ -0,0 +1,40 @@
+from pytrainer.upgrade.context import UPGRADE_CONTEXT
+from pytrainer.core.route import LENGTH_TOLERANCE, closest_route, encode_fingerprint, fingerprint
+from pytrainer.lib.gpx import track_points
+from sqlalchemy.sql.expression import text
+import logging
+import os
+import sqlalchemy
+
+# routes and segments added in version 1.11.0
+
+def upgrade(migrate_engine=None):
+    if migrate_engine is None:
+        # sqlalchemy-migrate 0.5.4 does not provide migrate engine to upgrade scripts
+        migrate_engine = sqlalchemy.create_engine(UPGRADE_CONTEXT.db_url)
+    logging.info("Populating track_fingerprints table")
+    records = migrate_engine.execute("select id_record from records order by id_record")
+    record_ids = [record["id_record"] for record in records]
+    records.close()
+    fingerprints = []
+    for record_id in record_ids:
+        gpx_file = os.path.join(UPGRADE_CONTEXT.conf_dir, "gpx", "%d.gpx" % record_id)
+        if not os.path.isfile(gpx_file):
+            continue
+        try:
+            lats, lons = track_points(gpx_file)
+        except Exception as e:
+            logging.info("Error reading track of record_id %s: %s" % (record_id, e))
+            continue
+        if len(lats) < 2:
+            continue
+        length, print_lats, print_lons = fingerprint(lats, lons)
+        candidates = [(route, print_) for route, other_length, print_ in fingerprints
+                      if abs(other_length - length) <= LENGTH_TOLERANCE * length]
+        route = closest_route((print_lats, print_lons), candidates)
+        if route is None:
+            route = record_id
+        logging.debug("record %s follows route %s", record_id, route)
+        fingerprints.append((route, length, (print_lats, print_lons)))
+        migrate_engine.execute(text("insert into track_fingerprints (record, route, length, points) values (:record, :route, :length, :points)"),
+                               record=record_id, route=route, length=length, points=encode_fingerprint(print_lats, print_lons))
@@ -0,0 +1,3 @@
+-- waypoint position index added in version 1.11.0
+
+create index waypoints_lat_lon on waypoints (lat, lon);
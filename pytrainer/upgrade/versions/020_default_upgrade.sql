@@ -0,0 +1,9 @@
+-- duplicate detection added in version 1.11.0
+
+create table track_hashes (
+	record integer primary key,
+	hash char(40)
+);
+
+create index track_hashes_hash on track_hashes (hash);
+create index records_date_time_utc on records (date_time_utc);
@@ -0,0 +1,31 @@
+from pytrainer.upgrade.context import UPGRADE_CONTEXT
+from pytrainer.core.duplicate import track_hash
+from pytrainer.lib.gpx import timed_track_points
+from sqlalchemy.sql.expression import text
+import logging
+import os
+import sqlalchemy
+
+# duplicate detection added in version 1.11.0
+
+def upgrade(migrate_engine=None):
+    if migrate_engine is None:
+        # sqlalchemy-migrate 0.5.4 does not provide migrate engine to upgrade scripts
+        migrate_engine = sqlalchemy.create_engine(UPGRADE_CONTEXT.db_url)
+    logging.info("Populating track_hashes table")
+    records = migrate_engine.execute("select id_record from records")
+    record_ids = [record["id_record"] for record in records]
+    records.close()
+    for record_id in record_ids:
+        gpx_file = os.path.join(UPGRADE_CONTEXT.conf_dir, "gpx", "%d.gpx" % record_id)
+        if not os.path.isfile(gpx_file):
+            continue
+        try:
+            lats, lons, times = timed_track_points(gpx_file)
+        except Exception as e:
+            logging.info("Error reading track of record_id %s: %s" % (record_id, e))
+            continue
+        if not lats:
+            continue
+        migrate_engine.execute(text("insert into track_hashes (record, hash) values (:record, :hash)"),
+                               record=record_id, hash=track_hash(lats, lons, times))
@@ -0,0 +1,122 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+"""Work done in background threads with the results handed back to the
+GUI thread.
+
+Only the latest job of a LatestJobRunner matters: submitting one cancels
+the previous, which stops at its next check and whose result is dropped.
+Jobs can also report their progress as they go.
+"""
+
+import logging
+import threading
+
+class Cancelled(Exception):
+    """Raised by Job.check once the job is cancelled."""
+
+class Job(object):
+
+    def __init__(self, number, report=None):
+        self.number = number
+        self._cancelled = threading.Event()
+        self._report = report
+
+    def report(self, *args):
+        """Hand progress over to the thread that wants it, unless cancelled."""
+        if self._report is not None and not self.cancelled:
+            self._report(self, *args)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def check(self):
+        """Stop the job here if it has been cancelled."""
+        if self.cancelled:
+            raise Cancelled()
+
+class LatestJobRunner(object):
+
+    """Runs each job in its own thread, cancelling the previous one.
+
+    Results are delivered through dispatch(function, *args), which runs a
+    function in the thread that wants them, gobject.idle_add for the GUI.
+    """
+
+    def __init__(self, dispatch, name="Worker"):
+        self._dispatch = dispatch
+        self._name = name
+        self._lock = threading.Lock()
+        self._count = 0
+        self._current = None
+
+    def submit(self, work, done, failed=None, discard=None, progress=None):
+        """Run work(job) in the background.
+
+        Once it returns, done(job, result) is dispatched, or failed(job,
+        exception) if it raised, unless the job was cancelled meanwhile.
+        discard(job, result) is dispatched instead for results that are
+        dropped, to clean up after them. Each job.report(*args) made by work
+        dispatches progress(job, *args).
+
+        Returns (Job): the new job.
+        """
+        report = None
+        if progress is not None:
+            report = lambda job, *args: self._dispatch(self._deliver, job, progress, None, *args)
+        with self._lock:
+            if self._current is not None:
+                self._current.cancel()
+            self._count += 1
+            job = self._current = Job(self._count, report)
+        thread = threading.Thread(target=self._run, args=(job, work, done, failed, discard),
+                                  name="%s-%d" % (self._name, job.number))
+        thread.daemon = True
+        thread.start()
+        return job
+
+    def cancel(self):
+        """Cancel the current job, if any."""
+        with self._lock:
+            if self._current is not None:
+                self._current.cancel()
+                self._current = None
+
+    def _run(self, job, work, done, failed, discard):
+        try:
+            result = work(job)
+        except Cancelled:
+            logging.debug("%s job %d cancelled" % (self._name, job.number))
+            return
+        except Exception as e:
+            logging.error("%s job %d failed: %s" % (self._name, job.number, e))
+            if failed is not None:
+                self._dispatch(self._deliver, job, failed, None, e)
+            return
+        self._dispatch(self._deliver, job, done, discard, result)
+
+    def _deliver(self, job, callback, discard, *values):
+        #Cancelled jobs may finish before noticing
+        if not job.cancelled:
+            callback(job, *values)
+        elif discard is not None:
+            discard(job, *values)
+        #Run once when dispatched with gobject.idle_add
+        return False
@@ -0,0 +1,101 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import calendar
+import numpy
+
+# Key formats understood by bucket_by_period, named after the strftime
+# directive the graphs used to build their keys with.
+DAY_OF_WEEK = "%a"
+DAY_OF_MONTH = "%d"
+MONTH = "%m"
+YEAR = "%Y"
+
+def parse_day_numbers(dates):
+    """Parse a sequence of dates into integer day numbers.
+
+    Args:
+        dates: sequence of "YYYY-MM-DD" strings or datetime.date objects.
+    Returns:
+        (numpy.ndarray): days since 1970-01-01 as int64, one per date.
+    """
+    return numpy.array([str(d) for d in dates], dtype="datetime64[D]").astype(numpy.int64)
+
+def period_keys(day_numbers, key_format):
+    """Derive bucket indices and labels for the given day numbers.
+
+    Week day, day of month, month and year are worked out arithmetically from
+    the day numbers rather than by formatting each date.
+
+    Args:
+        day_numbers (numpy.ndarray): days since 1970-01-01.
+        key_format (str): one of DAY_OF_WEEK, DAY_OF_MONTH, MONTH or YEAR.
+    Returns:
+        (numpy.ndarray, list): the bucket index for each day and the label of
+            each bucket index.
+    """
+    days = day_numbers.astype("datetime64[D]")
+    months = days.astype("datetime64[M]")
+    if key_format == DAY_OF_WEEK:
+        # 1970-01-01 was a Thursday; shift so that Monday is 0 like calendar
+        index = (day_numbers + 3) % 7
+        labels = [unicode(calendar.day_abbr[i]) for i in xrange(7)]
+    elif key_format == DAY_OF_MONTH:
+        index = (days - months.astype("datetime64[D]")).astype(numpy.int64)
+        labels = [u"%02d" % (i + 1) for i in xrange(31)]
+    elif key_format == MONTH:
+        index = months.astype(numpy.int64) % 12
+        labels = [u"%02d" % (i + 1) for i in xrange(12)]
+    elif key_format == YEAR:
+        years = days.astype("datetime64[Y]").astype(numpy.int64) + 1970
+        first_year = years.min() if len(years) else 1970
+        index = years - first_year
+        labels = [u"%d" % (first_year + i) for i in xrange(index.max() + 1 if len(index) else 0)]
+    else:
+        raise ValueError("Unsupported key format: {0}.".format(key_format))
+    return index, labels
+
+def bucket_by_period(dates, groups, values, key_format, average=False):
+    """Sum (or average) values per group and period.
+
+    Args:
+        dates: sequence of "YYYY-MM-DD" strings or datetime.date objects.
+        groups: sequence of group names (e.g. sports), one per date.
+        values: sequence of floats, one per date.
+        key_format (str): one of DAY_OF_WEEK, DAY_OF_MONTH, MONTH or YEAR.
+        average (bool): average the values within each bucket instead of
+            summing them.
+    Returns:
+        (dict): {group: {period label: value}} holding only the buckets that
+            received at least one value.
+    """
+    if not len(dates):
+        return {}
+    index, labels = period_keys(parse_day_numbers(dates), key_format)
+    group_names = sorted(set(groups))
+    group_index = dict((name, i) for i, name in enumerate(group_names))
+    num_buckets = len(labels)
+    flat = numpy.array([group_index[g] for g in groups], dtype=numpy.int64) * num_buckets + index
+    size = len(group_names) * num_buckets
+    sums = numpy.bincount(flat, weights=numpy.asarray(values, dtype=numpy.float64), minlength=size)
+    counts = numpy.bincount(flat, minlength=size)
+    if average:
+        sums = sums / numpy.maximum(counts, 1)
+    result = {}
+    for i in numpy.flatnonzero(counts):
+        group, bucket = divmod(int(i), num_buckets)
+        result.setdefault(group_names[group], {})[labels[bucket]] = float(sums[i])
+    return result
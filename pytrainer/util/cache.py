@@ -0,0 +1,88 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+from collections import OrderedDict
+
+class LruCache(object):
+
+    """A mapping that evicts its least recently used entries to stay within
+    a size budget.
+
+    By default every entry has a size of one, so the budget is a number of
+    entries. A sizeof function can be given to budget by e.g. bytes instead.
+    """
+
+    def __init__(self, max_size, sizeof=None):
+        if max_size <= 0:
+            raise ValueError("Maximum size must be positive.")
+        self._max_size = max_size
+        self._sizeof = sizeof if sizeof is not None else (lambda value: 1)
+        self._entries = OrderedDict()
+        self._size = 0
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Get the value for key, marking it as the most recently used."""
+        if key not in self._entries:
+            return default
+        value, size = self._entries.pop(key)
+        self._entries[key] = (value, size)
+        return value
+
+    def put(self, key, value):
+        """Store value for key, evicting older entries if over budget.
+
+        Returns (list): the (key, value) pairs that were evicted.
+        """
+        self.pop(key)
+        size = self._sizeof(value)
+        self._entries[key] = (value, size)
+        self._size += size
+        evicted = []
+        while self._size > self._max_size and len(self._entries) > 1:
+            old_key, (old_value, old_size) = self._entries.popitem(last=False)
+            self._size -= old_size
+            evicted.append((old_key, old_value))
+        return evicted
+
+    def pop(self, key, default=None):
+        """Remove key from the cache, returning its value."""
+        if key not in self._entries:
+            return default
+        value, size = self._entries.pop(key)
+        self._size -= size
+        return value
+
+    def keys(self):
+        """Get the keys from least to most recently used."""
+        return self._entries.keys()
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
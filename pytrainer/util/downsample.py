@@ -0,0 +1,109 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import numpy
+
+# Points kept per horizontal pixel of the axes a series is drawn in.
+POINTS_PER_PIXEL = 2
+
+def point_budget(width):
+    """Get the number of points worth drawing in an axes of the given width.
+
+    Args:
+        width (float): width of the axes in pixels.
+    Returns:
+        (int): the maximum number of points to keep for a series.
+    """
+    return max(int(width), 100) * POINTS_PER_PIXEL
+
+def lttb_indices(x, y, threshold):
+    """Select points with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are always kept. The points in between are
+    split into threshold - 2 buckets and the point forming the largest
+    triangle with the previously selected point and the average of the next
+    bucket is kept from each one.
+
+    Args:
+        x (numpy.ndarray): increasing x values.
+        y (numpy.ndarray): y values, same length as x.
+        threshold (int): number of points to select.
+    Returns:
+        (numpy.ndarray): sorted indices of the selected points.
+    """
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return numpy.arange(length)
+    edges = numpy.linspace(1, length - 1, threshold - 1).astype(numpy.int64)
+    indices = numpy.empty(threshold, dtype=numpy.int64)
+    indices[0] = 0
+    indices[-1] = length - 1
+    selected = 0
+    for i in xrange(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i < threshold - 3:
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = length - 1, length
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        ax, ay = x[selected], y[selected]
+        areas = numpy.abs((ax - avg_x) * (y[start:end] - ay) - (ax - x[start:end]) * (avg_y - ay))
+        selected = start + areas.argmax()
+        indices[i + 1] = selected
+    return indices
+
+def downsample(x_values, y_values, threshold, xlim=None, ylim=None):
+    """Reduce a series to about threshold points for display.
+
+    Only the points inside xlim (plus one either side so lines reach the
+    edges) are considered. y values are clipped to ylim when working out
+    which points matter, so zooming in on y keeps detail in the visible band.
+    The minimum and maximum of the visible points are always kept.
+
+    Series with non numeric values (e.g. dates) are returned unchanged.
+
+    Args:
+        x_values: sequence of increasing x values.
+        y_values: sequence of y values, same length as x_values.
+        threshold (int): number of points to aim for.
+        xlim (tuple): (min, max) of the visible x range, or None.
+        ylim (tuple): (min, max) of the visible y range, or None.
+    Returns:
+        (sequence, sequence): the x and y values to draw.
+    """
+    try:
+        x = numpy.asarray(x_values, dtype=numpy.float64)
+        y = numpy.asarray(y_values, dtype=numpy.float64)
+    except (TypeError, ValueError):
+        return x_values, y_values
+    if len(x) != len(y):
+        return x_values, y_values
+    if xlim is not None and xlim[0] is not None and xlim[1] is not None:
+        visible = numpy.flatnonzero((x >= min(xlim)) & (x <= max(xlim)))
+        if len(visible):
+            start = max(visible[0] - 1, 0)
+            end = min(visible[-1] + 2, len(x))
+            x = x[start:end]
+            y = y[start:end]
+    if len(x) <= threshold:
+        return x, y
+    significance = y
+    if ylim is not None and ylim[0] is not None and ylim[1] is not None:
+        significance = numpy.clip(y, min(ylim), max(ylim))
+    indices = lttb_indices(x, significance, threshold)
+    indices = numpy.union1d(indices, [y.argmin(), y.argmax()])
+    return x[indices], y[indices]
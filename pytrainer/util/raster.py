@@ -0,0 +1,38 @@
+# -*- coding: iso-8859-1 -*-
+
+#This program is free software; you can redistribute it and/or
+#modify it under the terms of the GNU General Public License
+#as published by the Free Software Foundation; either version 2
+#of the License, or (at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program; if not, write to the Free Software
+#Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+
+import numpy
+
+def rasterize(x, y, max_gap):
+    """Get the pixels a track passes through.
+
+    Consecutive points are joined by sampling the segment between them
+    about once per pixel, except across gaps longer than max_gap.
+
+    Returns (tuple): integer x and y arrays, with duplicates.
+    """
+    if len(x) < 2:
+        return numpy.floor(x).astype(numpy.int64), numpy.floor(y).astype(numpy.int64)
+    dx = numpy.diff(x)
+    dy = numpy.diff(y)
+    steps = numpy.ceil(numpy.maximum(numpy.abs(dx), numpy.abs(dy))).astype(numpy.int64)
+    #Jumps over a gap only keep their first point
+    steps[(steps < 1) | (steps > max_gap)] = 1
+    segment = numpy.repeat(numpy.arange(len(dx)), steps)
+    fraction = (numpy.arange(len(segment)) - numpy.repeat(numpy.cumsum(steps) - steps, steps)) / numpy.repeat(steps, steps).astype(numpy.float64)
+    xs = numpy.concatenate((x[segment] + dx[segment] * fraction, x[-1:]))
+    ys = numpy.concatenate((y[segment] + dy[segment] * fraction, y[-1:]))
+    return numpy.floor(xs).astype(numpy.int64), numpy.floor(ys).astype(numpy.int64)
@@ -17,6 +17,12 @@
 #Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
 
 import logging
+import math
+
+from pytrainer.core.route import EARTH_RADIUS, distances
+
+# Half side in degrees of the first box searched for the nearest waypoint
+NEAREST_START = 0.01
 
 class Waypoint:
 	def __init__(self, data_path = None, parent = None):
@@ -72,6 +78,58 @@ class Waypoint:
 		logging.debug("<<")
 		return retorno
 	
+	def getWaypointsInArea(self, minlat, minlon, maxlat, maxlon, limit=None):
+		"""Get the waypoints within an area, with the same columns as
+		getAllWaypoints, through the index on their position.
+		minlon is greater than maxlon for areas across the antimeridian."""
+		logging.debug(">>")
+		minlat, minlon, maxlat, maxlon = float(minlat), float(minlon), float(maxlat), float(maxlon)
+		if minlon <= maxlon:
+			lon_condition = "lon between %r and %r" % (minlon, maxlon)
+		else:
+			lon_condition = "(lon >= %r or lon <= %r)" % (minlon, maxlon)
+		condition = "lat between %r and %r and %s order by name" % (minlat, maxlat, lon_condition)
+		if limit is not None:
+			condition += " limit %d" % int(limit)
+		retorno = self.pytrainer_main.ddbb.select("waypoints","id_waypoint,lat,lon,ele,comment,time,name,sym",condition)
+		logging.debug("<<")
+		return retorno
+
+	def getNearestWaypoint(self, lat, lon):
+		"""Get the waypoint closest to a location, with the same columns as
+		getAllWaypoints, or None if there are no waypoints.
+
+		Looks in boxes of growing size around the location until the closest
+		waypoint found is nearer than the sides of the box."""
+		logging.debug(">>")
+		lat, lon = float(lat), float(lon)
+		lon_scale = max(math.cos(math.radians(lat)), 0.01)
+		half_side = NEAREST_START
+		while half_side < 180:
+			lon_side = half_side / lon_scale
+			if lon_side >= 180:
+				break
+			minlon = (lon - lon_side + 180) % 360 - 180
+			maxlon = (lon + lon_side + 180) % 360 - 180
+			waypoints = self.getWaypointsInArea(lat - half_side, minlon, lat + half_side, maxlon)
+			nearest = self._nearest(waypoints, lat, lon)
+			if nearest is not None and nearest[0] <= math.radians(half_side) * EARTH_RADIUS:
+				logging.debug("<<")
+				return nearest[1]
+			half_side *= 4
+		nearest = self._nearest(self.getAllWaypoints(), lat, lon)
+		logging.debug("<<")
+		return nearest[1] if nearest is not None else None
+
+	def _nearest(self, waypoints, lat, lon):
+		"""Get (distance in metres, waypoint) of the closest of some waypoints"""
+		waypoints = [w for w in waypoints if w[1] is not None and w[2] is not None]
+		if not waypoints:
+			return None
+		metres = distances([w[1] for w in waypoints], [w[2] for w in waypoints], lat, lon)
+		closest = int(metres.argmin())
+		return metres[closest], waypoints[closest]
+
 	def actualize_fromgpx(self,gpxfile):
 		logging.debug(">>")
 		#self.pytrainer_main.ddbb.connect()
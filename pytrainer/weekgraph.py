@@ -35,8 +35,8 @@ class WeekGraph(TimeGraph):
 		self.combovalue2 = combovalue2
 		self.KEY_FORMAT = "%a"
 
-	def drawgraph(self,values, date_ini):
-		TimeGraph.drawgraph(self, values, x_func=lambda x: getDays(date_ini))
+	def drawgraph(self,values, date_ini, period=None):
+		TimeGraph.drawgraph(self, values, x_func=lambda x: getDays(date_ini), period=period)
 
 def getDays(date_ini):
 	#TODO look at using calendar.day_abbr for this
@@ -36,8 +36,8 @@ class YearGraph(TimeGraph):
         self.combovalue2 = combovalue2
         self.KEY_FORMAT = "%m"
 
-    def drawgraph(self,values):
-        TimeGraph.drawgraph(self, values, x_func=lambda x: ["%02d" % m for m in xrange(1,13)])
+    def drawgraph(self,values, period=None):
+        TimeGraph.drawgraph(self, values, x_func=lambda x: ["%02d" % m for m in xrange(1,13)], period=period)
 
     def drawgraph2(self,values):
         
@@ -74,5 +74,5 @@ setup( 	name = "pytrainer",
 		('share/pixmaps/',['pytrainer.png']),
 		('share/applications/',['pytrainer.desktop'])
 		],
-	scripts=['bin/pytrainer'] 
+	scripts=['bin/pytrainer', 'bin/pytrainer-export', 'bin/pytrainer-fixelevation', 'bin/pytrainer-import', 'bin/pytrainer-importcsv'] 
 )